@@ -0,0 +1 @@
+"""Offline benchmarks for the data pipeline and the Streamlit app (run with `python -m`)."""
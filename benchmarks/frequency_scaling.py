@@ -0,0 +1,185 @@
+"""
+Runtime of the clean and process stages for monthly compared to quarterly data.
+
+Monthly series have three times as many observations as quarterly series. Monthly raw data
+is synthesized from the committed quarterly raw data (each quarter split evenly over its
+months), so the benchmark runs offline. Both frequencies are cleaned and processed in a
+temporary working directory, and the monthly/quarterly runtime ratio of each stage is
+reported. When a gates file is given, exits with a non-zero status code if a ratio exceeds
+its gate.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.frequency_scaling [--states Texas California ...] [--workers 1]
+        [--repeat 3] [--gates benchmarks/frequency_gates.json] [--output logs/frequency.json]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+# First Party Imports
+from src.d00_utils.const import (
+    EIA_API_IDS_YML_FILEPATH,
+    FREQUENCIES,
+    INTERMEDIATE_DATA_FOLDER,
+    RAW_DATA_FOLDER,
+    frequency_folder,
+)
+from src.d00_utils.utils import get_filepath, load_yml
+from src.d02_intermediate.clean_raw_data import DataCleaner
+from src.d03_processing.create_model_input import DataPreprocessor
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GATES_FILEPATH = os.path.join(ROOT_FOLDER, "benchmarks", "frequency_gates.json")
+DEFAULT_STATES = ["Texas", "California", "New York", "Florida", "Wyoming"]
+
+
+def monthly_raw_data(json_data: dict) -> dict:
+    """Split each quarterly value of an EIA API response evenly over the months of its quarter."""
+    if "series" not in json_data:
+        # Invalid responses are kept as is
+        return json_data
+    series = json_data["series"][0]
+    data = []
+    for period, value in series["data"]:
+        year, quarter = period.split("Q")
+        for month in range(3 * int(quarter), 3 * int(quarter) - 3, -1):
+            data.append(["{}{:02d}".format(year, month), None if value is None else value / 3])
+    return dict(json_data, series=[dict(series, f="M", data=data)])
+
+
+def prepare_working_directory(working_folder: str, data_types: List[str], states: List[str]):
+    """Copy the configuration and quarterly raw data and synthesize monthly raw data."""
+    shutil.copytree(os.path.join(ROOT_FOLDER, "conf"), os.path.join(working_folder, "conf"))
+    raw_folder = os.path.join(ROOT_FOLDER, RAW_DATA_FOLDER)
+    for data_type in data_types:
+        for state in states:
+            source_folder = os.path.join(raw_folder, data_type, state)
+            for file_name in os.listdir(source_folder):
+                with open(os.path.join(source_folder, file_name), "r") as f:
+                    json_data = json.load(f)
+                for frequency, content in [
+                    ("quarterly", json_data),
+                    ("monthly", monthly_raw_data(json_data)),
+                ]:
+                    folder = os.path.join(
+                        working_folder, frequency_folder(RAW_DATA_FOLDER, frequency), data_type
+                    )
+                    with open(get_filepath(folder, state, file_name), "w") as f:
+                        json.dump(content, f)
+
+
+def time_stage(run_stage: Callable, repeat: int) -> float:
+    """Best wall time of a stage over several repetitions in seconds."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_stage()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def count_rows(frequency: str) -> int:
+    """Number of cleaned observations of a frequency in the working directory."""
+    rows = 0
+    for folder, _, file_names in os.walk(frequency_folder(INTERMEDIATE_DATA_FOLDER, frequency)):
+        if frequency == "quarterly" and FREQUENCIES["monthly"]["folder"] in folder.split(os.sep):
+            continue
+        for file_name in file_names:
+            with open(os.path.join(folder, file_name), "r") as f:
+                rows += sum(1 for _ in f) - 1
+    return rows
+
+
+def run_benchmark(states: List[str], workers: int, repeat: int) -> dict:
+    """Clean and process the raw data of the states for each frequency and compare runtimes."""
+    api_ids = load_yml(os.path.join(ROOT_FOLDER, EIA_API_IDS_YML_FILEPATH))
+    cwd = os.getcwd()
+    working_folder = tempfile.mkdtemp(prefix="frequency_scaling-")
+    try:
+        prepare_working_directory(working_folder, list(api_ids), states)
+        # Data folders are relative to the working directory
+        os.chdir(working_folder)
+        report: Dict[str, dict] = {"states": states, "workers": workers, "frequencies": {}}
+        for frequency in FREQUENCIES:
+            stages = {
+                "clean": lambda: [
+                    DataCleaner(data_type, ids, states, frequency=frequency).clean_data(workers)
+                    for data_type, ids in api_ids.items()
+                ],
+                "process": lambda: [
+                    DataPreprocessor(data_type, ids, states, frequency=frequency).process_data(
+                        workers
+                    )
+                    for data_type, ids in api_ids.items()
+                ],
+            }
+            seconds = {stage: time_stage(run_stage, repeat) for stage, run_stage in stages.items()}
+            report["frequencies"][frequency] = dict(seconds=seconds, rows=count_rows(frequency))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(working_folder, ignore_errors=True)
+
+    quarterly, monthly = report["frequencies"]["quarterly"], report["frequencies"]["monthly"]
+    report["ratios"] = {
+        stage: monthly["seconds"][stage] / quarterly["seconds"][stage]
+        for stage in quarterly["seconds"]
+    }
+    report["ratios"]["rows"] = monthly["rows"] / quarterly["rows"]
+    return report
+
+
+def check_gates(report: dict, gates: dict) -> List[str]:
+    """
+    Compare a frequency scaling report with gates and return all violations.
+
+    Gates file format::
+
+        {"max_ratio": {"clean": 2.0, "process": 2.0}}
+    """
+    violations = []
+    for stage, limit in gates.get("max_ratio", {}).items():
+        ratio = report["ratios"].get(stage)
+        if ratio is not None and ratio > limit:
+            violations.append(f"monthly/quarterly runtime of {stage} {ratio:.2f} > {limit}")
+    return violations
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--states", nargs="+", default=DEFAULT_STATES)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes per stage")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per stage")
+    parser.add_argument(
+        "--gates", default=DEFAULT_GATES_FILEPATH, help="JSON file of regression gates ('' to skip)"
+    )
+    parser.add_argument("--output", default=None, help="Write JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args.states, args.workers, args.repeat)
+    log.info("Frequency scaling report:\n" + json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.gates:
+        with open(args.gates) as f:
+            violations = check_gates(report, json.load(f))
+        for violation in violations:
+            log.error(f"Frequency scaling gate exceeded: {violation}")
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
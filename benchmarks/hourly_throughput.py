@@ -0,0 +1,156 @@
+"""
+Throughput and peak memory of the streaming aggregation of hourly records at synthetic scales.
+
+For each number of hours, synthetic records of the stub EIA-930 API are aggregated into
+hourly, daily and quarterly windows in a fresh process and temporary working directory. The
+aggregation throughput (records per second, excluding the time generating records) is reported
+with the peak resident memory. Windows are written as they close, so peak memory stays about
+constant while the history grows. When a gates file is given, exits with a non-zero status code
+if the throughput of any scale is below its gate, or the peak memory or its growth from the
+smallest to the largest scale exceeds its gate.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.hourly_throughput [--hours 2190 8760] [--respondents 64]
+        [--batch-size 1000000] [--gates benchmarks/hourly_gates.json]
+        [--output logs/hourly_throughput.json]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+# First Party Imports
+from src.d00_utils.const import EIA930_FUEL_CODES_YML_FILEPATH, EMISSIONS_FACTORS_YML_FILEPATH
+from src.d00_utils.utils import load_yml
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GATES_FILEPATH = os.path.join(ROOT_FOLDER, "benchmarks", "hourly_gates.json")
+
+
+def run_scale(working_folder: str, hours: int, respondents: int, batch_size: int) -> dict:
+    """Aggregate synthetic hourly records in a working directory (run in a fresh process)."""
+    # Data folders are relative to the working directory
+    os.chdir(working_folder)
+    # Imported after changing directory, in the fresh process
+    # First Party Imports
+    from src.d01_data.get_hourly_data import StubHourlyAPI
+    from src.d03_processing.aggregate_hourly_data import HourlyAggregator
+
+    source = StubHourlyAPI(respondents=respondents, hours=hours, batch_size=batch_size)
+    aggregator = HourlyAggregator(
+        load_yml(EIA930_FUEL_CODES_YML_FILEPATH),
+        load_yml(EMISSIONS_FACTORS_YML_FILEPATH)["Net_Gen_By_Fuel_MWh"],
+    )
+    baseline_rss = _peak_rss_bytes()
+    stats = aggregator.aggregate(source.batches())
+    return dict(
+        rows=stats["rows"],
+        aggregate_seconds=stats["aggregate_seconds"],
+        rows_per_second=stats["rows_per_second"],
+        windows=stats["windows"],
+        baseline_rss_mb=baseline_rss / 1024**2,
+        peak_rss_mb=_peak_rss_bytes() / 1024**2,
+    )
+
+
+def run_benchmark(hour_scales: List[int], respondents: int, batch_size: int) -> dict:
+    """Aggregate synthetic hourly records at each scale."""
+    report: dict = {"respondents": respondents, "batch_size": batch_size, "scales": {}}
+    for hours in hour_scales:
+        working_folder = tempfile.mkdtemp(prefix="hourly_throughput-")
+        try:
+            shutil.copytree(os.path.join(ROOT_FOLDER, "conf"), os.path.join(working_folder, "conf"))
+            # A fresh process per scale, so peak memory is not carried over between scales
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(
+                    run_scale, working_folder, hours, respondents, batch_size
+                ).result()
+        finally:
+            shutil.rmtree(working_folder, ignore_errors=True)
+        report["scales"][str(hours)] = result
+        log.info(f"{hours} hours: {result}")
+
+    results = list(report["scales"].values())
+    report["min_rows_per_second"] = min(result["rows_per_second"] for result in results)
+    report["peak_rss_mb"] = max(result["peak_rss_mb"] for result in results)
+    report["rss_growth"] = results[-1]["peak_rss_mb"] / results[0]["peak_rss_mb"]
+    return report
+
+
+def check_gates(report: dict, gates: dict) -> List[str]:
+    """
+    Compare an hourly throughput report with gates and return all violations.
+
+    Gates file format::
+
+        {"min_rows_per_second": 1000000, "max_peak_rss_mb": 1000, "max_rss_growth": 1.5}
+    """
+    violations = []
+    if (
+        "min_rows_per_second" in gates
+        and report["min_rows_per_second"] < gates["min_rows_per_second"]
+    ):
+        violations.append(
+            f"throughput {report['min_rows_per_second']:.0f} rows/s "
+            f"< {gates['min_rows_per_second']} rows/s"
+        )
+    if "max_peak_rss_mb" in gates and report["peak_rss_mb"] > gates["max_peak_rss_mb"]:
+        violations.append(
+            f"peak RSS {report['peak_rss_mb']:.0f} MB > {gates['max_peak_rss_mb']} MB"
+        )
+    if "max_rss_growth" in gates and report["rss_growth"] > gates["max_rss_growth"]:
+        violations.append(
+            f"peak RSS growth across scales {report['rss_growth']:.2f} > {gates['max_rss_growth']}"
+        )
+    return violations
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident memory of this process (ru_maxrss is in kilobytes on Linux)."""
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--hours", nargs="+", type=int, default=[2190, 8760], help="Hours of records per scale"
+    )
+    parser.add_argument("--respondents", type=int, default=64, help="Balancing authorities")
+    parser.add_argument("--batch-size", type=int, default=1_000_000, help="Records per batch")
+    parser.add_argument(
+        "--gates", default=DEFAULT_GATES_FILEPATH, help="JSON file of regression gates ('' to skip)"
+    )
+    parser.add_argument("--output", default=None, help="Write JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(sorted(args.hours), args.respondents, args.batch_size)
+    log.info("Hourly throughput report:\n" + json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.gates:
+        with open(args.gates) as f:
+            violations = check_gates(report, json.load(f))
+        for violation in violations:
+            log.error(f"Hourly throughput gate exceeded: {violation}")
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
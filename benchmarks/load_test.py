@@ -0,0 +1,346 @@
+"""
+Headless load test of the Streamlit app using Streamlit's app testing interface.
+
+Simulates concurrent sessions which each open one page and make a series of realistic
+widget changes. Sessions are spread over worker processes which stand in for Streamlit
+server processes (sessions in one worker share its caches). Reports p50/p95/p99 rerun
+latency per page, peak RSS of the largest worker and hit rates of the app caches.
+When a gates file is given, exits with a non-zero status code if any gate is exceeded.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.load_test [--sessions 8] [--workers 4] [--interactions 10]
+        [--pages single_region_analysis multi_region_analysis emissions_on_map]
+        [--gates benchmarks/load_test_gates.json] [--output logs/load_test.json]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List
+
+# Package Imports
+import numpy as np
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_FILEPATH = os.path.join(ROOT_FOLDER, "src", "streamlit_app.py")
+DEFAULT_GATES_FILEPATH = os.path.join(ROOT_FOLDER, "benchmarks", "load_test_gates.json")
+
+# The app imports pages as `streamlit_pages.*` and pages import `src.*`
+for path in (ROOT_FOLDER, os.path.join(ROOT_FOLDER, "src")):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+PAGE_TITLES = {
+    "single_region_analysis": "Single Region Analysis",
+    "multi_region_analysis": "Multi-Region Analysis",
+    "emissions_on_map": "Emissions on USA Map",
+}
+
+
+def find_widget(at, widget_type: str, label: str):
+    """Find a widget by type (eg: 'selectbox') and label in the main area or sidebar."""
+    for widget in list(getattr(at, widget_type)) + list(getattr(at.sidebar, widget_type)):
+        if widget.label == label:
+            return widget
+    raise LookupError(f"No {widget_type} with label '{label}' found on page")
+
+
+def single_region_interaction(at, rng: random.Random):
+    """Pick a random state, generation type and time unit on the single region page."""
+    states = find_widget(at, "selectbox", "Pick a region to visualize").options
+    fuels = find_widget(at, "selectbox", "Pick a generation type").options
+    action = rng.choice(["state", "fuel", "time_unit"])
+    if action == "state":
+        find_widget(at, "selectbox", "Pick a region to visualize").select(rng.choice(states))
+    elif action == "fuel":
+        find_widget(at, "selectbox", "Pick a generation type").select(rng.choice(fuels))
+    else:
+        find_widget(at, "radio", "Select the time unit to view data by.").set_value(
+            rng.choice(["Quarter", "Year"])
+        )
+
+
+def single_region_setup(at):
+    """Tick the 'Let's Get Started!' checkbox to show the single region charts."""
+    find_widget(at, "checkbox", "Let's Get Started!").check()
+
+
+def multi_region_interaction(at, rng: random.Random):
+    """Change selected regions or region groups, generation type, time unit or emissions toggle."""
+    action = rng.choice(["regions", "groups", "fuel", "time_unit", "emissions"])
+    if action == "regions":
+        regions = find_widget(at, "multiselect", "Pick regions to compare.")
+        n_regions = rng.choice([1, 3, 10, len(regions.options)])
+        regions.set_value(rng.sample(regions.options, n_regions))
+    elif action == "groups":
+        groups = find_widget(at, "multiselect", "Pick region groups to compare.")
+        groups.set_value(rng.sample(groups.options, rng.choice([0, 1, 3])))
+    elif action == "fuel":
+        fuel = find_widget(at, "selectbox", "Pick a generation type")
+        fuel.select(rng.choice(fuel.options))
+    elif action == "time_unit":
+        find_widget(at, "radio", "Select the time unit to view data by.").set_value(
+            rng.choice(["Quarter", "Year"])
+        )
+    else:
+        emissions = find_widget(at, "checkbox", "Show Greenhouse Gas Emissions")
+        emissions.set_value(not emissions.value)
+
+
+def emissions_on_map_interaction(at, rng: random.Random):
+    """Change emissions type, regions, year or generation type on the map page."""
+    action = rng.choice(["emissions_type", "regions", "year", "fuel"])
+    if action == "emissions_type":
+        find_widget(at, "radio", "Select the type of emissions data.").set_value(
+            rng.choice(["Emissions Intensity", "Total Emissions"])
+        )
+    elif action == "regions":
+        regions = find_widget(at, "radio", "Show emissions by")
+        regions.set_value(rng.choice(regions.options))
+    elif action == "year":
+        year = find_widget(at, "slider", "Pick a year in time")
+        year.set_value(rng.randint(year.min, year.max))
+    else:
+        fuel = find_widget(at, "selectbox", "Pick a generation type")
+        if not fuel.disabled:
+            fuel.select(rng.choice(fuel.options))
+
+
+# page: (setup run once after opening the page, interaction repeated on every rerun)
+PAGE_SCENARIOS: Dict[str, tuple] = {
+    "single_region_analysis": (single_region_setup, single_region_interaction),
+    "multi_region_analysis": (None, multi_region_interaction),
+    "emissions_on_map": (None, emissions_on_map_interaction),
+}
+
+
+class _Session:
+    """One simulated user session on one page of the app."""
+
+    def __init__(self, page: str, seed: int, timeout: float):
+        # Package Imports
+        from streamlit.testing.v1 import AppTest
+
+        self.page = page
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.latencies = []
+        self.errors = 0
+        self.at = AppTest.from_file(APP_FILEPATH, default_timeout=timeout)
+
+    def rerun(self, action: Callable = None):
+        """Apply a widget change and time the resulting rerun of the app."""
+        if action is not None:
+            action()
+        start = time.perf_counter()
+        self.at.run(timeout=self.timeout)
+        self.latencies.append(time.perf_counter() - start)
+        self.errors += len(self.at.exception)
+
+    def open_page(self):
+        """Open the app and navigate to the session's page."""
+        self.rerun()
+        navigation = find_widget(self.at, "selectbox", "App Navigation")
+        self.rerun(lambda: navigation.select(PAGE_TITLES[self.page]))
+        setup, _ = PAGE_SCENARIOS[self.page]
+        if setup is not None:
+            self.rerun(lambda: setup(self.at))
+
+    def interact(self):
+        """Make one random widget change on the page."""
+        _, interaction = PAGE_SCENARIOS[self.page]
+        self.rerun(lambda: interaction(self.at, self.rng))
+
+
+def run_worker(sessions: List[tuple], n_interactions: int, timeout: float) -> dict:
+    """
+    Run sessions in one process, standing in for one Streamlit server process. Sessions are
+    interleaved round-robin and share this process's caches.
+
+    Streamlit's app testing interface uses a process-wide runtime, so sessions within a
+    process cannot rerun at the same time; concurrency comes from running several workers.
+
+    Parameters
+    -----------
+    sessions: List[tuple]
+        (page, seed) for each session
+    n_interactions: int
+        Number of widget changes per session
+    timeout: float
+        Timeout of one rerun in seconds
+
+    Returns
+    --------
+    dict
+        Rerun latencies and errors by page, peak RSS and cache statistics of the worker
+    """
+    # First Party Imports
+    from src.streamlit_pages.caching import get_cache_stats
+
+    active_sessions = [_Session(page, seed, timeout) for page, seed in sessions]
+    for session in active_sessions:
+        session.open_page()
+    for _ in range(n_interactions):
+        for session in active_sessions:
+            session.interact()
+
+    results = {}
+    for session in active_sessions:
+        page_results = results.setdefault(session.page, {"latencies": [], "errors": 0})
+        page_results["latencies"].extend(session.latencies)
+        page_results["errors"] += session.errors
+    return {"pages": results, "peak_rss_mb": peak_rss_mb(), "cache_stats": get_cache_stats()}
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MB."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    return peak / 1024**2 if sys.platform == "darwin" else peak / 1024
+
+
+def run_load_test(
+    pages: List[str],
+    n_sessions: int,
+    n_interactions: int,
+    n_workers: int,
+    timeout: float,
+    seed: int = 0,
+) -> dict:
+    """
+    Run n_sessions sessions for each page spread over n_workers concurrent processes and
+    summarize rerun latencies, peak RSS and cache hit rates.
+
+    Returns
+    --------
+    dict
+        Load test report
+    """
+    sessions = [(page, seed + idx) for idx in range(n_sessions) for page in pages]
+    sessions_by_worker = [sessions[idx::n_workers] for idx in range(n_workers)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [
+            executor.submit(run_worker, worker_sessions, n_interactions, timeout)
+            for worker_sessions in sessions_by_worker
+            if worker_sessions
+        ]
+        worker_reports = [future.result() for future in futures]
+
+    report = {
+        "sessions_per_page": n_sessions,
+        "interactions": n_interactions,
+        "workers": len(worker_reports),
+        "wall_time_s": time.perf_counter() - start,
+        "pages": {},
+        "peak_rss_mb": max(worker["peak_rss_mb"] for worker in worker_reports),
+        "cache_stats": {},
+    }
+    for page in pages:
+        latencies_ms = 1e3 * np.concatenate(
+            [
+                worker["pages"][page]["latencies"]
+                for worker in worker_reports
+                if page in worker["pages"]
+            ]
+        )
+        report["pages"][page] = {
+            "reruns": len(latencies_ms),
+            "errors": sum(
+                worker["pages"].get(page, {}).get("errors", 0) for worker in worker_reports
+            ),
+            "p50_ms": float(np.percentile(latencies_ms, 50)),
+            "p95_ms": float(np.percentile(latencies_ms, 95)),
+            "p99_ms": float(np.percentile(latencies_ms, 99)),
+        }
+
+    # Sum cache counters over workers
+    for worker in worker_reports:
+        for name, stats in worker["cache_stats"].items():
+            total = report["cache_stats"].setdefault(name, {"calls": 0, "misses": 0})
+            total["calls"] += stats["calls"]
+            total["misses"] += stats["misses"]
+    for stats in report["cache_stats"].values():
+        stats["hit_rate"] = (
+            (stats["calls"] - stats["misses"]) / stats["calls"] if stats["calls"] else None
+        )
+    return report
+
+
+def check_gates(report: dict, gates: dict) -> List[str]:
+    """
+    Compare a load test report with gates and return all violations.
+
+    Gates file format::
+
+        {"peak_rss_mb": 2000, "min_cache_hit_rate": 0.5,
+         "pages": {"emissions_on_map": {"p95_ms": 500, "errors": 0}, ...}}
+    """
+    violations = []
+    if "peak_rss_mb" in gates and report["peak_rss_mb"] > gates["peak_rss_mb"]:
+        violations.append(f"peak RSS {report['peak_rss_mb']:.0f} MB > {gates['peak_rss_mb']} MB")
+
+    for page, page_gates in gates.get("pages", {}).items():
+        if page not in report["pages"]:
+            continue
+        for metric, limit in page_gates.items():
+            value = report["pages"][page][metric]
+            if value > limit:
+                violations.append(f"{page} {metric} {value:.0f} > {limit}")
+
+    min_hit_rate = gates.get("min_cache_hit_rate")
+    if min_hit_rate is not None:
+        for name, stats in report["cache_stats"].items():
+            if stats["hit_rate"] is not None and stats["hit_rate"] < min_hit_rate:
+                violations.append(
+                    f"cache hit rate of {name} {stats['hit_rate']:.2f} < {min_hit_rate}"
+                )
+    return violations
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pages", nargs="+", default=list(PAGE_SCENARIOS), choices=PAGE_SCENARIOS)
+    parser.add_argument("--sessions", type=int, default=8, help="Sessions per page")
+    parser.add_argument(
+        "--workers", type=int, default=4, help="Concurrent processes standing in for app servers"
+    )
+    parser.add_argument("--interactions", type=int, default=10, help="Widget changes per session")
+    parser.add_argument("--timeout", type=float, default=120, help="Timeout of one rerun (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--gates", default=DEFAULT_GATES_FILEPATH, help="JSON file of regression gates ('' to skip)"
+    )
+    parser.add_argument("--output", default=None, help="Write JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_load_test(
+        args.pages, args.sessions, args.interactions, args.workers, args.timeout, args.seed
+    )
+    log.info("Load test report:\n" + json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.gates:
+        with open(args.gates) as f:
+            violations = check_gates(report, json.load(f))
+        for violation in violations:
+            log.error(f"Load test gate exceeded: {violation}")
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
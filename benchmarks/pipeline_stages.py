@@ -0,0 +1,254 @@
+"""
+Runtime and peak memory of every pipeline stage at synthetic scales, compared with a baseline.
+
+For each number of regions, synthetic EIA API responses (see `benchmarks.synthetic_data`) are
+generated in a temporary working directory, so the benchmark runs fully offline. The clean,
+process, train, forecast and emissions stages then run one after the other, each in a fresh
+process so its peak resident memory is measured on its own. The runtime, peak memory and
+status of every stage and scale are compared with the stored baseline: exits with a non-zero
+status code if a stage fails, or is slower or uses more memory than its baseline allows.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.pipeline_stages [--regions 4 16] [--fuels coal wind] [--periods 84]
+        [--zero-fraction 0.1] [--frequency quarterly] [--stages clean process ...]
+        [--baseline benchmarks/pipeline_baseline.json] [--update-baseline]
+        [--output logs/pipeline_stages.json]
+
+Timings depend on the machine, so record a baseline with ``--update-baseline`` on the machine
+which checks for regressions.
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+# First Party Imports
+from benchmarks.synthetic_data import prepare_working_directory, select_api_ids, select_regions
+from src.d00_utils.const import DEFAULT_FREQUENCY, FREQUENCIES
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE_FILEPATH = os.path.join(ROOT_FOLDER, "benchmarks", "pipeline_baseline.json")
+BENCHMARKED_STAGES = ["clean", "process", "train", "forecast", "emissions"]
+# Allowed ratios to the baseline, unless the baseline file sets its own
+DEFAULT_TOLERANCE = {"seconds": 1.5, "peak_rss_mb": 1.25}
+# Runtime differences below this many seconds are noise, not regressions
+DEFAULT_MIN_SECONDS = 0.5
+
+
+def run_stage(
+    working_folder: str, stage: str, states: List[str], fuel_types: List[str], frequency: str
+) -> dict:
+    """Run a pipeline stage in a working directory (run in a fresh process)."""
+    # Data folders are relative to the working directory
+    os.chdir(working_folder)
+    # Imported after changing directory, in the fresh process
+    # First Party Imports
+    from src.d00_utils.const import EIA_API_IDS_YML_FILEPATH, EMISSIONS_FACTORS_YML_FILEPATH
+    from src.pipeline import PipelineInterface
+
+    interface = PipelineInterface(
+        EIA_API_IDS_YML_FILEPATH,
+        EMISSIONS_FACTORS_YML_FILEPATH,
+        states=states,
+        fuel_types=fuel_types,
+        force=True,
+        frequency=frequency,
+    )
+    baseline_rss = _peak_rss_bytes()
+    start = time.perf_counter()
+    getattr(interface, dict(PipelineInterface.STAGES)[stage])()
+    return dict(
+        seconds=time.perf_counter() - start,
+        baseline_rss_mb=baseline_rss / 1024**2,
+        peak_rss_mb=_peak_rss_bytes() / 1024**2,
+        status="ok",
+    )
+
+
+def run_scale(
+    regions: int,
+    stages: List[str],
+    fuel_types: List[str],
+    periods: int,
+    zero_fraction: float,
+    frequency: str,
+) -> dict:
+    """Generate synthetic raw data for a number of regions and run each stage on it."""
+    states = select_regions(regions)
+    working_folder = tempfile.mkdtemp(prefix="pipeline_stages-")
+    result: dict = {"stages": {}}
+    try:
+        result["series"] = prepare_working_directory(
+            working_folder,
+            api_ids=select_api_ids(fuel_types),
+            states=states,
+            periods=periods,
+            zero_fraction=zero_fraction,
+            frequency=frequency,
+        )
+        context = multiprocessing.get_context("spawn")
+        for stage in stages:
+            # A fresh process per stage, so peak memory is not carried over between stages
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                future = executor.submit(
+                    run_stage, working_folder, stage, states, fuel_types, frequency
+                )
+                try:
+                    result["stages"][stage] = future.result()
+                except Exception as e:
+                    log.exception(f"Stage {stage} failed for {regions} regions")
+                    result["stages"][stage] = dict(status="failed", error=repr(e))
+                    # Later stages depend on the outputs of the failed stage
+                    break
+            log.info(f"{regions} regions, {stage}: {result['stages'][stage]}")
+    finally:
+        shutil.rmtree(working_folder, ignore_errors=True)
+    return result
+
+
+def run_benchmark(
+    region_scales: List[int],
+    stages: List[str],
+    fuel_types: List[str],
+    periods: int,
+    zero_fraction: float,
+    frequency: str,
+) -> dict:
+    """Run the stages at each scale."""
+    report: dict = {
+        "fuel_types": fuel_types,
+        "periods": periods,
+        "zero_fraction": zero_fraction,
+        "frequency": frequency,
+        "scales": {},
+    }
+    for regions in region_scales:
+        report["scales"][str(regions)] = run_scale(
+            regions, stages, fuel_types, periods, zero_fraction, frequency
+        )
+    return report
+
+
+def compare_with_baseline(report: dict, baseline: dict) -> List[str]:
+    """
+    Compare a report with a baseline and return all regressions.
+
+    Baseline file format (a report with optional tolerances)::
+
+        {
+            "tolerance": {"seconds": 1.5, "peak_rss_mb": 1.25},
+            "min_seconds": 0.5,
+            "scales": {"4": {"stages": {"clean": {"seconds": 1.2, "peak_rss_mb": 150}, ...}}}
+        }
+    """
+    tolerance = dict(DEFAULT_TOLERANCE, **baseline.get("tolerance", {}))
+    min_seconds = baseline.get("min_seconds", DEFAULT_MIN_SECONDS)
+    violations = []
+    for regions, result in report["scales"].items():
+        baseline_stages = baseline.get("scales", {}).get(regions, {}).get("stages", {})
+        for stage, stage_result in result["stages"].items():
+            if stage_result["status"] != "ok":
+                violations.append(f"{stage} failed for {regions} regions: {stage_result['error']}")
+                continue
+            if stage not in baseline_stages:
+                log.warning(f"No baseline of {stage} for {regions} regions")
+                continue
+            for metric, limit in tolerance.items():
+                value, baseline_value = stage_result[metric], baseline_stages[stage][metric]
+                if metric == "seconds" and value - baseline_value < min_seconds:
+                    continue
+                if value > baseline_value * limit:
+                    violations.append(
+                        f"{stage} {metric} for {regions} regions {value:.2f} > "
+                        f"{limit} x baseline {baseline_value:.2f}"
+                    )
+    return violations
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident memory of this process (ru_maxrss is in kilobytes on Linux)."""
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--regions", nargs="+", type=int, default=[4, 16], help="Number of states per scale"
+    )
+    parser.add_argument("--fuels", nargs="+", default=None, help="Fuel types (default: all)")
+    parser.add_argument("--periods", type=int, default=84, help="Periods per series")
+    parser.add_argument("--zero-fraction", type=float, default=0.1, help="Fraction of zero series")
+    parser.add_argument("--frequency", choices=list(FREQUENCIES), default=DEFAULT_FREQUENCY)
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        choices=BENCHMARKED_STAGES,
+        default=BENCHMARKED_STAGES,
+        help="Stages to run in order (default: all)",
+    )
+    parser.add_argument(
+        "--baseline",
+        default=DEFAULT_BASELINE_FILEPATH,
+        help="JSON file of the baseline ('' to skip the comparison)",
+    )
+    parser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Write the results to the baseline file instead of comparing with it",
+    )
+    parser.add_argument("--output", default=None, help="Write JSON report to this file")
+    args = parser.parse_args(argv)
+
+    stages = [stage for stage in BENCHMARKED_STAGES if stage in args.stages]
+    report = run_benchmark(
+        sorted(args.regions), stages, args.fuels, args.periods, args.zero_fraction, args.frequency
+    )
+    log.info("Pipeline stages report:\n" + json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {"tolerance": DEFAULT_TOLERANCE, "min_seconds": DEFAULT_MIN_SECONDS}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        # Only replace the baseline of the scales and stages which were run
+        for regions, result in report["scales"].items():
+            baseline_scale = baseline.setdefault("scales", {}).setdefault(regions, {"stages": {}})
+            baseline_scale["series"] = result["series"]
+            baseline_scale["stages"].update(
+                (stage, stage_result)
+                for stage, stage_result in result["stages"].items()
+                if stage_result["status"] == "ok"
+            )
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        log.info(f"Updated baseline {args.baseline}")
+        return 0
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            violations = compare_with_baseline(report, json.load(f))
+        for violation in violations:
+            log.error(f"Pipeline stage regression: {violation}")
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+"""
+Peak memory and runtime of cleaning and rolling up plant level data at synthetic scales.
+
+Synthetic EIA-923 style CSV files are generated for a growing number of plants in a temporary
+working directory. Each scale is cleaned into plant partitions and rolled up to state level
+series in a fresh process, whose peak resident memory is reported with the runtime and number
+of partition files. Out-of-core processing keeps peak memory about constant while the number
+of plant series grows. When a gates file is given, exits with a non-zero status code if the
+peak memory or its growth from the smallest to the largest scale exceeds its gate.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.plant_scaling [--plants 5000 50000] [--years 2] [--chunk-size 10000]
+        [--gates benchmarks/plant_gates.json] [--output logs/plant_scaling.json]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List
+
+# Package Imports
+import numpy as np
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.const import (
+    EIA_API_IDS_YML_FILEPATH,
+    PLANTS_FOLDER,
+    RAW_DATA_FOLDER,
+    STATES_YML_FILEPATH,
+)
+from src.d00_utils.utils import load_yml
+from src.d02_intermediate.clean_plant_data import MONTHS
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_GATES_FILEPATH = os.path.join(ROOT_FOLDER, "benchmarks", "plant_gates.json")
+
+FUEL_CODES = ["COL", "NG", "NUC", "HYC", "WND", "SUN", "GEO", "WOO", "DFO", "OTH"]
+FUELS_PER_PLANT = 2
+# Source rows generated and written at a time
+GENERATOR_BLOCK_SIZE = 20_000
+
+
+def generate_source_files(
+    raw_folder: str, plants: int, years: List[int], seed: int = 0
+) -> List[str]:
+    """Write one synthetic EIA-923 style CSV file per year, a block of rows at a time."""
+    rng = np.random.default_rng(seed)
+    state_codes = [code for code in load_yml(STATES_YML_FILEPATH).values() if code != "US"]
+    plant_states = rng.choice(state_codes, plants)
+    plant_fuels = rng.choice(FUEL_CODES, (plants, FUELS_PER_PLANT))
+    file_paths = []
+    for year in years:
+        file_path = os.path.join(raw_folder, "EIA923_{}.csv".format(year))
+        header = True
+        for start in range(0, plants, GENERATOR_BLOCK_SIZE):
+            plant_ids = np.arange(start, min(start + GENERATOR_BLOCK_SIZE, plants))
+            rows = len(plant_ids) * FUELS_PER_PLANT
+            df = pd.DataFrame(
+                {
+                    "Plant Id": np.repeat(plant_ids, FUELS_PER_PLANT),
+                    "Plant State": np.repeat(plant_states[plant_ids], FUELS_PER_PLANT),
+                    "AER Fuel Type Code": plant_fuels[plant_ids].ravel(),
+                    "YEAR": year,
+                }
+            )
+            for prefix in ("Netgen", "Tot_MMBtu"):
+                values = rng.gamma(2.0, 5_000.0, (rows, len(MONTHS))).round(1)
+                for idx, month in enumerate(MONTHS):
+                    df["{} {}".format(prefix, month.capitalize())] = values[:, idx]
+            df.to_csv(file_path, mode="w" if header else "a", header=header, index=False)
+            header = False
+        file_paths.append(file_path)
+    return file_paths
+
+
+def run_scale(working_folder: str, chunk_size: int) -> dict:
+    """Clean and roll up the plant level data of a working directory (run in a fresh process)."""
+    # Data folders are relative to the working directory
+    os.chdir(working_folder)
+    # Imported after changing directory, in the fresh process
+    # First Party Imports
+    from src.d02_intermediate.aggregate_plant_data import PlantDataAggregator
+    from src.d02_intermediate.clean_plant_data import PlantDataCleaner, plant_partition_filepaths
+
+    baseline_rss = _peak_rss_bytes()
+    start = time.perf_counter()
+    PlantDataCleaner(chunk_size=chunk_size).clean_data()
+    clean_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for data_type, api_ids_dict in load_yml(EIA_API_IDS_YML_FILEPATH).items():
+        PlantDataAggregator(data_type, api_ids_dict).aggregate_data()
+    rollup_seconds = time.perf_counter() - start
+
+    partition_filepaths = plant_partition_filepaths()
+    return dict(
+        clean_seconds=clean_seconds,
+        rollup_seconds=rollup_seconds,
+        baseline_rss_mb=baseline_rss / 1024**2,
+        peak_rss_mb=_peak_rss_bytes() / 1024**2,
+        partition_files=len(partition_filepaths),
+        partition_mb=sum(os.path.getsize(path) for path in partition_filepaths) / 1024**2,
+    )
+
+
+def run_benchmark(plant_scales: List[int], years: int, chunk_size: int) -> dict:
+    """Generate, clean and roll up plant level data at each scale."""
+    report: dict = {"years": years, "chunk_size": chunk_size, "scales": {}}
+    for plants in plant_scales:
+        working_folder = tempfile.mkdtemp(prefix="plant_scaling-")
+        try:
+            shutil.copytree(os.path.join(ROOT_FOLDER, "conf"), os.path.join(working_folder, "conf"))
+            raw_folder = os.path.join(working_folder, RAW_DATA_FOLDER, PLANTS_FOLDER)
+            os.makedirs(raw_folder)
+            generate_source_files(raw_folder, plants, list(range(2021 - years + 1, 2022)))
+
+            # A fresh process per scale, so peak memory is not carried over between scales
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_scale, working_folder, chunk_size).result()
+        finally:
+            shutil.rmtree(working_folder, ignore_errors=True)
+
+        result["source_rows"] = plants * FUELS_PER_PLANT * years
+        result["plant_series"] = plants * FUELS_PER_PLANT
+        result["rows_per_second"] = result["source_rows"] * len(MONTHS) / result["clean_seconds"]
+        report["scales"][str(plants)] = result
+        log.info(f"{plants} plants: {result}")
+
+    peaks = [result["peak_rss_mb"] for result in report["scales"].values()]
+    report["peak_rss_mb"] = max(peaks)
+    report["rss_growth"] = peaks[-1] / peaks[0]
+    return report
+
+
+def check_gates(report: dict, gates: dict) -> List[str]:
+    """
+    Compare a plant scaling report with gates and return all violations.
+
+    Gates file format::
+
+        {"max_peak_rss_mb": 800, "max_rss_growth": 1.5}
+    """
+    violations = []
+    if "max_peak_rss_mb" in gates and report["peak_rss_mb"] > gates["max_peak_rss_mb"]:
+        violations.append(
+            f"peak RSS {report['peak_rss_mb']:.0f} MB > {gates['max_peak_rss_mb']} MB"
+        )
+    if "max_rss_growth" in gates and report["rss_growth"] > gates["max_rss_growth"]:
+        violations.append(
+            f"peak RSS growth across scales {report['rss_growth']:.2f} > {gates['max_rss_growth']}"
+        )
+    return violations
+
+
+def _peak_rss_bytes() -> int:
+    """Peak resident memory of this process (ru_maxrss is in kilobytes on Linux)."""
+    unit = 1 if sys.platform == "darwin" else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--plants", nargs="+", type=int, default=[5_000, 50_000], help="Number of plants per scale"
+    )
+    parser.add_argument("--years", type=int, default=2, help="Years of monthly data per plant")
+    parser.add_argument("--chunk-size", type=int, default=10_000, help="Source rows per chunk")
+    parser.add_argument(
+        "--gates", default=DEFAULT_GATES_FILEPATH, help="JSON file of regression gates ('' to skip)"
+    )
+    parser.add_argument("--output", default=None, help="Write JSON report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(sorted(args.plants), args.years, args.chunk_size)
+    log.info("Plant scaling report:\n" + json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.gates:
+        with open(args.gates) as f:
+            violations = check_gates(report, json.load(f))
+        for violation in violations:
+            log.error(f"Plant scaling gate exceeded: {violation}")
+        return 1 if violations else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
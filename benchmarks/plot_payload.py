@@ -0,0 +1,91 @@
+"""
+Payload size and build/serialization time of the multi-state plots for 1, 10 and 51 states.
+
+Browser render time cannot be measured headlessly, so figure JSON size and the time to
+build and serialize the figure are used as proxies (payload size dominates browser cost).
+
+Usage (from the repository root)::
+
+    python -m benchmarks.plot_payload [--states 1 10 51] [--repeat 3]
+"""
+# Python Libraries
+import argparse
+import logging
+import time
+from typing import Dict, List
+
+# Package Imports
+import pandas as pd
+
+# First Party Imports
+from src.d06_reporting.calculate_emissions import read_multi_region_dataset
+from src.d06_visualization.plot import plot_combined_data_multiple_states, plot_multiple_states
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+# name: keyword arguments passed to the plot functions
+RENDER_CONFIGS = {
+    "svg": dict(render_mode="svg"),
+    "auto": dict(render_mode="auto"),
+    "auto + decimation": dict(render_mode="auto", max_points=40),
+}
+
+
+def get_states_data(dataset: pd.DataFrame, name: str, n_states: int) -> Dict[str, pd.DataFrame]:
+    """Get quarterly data of the first n_states regions of a dataset in the multi-region dataset."""
+    df = dataset.loc[name]
+    states = df.index.unique("state")[:n_states]
+    return {state: df.loc[state].reset_index(drop=True) for state in states}
+
+
+def time_figure(build_figure, repeat: int) -> dict:
+    """Time building and serializing a figure and measure its JSON payload size."""
+    build_times, serialize_times = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fig = build_figure()
+        build_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        payload = fig.to_json()
+        serialize_times.append(time.perf_counter() - start)
+    return dict(
+        traces=len(fig.data),
+        trace_type=fig.data[0].type,
+        payload_kb=len(payload) / 1024,
+        build_ms=min(build_times) * 1e3,
+        serialize_ms=min(serialize_times) * 1e3,
+    )
+
+
+def main(argv: List[str] = None) -> pd.DataFrame:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--states", type=int, nargs="+", default=[1, 10, 51])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    dataset = read_multi_region_dataset()
+    results = []
+    for n_states in args.states:
+        gen_by_states = get_states_data(dataset, "Net_Gen_By_Fuel_MWh", n_states)
+        emissions_by_states = get_states_data(dataset, "Total_Emissions", n_states)
+        for config_name, kwargs in RENDER_CONFIGS.items():
+            plots = {
+                "multiple_states": lambda: plot_multiple_states(gen_by_states, "coal", **kwargs),
+                "combined_multiple_states": lambda: plot_combined_data_multiple_states(
+                    gen_by_states, emissions_by_states, "coal", **kwargs
+                ),
+            }
+            for plot_name, build_figure in plots.items():
+                result = dict(states=n_states, config=config_name, plot=plot_name)
+                result.update(time_figure(build_figure, args.repeat))
+                results.append(result)
+
+    df_results = pd.DataFrame(results)
+    log.info("Plot payload benchmark results:\n" + df_results.round(1).to_string(index=False))
+    return df_results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Check that an abandoned claim of the shared-filesystem work queue is taken over by one worker.
+
+Replays the interleaving in which two workers both find the same claim abandoned before either
+takes it over, and the one in which the abandoned claim is released while a worker takes it
+over. Then repeatedly lets worker processes race to claim a shard with an abandoned claim.
+Exits with a non-zero status code if a shard is claimed by more than one worker.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.queue_takeover [--workers 8] [--rounds 20]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from typing import List
+
+# First Party Imports
+from src.d00_utils.work_queue import CLAIMS_FOLDER, FileWorkQueue
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+SHARD_ID = "shard"
+LEASE_SECONDS = 60
+
+
+def abandon_claim(queue: FileWorkQueue, worker_id: str = "abandoned"):
+    """Submit a shard claimed by a worker which stopped touching its lock file a while ago."""
+    queue.clear()
+    queue.submit(SHARD_ID, [{"unit": 0}])
+    assert queue.claim(worker_id) is not None
+    abandoned = time.time() - 10 * LEASE_SECONDS
+    os.utime(queue._path(CLAIMS_FOLDER, SHARD_ID, ".lock"), (abandoned, abandoned))
+
+
+def lock_owner(queue: FileWorkQueue) -> str:
+    """ID of the worker holding the claim of the shard."""
+    with open(queue._path(CLAIMS_FOLDER, SHARD_ID, ".lock")) as f:
+        return json.load(f)["worker_id"]
+
+
+def check_interleavings(queue_folder: str) -> List[str]:
+    """Replay takeover interleavings step by step and return all violations."""
+    violations = []
+    worker_a = FileWorkQueue(queue_folder, LEASE_SECONDS)
+    worker_b = FileWorkQueue(queue_folder, LEASE_SECONDS)
+
+    # Both workers find the claim abandoned, then take it over one after the other
+    abandon_claim(worker_a)
+    claim_a = worker_a._abandoned_claim(SHARD_ID)
+    claim_b = worker_b._abandoned_claim(SHARD_ID)
+    took_over_a = worker_a._take_over(SHARD_ID, "a", claim_a)
+    took_over_b = worker_b._take_over(SHARD_ID, "b", claim_b)
+    if not took_over_a or took_over_b or lock_owner(worker_a) != "a":
+        violations.append(
+            f"concurrent takeover: a took over {took_over_a}, b took over {took_over_b}, "
+            f"lock held by {lock_owner(worker_a)}"
+        )
+
+    # The abandoned claim is released and the shard claimed again before the takeover
+    abandon_claim(worker_a)
+    claim_b = worker_b._abandoned_claim(SHARD_ID)
+    worker_a._release(SHARD_ID)
+    claimed_a = worker_a.claim("a") is not None
+    took_over_b = worker_b._take_over(SHARD_ID, "b", claim_b)
+    if not claimed_a or took_over_b or lock_owner(worker_a) != "a":
+        violations.append(
+            f"takeover of released claim: a claimed {claimed_a}, b took over {took_over_b}, "
+            f"lock held by {lock_owner(worker_a)}"
+        )
+    return violations
+
+
+def claim_shard(queue_folder: str, worker_id: str, barrier, results):
+    """Claim the shard as soon as every worker is ready (run in a worker process)."""
+    queue = FileWorkQueue(queue_folder, LEASE_SECONDS)
+    barrier.wait()
+    results.put((worker_id, queue.claim(worker_id) is not None))
+
+
+def race(queue_folder: str, workers: int, rounds: int) -> List[str]:
+    """Let worker processes race to take over an abandoned claim and return all violations."""
+    violations = []
+    queue = FileWorkQueue(queue_folder, LEASE_SECONDS)
+    context = multiprocessing.get_context("fork")
+    for round_number in range(rounds):
+        abandon_claim(queue)
+        barrier = context.Barrier(workers)
+        results = context.Queue()
+        processes = [
+            context.Process(target=claim_shard, args=(queue_folder, str(i), barrier, results))
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        # Read results before joining, so no worker blocks on a full queue
+        claimed = [worker_id for worker_id, ok in (results.get() for _ in processes) if ok]
+        for process in processes:
+            process.join()
+        if len(claimed) != 1:
+            violations.append(f"round {round_number}: shard claimed by workers {claimed}")
+    return violations
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8, help="Racing worker processes")
+    parser.add_argument("--rounds", type=int, default=20, help="Races of the worker processes")
+    args = parser.parse_args(argv)
+
+    queue_folder = tempfile.mkdtemp(prefix="queue_takeover-")
+    try:
+        violations = check_interleavings(queue_folder)
+        violations += race(queue_folder, args.workers, args.rounds)
+    finally:
+        shutil.rmtree(queue_folder, ignore_errors=True)
+    for violation in violations:
+        log.error(f"Work queue takeover check failed: {violation}")
+    if not violations:
+        log.info(f"Abandoned claims were taken over by one worker in {args.rounds} races")
+    return 1 if violations else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""
+Synthetic raw data shaped like EIA API responses, for benchmarks and offline development.
+
+One JSON response is written per region, data type and fuel type into the raw data folder of
+a working directory, exactly where `EIADataPull` saves API responses. Values follow a trend
+with yearly seasonality and noise. A fraction of the series are written as the invalid
+responses the EIA API returns for series without data, which the pipeline cleans into series
+of zeros.
+
+Usage (from the repository root)::
+
+    python -m benchmarks.synthetic_data --output-folder /tmp/synthetic [--regions 10]
+        [--fuels coal wind] [--periods 84] [--zero-fraction 0.1] [--frequency quarterly] [--seed 0]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+from typing import Dict, List
+
+# Package Imports
+import numpy as np
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.const import (
+    DEFAULT_FREQUENCY,
+    EIA_API_IDS_YML_FILEPATH,
+    FREQUENCIES,
+    HISTORY_END_DATE,
+    RAW_DATA_FOLDER,
+    STATES_YML_FILEPATH,
+    frequency_folder,
+)
+from src.d00_utils.utils import get_filepath, load_yml
+from src.d03_processing.create_model_input import DataPreprocessor
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+ROOT_FOLDER = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def select_api_ids(fuel_types: List[str] = None) -> Dict[str, dict]:
+    """
+    EIA API IDs of the source series of each data type needed for fuel types.
+
+    Parameters
+    -----------
+    fuel_types: List[str]
+        Optional fuel types (all fuel types by default). Like the pipeline, the inputs of the
+        calculated "other" feature are included with it.
+
+    Returns
+    --------
+    Dict[str, dict]
+        API IDs of the selected fuel types by data type (see `EIA_API_IDS_YML_FILEPATH`)
+    """
+    api_ids = load_yml(os.path.join(ROOT_FOLDER, EIA_API_IDS_YML_FILEPATH))
+    if fuel_types is None:
+        return api_ids
+    source_fuels = set(fuel_types)
+    if "other" in source_fuels:
+        source_fuels.update(DataPreprocessor.other_input_fuels)
+    return {
+        data_type: {fuel: api_id for fuel, api_id in api_ids_dict.items() if fuel in source_fuels}
+        for data_type, api_ids_dict in api_ids.items()
+    }
+
+
+def select_regions(regions: int) -> List[str]:
+    """Full names of the first states (regions) in the states YAML."""
+    states = list(load_yml(os.path.join(ROOT_FOLDER, STATES_YML_FILEPATH)))
+    if regions > len(states):
+        raise ValueError(f"At most {len(states)} regions can be generated, got {regions}")
+    return states[:regions]
+
+
+def generate_raw_data(
+    working_folder: str,
+    api_ids: Dict[str, dict],
+    states: List[str],
+    periods: int = 84,
+    zero_fraction: float = 0.1,
+    frequency: str = DEFAULT_FREQUENCY,
+    seed: int = 0,
+) -> int:
+    """
+    Write a synthetic EIA API response for every state, data type and fuel type.
+
+    Parameters
+    -----------
+    working_folder: str
+        Folder the raw data folder is created in
+    api_ids: Dict[str, dict]
+        API IDs of the fuel types of each data type (see `select_api_ids`)
+    states: List[str]
+        Full names of the states (regions) to generate series for
+    periods: int
+        Number of periods of each series, ending with the last period of the history
+    zero_fraction: float
+        Fraction of series written as invalid responses (cleaned into series of zeros)
+    frequency: str
+        Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
+    seed: int
+        Seed of the random values
+
+    Returns
+    --------
+    int
+        Number of series written
+    """
+    rng = np.random.default_rng(seed)
+    api_suffix = FREQUENCIES[frequency]["api_suffix"]
+    dates = pd.period_range(end=HISTORY_END_DATE, periods=periods, freq=api_suffix)
+    # Newest period first, like the EIA API (eg: 2021Q4 or 202112)
+    period_names = [str(date).replace("-", "") for date in dates[::-1]]
+    seasonality = np.sin(2 * np.pi * dates.month.to_numpy()[::-1] / 12)
+    trend = np.linspace(1.2, 0.8, periods)
+
+    state_codes = load_yml(os.path.join(ROOT_FOLDER, STATES_YML_FILEPATH))
+    raw_folder = os.path.join(working_folder, frequency_folder(RAW_DATA_FOLDER, frequency))
+    series_count = 0
+    for data_type, api_ids_dict in api_ids.items():
+        for state in states:
+            for fuel_type, api_id in api_ids_dict.items():
+                series_id = "{}.{}".format(
+                    api_id.format(state_codes[state]).rsplit(".", 1)[0], api_suffix
+                )
+                if rng.random() < zero_fraction:
+                    json_data = {
+                        "request": {"command": "series", "series_id": series_id},
+                        "data": {"error": "invalid series_id. For key registration, ..."},
+                    }
+                else:
+                    level = rng.gamma(2.0, 5_000.0)
+                    values = level * trend * (1 + 0.2 * seasonality)
+                    values *= rng.normal(1, 0.05, periods)
+                    json_data = {
+                        "request": {"command": "series", "series_id": series_id},
+                        "series": [
+                            {
+                                "series_id": series_id,
+                                "f": api_suffix,
+                                "start": period_names[-1],
+                                "end": period_names[0],
+                                "data": [
+                                    [period, round(float(value), 5)]
+                                    for period, value in zip(period_names, values)
+                                ],
+                            }
+                        ],
+                    }
+                file_name = "{}-{}.json".format(data_type, fuel_type)
+                folder = os.path.join(raw_folder, data_type)
+                with open(get_filepath(folder, state, file_name), "w") as f:
+                    json.dump(json_data, f)
+                series_count += 1
+    return series_count
+
+
+def prepare_working_directory(working_folder: str, **kwargs) -> int:
+    """
+    Copy the configuration into a working directory and generate synthetic raw data in it.
+
+    Parameters
+    -----------
+    working_folder: str
+        Working directory, in which the pipeline finds its configuration and data folders
+    kwargs:
+        Arguments of `generate_raw_data`
+
+    Returns
+    --------
+    int
+        Number of series written
+    """
+    shutil.copytree(
+        os.path.join(ROOT_FOLDER, "conf"), os.path.join(working_folder, "conf"), dirs_exist_ok=True
+    )
+    return generate_raw_data(working_folder, **kwargs)
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output-folder", required=True, help="Working directory to create")
+    parser.add_argument("--regions", type=int, default=10, help="Number of states")
+    parser.add_argument("--fuels", nargs="+", default=None, help="Fuel types (default: all)")
+    parser.add_argument("--periods", type=int, default=84, help="Periods per series")
+    parser.add_argument("--zero-fraction", type=float, default=0.1, help="Fraction of zero series")
+    parser.add_argument("--frequency", choices=list(FREQUENCIES), default=DEFAULT_FREQUENCY)
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random values")
+    args = parser.parse_args(argv)
+
+    series_count = prepare_working_directory(
+        args.output_folder,
+        api_ids=select_api_ids(args.fuels),
+        states=select_regions(args.regions),
+        periods=args.periods,
+        zero_fraction=args.zero_fraction,
+        frequency=args.frequency,
+        seed=args.seed,
+    )
+    log.info(f"Wrote {series_count} synthetic series to {args.output_folder}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,576 @@
+"""
+Command line interface to run the data pipeline.
+
+Usage (from the repository root)::
+
+    python -m src run                                    # run every stage
+    python -m src run --stages clean,train               # run selected stages
+    python -m src run --stages process:forecast          # run a range of stages
+    python -m src run --stages train: --states Texas,CA --fuels wind,solar_all --workers 4
+    python -m src run --dry-run                          # only log what would run
+    python -m src run --force                            # re-run series which are up to date
+    python -m src run --streaming --workers 4            # overlap pulling and model fitting
+    python -m src run --frequency monthly                # monthly instead of quarterly series
+    python -m src run --granularity plant                # roll up EIA-923 plant level files
+    python -m src run --stages train --states Texas --fuels wind --profile sampling
+    python -m src resume                                 # continue the latest unfinished run
+    python -m src hourly                                 # aggregate hourly EIA-930 files
+    python -m src hourly --stub-hours 720                # aggregate synthetic hourly records
+
+Snapshots of finished runs in the content-addressed snapshot store::
+
+    python -m src snapshot-create                        # record the current data folders
+    python -m src snapshot-list                          # runs with their size and new data
+    python -m src snapshot-diff <run_id> [<run_id>]      # files changed since a run
+    python -m src snapshot-pin <run_id> [--unpin]        # keep a run through garbage collection
+    python -m src snapshot-restore <run_id>              # roll the data folders back to a run
+    python -m src snapshot-gc --keep 5                   # remove old runs and unlinked data
+
+Sharded training and forecasting on several nodes sharing the repository folder::
+
+    python -m src shard-submit --queue /shared/queue --states Texas,CA   # queue work units
+    python -m src shard-worker --queue /shared/queue                     # on every node
+    python -m src shard-merge --queue /shared/queue                      # assemble outputs
+    python -m src shard-local --nodes 4                                  # all of it locally
+"""
+# Python Libraries
+import argparse
+import logging
+import sys
+import time
+from typing import List
+
+# First Party Imports
+from src.d00_utils.checkpoint import find_resumable_run, write_run_marker
+from src.d00_utils.const import (
+    DEFAULT_FREQUENCY,
+    DEFAULT_GRANULARITY,
+    EIA930_FUEL_CODES_YML_FILEPATH,
+    EIA_API_IDS_YML_FILEPATH,
+    EMISSIONS_FACTORS_YML_FILEPATH,
+    FREQUENCIES,
+    GRANULARITIES,
+    STATES_YML_FILEPATH,
+    get_states,
+)
+from src.d00_utils.profiling import PROFILERS
+from src.d00_utils.utils import load_yml
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+# Kept in sync with `PipelineInterface.STAGES`, which is not imported here so that
+# parsing arguments does not pull in the modelling dependencies
+STAGE_NAMES = ["pull", "clean", "process", "train", "forecast", "emissions", "maps", "reports"]
+
+
+def parse_stages(stages: str) -> List[str]:
+    """
+    Parse stage selection into a list of stage names in pipeline order.
+
+    Parameters
+    -----------
+    stages: str
+        Comma separated stage names (eg: `clean,train`) or an inclusive range of stages
+        (eg: `process:forecast`, `train:` or `:process`)
+
+    Returns
+    --------
+    List[str]
+        Selected stage names in pipeline order
+    """
+    if ":" in stages:
+        start, end = (part.strip() for part in stages.split(":", 1))
+        for stage in (start, end):
+            if stage and stage not in STAGE_NAMES:
+                raise argparse.ArgumentTypeError(f"Unknown stage: {stage}")
+        start_idx = STAGE_NAMES.index(start) if start else 0
+        end_idx = STAGE_NAMES.index(end) if end else len(STAGE_NAMES) - 1
+        if start_idx > end_idx:
+            raise argparse.ArgumentTypeError(f"Stage range is empty: {stages}")
+        return STAGE_NAMES[start_idx : end_idx + 1]
+
+    selected = [stage.strip() for stage in stages.split(",") if stage.strip()]
+    unknown = [stage for stage in selected if stage not in STAGE_NAMES]
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown stage(s): {', '.join(unknown)}")
+    return [stage for stage in STAGE_NAMES if stage in selected]
+
+
+def parse_states(states: str) -> List[str]:
+    """
+    Parse comma separated states given as full names or state codes into full names.
+
+    Parameters
+    -----------
+    states: str
+        Comma separated states (eg: `Texas,CA`)
+
+    Returns
+    --------
+    List[str]
+        Full names of states
+    """
+    codes_to_names = {code: name for name, code in load_yml(STATES_YML_FILEPATH).items()}
+    names = set(codes_to_names.values())
+    full_names = []
+    for state in (state.strip() for state in states.split(",") if state.strip()):
+        if state in names:
+            full_names.append(state)
+        elif state.upper() in codes_to_names:
+            full_names.append(codes_to_names[state.upper()])
+        else:
+            raise argparse.ArgumentTypeError(f"Unknown state: {state}")
+    return full_names
+
+
+def _parse_list(values: str) -> List[str]:
+    """Parse comma separated values into a list."""
+    return [value.strip() for value in values.split(",") if value.strip()]
+
+
+def unknown_fuels(fuels: List[str], data_types: List[str] = None) -> List[str]:
+    """
+    Fuel types which are not modelled for any of the data types.
+
+    Parameters
+    -----------
+    fuels: List[str]
+        Selected fuel types
+    data_types: List[str]
+        Selected data types (default: all data types)
+
+    Returns
+    --------
+    List[str]
+        Selected fuel types which are unknown for the data types
+    """
+    # Imported here so that parsing arguments only pulls in the modelling dependencies
+    # when fuel types are selected
+    # First Party Imports
+    from src.d04_modelling.create_prophet_models import ModelTrainer
+
+    fuels_by_data_type = {
+        "Net_Gen_By_Fuel_MWh": ModelTrainer.net_gen_fuels,
+        "Fuel_Consumption_BTU": ModelTrainer.total_consumption_fuels,
+    }
+    known = {
+        fuel
+        for data_type in data_types or fuels_by_data_type
+        for fuel in fuels_by_data_type.get(data_type, [])
+    }
+    return [fuel for fuel in fuels if fuel not in known]
+
+
+def _add_selection_arguments(parser: argparse.ArgumentParser):
+    """Add the options selecting states, data types and fuel types of a run to a parser."""
+    parser.add_argument(
+        "--states",
+        type=parse_states,
+        default=None,
+        help="Comma separated state names or codes (default: all states)",
+    )
+    parser.add_argument(
+        "--data-types",
+        type=_parse_list,
+        default=None,
+        help="Comma separated data types eg: Net_Gen_By_Fuel_MWh (default: all)",
+    )
+    parser.add_argument(
+        "--fuels",
+        type=_parse_list,
+        default=None,
+        help="Comma separated fuel types eg: coal,wind (default: all)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Re-run every series, even those whose inputs and code are unchanged",
+    )
+    parser.add_argument(
+        "--frequency",
+        choices=list(FREQUENCIES),
+        default=DEFAULT_FREQUENCY,
+        help=f"Frequency of the series (default: {DEFAULT_FREQUENCY})",
+    )
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Create the argument parser with one sub-command per action."""
+    parser = argparse.ArgumentParser(
+        prog="emissions-oracle", description=__doc__.strip().splitlines()[0]
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run pipeline stages")
+    run_parser.add_argument(
+        "--stages",
+        type=parse_stages,
+        default=None,
+        help=f"Stages to run as a list or range of: {', '.join(STAGE_NAMES)} (default: all)",
+    )
+    run_parser.add_argument(
+        "--list-stages", action="store_true", help="List pipeline stages in order and exit"
+    )
+    _add_selection_arguments(run_parser)
+    run_parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes per stage (default: 1)"
+    )
+    run_parser.add_argument(
+        "--dry-run", action="store_true", help="Only log the stages which would run"
+    )
+    run_parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Move each series from pull to forecast as soon as its inputs are ready",
+    )
+    run_parser.add_argument(
+        "--granularity",
+        choices=GRANULARITIES,
+        default=DEFAULT_GRANULARITY,
+        help="Source data: state level EIA API series or plant level EIA-923 files "
+        "rolled up to states (default: state)",
+    )
+    run_parser.add_argument(
+        "--io-workers",
+        type=int,
+        default=8,
+        help="Series pulled and cleaned concurrently when streaming (default: 8)",
+    )
+    run_parser.add_argument(
+        "--profile",
+        choices=PROFILERS,
+        default=None,
+        help="Profile each stage, writing flame graph output and hot functions to logs/profiles",
+    )
+    run_parser.add_argument(
+        "--profile-top",
+        type=int,
+        default=25,
+        help="Number of hot functions in the profile summary (default: 25)",
+    )
+    run_parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="Do not record the data folders as a snapshot once the run finished",
+    )
+
+    resume_parser = subparsers.add_parser(
+        "resume", help="Resume an interrupted run, skipping its completed stages and series"
+    )
+    resume_parser.add_argument(
+        "--run-id", default=None, help="ID of the run to resume (default: latest unfinished run)"
+    )
+    resume_parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes per stage (default: 1)"
+    )
+
+    hourly_parser = subparsers.add_parser(
+        "hourly",
+        help="Aggregate hourly balancing authority data into hourly, daily and quarterly windows",
+    )
+    hourly_parser.add_argument(
+        "--files",
+        type=_parse_list,
+        default=None,
+        help="Comma separated CSV or Parquet files (default: all files in data/01_raw/Hourly)",
+    )
+    hourly_parser.add_argument(
+        "--stub-hours",
+        type=int,
+        default=None,
+        help="Aggregate this many hours of synthetic records instead of files",
+    )
+    hourly_parser.add_argument(
+        "--lateness",
+        type=int,
+        default=24,
+        help="Hours records may arrive out of order before their window is closed (default: 24)",
+    )
+    hourly_parser.add_argument(
+        "--batch-size", type=int, default=1_000_000, help="Records per batch (default: 1000000)"
+    )
+
+    subparsers.add_parser("snapshot-create", help="Record the current data folders as a snapshot")
+    subparsers.add_parser("snapshot-list", help="List snapshots from oldest to newest")
+    diff_parser = subparsers.add_parser(
+        "snapshot-diff", help="List files added, removed and changed between two snapshots"
+    )
+    diff_parser.add_argument("run_id", help="ID of the older snapshot")
+    diff_parser.add_argument(
+        "other_run_id", nargs="?", default=None, help="ID of the newer snapshot (default: current)"
+    )
+    pin_parser = subparsers.add_parser(
+        "snapshot-pin", help="Pin a snapshot so garbage collection keeps it"
+    )
+    pin_parser.add_argument("run_id", help="ID of the snapshot")
+    pin_parser.add_argument("--unpin", action="store_true", help="Unpin the snapshot instead")
+    restore_parser = subparsers.add_parser(
+        "snapshot-restore", help="Restore the data folders to a snapshot"
+    )
+    restore_parser.add_argument("run_id", help="ID of the snapshot")
+    restore_parser.add_argument(
+        "--prefix",
+        default=None,
+        help="Only restore files whose path starts with it eg: data/06_reporting (default: all)",
+    )
+    gc_parser = subparsers.add_parser(
+        "snapshot-gc", help="Remove old unpinned snapshots and data no snapshot links to"
+    )
+    gc_parser.add_argument(
+        "--keep",
+        type=int,
+        default=5,
+        help="Number of most recent unpinned snapshots to keep (default: 5)",
+    )
+
+    shard_parent = argparse.ArgumentParser(add_help=False)
+    shard_parent.add_argument(
+        "--queue",
+        default=None,
+        help="Work queue folder on a filesystem shared by all nodes (default: logs/queue)",
+    )
+    shard_parent.add_argument(
+        "--lease",
+        type=float,
+        default=600,
+        help="Seconds after which a shard of an unresponsive worker is taken over (default: 600)",
+    )
+    selection_parent = argparse.ArgumentParser(add_help=False)
+    selection_parent.add_argument(
+        "--stages",
+        type=_parse_list,
+        default=None,
+        help="Sharded stages to run: train and/or forecast (default: both)",
+    )
+    _add_selection_arguments(selection_parent)
+    selection_parent.add_argument(
+        "--shard-size", type=int, default=8, help="Series per shard (default: 8)"
+    )
+
+    subparsers.add_parser(
+        "shard-submit",
+        parents=[shard_parent, selection_parent],
+        help="Replace the work queue with shards of training and forecasting series",
+    )
+    worker_parser = subparsers.add_parser(
+        "shard-worker", parents=[shard_parent], help="Process shards until the queue is drained"
+    )
+    worker_parser.add_argument(
+        "--worker-id", default=None, help="ID of the worker (default: host name and process ID)"
+    )
+    worker_parser.add_argument(
+        "--poll", type=float, default=5, help="Seconds between polls for blocked shards"
+    )
+    worker_parser.add_argument(
+        "--retry-failed", action="store_true", help="Retry shards which failed before"
+    )
+    merge_parser = subparsers.add_parser(
+        "shard-merge", parents=[shard_parent], help="Assemble the combined sharded outputs"
+    )
+    merge_parser.add_argument(
+        "--workers", type=int, default=1, help="Worker processes (default: 1)"
+    )
+    subparsers.add_parser(
+        "shard-status", parents=[shard_parent], help="Show the number of shards in each state"
+    )
+    local_parser = subparsers.add_parser(
+        "shard-local",
+        parents=[shard_parent, selection_parent],
+        help="Submit, process with local worker processes standing in for nodes and merge",
+    )
+    local_parser.add_argument(
+        "--nodes", type=int, default=2, help="Local worker processes (default: 2)"
+    )
+    local_parser.add_argument(
+        "--poll", type=float, default=5, help="Seconds between polls for blocked shards"
+    )
+    return parser
+
+
+def shard(args: argparse.Namespace) -> int:
+    """Submit, work on, merge or show the status of sharded training and forecasting."""
+    # First Party Imports
+    from src.sharding import QUEUE_FOLDER, SHARDED_STAGES, ShardedPipeline
+
+    sharded_pipeline = ShardedPipeline(args.queue or QUEUE_FOLDER, args.lease)
+    if args.command in ("shard-submit", "shard-local"):
+        data_types = list(load_yml(EIA_API_IDS_YML_FILEPATH))
+        unknown = set(args.data_types or []) - set(data_types)
+        unknown.update(set(args.stages or []) - set(SHARDED_STAGES))
+        if unknown:
+            log.error(f"Unknown data type(s) or sharded stage(s): {', '.join(sorted(unknown))}")
+            return 2
+        sharded_pipeline.submit(
+            data_types=args.data_types or data_types,
+            states=args.states or list(get_states()),
+            fuel_types=args.fuels,
+            stages=args.stages,
+            shard_size=args.shard_size,
+            force=args.force,
+            frequency=args.frequency,
+        )
+    if args.command == "shard-worker":
+        if args.retry_failed:
+            sharded_pipeline.queue.retry_failed()
+        sharded_pipeline.work(args.worker_id, args.poll)
+        return 0 if sharded_pipeline.queue.status()["failed"] == 0 else 1
+    if args.command == "shard-merge":
+        return 0 if sharded_pipeline.merge(args.workers) else 1
+    if args.command == "shard-status":
+        print(sharded_pipeline.queue.status())
+        return 0
+    if args.command == "shard-local":
+        return 0 if sharded_pipeline.run_local(args.nodes, args.poll) else 1
+    return 0
+
+
+def snapshot(args: argparse.Namespace) -> int:
+    """Create, list, compare, pin, restore or garbage collect snapshots of the data folders."""
+    # First Party Imports
+    from src.d00_utils.snapshots import SnapshotStore
+
+    store = SnapshotStore()
+    try:
+        if args.command == "snapshot-create":
+            store.snapshot()
+        elif args.command == "snapshot-list":
+            for manifest in store.list_snapshots():
+                print(
+                    "{}{}  {}  {} files  {:.1f} MB  +{} objects  +{:.1f} MB".format(
+                        manifest["run_id"],
+                        " (pinned)" if manifest["pinned"] else "",
+                        time.strftime("%Y-%m-%d %H:%M", time.localtime(manifest["created_at"])),
+                        manifest["n_files"],
+                        manifest["bytes"] / 1e6,
+                        manifest["new_objects"],
+                        manifest["new_bytes"] / 1e6,
+                    )
+                )
+        elif args.command == "snapshot-diff":
+            changes = store.diff(args.run_id, args.other_run_id)
+            for status, change in [("A", "added"), ("D", "removed"), ("M", "changed")]:
+                for path in changes[change]:
+                    print(f"{status} {path}")
+            log.info(", ".join(f"{len(paths)} {change}" for change, paths in changes.items()))
+        elif args.command == "snapshot-pin":
+            store.pin(args.run_id, pinned=not args.unpin)
+        elif args.command == "snapshot-restore":
+            store.restore(args.run_id, args.prefix)
+            # The running app picks up the restored outputs like those of a new run
+            write_run_marker(args.run_id, {"restored": True})
+        elif args.command == "snapshot-gc":
+            store.gc(args.keep)
+    except KeyError as error:
+        log.error(error.args[0])
+        return 1
+    return 0
+
+
+def resume(args: argparse.Namespace) -> int:
+    """Resume an unfinished run with the selection it was started with."""
+    run_id, config = find_resumable_run(args.run_id)
+    if run_id is None:
+        log.error("No unfinished run found to resume.")
+        return 1
+
+    # First Party Imports
+    from src.pipeline import PipelineInterface
+
+    interface = PipelineInterface(
+        EIA_API_IDS_YML_FILEPATH,
+        EMISSIONS_FACTORS_YML_FILEPATH,
+        states=config["states"],
+        data_types=config["data_types"],
+        fuel_types=config["fuel_types"],
+        workers=args.workers,
+        force=config["force"],
+        streaming=config.get("streaming", False),
+        frequency=config.get("frequency", DEFAULT_FREQUENCY),
+        granularity=config.get("granularity", DEFAULT_GRANULARITY),
+        snapshot=config.get("snapshot", True),
+    )
+    interface.run(config["stages"], run_id=run_id)
+    return 0
+
+
+def hourly(args: argparse.Namespace) -> int:
+    """Aggregate hourly records of files or the stub API into windows."""
+    # First Party Imports
+    from src.d01_data.get_hourly_data import HourlyFileSource, StubHourlyAPI
+    from src.d03_processing.aggregate_hourly_data import HourlyAggregator
+
+    if args.stub_hours is not None:
+        source = StubHourlyAPI(hours=args.stub_hours, batch_size=args.batch_size)
+    else:
+        source = HourlyFileSource(args.files, batch_size=args.batch_size)
+    aggregator = HourlyAggregator(
+        load_yml(EIA930_FUEL_CODES_YML_FILEPATH),
+        load_yml(EMISSIONS_FACTORS_YML_FILEPATH)["Net_Gen_By_Fuel_MWh"],
+        lateness_hours=args.lateness,
+    )
+    aggregator.aggregate(source.batches())
+    return 0
+
+
+def run(args: argparse.Namespace) -> int:
+    """Run the selected pipeline stages."""
+    if args.list_stages:
+        print("\n".join(STAGE_NAMES))
+        return 0
+
+    # Imported here so that `--help` and `--list-stages` stay fast
+    # First Party Imports
+    from src.pipeline import PipelineInterface
+
+    unknown = set(args.data_types or []) - set(load_yml(EIA_API_IDS_YML_FILEPATH))
+    if unknown:
+        log.error(f"Unknown data type(s): {', '.join(sorted(unknown))}")
+        return 2
+    if args.streaming and args.granularity == "plant":
+        log.error("Plant level data cannot be streamed, run without --streaming.")
+        return 2
+
+    interface = PipelineInterface(
+        EIA_API_IDS_YML_FILEPATH,
+        EMISSIONS_FACTORS_YML_FILEPATH,
+        states=args.states,
+        data_types=args.data_types,
+        fuel_types=args.fuels,
+        workers=args.workers,
+        dry_run=args.dry_run,
+        force=args.force,
+        profiler=args.profile,
+        profile_top_n=args.profile_top,
+        streaming=args.streaming,
+        io_workers=args.io_workers,
+        frequency=args.frequency,
+        granularity=args.granularity,
+        snapshot=not args.no_snapshot,
+    )
+    interface.run(args.stages)
+    return 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if getattr(args, "fuels", None):
+        unknown = unknown_fuels(args.fuels, args.data_types)
+        if unknown:
+            parser.error(f"Unknown fuel type(s) for the selected data types: {', '.join(unknown)}")
+    if args.command == "run":
+        return run(args)
+    if args.command == "resume":
+        return resume(args)
+    if args.command == "hourly":
+        return hourly(args)
+    if args.command.startswith("snapshot-"):
+        return snapshot(args)
+    if args.command.startswith("shard-"):
+        return shard(args)
+    parser.error(f"Unknown command: {args.command}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,516 @@
+"""
+Data catalog of the datasets read and written by the pipeline stages.
+
+Every dataset is named once, with the layer folder it belongs to and the location template of
+its partitions (eg: one partition per data type, state and fuel type). The storage backend of
+each dataset is configured in `conf/base/catalog.yml`:
+
+- csv: one CSV file per partition
+- parquet: one typed and compressed columnar file per partition
+- sqlite: one table per partition in a SQLite database per layer folder, batches of partitions
+  are read and written over one connection
+- memory: partitions kept in the memory of the process (single process runs and benchmarks)
+- json: one JSON file per partition, for JSON objects (raw API responses and models)
+
+Stages read and write partitions by dataset name and keys, so switching the backend of a
+dataset does not touch stage code. File backends only create folders when writing, once per
+folder and process. Lineage, run snapshots and downloads in the app track files, so datasets
+stored in SQLite or in memory are recomputed on every run and are not part of snapshots.
+"""
+# Python Libraries
+import fnmatch
+import glob
+import json
+import logging
+import os
+import re
+import sqlite3
+from abc import ABC, abstractmethod
+from contextlib import closing
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, NamedTuple, Tuple
+
+# Package Imports
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.const import (
+    CATALOG_YML_FILEPATH,
+    DEFAULT_FREQUENCY,
+    INTERMEDIATE_DATA_FOLDER,
+    MODELS_FOLDER,
+    PROCESSED_DATA_FOLDER,
+    RAW_DATA_FOLDER,
+    REPORTING_FOLDER,
+    frequency_folder,
+)
+from src.d00_utils.utils import atomic_write, ensure_folder, load_yml
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+SQLITE_DATABASE_FILE_NAME = "catalog.sqlite"
+
+
+class Dataset(NamedTuple):
+    """Layer folder and location template of the partitions of a dataset."""
+
+    layer: str
+    # Location of a partition in the (frequency) folder of the layer, without file extension
+    template: str
+
+
+DATASETS: Dict[str, Dataset] = {
+    "raw": Dataset(RAW_DATA_FOLDER, "{data_type}/{state}/{data_type}-{fuel_type}"),
+    "intermediate": Dataset(
+        INTERMEDIATE_DATA_FOLDER, "{data_type}/{state}/{data_type}-{fuel_type}"
+    ),
+    "processed": Dataset(PROCESSED_DATA_FOLDER, "{data_type}/{state}/{data_type}-{fuel_type}"),
+    "model": Dataset(MODELS_FOLDER, "{data_type}/{state}/{data_type}-{fuel_type}"),
+    "individual_forecast": Dataset(
+        REPORTING_FOLDER, "Individual_Forecasts/{data_type}/{state}/{data_type}-{fuel_type}"
+    ),
+    "combined_forecast": Dataset(
+        REPORTING_FOLDER, "Combined_Forecasts/{state}/{data_type}-Combined"
+    ),
+    "all_states_generation": Dataset(
+        REPORTING_FOLDER, "Combined_Forecasts/Combined-Electricity-Generation-All-States"
+    ),
+    "total_emissions": Dataset(
+        REPORTING_FOLDER, "Emission_Forecasts/Total_Emissions/{state}-CO2e-Emissions"
+    ),
+    "emissions_intensity": Dataset(
+        REPORTING_FOLDER, "Emission_Forecasts/Emissions_Intensity/{state}-CO2e-Emissions-Intensity"
+    ),
+    "all_states_total_emissions": Dataset(
+        REPORTING_FOLDER, "Emission_Forecasts/Combined-CO2e-Total-Emissions"
+    ),
+    "all_states_emissions_intensity": Dataset(
+        REPORTING_FOLDER, "Emission_Forecasts/Combined-CO2e-Emissions-Intensity"
+    ),
+    "multi_region": Dataset(REPORTING_FOLDER, "Multi_Region/Multi-Region-Dataset"),
+}
+
+
+class Backend(ABC):
+    """Storage of the partitions of datasets, addressed by folder and location."""
+
+    extension = ""
+
+    def filepath(self, folder: str, location: str) -> str:
+        """Path of a partition (it only exists for file backends)."""
+        return os.path.join(folder, location + self.extension)
+
+    @abstractmethod
+    def exists(self, folder: str, location: str) -> bool:
+        """Check if a partition was written."""
+
+    @abstractmethod
+    def read(self, folder: str, location: str) -> Any:
+        """Read a partition."""
+
+    @abstractmethod
+    def write(self, folder: str, location: str, data: Any):
+        """Write (or replace) a partition."""
+
+    def read_many(self, folder: str, locations: List[str]) -> List[Any]:
+        """Read partitions, in the order of their locations."""
+        return [self.read(folder, location) for location in locations]
+
+    def write_many(self, folder: str, items: List[Tuple[str, Any]]):
+        """Write partitions given as (location, data) pairs."""
+        for location, data in items:
+            self.write(folder, location, data)
+
+    @abstractmethod
+    def locations(self, folder: str, pattern: str) -> List[str]:
+        """Sorted locations of the written partitions matching a glob pattern."""
+
+
+class FileBackend(Backend):
+    """One file per partition, written atomically."""
+
+    def exists(self, folder: str, location: str) -> bool:
+        return os.path.exists(self.filepath(folder, location))
+
+    def read(self, folder: str, location: str) -> Any:
+        return self._read_file(self.filepath(folder, location))
+
+    def write(self, folder: str, location: str, data: Any):
+        file_path = self.filepath(folder, location)
+        ensure_folder(os.path.dirname(file_path))
+        with atomic_write(file_path) as tmp_file_path:
+            self._write_file(tmp_file_path, data)
+
+    def locations(self, folder: str, pattern: str) -> List[str]:
+        file_paths = glob.glob(os.path.join(glob.escape(folder), pattern + self.extension))
+        return sorted(
+            os.path.relpath(file_path, folder)[: -len(self.extension)].replace(os.sep, "/")
+            for file_path in file_paths
+        )
+
+    @abstractmethod
+    def _read_file(self, file_path: str) -> Any:
+        """Read a partition from its file."""
+
+    @abstractmethod
+    def _write_file(self, file_path: str, data: Any):
+        """Write a partition to a (temporary) file."""
+
+
+class CSVBackend(FileBackend):
+    """Data frames as CSV files."""
+
+    extension = ".csv"
+
+    def _read_file(self, file_path: str) -> pd.DataFrame:
+        return pd.read_csv(file_path)
+
+    def _write_file(self, file_path: str, data: pd.DataFrame):
+        data.to_csv(file_path, index=False)
+
+
+class ParquetBackend(FileBackend):
+    """Data frames as Parquet files, keeping column types (eg: dates, categories)."""
+
+    extension = ".parquet"
+
+    def _read_file(self, file_path: str) -> pd.DataFrame:
+        return pd.read_parquet(file_path)
+
+    def _write_file(self, file_path: str, data: pd.DataFrame):
+        data.to_parquet(file_path, index=False)
+
+
+class JSONBackend(FileBackend):
+    """JSON objects as JSON files."""
+
+    extension = ".json"
+
+    def _read_file(self, file_path: str) -> Any:
+        with open(file_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_file(self, file_path: str, data: Any):
+        with open(file_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+
+
+class SQLiteBackend(Backend):
+    """Data frames as tables (named after their location) of a SQLite database per folder."""
+
+    def filepath(self, folder: str, location: str) -> str:
+        # Never exists, partitions are tables of the database of the folder
+        return os.path.join(folder, location + ".sqlite")
+
+    def exists(self, folder: str, location: str) -> bool:
+        return location in self._tables(folder)
+
+    def read(self, folder: str, location: str) -> pd.DataFrame:
+        return self.read_many(folder, [location])[0]
+
+    def write(self, folder: str, location: str, data: pd.DataFrame):
+        self.write_many(folder, [(location, data)])
+
+    def read_many(self, folder: str, locations: List[str]) -> List[pd.DataFrame]:
+        if not locations:
+            return []
+        with closing(self._connect(folder)) as con:
+            return [
+                pd.read_sql_query('SELECT * FROM "{}"'.format(location), con)
+                for location in locations
+            ]
+
+    def write_many(self, folder: str, items: List[Tuple[str, pd.DataFrame]]):
+        if not items:
+            return
+        ensure_folder(folder)
+        with closing(self._connect(folder)) as con:
+            for location, data in items:
+                _dates_as_text(data).to_sql(location, con, if_exists="replace", index=False)
+            con.commit()
+
+    def locations(self, folder: str, pattern: str) -> List[str]:
+        return sorted(fnmatch.filter(self._tables(folder), pattern))
+
+    def _tables(self, folder: str) -> List[str]:
+        if not os.path.exists(os.path.join(folder, SQLITE_DATABASE_FILE_NAME)):
+            return []
+        with closing(self._connect(folder)) as con:
+            return [
+                name
+                for (name,) in con.execute("SELECT name FROM sqlite_master WHERE type = 'table'")
+            ]
+
+    @staticmethod
+    def _connect(folder: str) -> sqlite3.Connection:
+        # Worker processes of a stage write to the same database and wait for each other
+        con = sqlite3.connect(os.path.join(folder, SQLITE_DATABASE_FILE_NAME), timeout=60)
+        con.execute("PRAGMA journal_mode=WAL")
+        return con
+
+
+class MemoryBackend(Backend):
+    """Partitions kept in the memory of the process (lost when it exits)."""
+
+    def __init__(self):
+        self._partitions: Dict[str, Any] = {}
+
+    def exists(self, folder: str, location: str) -> bool:
+        return self.filepath(folder, location) in self._partitions
+
+    def read(self, folder: str, location: str) -> Any:
+        data = self._partitions[self.filepath(folder, location)]
+        # Copies, so callers modifying a partition do not change the stored one
+        return data.copy() if isinstance(data, pd.DataFrame) else data
+
+    def write(self, folder: str, location: str, data: Any):
+        stored = data.copy() if isinstance(data, pd.DataFrame) else data
+        self._partitions[self.filepath(folder, location)] = stored
+
+    def locations(self, folder: str, pattern: str) -> List[str]:
+        return sorted(
+            os.path.relpath(file_path, folder).replace(os.sep, "/")
+            for file_path in fnmatch.filter(self._partitions, self.filepath(folder, pattern))
+        )
+
+
+BACKENDS: Dict[str, Backend] = {
+    "csv": CSVBackend(),
+    "parquet": ParquetBackend(),
+    "json": JSONBackend(),
+    "sqlite": SQLiteBackend(),
+    "memory": MemoryBackend(),
+}
+
+
+class DataCatalog:
+    """Reads and writes the partitions of the datasets in `DATASETS` with their backends."""
+
+    def __init__(self, backends: Dict[str, str] = None):
+        """
+
+        Parameters
+        ----------
+        backends: Dict[str, str]
+            Backend of datasets (eg: {"processed": "parquet"}), overriding the catalog YAML
+        """
+        self.backends = dict(load_catalog_backends(), **(backends or {}))
+        _validate_backends(self.backends)
+
+    def filepath(self, name: str, frequency: str = DEFAULT_FREQUENCY, **keys) -> str:
+        """
+        Path of a partition of a dataset. Folders are not created, only writes create them.
+
+        Parameters
+        -----------
+        name: str
+            Name of the dataset (see `DATASETS`)
+        frequency: str
+            Frequency of the data: one of quarterly or monthly
+        keys:
+            Keys of the location template of the dataset (eg: data_type, state, fuel_type)
+
+        Returns
+        --------
+        str
+            File path of the partition (which only exists for file backends)
+        """
+        return self._backend(name).filepath(
+            self._folder(name, frequency), self._location(name, keys)
+        )
+
+    def exists(self, name: str, frequency: str = DEFAULT_FREQUENCY, **keys) -> bool:
+        """Check if a partition of a dataset was written."""
+        return self._backend(name).exists(self._folder(name, frequency), self._location(name, keys))
+
+    def read(self, name: str, frequency: str = DEFAULT_FREQUENCY, **keys) -> Any:
+        """
+        Read a partition of a dataset.
+
+        Parameters
+        -----------
+        name: str
+            Name of the dataset (see `DATASETS`)
+        frequency: str
+            Frequency of the data: one of quarterly or monthly
+        keys:
+            Keys of the location template of the dataset (eg: data_type, state, fuel_type)
+
+        Returns
+        --------
+        Any
+            Data frame (or JSON object for the json backend)
+        """
+        return self._backend(name).read(self._folder(name, frequency), self._location(name, keys))
+
+    def write(self, name: str, data: Any, frequency: str = DEFAULT_FREQUENCY, **keys):
+        """
+        Write (or replace) a partition of a dataset.
+
+        Parameters
+        -----------
+        name: str
+            Name of the dataset (see `DATASETS`)
+        data: Any
+            Data frame (or JSON object for the json backend)
+        frequency: str
+            Frequency of the data: one of quarterly or monthly
+        keys:
+            Keys of the location template of the dataset (eg: data_type, state, fuel_type)
+        """
+        self._backend(name).write(self._folder(name, frequency), self._location(name, keys), data)
+
+    def read_many(
+        self, name: str, partitions: Iterable[dict], frequency: str = DEFAULT_FREQUENCY
+    ) -> List[Any]:
+        """
+        Read partitions of a dataset in one batch (eg: over one database connection).
+
+        Parameters
+        -----------
+        name: str
+            Name of the dataset (see `DATASETS`)
+        partitions: Iterable[dict]
+            Keys of each partition to read
+        frequency: str
+            Frequency of the data: one of quarterly or monthly
+
+        Returns
+        --------
+        List[Any]
+            Data of each partition, in the order of the partitions
+        """
+        locations = [self._location(name, keys) for keys in partitions]
+        return self._backend(name).read_many(self._folder(name, frequency), locations)
+
+    def write_many(
+        self, name: str, items: Iterable[Tuple[dict, Any]], frequency: str = DEFAULT_FREQUENCY
+    ):
+        """
+        Write partitions of a dataset in one batch (eg: in one database transaction).
+
+        Parameters
+        -----------
+        name: str
+            Name of the dataset (see `DATASETS`)
+        items: Iterable[Tuple[dict, Any]]
+            Keys and data of each partition to write
+        frequency: str
+            Frequency of the data: one of quarterly or monthly
+        """
+        items = [(self._location(name, keys), data) for keys, data in items]
+        self._backend(name).write_many(self._folder(name, frequency), items)
+
+    def partitions(self, name: str, frequency: str = DEFAULT_FREQUENCY, **keys) -> List[dict]:
+        """
+        Keys of the written partitions of a dataset, sorted by location.
+
+        Parameters
+        -----------
+        name: str
+            Name of the dataset (see `DATASETS`)
+        frequency: str
+            Frequency of the data: one of quarterly or monthly
+        keys:
+            Keys to filter partitions by (eg: data_type), any value of the other keys matches
+
+        Returns
+        --------
+        List[dict]
+            Keys of each partition (including the keys filtered by)
+        """
+        template = DATASETS[name].template
+        fields = _template_fields(template)
+        pattern = template.format(
+            **{field: glob.escape(keys[field]) if field in keys else "*" for field in fields}
+        )
+        regex = _template_regex(template)
+        partitions = []
+        for location in self._backend(name).locations(self._folder(name, frequency), pattern):
+            match = regex.fullmatch(location)
+            if match and all(match.group(field) == keys[field] for field in keys):
+                partitions.append(match.groupdict())
+        return partitions
+
+    def backend_name(self, name: str) -> str:
+        """Name of the backend of a dataset (eg: csv)."""
+        if name not in DATASETS:
+            raise KeyError(f"Unknown dataset {name}, expected one of {sorted(DATASETS)}")
+        return self.backends.get(name, "csv")
+
+    def _backend(self, name: str) -> Backend:
+        """Backend of a dataset."""
+        return BACKENDS[self.backend_name(name)]
+
+    @staticmethod
+    def _folder(name: str, frequency: str) -> str:
+        """Folder of the layer of a dataset for a frequency."""
+        return frequency_folder(DATASETS[name].layer, frequency)
+
+    @staticmethod
+    def _location(name: str, keys: dict) -> str:
+        """Location of a partition of a dataset."""
+        try:
+            return DATASETS[name].template.format(**keys)
+        except KeyError as e:
+            raise KeyError(f"Missing key {e} of a partition of dataset {name}") from None
+
+
+@lru_cache(maxsize=None)
+def load_catalog_backends() -> Dict[str, str]:
+    """Backend of each dataset from the catalog YAML (parsed once, csv if not listed)."""
+    backends = load_yml(CATALOG_YML_FILEPATH) or {}
+    _validate_backends(backends)
+    return backends
+
+
+@lru_cache(maxsize=None)
+def get_catalog() -> DataCatalog:
+    """Data catalog with the backends of the catalog YAML, shared by all stages of a process."""
+    return DataCatalog()
+
+
+def _validate_backends(backends: Dict[str, str]):
+    """Check backends are assigned to known datasets and exist."""
+    unknown_datasets = set(backends) - set(DATASETS)
+    if unknown_datasets:
+        raise ValueError(f"Unknown datasets in data catalog: {sorted(unknown_datasets)}")
+    unknown_backends = set(backends.values()) - set(BACKENDS)
+    if unknown_backends:
+        raise ValueError(
+            f"Unknown backends {sorted(unknown_backends)}, expected one of {sorted(BACKENDS)}"
+        )
+
+
+def _template_fields(template: str) -> List[str]:
+    """Unique field names of a location template, in order."""
+    return list(dict.fromkeys(re.findall(r"{(\w+)}", template)))
+
+
+@lru_cache(maxsize=None)
+def _template_regex(template: str) -> "re.Pattern":
+    """Regular expression matching locations of a template, capturing its fields."""
+    parts, seen = [], set()
+    for literal, field in re.findall(r"([^{]*)(?:{(\w+)})?", template):
+        parts.append(re.escape(literal))
+        if field:
+            # Fields repeated in the template (eg: data_type) must have the same value
+            parts.append(
+                "(?P={})".format(field) if field in seen else "(?P<{}>[^/]+)".format(field)
+            )
+            seen.add(field)
+    return re.compile("".join(parts))
+
+
+def _dates_as_text(df: pd.DataFrame) -> pd.DataFrame:
+    """Dates formatted like in CSVs (SQLite has no date type)."""
+    date_columns = df.select_dtypes(include="datetime").columns
+    if date_columns.empty:
+        return df
+    df = df.copy()
+    for column in date_columns:
+        dates = df[column].dropna()
+        at_midnight = (dates == dates.dt.normalize()).all()
+        df[column] = df[column].dt.strftime("%Y-%m-%d" if at_midnight else "%Y-%m-%d %H:%M:%S")
+    return df
@@ -0,0 +1,233 @@
+"""
+Run manifests to checkpoint and resume pipeline runs.
+
+A checkpointed run keeps a manifest in `logs/runs/<run_id>/`:
+
+- `config.json`: the selection the run was started with (stages, states, data types, ...)
+- `completed.jsonl`: one JSON line per completed work unit (a series of a stage,
+  or a whole stage), appended as soon as the unit's outputs are written
+- `finished`: marker written once every stage completed
+
+A run which completed stages writing reporting outputs also replaces the completed-run marker
+`data/06_reporting/_RUN_COMPLETE.json`, which the app watches to pick up the new outputs
+(see `src.streamlit_pages.refresh`).
+
+Resuming an unfinished run re-runs the same selection but skips every completed work unit,
+so a crash only loses the series which were in progress. The active manifest is passed to
+worker processes through an environment variable. Outside of a checkpointed run,
+`is_completed` is always False and `mark_completed` does nothing.
+"""
+# Python Libraries
+import json
+import logging
+import os
+import time
+from typing import Optional, Tuple
+
+# First Party Imports
+from src.d00_utils.const import LOGS_FOLDER, REPORTING_FOLDER
+from src.d00_utils.utils import atomic_write
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+RUNS_FOLDER = os.path.join(LOGS_FOLDER, "runs")
+CONFIG_FILE_NAME = "config.json"
+COMPLETED_FILE_NAME = "completed.jsonl"
+FINISHED_FILE_NAME = "finished"
+RUN_MARKER_FILEPATH = os.path.join(REPORTING_FOLDER, "_RUN_COMPLETE.json")
+
+_CHECKPOINT_ENV_VAR = "EMISSIONS_ORACLE_CHECKPOINT"
+
+# Completed work units of the active manifest loaded by this process
+_completed_units: Optional[set] = None
+
+
+def start_checkpoint(run_id: str, config: dict, runs_folder: str = RUNS_FOLDER) -> str:
+    """
+    Create (or reopen, when resuming) the manifest of a run and make it the active manifest.
+
+    Parameters
+    -----------
+    run_id: str
+        ID of the run
+    config: dict
+        JSON serializable selection the run was started with, used to resume it
+    runs_folder: str
+        Folder containing one manifest folder per run
+
+    Returns
+    --------
+    str
+        Manifest folder of the run
+    """
+    global _completed_units
+    manifest_folder = os.path.join(runs_folder, run_id)
+    os.makedirs(manifest_folder, exist_ok=True)
+    config_filepath = os.path.join(manifest_folder, CONFIG_FILE_NAME)
+    if not os.path.exists(config_filepath):
+        with atomic_write(config_filepath) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                json.dump(dict(config, run_id=run_id), f, indent=1)
+    os.environ[_CHECKPOINT_ENV_VAR] = manifest_folder
+    _completed_units = None
+    return manifest_folder
+
+
+def finish_checkpoint(finished: bool):
+    """
+    Deactivate the manifest of the current run.
+
+    Parameters
+    -----------
+    finished: bool
+        True if every stage of the run completed (the run can no longer be resumed)
+    """
+    global _completed_units
+    manifest_folder = os.environ.pop(_CHECKPOINT_ENV_VAR, None)
+    _completed_units = None
+    if finished and manifest_folder is not None:
+        open(os.path.join(manifest_folder, FINISHED_FILE_NAME), "w").close()
+
+
+def write_run_marker(run_id: str, config: dict, file_path: str = RUN_MARKER_FILEPATH) -> str:
+    """
+    Replace the completed-run marker once a run finished writing reporting outputs.
+
+    Parameters
+    -----------
+    run_id: str
+        ID of the completed run
+    config: dict
+        JSON serializable selection of the run (stages, states, frequency, ...)
+    file_path: str
+        Path of the marker
+
+    Returns
+    --------
+    str
+        Path of the written marker
+    """
+    # Written atomically so the app never reads a partial marker
+    with atomic_write(file_path) as tmp_file_path:
+        with open(tmp_file_path, "w") as f:
+            json.dump(dict(config, run_id=run_id, completed_at=time.time()), f, indent=1)
+    log.info(f"Marked run {run_id} as completed in {file_path}")
+    return file_path
+
+
+def read_run_marker(file_path: str = RUN_MARKER_FILEPATH) -> Optional[dict]:
+    """Read the completed-run marker (None if no run completed yet)."""
+    try:
+        with open(file_path, "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def find_resumable_run(
+    run_id: str = None, runs_folder: str = RUNS_FOLDER
+) -> Tuple[Optional[str], Optional[dict]]:
+    """
+    Find the run to resume: a specific run, or else the latest unfinished run.
+
+    Parameters
+    -----------
+    run_id: str
+        Optional ID of the run to resume
+    runs_folder: str
+        Folder containing one manifest folder per run
+
+    Returns
+    --------
+    Tuple[Optional[str], Optional[dict]]
+        ID and config of the run to resume, (None, None) if there is no such run
+    """
+    if not os.path.isdir(runs_folder):
+        return None, None
+    # Run IDs start with their start time, so they sort chronologically
+    candidates = [run_id] if run_id else sorted(os.listdir(runs_folder), reverse=True)
+    for candidate in candidates:
+        manifest_folder = os.path.join(runs_folder, candidate)
+        config_filepath = os.path.join(manifest_folder, CONFIG_FILE_NAME)
+        if not os.path.exists(config_filepath):
+            continue
+        if os.path.exists(os.path.join(manifest_folder, FINISHED_FILE_NAME)):
+            if run_id:
+                log.warning(f"Run {run_id} already finished, nothing to resume.")
+                return None, None
+            continue
+        with open(config_filepath, "r") as f:
+            return candidate, json.load(f)
+    return None, None
+
+
+def is_completed(stage: str, **labels) -> bool:
+    """
+    Check if a work unit was completed by the active run (eg: before it was interrupted).
+
+    Parameters
+    -----------
+    stage: str
+        Short name of the pipeline stage (eg: train)
+    labels:
+        Identifiers of the work unit such as data_type, state and fuel_type
+        (none for a whole stage)
+
+    Returns
+    --------
+    bool
+        True if the work unit can be skipped
+    """
+    global _completed_units
+    manifest_folder = os.environ.get(_CHECKPOINT_ENV_VAR)
+    if manifest_folder is None:
+        return False
+    if _completed_units is None:
+        _completed_units = set()
+        completed_filepath = os.path.join(manifest_folder, COMPLETED_FILE_NAME)
+        if os.path.exists(completed_filepath):
+            with open(completed_filepath, "r") as f:
+                for line in f:
+                    try:
+                        _completed_units.add(_unit_key(**json.loads(line)))
+                    except (ValueError, TypeError):
+                        # Partially written line of an interrupted run
+                        continue
+    return _unit_key(stage=stage, **labels) in _completed_units
+
+
+def mark_completed(stage: str, **labels):
+    """
+    Record a work unit of the active run as completed, after all its outputs were written.
+
+    Parameters
+    -----------
+    stage: str
+        Short name of the pipeline stage (eg: train)
+    labels:
+        Identifiers of the work unit such as data_type, state and fuel_type
+        (none for a whole stage)
+    """
+    manifest_folder = os.environ.get(_CHECKPOINT_ENV_VAR)
+    if manifest_folder is None:
+        return
+    line = json.dumps(dict(labels, stage=stage), sort_keys=True) + "\n"
+    # Single append per line keeps the manifest consistent across worker processes
+    fd = os.open(
+        os.path.join(manifest_folder, COMPLETED_FILE_NAME),
+        os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+        0o644,
+    )
+    try:
+        os.write(fd, line.encode("utf-8"))
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    if _completed_units is not None:
+        _completed_units.add(_unit_key(stage=stage, **labels))
+
+
+def _unit_key(**labels) -> str:
+    """Hashable key of a work unit."""
+    return json.dumps(labels, sort_keys=True)
@@ -1,5 +1,6 @@
 # Python Libraries
 import os
+from functools import lru_cache
 
 # First Party Imports
 from src.d00_utils.utils import load_yml
@@ -18,6 +19,31 @@ INTERMEDIATE_DATA_FOLDER = os.path.join(PREFIX, "data/02_intermediate/")
 PROCESSED_DATA_FOLDER = os.path.join(PREFIX, "data/03_processed/")
 MODELS_FOLDER = os.path.join(PREFIX, "data/04_models/")
 REPORTING_FOLDER = os.path.join(PREFIX, "data/06_reporting/")
+SNAPSHOTS_FOLDER = os.path.join(PREFIX, "data/snapshots/")
+
+# Time series frequencies: suffix of EIA API series IDs, pandas frequency alias, future periods
+# to forecast (3 years) and subfolder of every data folder holding the frequency's data
+FREQUENCIES = {
+    "quarterly": {"api_suffix": "Q", "pandas_freq": "Q", "forecast_periods": 12, "folder": ""},
+    "monthly": {"api_suffix": "M", "pandas_freq": "M", "forecast_periods": 36, "folder": "Monthly"},
+}
+DEFAULT_FREQUENCY = "quarterly"
+
+# Granularity of the source data: state level series from the EIA API, or plant level
+# EIA-923 data rolled up to state level series
+GRANULARITIES = ["state", "plant"]
+DEFAULT_GRANULARITY = "state"
+PLANTS_FOLDER = "Plants"
+
+# Folder of hourly balancing authority data (EIA-930) in the raw and reporting data folders
+HOURLY_FOLDER = "Hourly"
+
+# Historical period imputed by cleaning (forecasts extend beyond it)
+HISTORY_START_DATE = "2001-01-01"
+HISTORY_END_DATE = "2021-12-31"
+
+# Pipeline Run Logs Path
+LOGS_FOLDER = os.path.join(PREFIX, "logs/")
 
 # Documentation Path
 APPENDIX_FILEPATH = os.path.join(PREFIX, "docs/source/appendix.md")
@@ -25,8 +51,30 @@ APPENDIX_FILEPATH = os.path.join(PREFIX, "docs/source/appendix.md")
 # YML File Paths
 EIA_API_IDS_YML_FILEPATH = os.path.join(PREFIX, "conf/base/EIA_API_ids.yml")
 EMISSIONS_FACTORS_YML_FILEPATH = os.path.join(PREFIX, "conf/base/emissions_factors.yml")
+EIA923_FUEL_CODES_YML_FILEPATH = os.path.join(PREFIX, "conf/base/EIA923_fuel_codes.yml")
+EIA930_FUEL_CODES_YML_FILEPATH = os.path.join(PREFIX, "conf/base/EIA930_fuel_codes.yml")
 STREAMLIT_CONFIG_FILEPATH = os.path.join(PREFIX, "conf/base/config_streamlit.toml")
 STATES_YML_FILEPATH = os.path.join(PREFIX, "conf/base/states.yml")
+REGION_GROUPS_YML_FILEPATH = os.path.join(PREFIX, "conf/base/region_groups.yml")
+CATALOG_YML_FILEPATH = os.path.join(PREFIX, "conf/base/catalog.yml")
+
+
+@lru_cache(maxsize=None)
+def get_states() -> tuple:
+    """Full names of all states (only send full names of states to functions).
+    States YAML is only parsed on first use instead of at import time."""
+    return tuple(load_yml(STATES_YML_FILEPATH).keys())
+
+
+def frequency_folder(folder: str, frequency: str) -> str:
+    """Data folder of a frequency (quarterly data stays at the top of each data folder)."""
+    if frequency not in FREQUENCIES:
+        raise ValueError(f"Unexpected frequency encountered: {frequency}")
+    return os.path.join(folder, FREQUENCIES[frequency]["folder"])
+
 
-# Only send full names of states to functions
-STATES = list(load_yml(STATES_YML_FILEPATH).keys())
+def __getattr__(name: str):
+    """Lazily resolve STATES for modules still importing it as a constant."""
+    if name == "STATES":
+        return list(get_states())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
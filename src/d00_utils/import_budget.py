@@ -0,0 +1,108 @@
+"""
+Cold start import budget check for the Streamlit app and the data pipeline.
+
+Each entry point is imported in a fresh interpreter, timed, and checked for modules it
+must never pull in (eg: the pipeline must not import Streamlit, the map page must not
+import prophet). Exits with a non-zero status code when any budget is exceeded.
+
+Usage (from the repository root)::
+
+    python -m src.d00_utils.import_budget [--repeat 3] [--scale 1.0]
+"""
+# Python Libraries
+import argparse
+import json
+import logging
+import subprocess
+import sys
+from typing import List, Tuple
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+# name: (modules to import, modules which must not be imported, budget in seconds)
+IMPORT_BUDGETS = {
+    "pipeline utilities": (
+        ["src.d00_utils.const", "src.d00_utils.utils"],
+        ["streamlit", "plotly", "prophet", "pandas"],
+        0.5,
+    ),
+    "pipeline data stages": (
+        [
+            "src.d01_data.get_raw_data",
+            "src.d02_intermediate.clean_raw_data",
+            "src.d03_processing.create_model_input",
+            "src.d06_reporting.calculate_emissions",
+        ],
+        ["streamlit", "plotly", "prophet"],
+        2.0,
+    ),
+    # Streamlit imports plotly itself, so only prophet is ruled out for the app
+    "app shell": (["streamlit", "src.streamlit_pages.multipage"], ["prophet"], 3.0),
+    "map page": (["src.streamlit_pages.emissions_on_map"], ["prophet"], 4.0),
+    "multi-region page": (["src.streamlit_pages.multi_region_analysis"], ["prophet"], 4.0),
+}
+
+_CHILD_CODE = """
+import json, sys, time
+start = time.perf_counter()
+for module in {modules!r}:
+    __import__(module)
+elapsed = time.perf_counter() - start
+print(json.dumps([elapsed, sorted(m for m in {forbidden!r} if m in sys.modules)]))
+"""
+
+
+def measure_import(modules: List[str], forbidden: List[str], repeat: int) -> Tuple[float, list]:
+    """
+    Import modules in fresh interpreters and return best time and any forbidden modules loaded.
+
+    Parameters
+    -----------
+    modules: List[str]
+        Modules to import
+    forbidden: List[str]
+        Top level modules which must not be imported as a side effect
+    repeat: int
+        Number of fresh interpreters to time (minimum time is reported)
+
+    Returns
+    --------
+    Tuple[float, list]
+        Best import time in seconds and list of forbidden modules which were imported
+    """
+    code = _CHILD_CODE.format(modules=modules, forbidden=forbidden)
+    best_time = float("inf")
+    loaded_forbidden = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout
+        elapsed, loaded_forbidden = json.loads(output.strip().splitlines()[-1])
+        best_time = min(best_time, elapsed)
+    return best_time, loaded_forbidden
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh interpreters per check")
+    parser.add_argument(
+        "--scale", type=float, default=1.0, help="Multiplier applied to all time budgets"
+    )
+    args = parser.parse_args(argv)
+
+    failed = False
+    for name, (modules, forbidden, budget) in IMPORT_BUDGETS.items():
+        elapsed, loaded_forbidden = measure_import(modules, forbidden, args.repeat)
+        budget = budget * args.scale
+        ok = elapsed <= budget and not loaded_forbidden
+        failed = failed or not ok
+        log.info(
+            f"{'OK  ' if ok else 'FAIL'} {name}: {elapsed:.2f}s (budget {budget:.2f}s)"
+            + (f", imported forbidden modules: {loaded_forbidden}" if loaded_forbidden else "")
+        )
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,302 @@
+"""
+Structured instrumentation of pipeline runs.
+
+Every pipeline stage and every series processed within a stage is measured for wall time,
+CPU time, bytes read and written and peak resident memory. Each measurement is appended as
+one JSON line to the run log (`logs/pipeline_runs.jsonl`, kept across runs) and the stage
+totals of the latest run are written in Prometheus text format to
+`logs/pipeline_metrics.prom` (eg: for the node exporter textfile collector).
+
+The active run is passed to worker processes through environment variables, so series
+processed in a process pool are recorded too. Outside of a run, `measure` does nothing.
+"""
+# Python Libraries
+import json
+import logging
+import os
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Iterator, List, Optional
+
+# First Party Imports
+from src.d00_utils.const import LOGS_FOLDER
+from src.d00_utils.utils import atomic_write
+
+try:
+    # Python Libraries
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+RUN_LOG_FILE_NAME = "pipeline_runs.jsonl"
+PROMETHEUS_FILE_NAME = "pipeline_metrics.prom"
+
+_RUN_ID_ENV_VAR = "EMISSIONS_ORACLE_RUN_ID"
+_RUN_LOG_ENV_VAR = "EMISSIONS_ORACLE_RUN_LOG"
+
+# Prometheus metric name, help text and stage record field
+PROMETHEUS_METRICS = [
+    ("pipeline_stage_wall_seconds", "Wall clock time of the stage", "wall_seconds"),
+    ("pipeline_stage_cpu_seconds", "CPU time of the stage incl. workers", "cpu_seconds"),
+    ("pipeline_stage_series_total", "Number of series processed by the stage", "series"),
+    ("pipeline_stage_read_bytes", "Bytes read by the stage incl. workers", "read_bytes"),
+    ("pipeline_stage_written_bytes", "Bytes written by the stage incl. workers", "written_bytes"),
+    ("pipeline_stage_peak_rss_bytes", "Peak resident memory of any process", "peak_rss_bytes"),
+]
+
+
+def start_run(log_folder: str = LOGS_FOLDER, run_id: str = None) -> str:
+    """
+    Start recording a pipeline run (also for worker processes started afterwards).
+
+    Parameters
+    -----------
+    log_folder: str
+        Folder for the JSON-lines run log and the Prometheus metrics file
+    run_id: str
+        ID of the run, when continuing to record a resumed run (new ID by default)
+
+    Returns
+    --------
+    str
+        Unique ID of the run
+    """
+    os.makedirs(log_folder, exist_ok=True)
+    run_id = run_id or "{}-{}".format(time.strftime("%Y%m%dT%H%M%S"), uuid.uuid4().hex[:6])
+    os.environ[_RUN_ID_ENV_VAR] = run_id
+    os.environ[_RUN_LOG_ENV_VAR] = os.path.join(log_folder, RUN_LOG_FILE_NAME)
+    return run_id
+
+
+def end_run():
+    """Stop recording the current pipeline run."""
+    os.environ.pop(_RUN_ID_ENV_VAR, None)
+    os.environ.pop(_RUN_LOG_ENV_VAR, None)
+
+
+def get_run_id() -> Optional[str]:
+    """ID of the pipeline run being recorded, None outside of a run."""
+    return os.environ.get(_RUN_ID_ENV_VAR)
+
+
+@contextmanager
+def measure(kind: str, stage: str, **labels) -> Iterator[Optional[dict]]:
+    """
+    Context manager measuring the enclosed work and appending it to the run log.
+
+    Parameters
+    -----------
+    kind: str
+        Type of work measured: one of stage or series
+    stage: str
+        Short name of the pipeline stage (eg: clean)
+    labels:
+        Identifiers of the work such as data_type, state and fuel_type
+
+    Yields
+    --------
+    Optional[dict]
+        Record which will be logged (extra fields can be added to it),
+        None if no run is being recorded
+    """
+    run_id = get_run_id()
+    if run_id is None:
+        yield None
+        return
+
+    record = {"run_id": run_id, "kind": kind, "stage": stage, **labels, "pid": os.getpid()}
+    log_offset = _log_size()
+    start = _snapshot()
+    status = "ok"
+    try:
+        yield record
+    except BaseException:
+        status = "failed"
+        raise
+    finally:
+        end = _snapshot()
+        record.update(_difference(start, end, include_children=kind == "stage"))
+        record["status"] = status
+        record["timestamp"] = time.time()
+        if kind == "stage":
+            _add_worker_series(record, log_offset)
+        _append_record(record)
+
+
+def read_run_records(run_id: str, log_filepath: str = None, offset: int = 0) -> List[dict]:
+    """
+    Read all records of a pipeline run from the run log.
+
+    Parameters
+    -----------
+    run_id: str
+        ID of the run
+    log_filepath: str
+        Path to the JSON-lines run log (defaults to the log of the current run)
+    offset: int
+        Byte offset in the run log to start reading from
+
+    Returns
+    --------
+    List[dict]
+        Stage and series records of the run in the order they were written
+    """
+    log_filepath = log_filepath or os.environ.get(
+        _RUN_LOG_ENV_VAR, os.path.join(LOGS_FOLDER, RUN_LOG_FILE_NAME)
+    )
+    if not os.path.exists(log_filepath):
+        return []
+    records = []
+    with open(log_filepath, "rb") as f:
+        f.seek(offset)
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # Partially written line of an interrupted run
+                continue
+            if record.get("run_id") == run_id:
+                records.append(record)
+    return records
+
+
+def write_prometheus_metrics(run_id: str, file_path: str = None) -> str:
+    """
+    Write stage totals of a pipeline run in Prometheus text format.
+
+    Parameters
+    -----------
+    run_id: str
+        ID of the run
+    file_path: str
+        Output path (defaults to `pipeline_metrics.prom` next to the run log)
+
+    Returns
+    --------
+    str
+        Path of the written file
+    """
+    log_filepath = os.environ.get(_RUN_LOG_ENV_VAR, os.path.join(LOGS_FOLDER, RUN_LOG_FILE_NAME))
+    file_path = file_path or os.path.join(os.path.dirname(log_filepath), PROMETHEUS_FILE_NAME)
+    stages = [r for r in read_run_records(run_id, log_filepath) if r["kind"] == "stage"]
+
+    # Run ID is only kept in the info metric to avoid a new time series for every run
+    lines = [
+        "# HELP pipeline_run_info ID of the latest pipeline run",
+        "# TYPE pipeline_run_info gauge",
+        'pipeline_run_info{{run_id="{}"}} 1'.format(run_id),
+        "# HELP pipeline_run_timestamp_seconds Time the latest pipeline run was last updated",
+        "# TYPE pipeline_run_timestamp_seconds gauge",
+        "pipeline_run_timestamp_seconds {}".format(time.time()),
+    ]
+    for metric, help_text, field in PROMETHEUS_METRICS:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} gauge"]
+        for record in stages:
+            if record.get(field) is not None:
+                lines.append(
+                    '{}{{stage="{}",status="{}"}} {}'.format(
+                        metric, record["stage"], record["status"], record[field]
+                    )
+                )
+
+    # Written atomically so the collector never reads a partial file
+    with atomic_write(file_path) as tmp_file_path:
+        with open(tmp_file_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+    return file_path
+
+
+def _snapshot() -> dict:
+    """Current resource usage of this process and its finished child processes."""
+    times = os.times()
+    snapshot = {
+        "wall": time.perf_counter(),
+        "cpu": times.user + times.system,
+        "children_cpu": times.children_user + times.children_system,
+        "read_bytes": None,
+        "written_bytes": None,
+        "peak_rss": None,
+        "children_peak_rss": None,
+    }
+    # Characters read and written by any system call (incl. cached reads), Linux only
+    try:
+        with open("/proc/self/io", "r") as f:
+            io = dict(line.split(": ") for line in f.read().splitlines())
+        snapshot["read_bytes"] = int(io["rchar"])
+        snapshot["written_bytes"] = int(io["wchar"])
+    except (OSError, KeyError, ValueError):
+        pass
+    if resource is not None:
+        # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+        unit = 1 if os.uname().sysname == "Darwin" else 1024
+        snapshot["peak_rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+        snapshot["children_peak_rss"] = (
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * unit
+        )
+    return snapshot
+
+
+def _difference(start: dict, end: dict, include_children: bool) -> dict:
+    """Resource usage between two snapshots."""
+    cpu = end["cpu"] - start["cpu"]
+    peak_rss = end["peak_rss"]
+    if include_children:
+        cpu += end["children_cpu"] - start["children_cpu"]
+        if end["children_peak_rss"] is not None:
+            peak_rss = max(peak_rss, end["children_peak_rss"])
+    return {
+        "wall_seconds": round(end["wall"] - start["wall"], 6),
+        "cpu_seconds": round(cpu, 6),
+        "read_bytes": _subtract(end["read_bytes"], start["read_bytes"]),
+        "written_bytes": _subtract(end["written_bytes"], start["written_bytes"]),
+        # High-water mark of the process so far, not only of the measured work
+        "peak_rss_bytes": peak_rss,
+    }
+
+
+def _subtract(end: Optional[int], start: Optional[int]) -> Optional[int]:
+    """Difference of two counters which may be unavailable."""
+    return None if end is None or start is None else end - start
+
+
+def _log_size() -> int:
+    """Current size of the run log in bytes."""
+    try:
+        return os.path.getsize(os.environ[_RUN_LOG_ENV_VAR])
+    except OSError:
+        return 0
+
+
+def _add_worker_series(record: dict, log_offset: int):
+    """
+    Count series processed by a stage, adding bytes read and written by
+    worker processes which are not part of this process' counters.
+    A stage running several stages per series (eg: when streaming) lists them in `series_stages`.
+    """
+    series_stages = record.get("series_stages", [record["stage"]])
+    series = [
+        r
+        for r in read_run_records(record["run_id"], offset=log_offset)
+        if r["kind"] == "series" and r["stage"] in series_stages and r.get("status") == "ok"
+    ]
+    record["series"] = len(series)
+    for field in ("read_bytes", "written_bytes"):
+        if record[field] is None:
+            continue
+        record[field] += sum(
+            r[field] or 0 for r in series if r["pid"] != record["pid"] and r[field] is not None
+        )
+
+
+def _append_record(record: dict):
+    """Append a record to the run log as one JSON line (single write, safe across processes)."""
+    line = json.dumps(record, default=str) + "\n"
+    fd = os.open(os.environ[_RUN_LOG_ENV_VAR], os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode("utf-8"))
+    finally:
+        os.close(fd)
@@ -0,0 +1,165 @@
+"""
+Content-hash lineage of pipeline artifacts.
+
+Every artifact written by a pipeline stage (intermediate CSV, processed CSV, model, forecast,
+emissions file) gets a small sidecar file (`<artifact>.lineage.json`) recording a fingerprint
+of its inputs: the content hash of every input file plus the version of the code and config
+which created it. A stage can skip any series whose fingerprint is unchanged, so a change to
+one state's raw data only flows through the series derived from it. Outputs are hashed by
+content, so a series which is recomputed to the same values does not invalidate downstream
+artifacts either.
+"""
+# Python Libraries
+import hashlib
+import json
+import os
+from types import ModuleType
+from typing import Dict, List, Tuple
+
+# First Party Imports
+from src.d00_utils.const import PREFIX
+from src.d00_utils.utils import atomic_write
+
+LINEAGE_SUFFIX = ".lineage.json"
+
+# Content hash of files keyed by path, modification time and size
+_file_hashes: Dict[Tuple[str, int, int], str] = {}
+
+
+def file_hash(file_path: str) -> str:
+    """
+    Content hash of a file, cached while the file is not modified.
+
+    Parameters
+    -----------
+    file_path: str
+        Path to file
+
+    Returns
+    --------
+    str
+        SHA-256 hex digest of the file contents
+    """
+    stat = os.stat(file_path)
+    key = (os.path.abspath(file_path), stat.st_mtime_ns, stat.st_size)
+    if key not in _file_hashes:
+        digest = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        _file_hashes[key] = digest.hexdigest()
+    return _file_hashes[key]
+
+
+def code_version(*parts) -> str:
+    """
+    Version of the code and config creating an artifact.
+
+    Parameters
+    -----------
+    parts:
+        Modules (hashed by source file contents) and any JSON serializable config
+        (eg: emissions factors) or library versions the artifact depends on
+
+    Returns
+    --------
+    str
+        Short hash identifying the version
+    """
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, ModuleType):
+            digest.update(file_hash(part.__file__).encode())
+        else:
+            digest.update(json.dumps(part, sort_keys=True, default=str).encode())
+    return digest.hexdigest()[:16]
+
+
+def fingerprint(input_filepaths: List[str], version: str) -> dict:
+    """
+    Fingerprint of the inputs of an artifact.
+
+    Parameters
+    -----------
+    input_filepaths: List[str]
+        Paths to all files the artifact is created from (missing files are recorded as None)
+    version: str
+        Version of the code and config creating the artifact (see `code_version`)
+
+    Returns
+    --------
+    dict
+        Version and content hash of each input
+    """
+    return {
+        "version": version,
+        "inputs": {
+            _relative_path(path): file_hash(path) if os.path.exists(path) else None
+            for path in input_filepaths
+        },
+    }
+
+
+def is_current(output_filepath: str, input_fingerprint: dict) -> bool:
+    """
+    Check if an artifact was created from inputs with the same fingerprint and has not been
+    modified since.
+
+    Parameters
+    -----------
+    output_filepath: str
+        Path to the artifact
+    input_fingerprint: dict
+        Fingerprint of the artifact's current inputs (see `fingerprint`)
+
+    Returns
+    --------
+    bool
+        True if the artifact does not need to be recreated
+    """
+    lineage = read_lineage(output_filepath)
+    if lineage is None or not os.path.exists(output_filepath):
+        return False
+    # Inputs without a file (missing, or stored in SQLite or in memory by the data catalog)
+    # cannot be compared
+    if None in input_fingerprint["inputs"].values():
+        return False
+    return (
+        lineage["version"] == input_fingerprint["version"]
+        and lineage["inputs"] == input_fingerprint["inputs"]
+        and lineage["output"] == file_hash(output_filepath)
+    )
+
+
+def record_lineage(output_filepath: str, input_fingerprint: dict):
+    """
+    Record the fingerprint of the inputs an artifact was just created from.
+
+    Parameters
+    -----------
+    output_filepath: str
+        Path to the artifact
+    input_fingerprint: dict
+        Fingerprint of the inputs taken before creating the artifact (see `fingerprint`)
+    """
+    if not os.path.exists(output_filepath):
+        # Stored without a file by the data catalog (eg: in SQLite), always recreated
+        return
+    lineage = dict(input_fingerprint, output=file_hash(output_filepath))
+    with atomic_write(output_filepath + LINEAGE_SUFFIX) as tmp_file_path:
+        with open(tmp_file_path, "w") as f:
+            json.dump(lineage, f, indent=1, sort_keys=True)
+
+
+def read_lineage(output_filepath: str) -> dict:
+    """Read the lineage recorded for an artifact, None if there is none."""
+    try:
+        with open(output_filepath + LINEAGE_SUFFIX, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _relative_path(file_path: str) -> str:
+    """Path relative to the project root so lineage does not depend on the working directory."""
+    return os.path.relpath(file_path, PREFIX or os.curdir).replace(os.sep, "/")
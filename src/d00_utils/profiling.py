@@ -0,0 +1,201 @@
+"""
+On-demand profiling of pipeline stages.
+
+Two profilers are available:
+
+- `sampling`: samples the call stack of the profiled thread at a fixed interval and writes
+  collapsed stacks (`<name>.folded`, one `frame;frame;frame count` line per stack) which can
+  be rendered with flamegraph.pl, speedscope or inferno.
+- `cprofile`: deterministic profile using cProfile, written as pstats (`<name>.prof`)
+  which can be rendered with snakeviz or tuna.
+
+Both write a summary of the top-N hot functions (`<name>-top.txt`). Nothing is imported or
+started unless profiling is requested.
+"""
+# Python Libraries
+import io
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Iterator
+
+# First Party Imports
+from src.d00_utils.const import LOGS_FOLDER
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+PROFILES_FOLDER = os.path.join(LOGS_FOLDER, "profiles")
+PROFILERS = ["sampling", "cprofile"]
+
+
+@contextmanager
+def profile(
+    name: str,
+    profiler: str = "sampling",
+    top_n: int = 25,
+    interval: float = 0.005,
+    output_folder: str = PROFILES_FOLDER,
+) -> Iterator[None]:
+    """
+    Context manager profiling the enclosed code of the current thread.
+
+    Parameters
+    -----------
+    name: str
+        Name of the profile, used as prefix of the output files
+    profiler: str
+        Type of profiler: one of sampling or cprofile
+    top_n: int
+        Number of hot functions in the summary
+    interval: float
+        Seconds between stack samples (sampling profiler only)
+    output_folder: str
+        Folder to write profile and summary to
+    """
+    if profiler not in PROFILERS:
+        raise ValueError(f"Unexpected profiler encountered: {profiler}")
+    os.makedirs(output_folder, exist_ok=True)
+    file_prefix = os.path.join(output_folder, name)
+
+    if profiler == "cprofile":
+        # Python Libraries
+        import cProfile
+
+        cprofiler = cProfile.Profile()
+        cprofiler.enable()
+        try:
+            yield
+        finally:
+            cprofiler.disable()
+            _write_cprofile(cprofiler, file_prefix, top_n)
+    else:
+        sampler = StackSampler(interval)
+        sampler.start()
+        try:
+            yield
+        finally:
+            sampler.stop()
+            _write_samples(sampler, file_prefix, top_n)
+
+
+class StackSampler:
+    """Sampling profiler collecting the call stacks of one thread from a background thread."""
+
+    def __init__(self, interval: float = 0.005, thread_id: int = None):
+        """
+        Parameters
+        ------------
+        interval: float
+            Seconds between samples
+        thread_id: int
+            Identifier of the thread to sample (current thread by default)
+        """
+        self.interval = interval
+        self.thread_id = thread_id or threading.get_ident()
+        self.stacks = Counter()
+        self.elapsed = 0.0
+        self._stop_event = threading.Event()
+        self._thread = None
+        self._start_time = 0.0
+
+    def start(self):
+        """Start sampling in a daemon thread."""
+        self._start_time = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop sampling and wait for the sampling thread to finish."""
+        self._stop_event.set()
+        self._thread.join()
+        self.elapsed = time.perf_counter() - self._start_time
+
+    def _run(self):
+        """Record the stack of the sampled thread until stopped."""
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame))
+                frame = frame.f_back
+            # Collapsed stacks are ordered from root to leaf
+            self.stacks[";".join(reversed(stack))] += 1
+
+    def hot_functions(self, top_n: int) -> str:
+        """
+        Summary of the functions with most samples.
+
+        Parameters
+        -----------
+        top_n: int
+            Number of functions to include
+
+        Returns
+        --------
+        str
+            Table of functions with self (leaf) and total (anywhere on stack) samples
+        """
+        n_samples = sum(self.stacks.values())
+        self_samples = Counter()
+        total_samples = Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for frame in set(frames):
+                total_samples[frame] += count
+
+        lines = [
+            f"{n_samples} samples every {self.interval * 1e3:.1f}ms over {self.elapsed:.2f}s",
+            "",
+            f"{'self %':>7} {'total %':>8}  function",
+        ]
+        for frame, count in self_samples.most_common(top_n):
+            lines.append(
+                f"{100 * count / n_samples:7.1f} {100 * total_samples[frame] / n_samples:8.1f}"
+                f"  {frame}"
+            )
+        lines += ["", "Top functions by total samples:", f"{'total %':>8}  function"]
+        for frame, count in total_samples.most_common(top_n):
+            lines.append(f"{100 * count / n_samples:8.1f}  {frame}")
+        return "\n".join(lines) + "\n"
+
+
+def _frame_name(frame) -> str:
+    """Readable and collapsed-stack safe name of a stack frame."""
+    code = frame.f_code
+    return "{} ({}:{})".format(
+        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno
+    ).replace(";", ",")
+
+
+def _write_samples(sampler: StackSampler, file_prefix: str, top_n: int):
+    """Write collapsed stacks and hot functions summary of a sampling profile."""
+    with open(file_prefix + ".folded", "w") as f:
+        for stack, count in sampler.stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    summary = sampler.hot_functions(top_n)
+    with open(file_prefix + "-top.txt", "w") as f:
+        f.write(summary)
+    log.info(f"Wrote flame graph stacks to {file_prefix}.folded\n{summary}")
+
+
+def _write_cprofile(cprofiler, file_prefix: str, top_n: int):
+    """Write pstats and hot functions summary of a cProfile profile."""
+    # Python Libraries
+    import pstats
+
+    cprofiler.dump_stats(file_prefix + ".prof")
+    stream = io.StringIO()
+    stats = pstats.Stats(cprofiler, stream=stream).strip_dirs()
+    stats.sort_stats("tottime").print_stats(top_n)
+    stats.sort_stats("cumulative").print_stats(top_n)
+    with open(file_prefix + "-top.txt", "w") as f:
+        f.write(stream.getvalue())
+    log.info(f"Wrote profile to {file_prefix}.prof (see {file_prefix}-top.txt)")
@@ -0,0 +1,359 @@
+"""
+Versioned snapshots of pipeline runs in a content-addressed object store.
+
+Every pipeline run overwrites the data folders (`data/01_raw` to `data/06_reporting`). Once a
+run finished, its data folders are recorded as a snapshot in `data/snapshots/`:
+
+- ``objects/<ab>/<sha256>``: the contents of every file, stored once under its content hash,
+  however many snapshots include it
+- ``runs/<run_id>.json``: manifest of a snapshot, linking the path of every file to its object,
+  with the selection of the run and whether the snapshot is pinned
+- ``index.json``: content hash of every data file by modification time and size, so only files
+  modified since the last snapshot are hashed again
+
+Unchanged files cost one manifest entry per snapshot, so storage grows with the files a run
+changed instead of with the number of runs. Caches rebuilt from the outputs on first use (query
+databases and data plane versions) are not recorded.
+
+Snapshots can be listed, compared, pinned and restored. Garbage collection removes all but the
+most recent unpinned snapshots, then every object no remaining snapshot links to.
+"""
+# Python Libraries
+import glob
+import json
+import logging
+import os
+import shutil
+import time
+import uuid
+from typing import Dict, List
+
+# First Party Imports
+from src.d00_utils.const import (
+    INTERMEDIATE_DATA_FOLDER,
+    MODELS_FOLDER,
+    PREFIX,
+    PROCESSED_DATA_FOLDER,
+    RAW_DATA_FOLDER,
+    REPORTING_FOLDER,
+    SNAPSHOTS_FOLDER,
+)
+from src.d00_utils.lineage import file_hash
+from src.d00_utils.utils import atomic_write
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+DATA_FOLDERS = [
+    RAW_DATA_FOLDER,
+    INTERMEDIATE_DATA_FOLDER,
+    PROCESSED_DATA_FOLDER,
+    MODELS_FOLDER,
+    REPORTING_FOLDER,
+]
+# Folders of caches rebuilt from the outputs, and files which only make sense for one run
+EXCLUDED_FOLDERS = ["Query", "Data_Plane"]
+EXCLUDED_FILE_NAMES = ["_RUN_COMPLETE.json", ".gitkeep"]
+OBJECTS_FOLDER = "objects"
+MANIFESTS_FOLDER = "runs"
+INDEX_FILE_NAME = "index.json"
+# Number of most recent unpinned snapshots kept by garbage collection
+DEFAULT_KEPT_SNAPSHOTS = 5
+
+
+class SnapshotStore:
+    """Content-addressed store of snapshots of the data folders."""
+
+    def __init__(self, folder: str = SNAPSHOTS_FOLDER, data_folders: List[str] = None):
+        """
+
+        Parameters
+        ----------
+        folder: str
+            Folder of the objects, manifests and index of the store
+        data_folders: List[str]
+            Folders recorded by snapshots (all data folders by default)
+        """
+        self.folder = folder
+        self.data_folders = data_folders if data_folders is not None else DATA_FOLDERS
+
+    def snapshot(self, run_id: str = None, config: dict = None) -> dict:
+        """
+        Record the data folders as a snapshot, storing the contents of new files only.
+
+        Parameters
+        -----------
+        run_id: str
+            ID of the pipeline run the snapshot is named after (new ID by default)
+        config: dict
+            JSON serializable selection of the run, saved with the snapshot
+
+        Returns
+        --------
+        dict
+            Manifest of the snapshot, including the number and size of new objects
+        """
+        start = time.perf_counter()
+        run_id = run_id or "{}-{}".format(time.strftime("%Y%m%dT%H%M%S"), uuid.uuid4().hex[:6])
+        files = self._scan()
+        new_objects, new_bytes = 0, 0
+        for path, (digest, size) in files.items():
+            if self._store_object(path, digest):
+                new_objects += 1
+                new_bytes += size
+
+        manifest = {
+            "run_id": run_id,
+            "created_at": time.time(),
+            "config": config,
+            "pinned": False,
+            "new_objects": new_objects,
+            "new_bytes": new_bytes,
+            "files": {path: [digest, size] for path, (digest, size) in sorted(files.items())},
+        }
+        self._write_manifest(manifest)
+        log.info(
+            f"Saved snapshot {run_id} of {len(files)} files with {new_objects} new object(s) "
+            f"({new_bytes / 1e6:.1f} MB) in {time.perf_counter() - start:.1f}s."
+        )
+        return manifest
+
+    def list_snapshots(self) -> List[dict]:
+        """
+        Snapshots from oldest to newest.
+
+        Returns
+        --------
+        List[dict]
+            Run ID, creation time, pin, number and size of files, and number and size of the
+            objects first stored by each snapshot
+        """
+        snapshots = []
+        for file_path in glob.glob(os.path.join(glob.escape(self._manifests_folder), "*.json")):
+            with open(file_path, "r") as f:
+                manifest = json.load(f)
+            files = manifest.pop("files")
+            manifest["n_files"] = len(files)
+            manifest["bytes"] = sum(size for _, size in files.values())
+            snapshots.append(manifest)
+        return sorted(snapshots, key=lambda manifest: manifest["created_at"])
+
+    def read_manifest(self, run_id: str) -> dict:
+        """Manifest of a snapshot."""
+        file_path = self._manifest_filepath(run_id)
+        if not os.path.exists(file_path):
+            raise KeyError(f"No snapshot found for run {run_id}")
+        with open(file_path, "r") as f:
+            return json.load(f)
+
+    def diff(self, run_id: str, other_run_id: str = None) -> Dict[str, List[str]]:
+        """
+        Files added, removed and changed between two snapshots.
+
+        Parameters
+        -----------
+        run_id: str
+            ID of the older snapshot
+        other_run_id: str
+            ID of the newer snapshot (the current data folders by default)
+
+        Returns
+        --------
+        Dict[str, List[str]]
+            Sorted paths of the added, removed and changed files
+        """
+        files = {path: entry[0] for path, entry in self.read_manifest(run_id)["files"].items()}
+        if other_run_id is None:
+            other_files = {path: digest for path, (digest, _) in self._scan().items()}
+        else:
+            other_files = {
+                path: entry[0] for path, entry in self.read_manifest(other_run_id)["files"].items()
+            }
+        return {
+            "added": sorted(set(other_files) - set(files)),
+            "removed": sorted(set(files) - set(other_files)),
+            "changed": sorted(
+                path for path in set(files) & set(other_files) if files[path] != other_files[path]
+            ),
+        }
+
+    def pin(self, run_id: str, pinned: bool = True):
+        """
+        Pin a snapshot so garbage collection never removes it (or unpin it).
+
+        Parameters
+        -----------
+        run_id: str
+            ID of the snapshot
+        pinned: bool
+            False to unpin the snapshot
+        """
+        manifest = self.read_manifest(run_id)
+        manifest["pinned"] = pinned
+        self._write_manifest(manifest)
+        log.info(f"{'Pinned' if pinned else 'Unpinned'} snapshot {run_id}.")
+
+    def restore(self, run_id: str, prefix: str = None) -> Dict[str, int]:
+        """
+        Restore the data folders (or the files below a path prefix) to a snapshot, writing only
+        the files which differ and removing files the snapshot does not include.
+
+        Parameters
+        -----------
+        run_id: str
+            ID of the snapshot
+        prefix: str
+            Only restore files whose path starts with it (eg: `data/06_reporting`)
+
+        Returns
+        --------
+        Dict[str, int]
+            Number of restored and removed files
+        """
+        files = self.read_manifest(run_id)["files"]
+        current = self._scan()
+        index = self._read_index()
+        restored, removed = 0, 0
+        for path, (digest, size) in files.items():
+            if (prefix and not path.startswith(prefix)) or current.get(path, [None])[0] == digest:
+                continue
+            file_path = self._data_filepath(path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with atomic_write(file_path) as tmp_file_path:
+                shutil.copyfile(self._object_filepath(digest), tmp_file_path)
+            stat = os.stat(file_path)
+            index[path] = [stat.st_mtime_ns, stat.st_size, digest]
+            restored += 1
+        for path in current:
+            if path not in files and (not prefix or path.startswith(prefix)):
+                os.remove(self._data_filepath(path))
+                index.pop(path, None)
+                removed += 1
+        self._write_index(index)
+        log.info(f"Restored {restored} and removed {removed} file(s) of snapshot {run_id}.")
+        return {"restored": restored, "removed": removed}
+
+    def gc(self, keep: int = DEFAULT_KEPT_SNAPSHOTS) -> Dict[str, int]:
+        """
+        Remove all but the most recent unpinned snapshots, and every object which no remaining
+        snapshot links to. Must not run while a snapshot is being saved.
+
+        Parameters
+        -----------
+        keep: int
+            Number of most recent unpinned snapshots to keep
+
+        Returns
+        --------
+        Dict[str, int]
+            Number of removed snapshots and objects, and bytes freed
+        """
+        snapshots = self.list_snapshots()
+        unpinned = [manifest["run_id"] for manifest in snapshots if not manifest["pinned"]]
+        expired = set(unpinned[: max(len(unpinned) - keep, 0)])
+        for run_id in expired:
+            os.remove(self._manifest_filepath(run_id))
+
+        linked = set()
+        for manifest in snapshots:
+            if manifest["run_id"] not in expired:
+                files = self.read_manifest(manifest["run_id"])["files"]
+                linked.update(digest for digest, _ in files.values())
+        removed_objects, freed_bytes = 0, 0
+        for file_path in glob.glob(os.path.join(glob.escape(self._objects_folder), "*", "*")):
+            digest = os.path.basename(os.path.dirname(file_path)) + os.path.basename(file_path)
+            if digest not in linked and not file_path.endswith(".tmp"):
+                freed_bytes += os.path.getsize(file_path)
+                os.remove(file_path)
+                removed_objects += 1
+        log.info(
+            f"Removed {len(expired)} snapshot(s) and {removed_objects} object(s), "
+            f"freeing {freed_bytes / 1e6:.1f} MB."
+        )
+        return {
+            "snapshots": len(expired),
+            "objects": removed_objects,
+            "freed_bytes": freed_bytes,
+        }
+
+    @property
+    def _objects_folder(self) -> str:
+        """Folder of the objects, in subfolders named after the first 2 characters of hashes."""
+        return os.path.join(self.folder, OBJECTS_FOLDER)
+
+    @property
+    def _manifests_folder(self) -> str:
+        """Folder of the manifests of all snapshots."""
+        return os.path.join(self.folder, MANIFESTS_FOLDER)
+
+    def _scan(self) -> Dict[str, tuple]:
+        """Content hash and size of every data file (only hashing files modified since)."""
+        index = self._read_index()
+        files = {}
+        for data_folder in self.data_folders:
+            for root, folders, file_names in os.walk(data_folder):
+                folders[:] = sorted(folder for folder in folders if folder not in EXCLUDED_FOLDERS)
+                for file_name in file_names:
+                    if file_name in EXCLUDED_FILE_NAMES or file_name.endswith(".tmp"):
+                        continue
+                    file_path = os.path.join(root, file_name)
+                    path = _relative_path(file_path)
+                    stat = os.stat(file_path)
+                    entry = index.get(path)
+                    if entry is None or entry[:2] != [stat.st_mtime_ns, stat.st_size]:
+                        entry = [stat.st_mtime_ns, stat.st_size, file_hash(file_path)]
+                        index[path] = entry
+                    files[path] = (entry[2], entry[1])
+        self._write_index({path: entry for path, entry in index.items() if path in files})
+        return files
+
+    def _store_object(self, path: str, digest: str) -> bool:
+        """Store the contents of a data file under its hash, unless already stored."""
+        object_filepath = self._object_filepath(digest)
+        if os.path.exists(object_filepath):
+            return False
+        os.makedirs(os.path.dirname(object_filepath), exist_ok=True)
+        with atomic_write(object_filepath) as tmp_file_path:
+            shutil.copyfile(self._data_filepath(path), tmp_file_path)
+        return True
+
+    def _object_filepath(self, digest: str) -> str:
+        """Filepath of the object storing contents with a hash."""
+        return os.path.join(self._objects_folder, digest[:2], digest[2:])
+
+    def _manifest_filepath(self, run_id: str) -> str:
+        """Filepath of the manifest of a snapshot."""
+        return os.path.join(self._manifests_folder, "{}.json".format(run_id))
+
+    @staticmethod
+    def _data_filepath(path: str) -> str:
+        """Filepath of a data file from its path relative to the project root."""
+        return os.path.join(PREFIX, *path.split("/"))
+
+    def _write_manifest(self, manifest: dict):
+        """Save (or replace) the manifest of a snapshot."""
+        file_path = self._manifest_filepath(manifest["run_id"])
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with atomic_write(file_path) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                json.dump(manifest, f)
+
+    def _read_index(self) -> Dict[str, list]:
+        """Modification time, size and content hash of data files by path."""
+        try:
+            with open(os.path.join(self.folder, INDEX_FILE_NAME), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _write_index(self, index: Dict[str, list]):
+        """Save the modification time, size and content hash of data files."""
+        os.makedirs(self.folder, exist_ok=True)
+        with atomic_write(os.path.join(self.folder, INDEX_FILE_NAME)) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                json.dump(index, f)
+
+
+def _relative_path(file_path: str) -> str:
+    """Path relative to the project root, so snapshots do not depend on the working directory."""
+    return os.path.relpath(file_path, PREFIX or os.curdir).replace(os.sep, "/")
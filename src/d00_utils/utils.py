@@ -1,10 +1,13 @@
 # Python Libraries
+import gzip
 import logging
 import os
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable, Iterable, Iterator, Set
 
 # Package Imports
-import streamlit as st
 import toml
 import yaml
 from dotenv import find_dotenv, load_dotenv
@@ -12,6 +15,9 @@ from dotenv import find_dotenv, load_dotenv
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 
+# Absolute paths of folders created (or found to exist) by this process
+_created_folders: Set[str] = set()
+
 
 def setup_env_vars():
     """Finds .env file and loads all entries as environment variables."""
@@ -24,8 +30,25 @@ def setup_env_vars():
     log.info("Finished loading environment variables.")
 
 
+def ensure_folder(folder_path: str):
+    """Create a folder (and its parents) if it does not exist, checked once per process.
+
+    Parameters
+    -----------
+    folder_path: str
+        Path to folder
+    """
+    # Absolute, as benchmarks run stages with relative paths in temporary working folders
+    folder_path = os.path.abspath(folder_path)
+    if folder_path not in _created_folders:
+        Path(folder_path).mkdir(parents=True, exist_ok=True)
+        _created_folders.add(folder_path)
+
+
 def get_filepath(parent_folder: str, save_folder: str, file_name: str) -> str:
     """Create folder for saving data (if not exists already) and return final filepath.
+    Pipeline datasets get their paths from the data catalog (`src.d00_utils.catalog`)
+    instead, which only creates folders when writing.
 
     Eg: For parent_folder = 'data/01_raw/', save_folder = 'Net_Generation'
     and file_name = 'net_generation_{}.{}'
@@ -47,11 +70,89 @@ def get_filepath(parent_folder: str, save_folder: str, file_name: str) -> str:
         Combined file path including file name
     """
     folder_path = os.path.join(parent_folder, save_folder)
-    Path(folder_path).mkdir(parents=True, exist_ok=True)
+    ensure_folder(folder_path)
 
     return os.path.join(folder_path, file_name)
 
 
+@contextmanager
+def atomic_write(file_path: str) -> Iterator[str]:
+    """Context manager yielding a temporary path to write a file to, which is moved to the
+    final path only once writing finished. Readers never see a partially written file,
+    and an interrupted write leaves any previous version of the file in place.
+
+    Parameters
+    -----------
+    file_path: str
+        Final path of the file
+
+    Yields
+    --------
+    str
+        Temporary path (in the same folder) to write the file to
+    """
+    tmp_file_path = "{}.{}.tmp".format(file_path, os.getpid())
+    try:
+        yield tmp_file_path
+        # Flush file contents to disk before the rename makes them visible
+        fd = os.open(tmp_file_path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        os.replace(tmp_file_path, file_path)
+    finally:
+        if os.path.exists(tmp_file_path):
+            os.remove(tmp_file_path)
+
+
+def parallel_map(func: Callable, items: Iterable, workers: int = 1) -> list:
+    """Apply a function to every item, in a pool of worker processes if workers > 1.
+
+    Parameters
+    -----------
+    func: Callable
+        Picklable function (or bound method of a picklable object) to apply
+    items: Iterable
+        Items to apply the function to
+    workers: int
+        Number of worker processes (items are processed in order in this process if 1)
+
+    Returns
+    --------
+    list
+        Results in the same order as the items
+    """
+    items = list(items)
+    if workers <= 1 or len(items) <= 1:
+        return [func(item) for item in items]
+    with ProcessPoolExecutor(max_workers=min(workers, len(items))) as executor:
+        return list(executor.map(func, items))
+
+
+def write_gzip_copy(file_path: str) -> str:
+    """Write a gzip compressed copy of a file next to it (eg: 'data.csv' -> 'data.csv.gz').
+
+    Parameters
+    -----------
+    file_path: str
+        Path to file to compress
+
+    Returns
+    --------
+    str
+        File path of compressed copy
+    """
+    gzip_file_path = file_path + ".gz"
+    with open(file_path, "rb") as f_in:
+        data = f_in.read()
+    # mtime=0 keeps the compressed bytes identical for identical inputs
+    with atomic_write(gzip_file_path) as tmp_file_path:
+        with open(tmp_file_path, "wb") as f_out:
+            f_out.write(gzip.compress(data, mtime=0))
+    return gzip_file_path
+
+
 def load_yml(filepath: str) -> dict:
     """
     Load YAML config.
@@ -70,10 +171,12 @@ def load_yml(filepath: str) -> dict:
     return yaml.load(yaml_file, Loader=yaml.FullLoader)
 
 
-@st.cache(allow_output_mutation=True, ttl=300)
 def load_config(toml_filepath: str) -> dict:
     """Loads toml configuration file.
 
+    This module is shared with the data pipeline and must not import UI frameworks,
+    the Streamlit app uses the cached version in `src.streamlit_pages.caching`.
+
     Parameters
     ----------
     toml_filepath : str
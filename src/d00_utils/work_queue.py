@@ -0,0 +1,269 @@
+"""
+Work queue on a shared filesystem, for running pipeline work units on several machines.
+
+Layout of a queue folder::
+
+    shards/<shard_id>.json   work units of a shard and the shards it depends on
+    claims/<shard_id>.lock   claim of a shard by a worker (created with O_EXCL)
+    claims/<shard_id>.lock.<claim>.takeover
+                             marker of the takeover of an abandoned claim (created with O_EXCL)
+    done/<shard_id>.json     marker of a completed shard
+    failed/<shard_id>.json   error of a failed shard
+
+A worker claims a shard by exclusively creating its lock file, so each shard is processed
+by one worker only. Workers touch the lock file while they work on a shard; a claim whose
+lock file was not touched for longer than the lease is considered abandoned (eg: the node
+died) and can be taken over by another worker. Of the workers finding a claim abandoned, only
+the one which exclusively creates its takeover marker replaces the lock file. Failed shards
+are not claimed again until they are retried.
+"""
+# Python Libraries
+import json
+import logging
+import os
+import socket
+import time
+from typing import List, Optional
+
+# First Party Imports
+from src.d00_utils.utils import atomic_write
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+SHARDS_FOLDER = "shards"
+CLAIMS_FOLDER = "claims"
+DONE_FOLDER = "done"
+FAILED_FOLDER = "failed"
+
+
+class FileWorkQueue:
+    """Queue of shards of work units stored as files in a (shared) folder."""
+
+    def __init__(self, queue_folder: str, lease_seconds: float = 600):
+        """
+        Parameters
+        ------------
+        queue_folder: str
+            Folder of the queue, on a filesystem shared by all workers
+        lease_seconds: float
+            Seconds after which the claim of a worker which stopped touching its lock file
+            can be taken over by another worker
+        """
+        self.queue_folder = queue_folder
+        self.lease_seconds = lease_seconds
+        for folder in (SHARDS_FOLDER, CLAIMS_FOLDER, DONE_FOLDER, FAILED_FOLDER):
+            os.makedirs(os.path.join(queue_folder, folder), exist_ok=True)
+
+    def submit(self, shard_id: str, units: List[dict], depends_on: List[str] = None):
+        """
+        Add a shard of work units to the queue.
+
+        Parameters
+        -----------
+        shard_id: str
+            Unique ID of the shard (used as file name)
+        units: List[dict]
+            JSON serializable work units of the shard
+        depends_on: List[str]
+            IDs of shards which need to be done before this shard can be claimed
+        """
+        shard = {"shard_id": shard_id, "units": units, "depends_on": depends_on or []}
+        with atomic_write(self._path(SHARDS_FOLDER, shard_id, ".json")) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                json.dump(shard, f, indent=1)
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """
+        Claim the first shard which is not done or failed, not claimed by a live worker and
+        whose dependencies are done.
+
+        Parameters
+        -----------
+        worker_id: str
+            ID of the claiming worker
+
+        Returns
+        --------
+        Optional[dict]
+            Claimed shard, None if no shard can be claimed right now
+        """
+        done = set(self._ids(DONE_FOLDER))
+        failed = set(self._ids(FAILED_FOLDER))
+        for shard_id in self._ids(SHARDS_FOLDER):
+            if shard_id in done or shard_id in failed:
+                continue
+            shard = self._read_shard(shard_id)
+            if not all(dependency in done for dependency in shard["depends_on"]):
+                continue
+            if self._try_lock(shard_id, worker_id):
+                return shard
+        return None
+
+    def heartbeat(self, shard_id: str):
+        """Touch the lock file of a claimed shard to keep the claim alive."""
+        os.utime(self._path(CLAIMS_FOLDER, shard_id, ".lock"))
+
+    def complete(self, shard_id: str, worker_id: str):
+        """Mark a claimed shard as done and release its claim."""
+        self._write_marker(DONE_FOLDER, shard_id, {"worker_id": worker_id})
+        self._release(shard_id)
+
+    def fail(self, shard_id: str, worker_id: str, error: str):
+        """Record the error of a claimed shard and release its claim (see `retry_failed`)."""
+        self._write_marker(FAILED_FOLDER, shard_id, {"worker_id": worker_id, "error": error})
+        self._release(shard_id)
+
+    def status(self) -> dict:
+        """
+        Number of shards in each state.
+
+        Returns
+        --------
+        dict
+            Counts of total, done, claimed, failed and pending shards
+        """
+        shards = set(self._ids(SHARDS_FOLDER))
+        done = set(self._ids(DONE_FOLDER)) & shards
+        claimed = set(self._ids(CLAIMS_FOLDER)) - done
+        failed = set(self._ids(FAILED_FOLDER)) - done
+        return {
+            "total": len(shards),
+            "done": len(done),
+            "claimed": len(claimed),
+            "failed": len(failed),
+            "pending": len(shards - done - claimed - failed),
+        }
+
+    def is_finished(self) -> bool:
+        """True if every shard in the queue is done."""
+        status = self.status()
+        return status["done"] == status["total"]
+
+    def units(self) -> List[dict]:
+        """Work units of all shards in the queue, in shard order."""
+        return [
+            unit
+            for shard_id in self._ids(SHARDS_FOLDER)
+            for unit in self._read_shard(shard_id)["units"]
+        ]
+
+    def retry_failed(self) -> int:
+        """
+        Make failed shards claimable again.
+
+        Returns
+        --------
+        int
+            Number of shards to retry
+        """
+        failed = self._ids(FAILED_FOLDER)
+        for shard_id in failed:
+            os.remove(self._path(FAILED_FOLDER, shard_id, ".json"))
+        return len(failed)
+
+    def clear(self):
+        """Remove all shards and markers, eg: before submitting a new batch of work."""
+        for folder in (SHARDS_FOLDER, CLAIMS_FOLDER, DONE_FOLDER, FAILED_FOLDER):
+            for file_name in os.listdir(os.path.join(self.queue_folder, folder)):
+                os.remove(os.path.join(self.queue_folder, folder, file_name))
+
+    def _try_lock(self, shard_id: str, worker_id: str) -> bool:
+        """Exclusively create the lock file of a shard, taking over abandoned claims."""
+        claim = self._abandoned_claim(shard_id)
+        if claim is not None:
+            return self._take_over(shard_id, worker_id, claim)
+
+        try:
+            fd = os.open(
+                self._path(CLAIMS_FOLDER, shard_id, ".lock"),
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o644,
+            )
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump(self._lock_content(worker_id), f)
+        return True
+
+    def _abandoned_claim(self, shard_id: str) -> Optional[str]:
+        """
+        Identify the claim of a shard if it was abandoned.
+
+        Returns
+        --------
+        Optional[str]
+            Inode and modification time of the lock file if it was not touched for longer
+            than the lease, None if the shard is not claimed or its claim is alive
+        """
+        try:
+            stat = os.stat(self._path(CLAIMS_FOLDER, shard_id, ".lock"))
+        except FileNotFoundError:
+            return None
+        if time.time() - stat.st_mtime <= self.lease_seconds:
+            return None
+        return "{}.{}".format(stat.st_ino, stat.st_mtime_ns)
+
+    def _take_over(self, shard_id: str, worker_id: str, claim: str) -> bool:
+        """
+        Replace the lock file of an abandoned claim by a lock file of the worker.
+
+        Every worker which found the claim abandoned races to exclusively create a takeover
+        marker of that claim, so only one of them replaces the lock file. A worker which
+        found the claim abandoned before another worker took it over finds the marker and
+        leaves the new claim alone. The lock file is only replaced if it still belongs to the
+        abandoned claim, eg: not if its worker released it in the meantime.
+        """
+        lock_path = self._path(CLAIMS_FOLDER, shard_id, ".lock")
+        try:
+            fd = os.open(
+                "{}.{}.takeover".format(lock_path, claim),
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL,
+                0o644,
+            )
+        except FileExistsError:
+            return False
+        os.close(fd)
+        if self._abandoned_claim(shard_id) != claim:
+            return False
+        with atomic_write(lock_path) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                json.dump(self._lock_content(worker_id), f)
+        log.warning(f"Taking over abandoned claim of shard {shard_id}")
+        return True
+
+    @staticmethod
+    def _lock_content(worker_id: str) -> dict:
+        """Worker, host and process holding a claim."""
+        return {"worker_id": worker_id, "host": socket.gethostname(), "pid": os.getpid()}
+
+    def _release(self, shard_id: str):
+        """Remove the lock file of a shard."""
+        try:
+            os.remove(self._path(CLAIMS_FOLDER, shard_id, ".lock"))
+        except FileNotFoundError:
+            pass
+
+    def _write_marker(self, folder: str, shard_id: str, content: dict):
+        """Atomically write a marker file of a shard."""
+        with atomic_write(self._path(folder, shard_id, ".json")) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                json.dump(dict(content, timestamp=time.time()), f)
+
+    def _read_shard(self, shard_id: str) -> dict:
+        """Read the work units and dependencies of a shard."""
+        with open(self._path(SHARDS_FOLDER, shard_id, ".json"), "r") as f:
+            return json.load(f)
+
+    def _ids(self, folder: str) -> List[str]:
+        """Sorted shard IDs of all files in one of the queue folders (ignoring temp files)."""
+        ids = []
+        for file_name in os.listdir(os.path.join(self.queue_folder, folder)):
+            shard_id, extension = os.path.splitext(file_name)
+            if extension in (".json", ".lock"):
+                ids.append(shard_id)
+        return sorted(ids)
+
+    def _path(self, folder: str, shard_id: str, extension: str) -> str:
+        """Path of a shard's file in one of the queue folders."""
+        return os.path.join(self.queue_folder, folder, shard_id + extension)
@@ -0,0 +1,150 @@
+"""
+Sources of hourly balancing authority generation by fuel type (EIA-930 style).
+
+EIA-930 reports the net generation (MWh) of every balancing authority ("respondent") and fuel
+type for every hour, identified by the hour ending in UTC (eg: '2021-07-01T05'). Sources yield
+these records in batches of bounded size, so the full history is never held in memory:
+
+- `HourlyFileSource` reads CSV or Parquet files (eg: exported from the EIA-930 API) in chunks
+- `StubHourlyAPI` stands in for the paged EIA-930 API, generating synthetic records in time
+  order (eg: for benchmarks and offline development)
+
+Each batch is a dataframe with the columns period (datetime), respondent and fueltype
+(categorical) and value.
+"""
+# Python Libraries
+import glob
+import logging
+import os
+from typing import Iterator, List
+
+# Package Imports
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+# First Party Imports
+from src.d00_utils.const import EIA930_FUEL_CODES_YML_FILEPATH, HOURLY_FOLDER, RAW_DATA_FOLDER
+from src.d00_utils.utils import load_yml
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+HOURLY_COLUMNS = ["period", "respondent", "fueltype", "value"]
+
+
+class HourlyFileSource:
+    """Read hourly records from CSV or Parquet files in batches."""
+
+    def __init__(self, file_paths: List[str] = None, batch_size: int = 1_000_000):
+        """
+        Parameters
+        ------------
+        file_paths: List[str]
+            Optional paths to CSV or Parquet files with the columns period, respondent,
+            fueltype and value (all such files in the hourly raw data folder by default).
+            Files are read in order, so they should be sorted by time.
+        batch_size: int
+            Number of records per batch
+        """
+        self.file_paths = file_paths if file_paths is not None else hourly_source_filepaths()
+        self.batch_size = batch_size
+
+    def batches(self) -> Iterator[pd.DataFrame]:
+        """Yield the records of all files in batches."""
+        if not self.file_paths:
+            log.warning(f"No hourly data found in {_hourly_raw_folder()}")
+        for file_path in self.file_paths:
+            log.info(f"Reading hourly data from {file_path}")
+            if file_path.endswith(".parquet"):
+                # Dictionary encoded columns are read as categoricals
+                parquet_file = pq.ParquetFile(file_path, read_dictionary=["respondent", "fueltype"])
+                for batch in parquet_file.iter_batches(self.batch_size, columns=HOURLY_COLUMNS):
+                    yield self._parse_periods(batch.to_pandas())
+            else:
+                chunks = pd.read_csv(
+                    file_path,
+                    usecols=HOURLY_COLUMNS,
+                    dtype={"respondent": "category", "fueltype": "category", "value": "float64"},
+                    chunksize=self.batch_size,
+                )
+                for chunk in chunks:
+                    yield self._parse_periods(chunk)
+
+    @staticmethod
+    def _parse_periods(df: pd.DataFrame) -> pd.DataFrame:
+        """Convert hour ending strings (eg: '2021-07-01T05') to datetimes."""
+        if not pd.api.types.is_datetime64_any_dtype(df["period"]):
+            df["period"] = pd.to_datetime(df["period"], format="%Y-%m-%dT%H")
+        return df
+
+
+class StubHourlyAPI:
+    """Stand-in for the paged EIA-930 API generating synthetic hourly records in time order."""
+
+    def __init__(
+        self,
+        respondents: int = 64,
+        start: str = "2021-01-01",
+        hours: int = 24 * 365,
+        batch_size: int = 1_000_000,
+        seed: int = 0,
+    ):
+        """
+        Parameters
+        ------------
+        respondents: int
+            Number of balancing authorities
+        start: str
+            First hour
+        hours: int
+            Number of hours to generate records for
+        batch_size: int
+            Approximate number of records per batch (always whole hours)
+        seed: int
+            Seed of the random generation values
+        """
+        self.respondents = ["BA{:03d}".format(idx) for idx in range(respondents)]
+        self.fuel_types = list(load_yml(EIA930_FUEL_CODES_YML_FILEPATH))
+        self.start = np.datetime64(start, "h")
+        self.hours = hours
+        self.batch_size = batch_size
+        self.seed = seed
+
+    @property
+    def rows(self) -> int:
+        """Total number of records."""
+        return self.hours * len(self.respondents) * len(self.fuel_types)
+
+    def batches(self) -> Iterator[pd.DataFrame]:
+        """Yield records one page of whole hours at a time."""
+        rng = np.random.default_rng(self.seed)
+        n_respondents, n_fuels = len(self.respondents), len(self.fuel_types)
+        records_per_hour = n_respondents * n_fuels
+        hours_per_batch = max(1, self.batch_size // records_per_hour)
+        for first_hour in range(0, self.hours, hours_per_batch):
+            n_hours = min(hours_per_batch, self.hours - first_hour)
+            periods = self.start + 1 + np.arange(first_hour, first_hour + n_hours)
+            respondent_codes = np.tile(np.repeat(np.arange(n_respondents), n_fuels), n_hours)
+            fuel_codes = np.tile(np.arange(n_fuels), n_hours * n_respondents)
+            yield pd.DataFrame(
+                {
+                    "period": np.repeat(periods, records_per_hour).astype("datetime64[ns]"),
+                    "respondent": pd.Categorical.from_codes(respondent_codes, self.respondents),
+                    "fueltype": pd.Categorical.from_codes(fuel_codes, self.fuel_types),
+                    "value": rng.gamma(2.0, 250.0, n_hours * records_per_hour),
+                }
+            )
+
+
+def hourly_source_filepaths() -> List[str]:
+    """Paths to all CSV and Parquet files in the hourly raw data folder, sorted by name."""
+    return sorted(
+        glob.glob(os.path.join(_hourly_raw_folder(), "*.csv"))
+        + glob.glob(os.path.join(_hourly_raw_folder(), "*.parquet"))
+    )
+
+
+def _hourly_raw_folder() -> str:
+    """Folder of the hourly source files."""
+    return os.path.join(RAW_DATA_FOLDER, HOURLY_FOLDER)
@@ -1,14 +1,17 @@
 # Python Libraries
-import json
 import logging
 import os
+from typing import List
 
 # Package Imports
 import requests
 
 # First Party Imports
-from src.d00_utils.const import EIA_API_URL, RAW_DATA_FOLDER, STATES_YML_FILEPATH
-from src.d00_utils.utils import get_filepath, load_yml
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import DEFAULT_FREQUENCY, EIA_API_URL, FREQUENCIES, STATES_YML_FILEPATH
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.utils import load_yml, parallel_map
 
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
@@ -17,7 +20,13 @@ logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 class EIADataPull:
     """Class to pull relevant electricity generation data from EIA API"""
 
-    def __init__(self, data_type: str, api_ids_dict: dict):
+    def __init__(
+        self,
+        data_type: str,
+        api_ids_dict: dict,
+        states: List[str] = None,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
         """
 
         Parameters
@@ -31,23 +40,49 @@ class EIADataPull:
             value is the EIA API Series ID to access the specific data.
             For data_type `Net_Gen_By_Fuel_MWh`, examples of api_ids_dict key values
             include fuel names (coal, natural_gas, etc.)
+        states: List[str]
+            Optional full names of states to pull data for (all states in states yml by default)
+        frequency: str
+            Frequency of the series to pull: one of quarterly or monthly (see `FREQUENCIES`).
+            API IDs in the yml are quarterly and are converted to the frequency.
         """
         self.api_ids_dict = api_ids_dict
         self.data_type = data_type
-        self.save_folder = ""
+        self.states = states
+        self.frequency = frequency
 
-    def load_data(self):
-        """Loads and saves response data from EIA API for each state and each type of generation."""
+    def load_data(self, workers: int = 1):
+        """Loads and saves response data from EIA API for each state and each type of generation.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes pulling data for different states in parallel
+        """
         states = load_yml(STATES_YML_FILEPATH)
-        for state_name, state_code in states.items():
-            log.info(f"Loading raw data for {state_name}")
-            self.save_folder = "{}/{}".format(self.data_type, state_name)
+        if self.states is not None:
+            states = {name: code for name, code in states.items() if name in self.states}
+        parallel_map(self._load_state_data, states.items(), workers)
+
+    def _load_state_data(self, state: tuple):
+        """Loads and saves response data from EIA API for each type of generation of a state."""
+        state_name, state_code = state
+        log.info(f"Loading raw data for {state_name}")
+
+        for fuel_type, api_id in self.api_ids_dict.items():
+            # Pull and save JSON raw data using EIA API
+            unit = dict(data_type=self.data_type, state=state_name, fuel_type=fuel_type)
+            if is_completed("pull", **unit):
+                continue
+            with measure("series", "pull", **unit):
+                response = self._request_data(self._frequency_api_id(api_id), state_code)
+                self._save_data(response, state_name, fuel_type)
+                mark_completed("pull", **unit)
 
-            for fuel_type, api_id in self.api_ids_dict.items():
-                # Pull and save JSON raw data using EIA API
-                file_name = "{}-{}.json".format(self.data_type, fuel_type)
-                response = self._request_data(api_id, state_code)
-                self._save_data(response, file_name)
+    def _frequency_api_id(self, api_series_id: str) -> str:
+        """EIA API series ID for the frequency (eg: ELEC.GEN.COW-{}-99.Q -> ELEC.GEN.COW-{}-99.M)"""
+        series_id, _ = api_series_id.rsplit(".", 1)
+        return "{}.{}".format(series_id, FREQUENCIES[self.frequency]["api_suffix"])
 
     @staticmethod
     def _request_data(api_series_id: str, state: str):
@@ -55,8 +90,13 @@ class EIADataPull:
         custom_series_id = api_series_id.format(state)
         return requests.get(EIA_API_URL.format(custom_series_id, os.environ.get("EIA_ACCESS_KEY")))
 
-    def _save_data(self, response, file_name):
+    def _save_data(self, response, state: str, fuel_type: str):
         """Save get request response as JSON file."""
-        file_path = get_filepath(RAW_DATA_FOLDER, self.save_folder, file_name)
-        with open(file_path, "w", encoding="utf-8") as f:
-            json.dump(response.json(), f, ensure_ascii=False, indent=4)
+        get_catalog().write(
+            "raw",
+            response.json(),
+            self.frequency,
+            data_type=self.data_type,
+            state=state,
+            fuel_type=fuel_type,
+        )
@@ -0,0 +1,192 @@
+"""
+Roll-ups of plant level data to state level series.
+
+The plant partitions written by `PlantDataCleaner` are read one record batch at a time and
+summed by month and fuel code, so memory use only depends on the batch size and the number of
+months, not on the number of plants. The monthly totals are summed to the fuel types of the
+EIA API series (see `conf/base/EIA923_fuel_codes.yml`), converted to the same units, resampled
+to the pipeline frequency and saved as the same intermediate CSVs which `DataCleaner` creates
+from state level data. Processing, training, forecasting and the `EmissionsCalculator` then
+run unchanged on plant level data. The United States series sums the plants of all states.
+"""
+# Python Libraries
+import logging
+import sys
+from typing import List
+
+# Package Imports
+import pandas as pd
+import pyarrow.parquet as pq
+
+# First Party Imports
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import (
+    DEFAULT_FREQUENCY,
+    EIA923_FUEL_CODES_YML_FILEPATH,
+    FREQUENCIES,
+    HISTORY_END_DATE,
+    HISTORY_START_DATE,
+    get_states,
+)
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import load_yml, parallel_map
+from src.d02_intermediate.clean_plant_data import plant_partition_filepaths
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+# Column of the plant partitions for each data type and the divisor converting it to the
+# units of the EIA API series (thousand MWh and million MMBtu)
+PLANT_VALUE_COLUMNS = {
+    "Net_Gen_By_Fuel_MWh": ("net_generation_mwh", 1e3),
+    "Fuel_Consumption_BTU": ("fuel_consumption_mmbtu", 1e6),
+}
+
+
+class PlantDataAggregator:
+    """Class to roll up plant level data to the state level series of the intermediate layer."""
+
+    def __init__(
+        self,
+        data_type: str,
+        api_ids_dict: dict,
+        states: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+        batch_size: int = 65_536,
+    ):
+        """
+
+        Parameters
+        ------------
+        data_type: str
+            Type of data being rolled up such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`
+        api_ids_dict: dict
+            Dictionary of API IDs where key is a fuel type. A series is created for each
+            fuel type, summing the plant level fuel codes listed for it in EIA923_fuel_codes.yml
+        states: List[str]
+            Optional full names of states to roll up data for (all states by default)
+        force: bool
+            If False, skip series whose plant partitions and roll-up code are unchanged
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
+        batch_size: int
+            Number of plant rows read and summed at a time
+        """
+        if data_type not in PLANT_VALUE_COLUMNS:
+            raise ValueError(f"Unexpected EIA Data Type encountered: {data_type}")
+        fuel_codes = load_yml(EIA923_FUEL_CODES_YML_FILEPATH)[data_type]
+        self.fuel_codes = {fuel_type: fuel_codes[fuel_type] for fuel_type in api_ids_dict}
+        self.data_type = data_type
+        self.states = states if states is not None else get_states()
+        self.force = force
+        self.frequency = frequency
+        self.pandas_freq = FREQUENCIES[frequency]["pandas_freq"]
+        self.batch_size = batch_size
+        self.version = code_version(sys.modules[__name__], self.fuel_codes)
+        self.state = ""
+
+    def aggregate_data(self, workers: int = 1):
+        """
+        Roll up plant level data to a series of each fuel type for each state.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes rolling up data for different states in parallel
+        """
+        parallel_map(self._aggregate_state_data, self.states, workers)
+
+    def _aggregate_state_data(self, state: str):
+        """Roll up and save the series of a state which are not up to date."""
+        self.state = state
+        partition_filepaths = plant_partition_filepaths(None if state == "United States" else state)
+        inputs = fingerprint(partition_filepaths, self.version)
+        fuel_types = [
+            fuel_type
+            for fuel_type in self.fuel_codes
+            if not is_completed("clean", data_type=self.data_type, state=state, fuel_type=fuel_type)
+            and (self.force or not is_current(self._intermediate_filepath(fuel_type), inputs))
+        ]
+        if not fuel_types:
+            return
+
+        log.info(f"Rolling up plant level data for {state}")
+        value_column, divisor = PLANT_VALUE_COLUMNS[self.data_type]
+        with measure("series", "clean", data_type=self.data_type, state=state):
+            totals = rollup_plant_data(partition_filepaths, value_column, self.batch_size)
+            totals = self._resample_totals(totals / divisor)
+            for fuel_type in fuel_types:
+                df = self._create_state_series(totals, fuel_type)
+                self._save_intermediate_data(df, fuel_type)
+                record_lineage(self._intermediate_filepath(fuel_type), inputs)
+                mark_completed("clean", data_type=self.data_type, state=state, fuel_type=fuel_type)
+
+    def _resample_totals(self, totals: pd.DataFrame) -> pd.DataFrame:
+        """
+        Resample monthly totals of each fuel code to the pipeline frequency and impute 0 for
+        periods without plant data between 2001 and 2021.
+        """
+        totals.index = pd.DatetimeIndex(totals.index)
+        totals = totals.resample(self.pandas_freq).sum()
+        dt_range_idx = pd.date_range(HISTORY_START_DATE, HISTORY_END_DATE, freq=self.pandas_freq)
+        return totals.reindex(dt_range_idx, fill_value=0)
+
+    def _create_state_series(self, totals: pd.DataFrame, fuel_type: str) -> pd.DataFrame:
+        """Sum the totals of the fuel codes of a fuel type."""
+        fuel_codes = [code for code in self.fuel_codes[fuel_type] if code in totals.columns]
+        pd_series = totals[fuel_codes].sum(axis=1)
+        return pd.DataFrame({"date": pd_series.index, self.data_type: pd_series.values})
+
+    def _intermediate_filepath(self, fuel_type: str) -> str:
+        """Filepath of the intermediate data of a fuel type for the current state."""
+        return get_catalog().filepath(
+            "intermediate",
+            self.frequency,
+            data_type=self.data_type,
+            state=self.state,
+            fuel_type=fuel_type,
+        )
+
+    def _save_intermediate_data(self, df: pd.DataFrame, fuel_type: str):
+        """Save a rolled up series in the intermediate data folder."""
+        get_catalog().write(
+            "intermediate",
+            df,
+            self.frequency,
+            data_type=self.data_type,
+            state=self.state,
+            fuel_type=fuel_type,
+        )
+
+
+def rollup_plant_data(
+    partition_filepaths: List[str], value_column: str, batch_size: int = 65_536
+) -> pd.DataFrame:
+    """
+    Monthly totals of a value of plant partitions by fuel code, reading one batch at a time.
+
+    Parameters
+    -----------
+    partition_filepaths: List[str]
+        Paths to plant partitions (see `plant_partition_filepaths`)
+    value_column: str
+        Column to sum: net_generation_mwh or fuel_consumption_mmbtu
+    batch_size: int
+        Number of plant rows read and summed at a time
+
+    Returns
+    --------
+    pd.DataFrame
+        Totals with one row per month end date and one column per fuel code
+    """
+    totals = pd.DataFrame(dtype="float64")
+    for file_path in partition_filepaths:
+        parquet_file = pq.ParquetFile(file_path)
+        batches = parquet_file.iter_batches(batch_size, columns=["date", "fuel_code", value_column])
+        for batch in batches:
+            sums = batch.to_pandas().groupby(["date", "fuel_code"])[value_column].sum()
+            totals = totals.add(sums.unstack(fill_value=0), fill_value=0)
+    return totals.fillna(0)
@@ -0,0 +1,252 @@
+"""
+Chunked cleaning of plant level EIA-923 generation and fuel consumption data.
+
+EIA-923 ("Page 1 Generation and Fuel Data") reports the monthly net generation and fuel
+consumption of every plant, prime mover and fuel, with one column per month. Yearly files
+saved as CSV in `data/01_raw/Plants/` are read in chunks, so memory use is bounded by the
+chunk size instead of the file size. Each chunk is converted to one row per plant, fuel and
+month and appended as a row group to a columnar (Parquet) partition of its state::
+
+    data/02_intermediate/Plants/<state>/<source file name>.parquet
+
+Tens of thousands of plant series are therefore stored in one file per state and source
+file instead of one file per series. `PlantDataAggregator` rolls them up to state level series.
+"""
+# Python Libraries
+import calendar
+import glob
+import logging
+import os
+import re
+import sys
+from contextlib import ExitStack
+from typing import Dict, List
+
+# Package Imports
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# First Party Imports
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import (
+    INTERMEDIATE_DATA_FOLDER,
+    PLANTS_FOLDER,
+    RAW_DATA_FOLDER,
+    STATES_YML_FILEPATH,
+)
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import (
+    LINEAGE_SUFFIX,
+    code_version,
+    fingerprint,
+    is_current,
+    record_lineage,
+)
+from src.d00_utils.utils import atomic_write, ensure_folder, load_yml, parallel_map
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+MONTHS = [month.lower() for month in calendar.month_name[1:]]
+
+# Normalized names of the source columns which are read (see `_normalize_column`)
+SOURCE_COLUMNS = {"plant_id", "plant_state", "aer_fuel_type_code", "year"} | {
+    "{}_{}".format(prefix, month) for prefix in ("netgen", "tot_mmbtu") for month in MONTHS
+}
+
+# Columns of the plant partitions
+PLANT_SCHEMA = pa.schema(
+    [
+        ("plant_id", pa.int64()),
+        ("fuel_code", pa.string()),
+        ("date", pa.timestamp("ns")),
+        ("net_generation_mwh", pa.float64()),
+        ("fuel_consumption_mmbtu", pa.float64()),
+    ]
+)
+
+
+class PlantDataCleaner:
+    """Class to clean plant level EIA-923 data in chunks into columnar partitions per state."""
+
+    def __init__(
+        self, source_filepaths: List[str] = None, force: bool = True, chunk_size: int = 10_000
+    ):
+        """
+
+        Parameters
+        ------------
+        source_filepaths: List[str]
+            Optional paths to EIA-923 CSV files (all CSV files in the plants raw data folder by
+            default). Files need the header in their first row, including the columns Plant Id,
+            Plant State, AER Fuel Type Code, YEAR and the monthly Netgen and Tot_MMBtu columns.
+        force: bool
+            If False, skip source files whose contents and the cleaning code are unchanged
+        chunk_size: int
+            Number of source rows read and converted at a time
+        """
+        self.source_filepaths = (
+            source_filepaths if source_filepaths is not None else plant_source_filepaths()
+        )
+        self.force = force
+        self.chunk_size = chunk_size
+        self.version = code_version(sys.modules[__name__])
+
+    def clean_data(self, workers: int = 1):
+        """
+        Convert each source file into partitions of its states.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes cleaning different source files in parallel
+        """
+        if not self.source_filepaths:
+            log.warning(f"No plant level data found in {_plants_raw_folder()}")
+        parallel_map(self._clean_source_data, self.source_filepaths, workers)
+
+    def _clean_source_data(self, source_filepath: str):
+        """Clean a source file unless its partitions are up to date."""
+        source = os.path.splitext(os.path.basename(source_filepath))[0]
+        unit = dict(data_type=PLANTS_FOLDER, source=source)
+        inputs = fingerprint([source_filepath], self.version)
+        existing_filepaths = plant_partition_filepaths(source=source)
+        if is_completed("clean", **unit) or (
+            not self.force
+            and existing_filepaths
+            and all(is_current(file_path, inputs) for file_path in existing_filepaths)
+        ):
+            return
+
+        log.info(f"Cleaning plant level data of {source}")
+        with measure("series", "clean", **unit) as record:
+            rows = self._write_partitions(source_filepath, source)
+            written_filepaths = plant_partition_filepaths(source=source)
+            for file_path in written_filepaths:
+                record_lineage(file_path, inputs)
+            # Remove partitions of states no longer in the source file
+            for file_path in set(existing_filepaths) - set(written_filepaths):
+                os.remove(file_path)
+                os.remove(file_path + LINEAGE_SUFFIX)
+            if record is not None:
+                record["rows"] = rows
+            mark_completed("clean", **unit)
+        log.info(f"Cleaned {rows} plant rows of {source} into {len(written_filepaths)} states")
+
+    def _write_partitions(self, source_filepath: str, source: str) -> int:
+        """Append each converted chunk to the partitions of its states, return the row count."""
+        state_names = {code: name for name, code in load_yml(STATES_YML_FILEPATH).items()}
+        rows = 0
+        with ExitStack() as stack:
+            writers: Dict[str, pq.ParquetWriter] = {}
+            chunks = pd.read_csv(
+                source_filepath,
+                usecols=lambda column: _normalize_column(column) in SOURCE_COLUMNS,
+                thousands=",",
+                na_values=["."],
+                chunksize=self.chunk_size,
+            )
+            for chunk in chunks:
+                df = self._convert_chunk(chunk)
+                df["state"] = df["state"].map(state_names)
+                if df["state"].isna().any():
+                    log.warning(f"Skipping {df['state'].isna().sum()} rows with unknown states")
+                    df = df.dropna(subset=["state"])
+                for state, state_df in df.groupby("state", sort=False):
+                    if state not in writers:
+                        # Partitions only replace previous versions once completely written
+                        file_path = plant_partition_filepath(state, source)
+                        ensure_folder(os.path.dirname(file_path))
+                        tmp_file_path = stack.enter_context(atomic_write(file_path))
+                        writers[state] = pq.ParquetWriter(tmp_file_path, PLANT_SCHEMA)
+                        stack.callback(writers[state].close)
+                    table = pa.Table.from_pandas(
+                        state_df.drop(columns="state"), schema=PLANT_SCHEMA, preserve_index=False
+                    )
+                    writers[state].write_table(table)
+                rows += len(df)
+        return rows
+
+    @staticmethod
+    def _convert_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+        """
+        Convert a chunk of source rows (one column per month) into one row per plant, fuel and
+        month. Missing values imply no generation or consumption in that month.
+        """
+        chunk.columns = [_normalize_column(column) for column in chunk.columns]
+        chunk = chunk.dropna(subset=["plant_id", "plant_state", "aer_fuel_type_code", "year"])
+
+        # Month end date of every month of each row, in row-major order
+        months = (chunk["year"].to_numpy(dtype="int64")[:, None] - 1970) * 12 + np.arange(12)
+        month_starts = months.ravel().astype("datetime64[M]")
+        dates = (month_starts + 1).astype("datetime64[D]") - np.timedelta64(1, "D")
+
+        df = pd.DataFrame(
+            {
+                "state": np.repeat(chunk["plant_state"].to_numpy(), 12),
+                "plant_id": np.repeat(chunk["plant_id"].to_numpy(dtype="int64"), 12),
+                "fuel_code": np.repeat(chunk["aer_fuel_type_code"].to_numpy(), 12),
+                "date": dates.astype("datetime64[ns]"),
+                "net_generation_mwh": _monthly_values(chunk, "netgen"),
+                "fuel_consumption_mmbtu": _monthly_values(chunk, "tot_mmbtu"),
+            }
+        )
+        df = df.dropna(subset=["net_generation_mwh", "fuel_consumption_mmbtu"], how="all")
+        # Sum rows of different prime movers of a plant using the same fuel
+        return (
+            df.fillna(0)
+            .groupby(["state", "plant_id", "fuel_code", "date"], sort=False, as_index=False)
+            .sum()
+        )
+
+
+def plant_source_filepaths() -> List[str]:
+    """Paths to all EIA-923 CSV files in the plants raw data folder."""
+    return sorted(glob.glob(os.path.join(_plants_raw_folder(), "*.csv")))
+
+
+def plant_partition_filepath(state: str, source: str) -> str:
+    """Filepath of the partition of a state created from a source file (folder not created)."""
+    return os.path.join(INTERMEDIATE_DATA_FOLDER, PLANTS_FOLDER, state, "{}.parquet".format(source))
+
+
+def plant_partition_filepaths(state: str = None, source: str = None) -> List[str]:
+    """
+    Paths to the existing partitions of a state and/or source file.
+
+    Parameters
+    -----------
+    state: str
+        Optional full name of a state (all states by default)
+    source: str
+        Optional source file name without extension (all source files by default)
+
+    Returns
+    --------
+    List[str]
+        Sorted paths to the partitions
+    """
+    pattern = os.path.join(
+        glob.escape(os.path.join(INTERMEDIATE_DATA_FOLDER, PLANTS_FOLDER)),
+        glob.escape(state) if state is not None else "*",
+        "{}.parquet".format(glob.escape(source) if source is not None else "*"),
+    )
+    return sorted(glob.glob(pattern))
+
+
+def _plants_raw_folder() -> str:
+    """Folder of the EIA-923 source files."""
+    return os.path.join(RAW_DATA_FOLDER, PLANTS_FOLDER)
+
+
+def _normalize_column(column: str) -> str:
+    """Lower case column name with words joined by underscores (eg: 'Netgen\\nJanuary')."""
+    return re.sub(r"[^a-z0-9]+", "_", str(column).strip().lower()).strip("_")
+
+
+def _monthly_values(chunk: pd.DataFrame, prefix: str) -> np.ndarray:
+    """Values of the monthly columns with a prefix of each row, in row-major order."""
+    columns = ["{}_{}".format(prefix, month) for month in MONTHS]
+    return chunk[columns].to_numpy(dtype="float64").ravel()
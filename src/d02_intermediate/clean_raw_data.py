@@ -1,13 +1,24 @@
 # Python Libraries
-import json
 import logging
+import sys
+from typing import List
 
 # Package Imports
 import pandas as pd
 
 # First Party Imports
-from src.d00_utils.const import INTERMEDIATE_DATA_FOLDER, RAW_DATA_FOLDER, STATES
-from src.d00_utils.utils import get_filepath
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import (
+    DEFAULT_FREQUENCY,
+    FREQUENCIES,
+    HISTORY_END_DATE,
+    HISTORY_START_DATE,
+    get_states,
+)
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import parallel_map
 
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
@@ -16,7 +27,14 @@ logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 class DataCleaner:
     """Class to clean raw data prior to feature engineering."""
 
-    def __init__(self, data_type: str, api_ids_dict: dict):
+    def __init__(
+        self,
+        data_type: str,
+        api_ids_dict: dict,
+        states: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
         """
 
         Parameters
@@ -30,39 +48,74 @@ class DataCleaner:
             value is the EIA API Series ID to access the specific data.
             For data_type `Net_Gen_By_Fuel_MWh`, examples of api_ids_dict
             key values include fuel names (coal, natural_gas, etc.)
+        states: List[str]
+            Optional full names of states to clean data for (all states by default)
+        force: bool
+            If False, skip series whose raw data and cleaning code are unchanged
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
         """
         self.api_ids_dict = api_ids_dict
         self.data_type = data_type
-        self.save_folder = ""
+        self.states = states if states is not None else get_states()
+        self.force = force
+        self.frequency = frequency
+        self.pandas_freq = FREQUENCIES[frequency]["pandas_freq"]
+        self.version = code_version(sys.modules[__name__])
+        self.state = ""
         self.fuel_type = ""
 
-    def clean_data(self):
+    def clean_data(self, workers: int = 1):
         """Clean and save raw data in two steps for each state and each data type:
         1) Convert raw data from JSON to CSV format (for failed API requests, create empty CSV)
         2) Impute missing data for time periods with no entry (implies no generation in that period)
-        """
-        for state in STATES:
-            log.info(f"Cleaning raw data for {state}")
-            # Folder for each state's data
-            self.save_folder = "{}/{}".format(self.data_type, state)
 
-            for fuel_type, api_id in self.api_ids_dict.items():
-                self.fuel_type = fuel_type
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes cleaning data for different states in parallel
+        """
+        parallel_map(self._clean_state_data, self.states, workers)
+
+    def _clean_state_data(self, state: str):
+        """Clean and save raw data for each data type of a state."""
+        log.info(f"Cleaning raw data for {state}")
+        self.state = state
+
+        for fuel_type, api_id in self.api_ids_dict.items():
+            self.fuel_type = fuel_type
+            unit = dict(data_type=self.data_type, state=state, fuel_type=fuel_type)
+            inputs = fingerprint([self._raw_filepath()], self.version)
+            if is_completed("clean", **unit) or (
+                not self.force and is_current(self._intermediate_filepath(), inputs)
+            ):
+                continue
+            with measure("series", "clean", **unit):
                 df = self._convert_raw_data()
                 df = self._impute_missing_data(df)
                 self._save_intermediate_data(df)
+                record_lineage(self._intermediate_filepath(), inputs)
+                mark_completed("clean", **unit)
+
+    def _partition(self) -> dict:
+        """Data catalog keys of the current state and fuel type."""
+        return dict(data_type=self.data_type, state=self.state, fuel_type=self.fuel_type)
+
+    def _raw_filepath(self) -> str:
+        """Filepath of raw JSON data for current state and fuel type."""
+        return get_catalog().filepath("raw", self.frequency, **self._partition())
+
+    def _intermediate_filepath(self) -> str:
+        """Filepath of cleaned intermediate data for current state and fuel type."""
+        return get_catalog().filepath("intermediate", self.frequency, **self._partition())
 
     def _convert_raw_data(self) -> pd.DataFrame:
         """Read raw JSON data and convert to dataframe including handling invalid responses"""
-        raw_file_name = "{}-{}.{}".format(self.data_type, self.fuel_type, "json")
-        raw_file_path = get_filepath(RAW_DATA_FOLDER, self.save_folder, raw_file_name)
-
-        with open(raw_file_path, "r") as f:
-            json_data = json.load(f)
-            if self._is_response_valid(json_data):
-                return self._create_valid_df(json_data)
-            else:
-                return self._create_empty_df()
+        json_data = get_catalog().read("raw", self.frequency, **self._partition())
+        if self._is_response_valid(json_data):
+            return self._create_valid_df(json_data)
+        else:
+            return self._create_empty_df()
 
     @staticmethod
     def _is_response_valid(json_data) -> bool:
@@ -76,10 +129,15 @@ class DataCleaner:
         return True
 
     def _create_valid_df(self, json_data) -> pd.DataFrame:
-        """Creates a dataframe from JSON response and converts quarter string to datetime format"""
+        """Creates a dataframe from JSON response and converts period string to datetime format"""
         df = pd.DataFrame(json_data["series"][0]["data"])
         df.columns = ["date", self.data_type]
 
+        if self.frequency == "monthly":
+            # Convert year_month (202109) into date ('2021-09-30') format
+            df["date"] = pd.to_datetime(df["date"], format="%Y%m") + pd.offsets.MonthEnd(0)
+            return df
+
         # Convert year_quarter (2021Q3) into date ('2021-09-30') format
         qs = df["date"].str.replace(r"(\d+)(Q\d)", r"\1-\2", regex=True)
         df["date"] = pd.PeriodIndex(qs, freq="Q").to_timestamp()
@@ -89,16 +147,14 @@ class DataCleaner:
     def _create_empty_df(self) -> pd.DataFrame:
         """Creates an empty df when the JSON response from EIA is invalid
         which means there is no data for that attribute for the state specified."""
-        start_date = "2001-01-01"
-        end_date = "2021-12-31"
-        dt_range = pd.date_range(start_date, end_date, freq="Q")
+        dt_range = pd.date_range(HISTORY_START_DATE, HISTORY_END_DATE, freq=self.pandas_freq)
         return pd.DataFrame({"date": dt_range, self.data_type: 0.0})
 
     def _impute_missing_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """
         Performs two imputations on each CSV file in 02_intermediate data folder:
         1) Impute 0 for all rows with missing y value (eg: Net_Gen_By_Fuel_MWh)
-        2) For any missing quarters between 2001 and 2021, create a new row for the
+        2) For any missing periods between 2001 and 2021, create a new row for the
         missing date with a y value of zero. This ensures the time-series training
         algorithm has data points for all time periods without any missing periods.
         """
@@ -109,7 +165,7 @@ class DataCleaner:
         pd_series.index = pd.DatetimeIndex(pd_series.index)
 
         # Create new index with all possible dates in interval and reindex
-        dt_range_idx = pd.date_range("2001-01-01", "2021-12-31", freq="Q")
+        dt_range_idx = pd.date_range(HISTORY_START_DATE, HISTORY_END_DATE, freq=self.pandas_freq)
         pd_series = pd_series.reindex(dt_range_idx, fill_value=0)
 
         # Create dataframe from pd.Series
@@ -117,8 +173,4 @@ class DataCleaner:
 
     def _save_intermediate_data(self, df: pd.DataFrame):
         """Save cleaned raw data in intermediate data folder."""
-        intermediate_file_name = "{}-{}.{}".format(self.data_type, self.fuel_type, "csv")
-        intermediate_file_path = get_filepath(
-            INTERMEDIATE_DATA_FOLDER, self.save_folder, intermediate_file_name
-        )
-        df.to_csv(intermediate_file_path, index=False)
+        get_catalog().write("intermediate", df, self.frequency, **self._partition())
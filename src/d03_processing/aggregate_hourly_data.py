@@ -0,0 +1,344 @@
+"""
+Streaming windowed aggregation of hourly balancing authority generation by fuel type.
+
+Hourly records (see `src.d01_data.get_hourly_data`) are summed into hourly, daily and quarterly
+windows per respondent and fuel type. Each window type keeps the totals of its open windows in
+a dense array buffer (window x respondent x fuel type), which is updated with a single
+`np.bincount` per batch. Records may arrive out of order by up to `lateness_hours`. Once the
+latest hour seen is that far past the end of a window, the window is closed: its totals and
+emissions intensity are appended to the Parquet file of its window type and it is dropped
+from the buffer. Memory use is bounded by the number of open windows and respondents, never
+by the length of the history. Records of windows which were already closed are counted as
+late and dropped.
+
+Emissions intensity (kgCO2e/MWh) applies the emissions factors of net generation (see
+`conf/base/emissions_factors.yml`) to the fuel types mapped in `conf/base/EIA930_fuel_codes.yml`.
+"""
+# Python Libraries
+import logging
+import os
+import time
+from contextlib import ExitStack
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Package Imports
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# First Party Imports
+from src.d00_utils.const import HOURLY_FOLDER, REPORTING_FOLDER
+from src.d00_utils.utils import atomic_write, get_filepath
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+WINDOW_TYPES = ["hourly", "daily", "quarterly"]
+# Fuel type which records of fuel types missing in the fuel codes are counted as
+OTHER_FUEL_CODE = "OTH"
+
+
+class WindowBuffer:
+    """Totals of the open windows of one window type, by respondent and fuel type."""
+
+    def __init__(self, window_type: str, n_fuels: int):
+        """
+        Parameters
+        ------------
+        window_type: str
+            One of hourly, daily or quarterly (see `WINDOW_TYPES`)
+        n_fuels: int
+            Number of fuel types
+        """
+        self.window_type = window_type
+        # Index of the first open window and of the first window which is not closed yet
+        self.first_window: Optional[int] = None
+        self.closed_until: Optional[int] = None
+        self.totals = np.zeros((0, 0, n_fuels))
+        self.late_rows = 0
+
+    def add(
+        self,
+        windows: np.ndarray,
+        respondents: np.ndarray,
+        fuels: np.ndarray,
+        values: np.ndarray,
+        n_respondents: int,
+    ):
+        """Add records (window, respondent and fuel type indices and values) to the totals."""
+        if self.closed_until is not None:
+            on_time = windows >= self.closed_until
+            if not on_time.all():
+                self.late_rows += int((~on_time).sum())
+                windows, respondents = windows[on_time], respondents[on_time]
+                fuels, values = fuels[on_time], values[on_time]
+        if len(windows) == 0:
+            return
+
+        first_window, last_window = int(windows.min()), int(windows.max())
+        if self.first_window is not None:
+            first_window = min(first_window, self.first_window)
+            last_window = max(last_window, self.first_window + self.totals.shape[0] - 1)
+        self._resize(first_window, last_window - first_window + 1, n_respondents)
+
+        n_windows, _, n_fuels = self.totals.shape
+        flat_index = ((windows - self.first_window) * n_respondents + respondents) * n_fuels + fuels
+        self.totals += np.bincount(flat_index, weights=values, minlength=self.totals.size).reshape(
+            self.totals.shape
+        )
+
+    def pop_closed(self, end_window: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Remove the windows before a window from the buffer.
+
+        Returns
+        --------
+        Tuple[np.ndarray, np.ndarray]
+            Indices and totals (window x respondent x fuel type) of the removed windows
+        """
+        self.closed_until = (
+            end_window if self.closed_until is None else max(self.closed_until, end_window)
+        )
+        if self.first_window is None or end_window <= self.first_window:
+            return np.zeros(0, dtype=np.int64), self.totals[:0]
+        n_closed = min(end_window - self.first_window, self.totals.shape[0])
+        windows = np.arange(self.first_window, self.first_window + n_closed)
+        closed = self.totals[:n_closed]
+        self.totals = self.totals[n_closed:].copy()
+        self.first_window += n_closed
+        return windows, closed
+
+    def _resize(self, first_window: int, n_windows: int, n_respondents: int):
+        """Grow the buffer to hold windows from a first window and more respondents."""
+        if (
+            self.first_window == first_window
+            and self.totals.shape[0] == n_windows
+            and self.totals.shape[1] == n_respondents
+        ):
+            return
+        totals = np.zeros((n_windows, n_respondents, self.totals.shape[2]))
+        if self.first_window is not None:
+            offset = self.first_window - first_window
+            old_windows, old_respondents, _ = self.totals.shape
+            totals[offset : offset + old_windows, :old_respondents] = self.totals
+        self.totals = totals
+        self.first_window = first_window
+
+
+class HourlyAggregator:
+    """Aggregate a stream of hourly records into windows, writing closed windows to Parquet."""
+
+    def __init__(
+        self,
+        fuel_codes: Dict[str, str],
+        emission_factors: Dict[str, float],
+        output_folder: str = None,
+        lateness_hours: int = 24,
+        window_types: List[str] = None,
+    ):
+        """
+        Parameters
+        ------------
+        fuel_codes: Dict[str, str]
+            EIA-930 fuel types and the net generation fuel type whose emissions factor applies
+            (see EIA930_fuel_codes.yml)
+        emission_factors: Dict[str, float]
+            Emissions factors (kgCO2e/MWh) of net generation fuel types
+            (Net_Gen_By_Fuel_MWh in emissions_factors.yml)
+        output_folder: str
+            Folder of the Parquet file of each window type (hourly reporting folder by default)
+        lateness_hours: int
+            Hours records may arrive after later records before their window is closed
+        window_types: List[str]
+            Window types to aggregate (see `WINDOW_TYPES`, all by default)
+        """
+        self.fuel_codes = list(fuel_codes)
+        self.factors = np.array([emission_factors[fuel_codes[code]] for code in self.fuel_codes])
+        self.output_folder = output_folder or os.path.join(REPORTING_FOLDER, HOURLY_FOLDER)
+        self.lateness_hours = lateness_hours
+        self.window_types = window_types or WINDOW_TYPES
+        self.buffers = {
+            window_type: WindowBuffer(window_type, len(self.fuel_codes))
+            for window_type in self.window_types
+        }
+        self.respondents: List[str] = []
+        self._respondent_index: Dict[str, int] = {}
+        self._fuel_index = {code: idx for idx, code in enumerate(self.fuel_codes)}
+        self.latest_hour: Optional[int] = None
+        self.schema = pa.schema(
+            [("period", pa.timestamp("ns")), ("respondent", pa.string())]
+            + [(code, pa.float64()) for code in self.fuel_codes]
+            + [("all_sources", pa.float64()), ("emissions_intensity", pa.float64())]
+        )
+
+    def aggregate(self, batches: Iterable[pd.DataFrame]) -> dict:
+        """
+        Aggregate all batches of a source and write every window once it is closed.
+
+        Parameters
+        -----------
+        batches: Iterable[pd.DataFrame]
+            Batches of hourly records (see `HourlyFileSource` and `StubHourlyAPI`)
+
+        Returns
+        --------
+        dict
+            Number of rows aggregated, late rows dropped, windows written per window type and
+            seconds spent aggregating (excluding the time waiting for batches)
+        """
+        stats: dict = {"rows": 0, "late_rows": {}, "windows": {}, "aggregate_seconds": 0.0}
+        with ExitStack() as stack:
+            writers = {}
+            for window_type in self.window_types:
+                file_path = get_filepath(self.output_folder, "", "{}.parquet".format(window_type))
+                # Outputs only replace previous versions once completely written
+                tmp_file_path = stack.enter_context(atomic_write(file_path))
+                writers[window_type] = pq.ParquetWriter(tmp_file_path, self.schema)
+                stack.callback(writers[window_type].close)
+                stats["windows"][window_type] = 0
+
+            for batch in batches:
+                start = time.perf_counter()
+                self.add_batch(batch)
+                self._write_closed_windows(writers, stats, final=False)
+                stats["rows"] += len(batch)
+                stats["aggregate_seconds"] += time.perf_counter() - start
+            start = time.perf_counter()
+            self._write_closed_windows(writers, stats, final=True)
+            stats["aggregate_seconds"] += time.perf_counter() - start
+
+        stats["late_rows"] = {
+            window_type: buffer.late_rows for window_type, buffer in self.buffers.items()
+        }
+        stats["rows_per_second"] = stats["rows"] / max(stats["aggregate_seconds"], 1e-9)
+        log.info(f"Aggregated {stats['rows']} hourly records: {stats}")
+        return stats
+
+    def add_batch(self, batch: pd.DataFrame):
+        """Add a batch of hourly records to the open windows of every window type."""
+        batch = batch.dropna(subset=["period", "respondent", "fueltype"])
+        # Periods are hour ending, so each record belongs to the hour starting one hour earlier
+        hours = batch["period"].to_numpy(dtype="datetime64[h]").astype(np.int64) - 1
+        respondents = self._encode(batch["respondent"], self._respondent_index, self.respondents)
+        fuels = self._encode_fuels(batch["fueltype"])
+        values = np.nan_to_num(batch["value"].to_numpy(dtype="float64"))
+        if len(hours) == 0:
+            return
+        latest_hour = int(hours.max())
+        self.latest_hour = (
+            latest_hour if self.latest_hour is None else max(self.latest_hour, latest_hour)
+        )
+
+        for window_type, buffer in self.buffers.items():
+            windows = _window_index(window_type, hours)
+            buffer.add(windows, respondents, fuels, values, len(self.respondents))
+
+    def _write_closed_windows(self, writers: dict, stats: dict, final: bool):
+        """Write windows ending before the latest hour minus the lateness (all if final)."""
+        if self.latest_hour is None:
+            return
+        watermark = self.latest_hour + 1 - (0 if final else self.lateness_hours)
+        for window_type, buffer in self.buffers.items():
+            # First window which is still open at the watermark (all windows if final)
+            end_window = _window_index(window_type, np.array([watermark]))[0]
+            if final:
+                end_window = max(end_window, (buffer.first_window or 0) + buffer.totals.shape[0])
+            windows, totals = buffer.pop_closed(end_window)
+            if len(windows) == 0:
+                continue
+            table = self._windows_table(window_type, windows, totals)
+            writers[window_type].write_table(table)
+            stats["windows"][window_type] += len(windows)
+
+    def _windows_table(self, window_type: str, windows: np.ndarray, totals: np.ndarray) -> pa.Table:
+        """Totals and emissions intensity of closed windows, one row per window and respondent."""
+        n_windows, n_respondents, _ = totals.shape
+        rows = totals.reshape(n_windows * n_respondents, -1)
+        all_sources = rows.sum(axis=1)
+        emissions = rows @ self.factors
+        intensity = np.full(len(rows), np.nan)
+        np.divide(emissions, all_sources, out=intensity, where=all_sources > 0)
+
+        # Skip respondents without any generation in a window
+        reported = (rows != 0).any(axis=1)
+        periods = _window_start(window_type, windows).astype("datetime64[ns]")
+        columns = {
+            "period": np.repeat(periods, n_respondents)[reported],
+            "respondent": np.tile(np.array(self.respondents, dtype=object), n_windows)[reported],
+        }
+        for idx, code in enumerate(self.fuel_codes):
+            columns[code] = rows[reported, idx]
+        columns["all_sources"] = all_sources[reported]
+        columns["emissions_intensity"] = intensity[reported]
+        return pa.Table.from_pydict(columns, schema=self.schema)
+
+    def _encode_fuels(self, fuel_types: pd.Series) -> np.ndarray:
+        """Indices of fuel types, counting fuel types without emissions factor as other."""
+        other_index = self._fuel_index[OTHER_FUEL_CODE]
+        codes, labels = _factorize(fuel_types)
+        mapping = np.array([self._fuel_index.get(label, other_index) for label in labels])
+        return mapping[codes] if len(mapping) else codes
+
+    @staticmethod
+    def _encode(values: pd.Series, index: Dict[str, int], labels: List[str]) -> np.ndarray:
+        """Indices of values in a growing list of labels (eg: respondents)."""
+        codes, uniques = _factorize(values)
+        for label in uniques:
+            if label not in index:
+                index[label] = len(labels)
+                labels.append(label)
+        mapping = np.array([index[label] for label in uniques], dtype=np.int64)
+        return mapping[codes] if len(mapping) else codes
+
+
+def read_hourly_windows(window_type: str, output_folder: str = None) -> pd.DataFrame:
+    """
+    Read the aggregated windows of a window type.
+
+    Parameters
+    -----------
+    window_type: str
+        One of hourly, daily or quarterly (see `WINDOW_TYPES`)
+    output_folder: str
+        Folder the windows were written to (hourly reporting folder by default)
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per window (period start) and respondent with the generation of each fuel
+        type, all sources and emissions intensity
+    """
+    output_folder = output_folder or os.path.join(REPORTING_FOLDER, HOURLY_FOLDER)
+    return pd.read_parquet(os.path.join(output_folder, "{}.parquet".format(window_type)))
+
+
+def _factorize(values: pd.Series) -> Tuple[np.ndarray, list]:
+    """Integer codes and labels of values, using the categories of categorical values."""
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.cat.codes.to_numpy(dtype=np.int64), list(values.cat.categories)
+    codes, uniques = pd.factorize(values)
+    return codes.astype(np.int64), list(uniques)
+
+
+def _window_index(window_type: str, hours: np.ndarray) -> np.ndarray:
+    """Index of the window of each hour (hours since the epoch)."""
+    if window_type == "hourly":
+        return hours
+    if window_type == "daily":
+        return hours // 24
+    if window_type == "quarterly":
+        months = hours.astype("datetime64[h]").astype("datetime64[M]").astype(np.int64)
+        return months // 3
+    raise ValueError(f"Unexpected window type encountered: {window_type}")
+
+
+def _window_start(window_type: str, windows: np.ndarray) -> np.ndarray:
+    """Start of each window as datetime."""
+    if window_type == "hourly":
+        return windows.astype("datetime64[h]")
+    if window_type == "daily":
+        return windows.astype("datetime64[D]")
+    if window_type == "quarterly":
+        return (windows * 3).astype("datetime64[M]")
+    raise ValueError(f"Unexpected window type encountered: {window_type}")
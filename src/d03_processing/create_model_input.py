@@ -1,12 +1,18 @@
 # Python Libraries
 import logging
+import sys
+from typing import Callable, List
 
 # Package Imports
 import pandas as pd
 
 # First Party Imports
-from src.d00_utils.const import INTERMEDIATE_DATA_FOLDER, PROCESSED_DATA_FOLDER, STATES
-from src.d00_utils.utils import get_filepath
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import DEFAULT_FREQUENCY, get_states
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import parallel_map
 
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
@@ -15,7 +21,27 @@ logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 class DataPreprocessor:
     """Class to preprocess intermediate data prior to training models"""
 
-    def __init__(self, data_type: str, api_ids_dict: dict):
+    # Fuels which need no processing and the intermediate inputs of the calculated "other" feature
+    no_processing_fuels = [
+        "all_sources",
+        "coal",
+        "natural_gas",
+        "nuclear",
+        "hydro",
+        "wind",
+        "solar_all",
+    ]
+    other_input_fuels = ["other_renewables", "wind", "solar_utility", "other"]
+
+    def __init__(
+        self,
+        data_type: str,
+        api_ids_dict: dict,
+        states: List[str] = None,
+        fuel_types: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
         """
 
         Parameters
@@ -29,45 +55,65 @@ class DataPreprocessor:
                 value is the EIA API Series ID to access the specific data.
             For data_type `Net_Gen_By_Fuel_MWh`, examples of api_ids_dict key values
                 include fuel names (coal, natural_gas, etc.)
+        states: List[str]
+            Optional full names of states to process data for (all states by default)
+        fuel_types: List[str]
+            Optional fuel types (features) to process (all fuel types by default)
+        force: bool
+            If False, skip features whose intermediate inputs and code are unchanged
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
         """
         self.api_ids_dict = api_ids_dict
         self.data_type = data_type
-        self.save_folder = ""
-
-    def process_data(self):
+        self.states = states if states is not None else get_states()
+        self.fuel_types = fuel_types
+        self.force = force
+        self.frequency = frequency
+        self.version = code_version(sys.modules[__name__])
+        self.state = ""
+
+    def process_data(self, workers: int = 1):
         """
         Process each type of data (net generation and fuel consumption) and perform
         required feature engineering to finalize datasets as input to training models.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes processing data for different states in parallel
         """
-        for state in STATES:
-            log.info(f"Processing intermediate data for {state}")
-            self.save_folder = "{}/{}".format(self.data_type, state)
+        if self.data_type not in ("Net_Gen_By_Fuel_MWh", "Fuel_Consumption_BTU"):
+            raise ValueError(f"Unexpected EIA Data Type encountered: {self.data_type}")
+        parallel_map(self._process_state_data, self.states, workers)
+
+    def _process_state_data(self, state: str):
+        """Process each type of data for a state."""
+        log.info(f"Processing intermediate data for {state}")
+        self.state = state
 
-            if self.data_type == "Net_Gen_By_Fuel_MWh":
-                self._process_net_gen_data()
-            elif self.data_type == "Fuel_Consumption_BTU":
-                self._process_fuel_cons_data()
-            else:
-                raise ValueError(f"Unexpected EIA Data Type encountered: {self.data_type}")
+        if self.data_type == "Net_Gen_By_Fuel_MWh":
+            self._process_net_gen_data()
+        else:
+            self._process_fuel_cons_data()
 
     def _process_net_gen_data(self):
         """Performs feature engineering and saving for all Net Electricity Generation sources"""
         # No processing needed for most fuels
-        no_processing_fuels = [
-            "all_sources",
-            "coal",
-            "natural_gas",
-            "nuclear",
-            "hydro",
-            "wind",
-            "solar_all",
-        ]
-        for fuel_type in no_processing_fuels:
-            df = self._read_input_data(fuel_type)
-            self._save_feature(df, fuel_type)
-
-        # Compute feature for "Other" generation
-        # Note: The calculated version is different from the "Other" imported from EIA directly
+        for fuel_type in DataPreprocessor.no_processing_fuels:
+            self._process_feature(fuel_type, [fuel_type], self._read_input_data)
+
+        # "Other" is derived from several intermediate series and tracks all of them
+        self._process_feature(
+            "other",
+            DataPreprocessor.other_input_fuels,
+            lambda fuel_type: self._calculate_other_feature(),
+        )
+
+    def _calculate_other_feature(self) -> pd.DataFrame:
+        """Compute feature for "Other" generation.
+        Note: The calculated version is different from the "Other" imported from EIA directly
+        """
         df_other_rw = self._read_input_data("other_renewables")
         df_wind = self._read_input_data("wind")
         df_solar_utility = self._read_input_data("solar_utility")
@@ -82,30 +128,60 @@ class DataPreprocessor:
             - df_solar_utility[self.data_type]
             + df_eia_other[self.data_type]
         )
-        self._save_feature(df_other, "other")
+        return df_other
 
     def _process_fuel_cons_data(self):
         """Performs feature engineering and saving for all Fuel Consumption types
         (coal, natural gas)."""
         for fuel_type in self.api_ids_dict.keys():
-            df = self._read_input_data(fuel_type)
-            self._save_feature(df, fuel_type)
+            self._process_feature(fuel_type, [fuel_type], self._read_input_data)
+
+    def _process_feature(
+        self,
+        fuel_type: str,
+        input_fuel_types: List[str],
+        create_feature: Callable[[str], pd.DataFrame],
+    ):
+        """
+        Create and save the feature for a fuel type of the current state, unless it is not
+        one of the selected fuel types or its intermediate inputs are unchanged (unless forced).
+        """
+        if self.fuel_types is not None and fuel_type not in self.fuel_types:
+            return
+        unit = dict(data_type=self.data_type, state=self.state, fuel_type=fuel_type)
+        output_filepath = self._processed_filepath(fuel_type)
+        inputs = fingerprint(
+            [self._intermediate_filepath(input_fuel) for input_fuel in input_fuel_types],
+            self.version,
+        )
+        if is_completed("process", **unit) or (
+            not self.force and is_current(output_filepath, inputs)
+        ):
+            return
+
+        with measure("series", "process", **unit):
+            self._save_feature(create_feature(fuel_type), fuel_type)
+            record_lineage(output_filepath, inputs)
+            mark_completed("process", **unit)
+
+    def _partition(self, fuel_type: str) -> dict:
+        """Data catalog keys of the current state and a fuel type."""
+        return dict(data_type=self.data_type, state=self.state, fuel_type=fuel_type)
+
+    def _intermediate_filepath(self, fuel_type: str) -> str:
+        """Filepath of intermediate data for specific fuel type."""
+        return get_catalog().filepath("intermediate", self.frequency, **self._partition(fuel_type))
+
+    def _processed_filepath(self, fuel_type: str) -> str:
+        """Filepath of processed feature for specific fuel type."""
+        return get_catalog().filepath("processed", self.frequency, **self._partition(fuel_type))
 
     def _read_input_data(self, fuel_type: str) -> pd.DataFrame:
         """Reads data from intermediate folder for specific fuel type."""
-        intermediate_file_name = "{}-{}.{}".format(self.data_type, fuel_type, "csv")
-        intermediate_file_path = get_filepath(
-            INTERMEDIATE_DATA_FOLDER, self.save_folder, intermediate_file_name
-        )
-        return pd.read_csv(intermediate_file_path)
+        return get_catalog().read("intermediate", self.frequency, **self._partition(fuel_type))
 
     def _save_feature(self, df: pd.DataFrame, fuel_type: str):
         """Saves the final engineered feature ready for model training in Processed Data folder."""
-        processed_file_name = "{}-{}.{}".format(self.data_type, fuel_type, "csv")
-        processed_file_path = get_filepath(
-            PROCESSED_DATA_FOLDER, self.save_folder, processed_file_name
-        )
-
         # Prophet expects column names to be 'ds' and 'y'
         df.columns = ["ds", "y"]
-        df.to_csv(processed_file_path, index=False)
+        get_catalog().write("processed", df, self.frequency, **self._partition(fuel_type))
@@ -1,15 +1,21 @@
 # Python Libraries
-import json
 import logging
+import sys
+from typing import List
 
 # Package Imports
 import pandas as pd
+import prophet
 from prophet import Prophet
 from prophet.serialize import model_to_json
 
 # First Party Imports
-from src.d00_utils.const import MODELS_FOLDER, PROCESSED_DATA_FOLDER, STATES
-from src.d00_utils.utils import get_filepath
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import DEFAULT_FREQUENCY, get_states
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import parallel_map
 
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
@@ -29,7 +35,14 @@ class ModelTrainer:
     total_consumption_fuels = ["coal", "natural_gas"]
     """Class to train Facebook Prophet models"""
 
-    def __init__(self, data_type: str):
+    def __init__(
+        self,
+        data_type: str,
+        states: List[str] = None,
+        fuel_types: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
         """
         Parameters
         ------------
@@ -37,35 +50,83 @@ class ModelTrainer:
             Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
             This string is used when creating folders to save respective data
             and for column names within each dataframe
+        states: List[str]
+            Optional full names of states to train models for (all states by default)
+        fuel_types: List[str]
+            Optional fuel types to train models for (all fuel types by default)
+        force: bool
+            If False, skip models whose processed input data and training code are unchanged
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`).
+            Prophet fits yearly seasonality, which covers month of year for monthly series.
         """
         self.data_type = data_type
-        self.save_folder = ""
-
-    def train_models(self):
-        """Train and Save Prophet models for each state and each type of generation source."""
-        for state in STATES:
-            log.info(f"Training models for State: {state}")
-            self.save_folder = "{}/{}".format(self.data_type, state)
-
-            if self.data_type == "Net_Gen_By_Fuel_MWh":
-                fuel_types = ModelTrainer.net_gen_fuels
-            elif self.data_type == "Fuel_Consumption_BTU":
-                fuel_types = ModelTrainer.total_consumption_fuels
-            else:
-                raise ValueError(f"Unexpected EIA Data Type encountered: {self.data_type}")
-
-            for fuel_type in fuel_types:
+        self.states = states if states is not None else get_states()
+        self.fuel_types = fuel_types
+        self.force = force
+        self.frequency = frequency
+        self.version = code_version(sys.modules[__name__], prophet.__version__)
+        self.state = ""
+
+    def train_models(self, workers: int = 1):
+        """Train and Save Prophet models for each state and each type of generation source.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes training models for different states in parallel
+        """
+        # Validate data type before starting any workers
+        self._get_fuel_types()
+        parallel_map(self._train_state_models, self.states, workers)
+
+    def _get_fuel_types(self) -> List[str]:
+        """Fuel types to train models for based on data type and selected fuel types."""
+        if self.data_type == "Net_Gen_By_Fuel_MWh":
+            fuel_types = ModelTrainer.net_gen_fuels
+        elif self.data_type == "Fuel_Consumption_BTU":
+            fuel_types = ModelTrainer.total_consumption_fuels
+        else:
+            raise ValueError(f"Unexpected EIA Data Type encountered: {self.data_type}")
+
+        if self.fuel_types is None:
+            return fuel_types
+        return [fuel for fuel in fuel_types if fuel in self.fuel_types]
+
+    def _train_state_models(self, state: str):
+        """Train and Save Prophet models for each selected type of generation source of a state."""
+        log.info(f"Training models for State: {state}")
+        self.state = state
+
+        for fuel_type in self._get_fuel_types():
+            unit = dict(data_type=self.data_type, state=state, fuel_type=fuel_type)
+            inputs = fingerprint([self._processed_filepath(fuel_type)], self.version)
+            if is_completed("train", **unit) or (
+                not self.force and is_current(self._model_filepath(fuel_type), inputs)
+            ):
+                continue
+            with measure("series", "train", **unit):
                 df = self._read_processed_data(fuel_type)
                 model = self._fit_model(df)
                 self._save_model(model, fuel_type)
+                record_lineage(self._model_filepath(fuel_type), inputs)
+                mark_completed("train", **unit)
+
+    def _partition(self, fuel_type: str) -> dict:
+        """Data catalog keys of the current state and a fuel type."""
+        return dict(data_type=self.data_type, state=self.state, fuel_type=fuel_type)
+
+    def _processed_filepath(self, fuel_type: str) -> str:
+        """Filepath of processed data for specific fuel type."""
+        return get_catalog().filepath("processed", self.frequency, **self._partition(fuel_type))
+
+    def _model_filepath(self, fuel_type: str) -> str:
+        """Filepath of serialized Prophet model for specific fuel type."""
+        return get_catalog().filepath("model", self.frequency, **self._partition(fuel_type))
 
     def _read_processed_data(self, fuel_type: str) -> pd.DataFrame:
         """Reads data from processed folder for specific fuel type."""
-        processed_file_name = "{}-{}.{}".format(self.data_type, fuel_type, "csv")
-        processed_file_path = get_filepath(
-            PROCESSED_DATA_FOLDER, self.save_folder, processed_file_name
-        )
-        return pd.read_csv(processed_file_path)
+        return get_catalog().read("processed", self.frequency, **self._partition(fuel_type))
 
     @staticmethod
     def _fit_model(df: pd.DataFrame) -> Prophet:
@@ -76,8 +137,6 @@ class ModelTrainer:
 
     def _save_model(self, model: Prophet, fuel_type: str):
         """Save trained Prophet model as a JSON object."""
-        models_file_name = "{}-{}.{}".format(self.data_type, fuel_type, "json")
-        models_file_path = get_filepath(MODELS_FOLDER, self.save_folder, models_file_name)
-
-        with open(models_file_path, "w") as fout:
-            json.dump(model_to_json(model), fout)
+        get_catalog().write(
+            "model", model_to_json(model), self.frequency, **self._partition(fuel_type)
+        )
@@ -1,64 +1,102 @@
 # Python Libraries
 import logging
+import sys
+from typing import Callable, List
 
 # Package Imports
 import pandas as pd
 
 # First Party Imports
-from src.d00_utils.const import REPORTING_FOLDER, STATES
-from src.d00_utils.utils import get_filepath
-from src.d06_reporting.create_forecasts import read_forecast
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import DEFAULT_FREQUENCY, get_states
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import write_gzip_copy
+from src.d06_reporting.create_forecasts import forecast_filepath, read_forecast
 
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 
+# Data catalog datasets of each emissions type, per state and of all states
+_EMISSIONS_DATASETS = {"total": "total_emissions", "intensity": "emissions_intensity"}
+_ALL_STATES_EMISSIONS_DATASETS = {
+    "total": "all_states_total_emissions",
+    "intensity": "all_states_emissions_intensity",
+}
+
 
 class EmissionsCalculator:
     """Class to calculate emissions for all regions based on forecasts generated earlier."""
 
     net_gen_fuels = ["coal", "natural_gas", "nuclear", "hydro", "wind", "solar_all", "other"]
 
-    def __init__(self, emission_factors: dict):
+    def __init__(
+        self,
+        emission_factors: dict,
+        states: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
         """
 
         Parameters
         ------------
         emission_factors: dict
             Dictionary of emissions factors for each type of electricity generation source and fuel.
+        states: List[str]
+            Optional full names of states to calculate emissions for (all states by default).
+            Combined datasets always include every state.
+        force: bool
+            If False, skip states whose forecasts, emissions factors and code are unchanged
+        frequency: str
+            Frequency of the forecasts: one of quarterly or monthly (see `FREQUENCIES`)
         """
         self.emission_factors = emission_factors
-        self.save_folder = ""
+        self.states = states if states is not None else get_states()
+        self.force = force
+        self.frequency = frequency
+        self.version = code_version(sys.modules[__name__], emission_factors)
 
     def calculate_total_emissions(self):
         """
         Total Emissions Calculation: For each state, calculates emissions
         for each generation type.
         """
-        for state in STATES:
-            df = self._create_empty_dataframe(state)
-            for data_type, emissions_dict in self.emission_factors.items():
-                fcst = read_forecast(data_type, "combined", state)
-
-                # For each fuel, multiply amount created by emissions factor
-                for col in fcst.columns:
-                    if col in emissions_dict:
-                        # Divide Net_Gen_By_Fuel_MWh emissions by 1000 to get
-                        # emissions in thousand metrics tons CO2
-                        if data_type == "Net_Gen_By_Fuel_MWh":
-                            df[col] += emissions_dict[col] * fcst[col] / 1e3
-                        else:
-                            df[col] += emissions_dict[col] * fcst[col]
-
-            # Sum all columns except first which is date to calculate total emissions
-            df["all_sources"] = df.iloc[:, 1:].sum(axis=1)
-            self._save_emissions(df, "total", state)
+        for state in self.states:
+            input_filepaths = [
+                forecast_filepath(data_type, "combined", state, frequency=self.frequency)
+                for data_type in ["Net_Gen_By_Fuel_MWh"] + list(self.emission_factors)
+            ]
+            self._calculate_if_changed(
+                "total", state, input_filepaths, self._calculate_state_total_emissions
+            )
         log.info("Completed calculating total emissions for all states.")
 
-    @staticmethod
-    def _create_empty_dataframe(state: str) -> pd.DataFrame:
+    def _calculate_state_total_emissions(self, state: str):
+        """Calculate and save emissions of each generation type for a state."""
+        df = self._create_empty_dataframe(state)
+        for data_type, emissions_dict in self.emission_factors.items():
+            fcst = read_forecast(data_type, "combined", state, frequency=self.frequency)
+
+            # For each fuel, multiply amount created by emissions factor
+            for col in fcst.columns:
+                if col in emissions_dict:
+                    # Divide Net_Gen_By_Fuel_MWh emissions by 1000 to get
+                    # emissions in thousand metrics tons CO2
+                    if data_type == "Net_Gen_By_Fuel_MWh":
+                        df[col] += emissions_dict[col] * fcst[col] / 1e3
+                    else:
+                        df[col] += emissions_dict[col] * fcst[col]
+
+        # Sum all columns except first which is date to calculate total emissions
+        df["all_sources"] = df.iloc[:, 1:].sum(axis=1)
+        self._save_emissions(df, "total", state)
+
+    def _create_empty_dataframe(self, state: str) -> pd.DataFrame:
         """Create dataframe with columns for each type of generation and initialized value of 0"""
         df = pd.DataFrame()
-        fcst = read_forecast("Net_Gen_By_Fuel_MWh", "combined", state)
+        fcst = read_forecast("Net_Gen_By_Fuel_MWh", "combined", state, frequency=self.frequency)
         df["date"] = fcst["date"]
 
         # Initialize empty columns for each type of generation source
@@ -72,67 +110,142 @@ class EmissionsCalculator:
         total generation and total emissions.
         """
         log.info("Calculating Emissions Intensity for all states")
-        for state in STATES:
-            generation_fcst = read_forecast("Net_Gen_By_Fuel_MWh", "combined", state)
-            emissions_fcst = read_emissions("total", state)
-
-            # Create emissions intensity dataframe
-            df = pd.DataFrame()
-            df["date"] = generation_fcst["date"]
-            df["emissions_intensity"] = (
-                emissions_fcst["all_sources"] / generation_fcst["all_sources"]
+        for state in self.states:
+            input_filepaths = [
+                forecast_filepath(
+                    "Net_Gen_By_Fuel_MWh", "combined", state, frequency=self.frequency
+                ),
+                emissions_filepath("total", state, self.frequency),
+            ]
+            self._calculate_if_changed(
+                "intensity", state, input_filepaths, self._calculate_state_emissions_intensity
             )
-
-            self._save_emissions(df, "intensity", state)
         log.info("Completed calculating emissions intensity for all states.")
 
-    @staticmethod
-    def _save_emissions(df: pd.DataFrame, emissions_type: str, state: str):
+    def _calculate_state_emissions_intensity(self, state: str):
+        """Calculate and save emissions intensity for a state."""
+        generation_fcst = read_forecast(
+            "Net_Gen_By_Fuel_MWh", "combined", state, frequency=self.frequency
+        )
+        emissions_fcst = read_emissions("total", state, self.frequency)
+
+        # Create emissions intensity dataframe
+        df = pd.DataFrame()
+        df["date"] = generation_fcst["date"]
+        df["emissions_intensity"] = emissions_fcst["all_sources"] / generation_fcst["all_sources"]
+
+        self._save_emissions(df, "intensity", state)
+
+    def _calculate_if_changed(
+        self,
+        emissions_type: str,
+        state: str,
+        input_filepaths: List[str],
+        calculate: Callable[[str], None],
+    ):
+        """Calculate emissions of a state unless its inputs are unchanged (unless forced)."""
+        unit = dict(emissions_type=emissions_type, state=state)
+        output_filepath = emissions_filepath(emissions_type, state, self.frequency)
+        inputs = fingerprint(input_filepaths, self.version)
+        if is_completed("emissions", **unit) or (
+            not self.force and is_current(output_filepath, inputs)
+        ):
+            return
+        with measure("series", "emissions", **unit):
+            calculate(state)
+            record_lineage(output_filepath, inputs)
+            mark_completed("emissions", **unit)
+
+    def _save_emissions(self, df: pd.DataFrame, emissions_type: str, state: str):
         """Save calculated emissions in relevant folders based on emissions_type."""
-        target_folder = ""
-        file_name = ""
-        if emissions_type == "total":
-            target_folder = "Emission_Forecasts/Total_Emissions"
-            file_name = "{}-CO2e-Emissions.csv".format(state)
-        elif emissions_type == "intensity":
-            target_folder = "Emission_Forecasts/Emissions_Intensity"
-            file_name = "{}-CO2e-Emissions-Intensity.csv".format(state)
-        file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
-        df.to_csv(file_path, index=False)
-
-    @staticmethod
-    def combine_state_emissions():
+        get_catalog().write(_EMISSIONS_DATASETS[emissions_type], df, self.frequency, state=state)
+
+    def combine_state_emissions(self):
         """
         Concatenate all individual state emissions CSVs into
         one for both Total Emissions and Emissions Intensity.
         """
-        total_emissions_combined = pd.DataFrame()
-        emissions_intensity_combined = pd.DataFrame()
-        for state in STATES:
-            df_total = read_emissions("total", state)
-            df_intensity = read_emissions("intensity", state)
-
-            df_total["state"] = state
-            df_intensity["state"] = state
-            total_emissions_combined = pd.concat(
-                [total_emissions_combined, df_total], ignore_index=True
+        catalog = get_catalog()
+        states = get_states()
+        for emissions_type, dataset in _EMISSIONS_DATASETS.items():
+            state_emissions = catalog.read_many(
+                dataset, [dict(state=state) for state in states], self.frequency
             )
-            emissions_intensity_combined = pd.concat(
-                [emissions_intensity_combined, df_intensity], ignore_index=True
+            emissions_combined = pd.DataFrame()
+            for state, df in zip(states, state_emissions):
+                df["state"] = state
+                emissions_combined = pd.concat([emissions_combined, df], ignore_index=True)
+
+            all_states_dataset = _ALL_STATES_EMISSIONS_DATASETS[emissions_type]
+            catalog.write(all_states_dataset, emissions_combined, self.frequency)
+
+            # Compressed copies of CSVs are served as-is for data downloads in the app
+            if catalog.backend_name(all_states_dataset) == "csv":
+                write_gzip_copy(catalog.filepath(all_states_dataset, self.frequency))
+
+    def combine_multi_region_dataset(self):
+        """
+        Combine generation forecasts (both data types), total emissions and emissions intensity
+        of all states into one columnar dataset indexed by dataset name and state.
+        This lets the app compare any number of regions with a single read.
+        """
+        catalog = get_catalog()
+        states = get_states()
+        state_datasets = {
+            data_type: catalog.read_many(
+                "combined_forecast",
+                [dict(data_type=data_type, state=state) for state in states],
+                self.frequency,
             )
+            for data_type in ["Net_Gen_By_Fuel_MWh", "Fuel_Consumption_BTU"]
+        }
+        state_datasets["Total_Emissions"] = catalog.read_many(
+            "total_emissions", [dict(state=state) for state in states], self.frequency
+        )
+        state_datasets["Emissions_Intensity"] = catalog.read_many(
+            "emissions_intensity", [dict(state=state) for state in states], self.frequency
+        )
+
+        # Datasets of each state in turn
+        datasets = []
+        for i, state in enumerate(states):
+            for dataset, frames in state_datasets.items():
+                df = frames[i]
+                df.insert(0, "state", state)
+                df.insert(0, "dataset", dataset)
+                datasets.append(df)
 
-        # Save both dataframes as CSV
-        target_folder = "Emission_Forecasts"
-        intensity_file_name = "Combined-CO2e-Emissions-Intensity.csv"
-        total_file_name = "Combined-CO2e-Total-Emissions.csv"
+        df_combined = pd.concat(datasets, ignore_index=True)
+        df_combined["date"] = pd.to_datetime(df_combined["date"], format="%Y-%m-%d")
+        df_combined["dataset"] = df_combined["dataset"].astype("category")
+        df_combined["state"] = df_combined["state"].astype("category")
+
+        catalog.write("multi_region", df_combined, self.frequency)
+        log.info("Saved combined multi-region dataset.")
+
+
+def read_multi_region_dataset(frequency: str = DEFAULT_FREQUENCY) -> pd.DataFrame:
+    """
+    Read combined multi-region dataset indexed by dataset name
+    (Net_Gen_By_Fuel_MWh, Fuel_Consumption_BTU, Total_Emissions, Emissions_Intensity) and state.
+
+    Parameters
+    -----------
+    frequency: str
+        Frequency of the dataset: one of quarterly or monthly
 
-        file_path_intensity = get_filepath(REPORTING_FOLDER, target_folder, intensity_file_name)
-        file_path_total = get_filepath(REPORTING_FOLDER, target_folder, total_file_name)
-        emissions_intensity_combined.to_csv(file_path_intensity, index=False)
-        total_emissions_combined.to_csv(file_path_total, index=False)
+    Returns
+    --------
+    pd.DataFrame()
+        Combined dataset with one column for each generation type and for emissions intensity
+    """
+    df = get_catalog().read("multi_region", frequency)
+    return df.set_index(["dataset", "state"]).sort_index()
 
 
-def read_emissions(emissions_type: str, state: str) -> pd.DataFrame:
+def read_emissions(
+    emissions_type: str, state: str, frequency: str = DEFAULT_FREQUENCY
+) -> pd.DataFrame:
     """
     Read emissions from file for specific emissions type (total emissions or emissions intensity).
 
@@ -143,19 +256,48 @@ def read_emissions(emissions_type: str, state: str) -> pd.DataFrame:
         Type of emissions data to read: one of total or intensity
     state: str
         State of interest
+    frequency: str
+        Frequency of the emissions: one of quarterly or monthly
 
     Returns
     --------
     pd.DataFrame()
         Calculated emissions dataframe
     """
-    target_folder = ""
-    file_name = ""
-    if emissions_type == "total":
-        target_folder = "Emission_Forecasts/Total_Emissions"
-        file_name = "{}-CO2e-Emissions.csv".format(state)
-    elif emissions_type == "intensity":
-        target_folder = "Emission_Forecasts/Emissions_Intensity"
-        file_name = "{}-CO2e-Emissions-Intensity.csv".format(state)
-    file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
-    return pd.read_csv(file_path)
+    return get_catalog().read(_EMISSIONS_DATASETS[emissions_type], frequency, state=state)
+
+
+def read_all_states_emissions(
+    emissions_type: str, frequency: str = DEFAULT_FREQUENCY
+) -> pd.DataFrame:
+    """
+    Read emissions of all states combined for specific emissions type.
+
+    Parameters
+    -----------
+    emissions_type: str
+        Type of emissions data to read: one of total or intensity
+    frequency: str
+        Frequency of the emissions: one of quarterly or monthly
+
+    Returns
+    --------
+    pd.DataFrame()
+        Calculated emissions dataframe with a state column
+    """
+    return get_catalog().read(_ALL_STATES_EMISSIONS_DATASETS[emissions_type], frequency)
+
+
+def multi_region_filepath(frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of combined multi-region dataset for specific frequency."""
+    return get_catalog().filepath("multi_region", frequency)
+
+
+def emissions_filepath(emissions_type: str, state: str, frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of calculated emissions for specific emissions type, state and frequency."""
+    return get_catalog().filepath(_EMISSIONS_DATASETS[emissions_type], frequency, state=state)
+
+
+def all_states_emissions_filepath(emissions_type: str, frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of calculated emissions of all states for specific emissions type and frequency."""
+    return get_catalog().filepath(_ALL_STATES_EMISSIONS_DATASETS[emissions_type], frequency)
@@ -1,19 +1,30 @@
 # Python Libraries
-import json
 import logging
+import sys
+from typing import TYPE_CHECKING, List
 
 # Package Imports
 import pandas as pd
-from prophet import Prophet
-from prophet.serialize import model_from_json
 
 # First Party Imports
-from src.d00_utils.const import MODELS_FOLDER, REPORTING_FOLDER, STATES
-from src.d00_utils.utils import get_filepath
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import DEFAULT_FREQUENCY, FREQUENCIES, get_states
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import parallel_map, write_gzip_copy
+
+if TYPE_CHECKING:
+    # Prophet is only needed to load models, not to read forecasts in the app
+    # Package Imports
+    from prophet import Prophet
 
 log = logging.getLogger(__name__)
 logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 
+# Data catalog dataset of each forecast type
+_FORECAST_DATASETS = {"individual": "individual_forecast", "combined": "combined_forecast"}
+
 
 class ModelForecast:
     """Class to create forecasts based on models trained earlier"""
@@ -30,7 +41,14 @@ class ModelForecast:
     ]
     total_consumption_fuels = ["coal", "natural_gas"]
 
-    def __init__(self, data_type: str):
+    def __init__(
+        self,
+        data_type: str,
+        states: List[str] = None,
+        fuel_types: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
         """
 
         Parameters
@@ -39,11 +57,26 @@ class ModelForecast:
             Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
             This string is used when creating folders to save respective data
             and for column names within each dataframe
+        states: List[str]
+            Optional full names of states to forecast for (all states by default)
+        fuel_types: List[str]
+            Optional fuel types to create individual forecasts for (all fuel types by default).
+            Combined forecasts always include every fuel type.
+        force: bool
+            If False, skip forecasts whose models (or individual forecasts for combined
+            forecasts) and forecasting code are unchanged
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
         """
         self.data_type = data_type
-        self.save_folder = ""
+        self.states = states if states is not None else get_states()
+        self.fuel_types = fuel_types
+        self.force = force
+        self.frequency = frequency
+        self.version = code_version(sys.modules[__name__])
+        self.combine = True
 
-    def forecast(self):
+    def forecast(self, workers: int = 1, combine: bool = True):
         """
         Performs two steps for each state:
         1) Imports each prophet model and creates individual forecasts for time periods till 2025
@@ -51,42 +84,89 @@ class ModelForecast:
             - For Alabama state, it will create two CSVs - Net Elec. Gen and Fuel Consumption
             - Each CSV will have one column for each type of generation i.e Net Elec. Gen will have
             one column for each type of generation source (coal, solar, wind, etc.)
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes forecasting for different states in parallel
+        combine: bool
+            If False, only create individual forecasts, eg: when the fuel types of a state are
+            forecasted on different nodes and combined afterwards with `combine_forecasts`
+        """
+        # Validate data type before starting any workers
+        self._get_fuel_types()
+        self.combine = combine
+        parallel_map(self._forecast_state, self.states, workers)
+
+    def combine_forecasts(self, workers: int = 1):
+        """
+        Combine existing individual forecasts into a combined dataframe for each state.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes combining forecasts of different states in parallel
         """
-        for state in STATES:
-            log.info(f"Forecasting for State: {state}")
-            self.save_folder = "{}/{}".format(self.data_type, state)
-
-            if self.data_type == "Net_Gen_By_Fuel_MWh":
-                fuel_types = ModelForecast.net_gen_fuels
-            elif self.data_type == "Fuel_Consumption_BTU":
-                fuel_types = ModelForecast.total_consumption_fuels
-            else:
-                raise ValueError(f"Unexpected EIA Data Type encountered: {self.data_type}")
-
-            self._generate_individual_forecasts(fuel_types, state)
+        self._get_fuel_types()
+        parallel_map(self._combine_state_forecasts, self.states, workers)
+
+    def _forecast_state(self, state: str):
+        """Create individual and combined forecasts for a state."""
+        log.info(f"Forecasting for State: {state}")
+
+        fuel_types = self._get_fuel_types()
+        self._generate_individual_forecasts(fuel_types, state)
+        if self.combine:
             self._combine_forecasts(fuel_types, state)
 
+    def _combine_state_forecasts(self, state: str):
+        """Create combined forecast of a state from its individual forecasts."""
+        self._combine_forecasts(self._get_fuel_types(), state)
+
+    def _get_fuel_types(self) -> List[str]:
+        """All fuel types forecasted for the data type."""
+        if self.data_type == "Net_Gen_By_Fuel_MWh":
+            return ModelForecast.net_gen_fuels
+        elif self.data_type == "Fuel_Consumption_BTU":
+            return ModelForecast.total_consumption_fuels
+        raise ValueError(f"Unexpected EIA Data Type encountered: {self.data_type}")
+
     def _generate_individual_forecasts(self, fuel_types: list, state: str):
         """Read in Prophet model, generate predictions and save as CSV."""
         for fuel_type in fuel_types:
-            model = self._load_prophet_model(fuel_type)
-            forecast = self._predict(model)
-            self._save_forecast(forecast, "individual", state, fuel_type)
+            if self.fuel_types is not None and fuel_type not in self.fuel_types:
+                continue
+            output_filepath = forecast_filepath(
+                self.data_type, "individual", state, fuel_type, self.frequency
+            )
+            unit = dict(data_type=self.data_type, state=state, fuel_type=fuel_type)
+            inputs = fingerprint(
+                [model_filepath(self.data_type, state, fuel_type, self.frequency)], self.version
+            )
+            if is_completed("forecast", **unit) or (
+                not self.force and is_current(output_filepath, inputs)
+            ):
+                continue
+            with measure("series", "forecast", **unit):
+                model = self._load_prophet_model(state, fuel_type)
+                forecast = self._predict(model)
+                self._save_forecast(forecast, "individual", state, fuel_type)
+                record_lineage(output_filepath, inputs)
+                mark_completed("forecast", **unit)
 
-    def _load_prophet_model(self, fuel_type: str) -> Prophet:
+    def _load_prophet_model(self, state: str, fuel_type: str) -> "Prophet":
         """Load Prophet model for specific data type, state and fuel type."""
-        models_file_name = "{}-{}.{}".format(self.data_type, fuel_type, "json")
-        models_file_path = get_filepath(MODELS_FOLDER, self.save_folder, models_file_name)
-        with open(models_file_path, "r") as fin:
-            return model_from_json(json.load(fin))
+        return read_model(self.data_type, state, fuel_type, self.frequency)
 
-    @staticmethod
-    def _predict(model: Prophet) -> pd.DataFrame:
+    def _predict(self, model: "Prophet") -> pd.DataFrame:
         """
-        Perform predictions for all time periods including 12 future quarters
-        using Prophet model.
+        Perform predictions for all time periods including 3 future years (12 quarters or
+        36 months) using Prophet model.
         """
-        future = model.make_future_dataframe(periods=12, freq="Q")
+        frequency = FREQUENCIES[self.frequency]
+        future = model.make_future_dataframe(
+            periods=frequency["forecast_periods"], freq=frequency["pandas_freq"]
+        )
         forecast = model.predict(future)
 
         # Create column y with historical values for periods in past with
@@ -98,49 +178,72 @@ class ModelForecast:
         self, forecast: pd.DataFrame, forecast_type: str, state: str, fuel_type: str = None
     ):
         """Save forecast to folder depending on forecast type."""
-        target_folder = ""
-        file_name = ""
-        if forecast_type == "individual":
-            target_folder = "Individual_Forecasts/{}/{}".format(self.data_type, state)
-            file_name = "{}-{}.csv".format(self.data_type, fuel_type)
-        elif forecast_type == "combined":
-            target_folder = "Combined_Forecasts/{}".format(state)
-            file_name = "{}-Combined.csv".format(self.data_type)
-        file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
-        forecast.to_csv(file_path, index=False)
+        get_catalog().write(
+            _FORECAST_DATASETS[forecast_type],
+            forecast,
+            self.frequency,
+            **_forecast_partition(self.data_type, state, fuel_type),
+        )
 
     def _combine_forecasts(self, fuel_types: list, state: str):
         """For each state and data type, combine individual forecasts into one combined dataframe.
         For Alabama state and Net Elec. Gen data, it will create a CSV with one column for each
         type of generation source (coal, solar, wind, etc.).
         """
+        output_filepath = forecast_filepath(
+            self.data_type, "combined", state, frequency=self.frequency
+        )
+        inputs = fingerprint(
+            [
+                forecast_filepath(self.data_type, "individual", state, fuel, self.frequency)
+                for fuel in fuel_types
+            ],
+            self.version,
+        )
+        if not self.force and is_current(output_filepath, inputs):
+            return
+
+        forecasts = get_catalog().read_many(
+            "individual_forecast",
+            [_forecast_partition(self.data_type, state, fuel) for fuel in fuel_types],
+            self.frequency,
+        )
         df_combined = pd.DataFrame()
-        for fuel in fuel_types:
-            forecast = read_forecast(self.data_type, "individual", state, fuel)
+        for fuel, forecast in zip(fuel_types, forecasts):
             if "date" not in df_combined.columns:
                 df_combined["date"] = forecast["ds"]
             df_combined[fuel] = forecast["y"]
         self._save_forecast(df_combined, "combined", state)
+        record_lineage(output_filepath, inputs)
 
 
-def combine_all_states_generation():
-    """Concatenate and save all state electricity generation CSVs into one"""
+def combine_all_states_generation(frequency: str = DEFAULT_FREQUENCY):
+    """Concatenate and save all state electricity generation CSVs of a frequency into one"""
+    catalog = get_catalog()
+    states = get_states()
+    generation_forecasts = catalog.read_many(
+        "combined_forecast",
+        [_forecast_partition("Net_Gen_By_Fuel_MWh", state) for state in states],
+        frequency,
+    )
     generation_combined = pd.DataFrame()
-    for state in STATES:
-        df_gen = read_forecast("Net_Gen_By_Fuel_MWh", "combined", state)
-
+    for state, df_gen in zip(states, generation_forecasts):
         df_gen["state"] = state
         generation_combined = pd.concat([generation_combined, df_gen], ignore_index=True)
 
-    # Save dataframes as CSV
-    target_folder = "Combined_Forecasts"
-    file_name = "Combined-Electricity-Generation-All-States.csv"
-    file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
-    generation_combined.to_csv(file_path, index=False)
+    catalog.write("all_states_generation", generation_combined, frequency)
+
+    # Compressed copy of the CSV is served as-is for data downloads in the app
+    if catalog.backend_name("all_states_generation") == "csv":
+        write_gzip_copy(all_states_generation_filepath(frequency))
 
 
 def read_forecast(
-    data_type: str, forecast_type: str, state: str, fuel_type: str = None
+    data_type: str,
+    forecast_type: str,
+    state: str,
+    fuel_type: str = None,
+    frequency: str = DEFAULT_FREQUENCY,
 ) -> pd.DataFrame:
     """
     Read forecasts from file for specific forecast type (individual and combined).
@@ -155,19 +258,86 @@ def read_forecast(
         State of interest
     fuel_type: str
         Type of generation source (coal, wind, etc.)
+    frequency: str
+        Frequency of the forecast: one of quarterly or monthly
 
     Returns
     --------
     pd.DataFrame()
         Forecast dataframe
     """
-    target_folder = ""
-    file_name = ""
-    if forecast_type == "individual":
-        target_folder = "Individual_Forecasts/{}/{}".format(data_type, state)
-        file_name = "{}-{}.csv".format(data_type, fuel_type)
-    elif forecast_type == "combined":
-        target_folder = "Combined_Forecasts/{}".format(state)
-        file_name = "{}-Combined.csv".format(data_type)
-    file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
-    return pd.read_csv(file_path)
+    return get_catalog().read(
+        _FORECAST_DATASETS[forecast_type],
+        frequency,
+        **_forecast_partition(data_type, state, fuel_type),
+    )
+
+
+def read_model(
+    data_type: str, state: str, fuel_type: str, frequency: str = DEFAULT_FREQUENCY
+) -> "Prophet":
+    """
+    Read trained Prophet model from file for specific data type, state and fuel type.
+
+    Parameters
+    -----------
+    data_type: str
+        Type of data: one of Net_Gen_By_Fuel_MWh or Fuel_Consumption_BTU
+    state: str
+        State of interest
+    fuel_type: str
+        Type of generation source (coal, wind, etc.)
+    frequency: str
+        Frequency the model was trained on: one of quarterly or monthly
+
+    Returns
+    --------
+    Prophet
+        Deserialized Prophet model
+    """
+    # Package Imports
+    from prophet.serialize import model_from_json
+
+    return model_from_json(
+        get_catalog().read("model", frequency, **_forecast_partition(data_type, state, fuel_type))
+    )
+
+
+def forecast_filepath(
+    data_type: str,
+    forecast_type: str,
+    state: str,
+    fuel_type: str = None,
+    frequency: str = DEFAULT_FREQUENCY,
+) -> str:
+    """
+    Filepath of individual or combined forecast for specific data type, state, fuel type
+    and frequency.
+    """
+    return get_catalog().filepath(
+        _FORECAST_DATASETS[forecast_type],
+        frequency,
+        **_forecast_partition(data_type, state, fuel_type),
+    )
+
+
+def model_filepath(
+    data_type: str, state: str, fuel_type: str, frequency: str = DEFAULT_FREQUENCY
+) -> str:
+    """Filepath of trained Prophet model for specific data type, state, fuel type and frequency."""
+    return get_catalog().filepath(
+        "model", frequency, **_forecast_partition(data_type, state, fuel_type)
+    )
+
+
+def all_states_generation_filepath(frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of electricity generation forecasts of all states combined for a frequency."""
+    return get_catalog().filepath("all_states_generation", frequency)
+
+
+def _forecast_partition(data_type: str, state: str, fuel_type: str = None) -> dict:
+    """Data catalog keys of a forecast (combined forecasts have no fuel type)."""
+    keys = dict(data_type=data_type, state=state)
+    if fuel_type is not None:
+        keys["fuel_type"] = fuel_type
+    return keys
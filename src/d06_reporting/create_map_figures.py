@@ -0,0 +1,177 @@
+# Python Libraries
+import gzip
+import json
+import logging
+import os
+
+# Package Imports
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.const import REPORTING_FOLDER, STATES_YML_FILEPATH
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.utils import atomic_write, ensure_folder, load_yml
+from src.d06_reporting.calculate_emissions import EmissionsCalculator, read_all_states_emissions
+from src.d06_reporting.region_groups import (
+    aggregate_by_time_unit,
+    aggregate_region_groups,
+    load_region_groups,
+)
+from src.d06_visualization.plot import plot_map_animated
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+MAP_FIGURES_FOLDER = "Map_Figures"
+
+
+class MapFigureBuilder:
+    """Class to precompute the animated USA map figures shown in the Streamlit app."""
+
+    total_emissions_fuels = ["all_sources"] + EmissionsCalculator.net_gen_fuels
+
+    def create_map_figures(self):
+        """
+        Create and save one animated map figure (one frame per year) for emissions intensity
+        and one for total emissions of each generation source.
+        """
+        log.info("Creating map figure for emissions intensity")
+        with measure("series", "maps", emissions_type="intensity"):
+            self._save_figure(create_map_figure("intensity"), "intensity")
+
+        for fuel in MapFigureBuilder.total_emissions_fuels:
+            log.info(f"Creating map figure for total emissions of {fuel}")
+            with measure("series", "maps", emissions_type="total", fuel_type=fuel):
+                self._save_figure(create_map_figure("total", fuel), "total", fuel)
+        log.info("Finished creating all map figures.")
+
+    @staticmethod
+    def _save_figure(fig_json: str, emissions_type: str, fuel: str = None):
+        """Save serialized figure as compressed JSON."""
+        file_path = map_figure_filepath(emissions_type, fuel)
+        ensure_folder(os.path.dirname(file_path))
+        # Without a timestamp, unchanged figures are byte for byte identical across runs
+        with atomic_write(file_path) as tmp_file_path:
+            with open(tmp_file_path, "wb") as f:
+                f.write(gzip.compress(fig_json.encode("utf-8"), mtime=0))
+
+
+def create_map_figure(emissions_type: str, fuel: str = None) -> str:
+    """
+    Aggregate combined emissions by state and year and create the animated map figure.
+
+    Parameters
+    -----------
+    emissions_type: str
+        Type of emissions data to plot: one of total or intensity
+    fuel: str
+        Type of generation source (coal, wind, etc.). Only used for total emissions.
+
+    Returns
+    --------
+    str
+        Plotly figure serialized as JSON
+    """
+    filter_col, title, colorbar_title = _map_labels(emissions_type, fuel, "State")
+    df = read_all_states_emissions(emissions_type)[["date", "state", filter_col]]
+    df = df[df["state"] != "United States"]
+    df["year"] = pd.to_datetime(df["date"], format="%Y-%m-%d").dt.year
+
+    # Aggregate by state and year (mean for emissions intensity, sum for total emissions)
+    grouped = df.groupby(["year", "state"])[filter_col]
+    df = grouped.mean() if emissions_type == "intensity" else grouped.sum()
+    df = df.reset_index()
+
+    # Map state names to state codes
+    df["state"] = df["state"].map(load_yml(STATES_YML_FILEPATH))
+
+    fig = plot_map_animated(df, filter_col, colorbar_title=colorbar_title, title=title)
+    return fig.to_json()
+
+
+def create_region_group_map_figure(kind: str, emissions_type: str, fuel: str = None) -> str:
+    """
+    Aggregate emissions of the region groups of a kind by year and create the animated map
+    figure, colouring every state of a group with the value of the group.
+
+    Parameters
+    -----------
+    kind: str
+        Kind of region groups (eg: NERC, ISO), see `load_region_groups`
+    emissions_type: str
+        Type of emissions data to plot: one of total or intensity
+    fuel: str
+        Type of generation source (coal, wind, etc.). Only used for total emissions.
+
+    Returns
+    --------
+    str
+        Plotly figure serialized as JSON
+    """
+    groups = load_region_groups()[kind]
+    filter_col, title, colorbar_title = _map_labels(emissions_type, fuel, "{} Region".format(kind))
+    dataset = "Emissions_Intensity" if emissions_type == "intensity" else "Total_Emissions"
+
+    # Aggregate by group and year, intensity of a year is its total emissions divided by its
+    # total net generation like on the multi-region page
+    df = aggregate_by_time_unit(aggregate_region_groups(groups), "Y")
+    df = df.loc[df["dataset"] == dataset, ["date", "state", filter_col]]
+    df["year"] = df["date"].dt.year
+    df = df[["year", "state", filter_col]].rename(columns={"state": "group"})
+
+    # Colour member states with the value of their group (the first group listing a state)
+    state_codes = load_yml(STATES_YML_FILEPATH)
+    members = pd.DataFrame(
+        [(name, state_codes[state]) for name, states in groups.items() for state in states],
+        columns=["group", "state"],
+    ).drop_duplicates("state")
+    df = df.merge(members, on="group")
+
+    fig = plot_map_animated(
+        df, filter_col, colorbar_title=colorbar_title, title=title, text_col="group"
+    )
+    return fig.to_json()
+
+
+def read_map_figure(emissions_type: str, fuel: str = None) -> dict:
+    """
+    Read precomputed map figure for specific emissions type and fuel.
+    Falls back to creating the figure if it has not been precomputed yet.
+
+    Parameters
+    -----------
+    emissions_type: str
+        Type of emissions data: one of total or intensity
+    fuel: str
+        Type of generation source (coal, wind, etc.). Only used for total emissions.
+
+    Returns
+    --------
+    dict
+        Plotly figure as a dictionary including one animation frame per year
+    """
+    file_path = map_figure_filepath(emissions_type, fuel)
+    if not os.path.exists(file_path):
+        log.info(f"No precomputed map figure found at {file_path}, creating it instead.")
+        return json.loads(create_map_figure(emissions_type, fuel))
+
+    with gzip.open(file_path, "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def map_figure_filepath(emissions_type: str, fuel: str = None) -> str:
+    """Filepath of precomputed map figure for emissions type and fuel (folder not created)."""
+    if emissions_type == "intensity":
+        file_name = "Map-CO2e-Emissions-Intensity.json.gz"
+    else:
+        file_name = "Map-CO2e-Total-Emissions-{}.json.gz".format(fuel)
+    return os.path.join(REPORTING_FOLDER, MAP_FIGURES_FOLDER, file_name)
+
+
+def _map_labels(emissions_type: str, fuel: str = None, region: str = "State") -> tuple:
+    """Column to plot, title and colour bar title of the map figure of an emissions type."""
+    if emissions_type == "intensity":
+        title = "Electricity Generation Emissions Intensity by {}".format(region)
+        return "emissions_intensity", title, "kg CO<sub>2</sub>e per MWh"
+    title = "Electricity Generation Emissions by {} - {}".format(region, fuel.title())
+    return fuel, title, "Thousand metric tons CO<sub>2</sub>e"
@@ -0,0 +1,240 @@
+"""
+Static HTML reports of every region for stakeholders.
+
+One report per state is written to `data/06_reporting/State_Reports/<State>.html` with:
+
+- the forecast of net generation from all sources
+- the components (trend and yearly seasonality) of that forecast
+- the generation and emissions breakdown by generation source
+- the emissions intensity trend
+
+Figures are created with the functions of `src.d06_visualization.plot` from the data plane
+(see `src.d06_reporting.data_plane`), which worker processes map instead of each reading the
+CSVs. Reports only embed their figures: all reports load the same plotly.js bundle, written
+once next to them, which keeps each report around 100 KB instead of several MB.
+An `index.html` links to all reports.
+"""
+# Python Libraries
+import html
+import logging
+import os
+import sys
+from typing import List
+
+# Package Imports
+import plotly.io as pio
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+# First Party Imports
+from src.d00_utils.checkpoint import is_completed, mark_completed
+from src.d00_utils.const import DEFAULT_FREQUENCY, REPORTING_FOLDER, frequency_folder, get_states
+from src.d00_utils.instrumentation import measure
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import atomic_write, get_filepath, parallel_map
+from src.d06_reporting.calculate_emissions import EmissionsCalculator, multi_region_filepath
+from src.d06_reporting.create_forecasts import forecast_filepath
+from src.d06_reporting.data_plane import open_data_plane, publish_data_plane
+from src.d06_visualization import plot
+from src.d06_visualization.plot import (
+    plot_combined_data_multiple_fuels,
+    plot_forecast_components,
+    plot_multiple_states,
+    plot_prophet_forecast,
+)
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+REPORTS_FOLDER = "State_Reports"
+INDEX_FILE_NAME = "index.html"
+# Named after the plotly.js version, so reports never load a bundle they were not made with
+PLOTLY_JS_FILE_NAME = "plotly-{}.min.js".format(get_plotlyjs_version())
+
+REPORT_TEMPLATE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotly_js}"></script>
+<style>body {{ font-family: sans-serif; margin: 2em auto; max-width: 960px; }}</style>
+</head>
+<body>
+<h1>{title}</h1>
+{body}
+</body>
+</html>
+"""
+
+
+class ReportBuilder:
+    """Class to render a static HTML report for each state."""
+
+    def __init__(
+        self,
+        states: List[str] = None,
+        force: bool = True,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
+        """
+
+        Parameters
+        ------------
+        states: List[str]
+            Optional full names of states to create reports for (all states by default)
+        force: bool
+            If False, skip reports whose forecasts, emissions and reporting code are unchanged
+        frequency: str
+            Frequency of the outputs: one of quarterly or monthly (see `FREQUENCIES`)
+        """
+        self.states = states if states is not None else get_states()
+        self.force = force
+        self.frequency = frequency
+        self.version = code_version(sys.modules[__name__], plot, get_plotlyjs_version())
+
+    def create_reports(self, workers: int = 1):
+        """
+        Render the report of every state, then the index linking to all reports.
+
+        Parameters
+        ------------
+        workers: int
+            Number of worker processes rendering reports of different states in parallel
+        """
+        # Workers map the data plane of the current outputs (only moves the pointer if published)
+        publish_data_plane(self.frequency)
+        self._write_plotly_js()
+        parallel_map(self._create_state_report, self.states, workers)
+        self._write_index()
+        log.info(f"Finished creating reports of {len(self.states)} states.")
+
+    def _create_state_report(self, state: str):
+        """Render and save the report of a state, unless it is up to date."""
+        output_filepath = report_filepath(state, self.frequency)
+        inputs = fingerprint(
+            [
+                multi_region_filepath(self.frequency),
+                forecast_filepath(
+                    "Net_Gen_By_Fuel_MWh", "individual", state, "all_sources", self.frequency
+                ),
+            ],
+            self.version,
+        )
+        if is_completed("reports", state=state) or (
+            not self.force and is_current(output_filepath, inputs)
+        ):
+            return
+        with measure("series", "reports", state=state):
+            report = render_state_report(state, self.frequency)
+            with atomic_write(output_filepath) as tmp_file_path:
+                with open(tmp_file_path, "w", encoding="utf-8") as f:
+                    f.write(report)
+            record_lineage(output_filepath, inputs)
+            mark_completed("reports", state=state)
+
+    def _write_plotly_js(self):
+        """Write the plotly.js bundle shared by all reports (once per plotly.js version)."""
+        file_path = get_filepath(
+            frequency_folder(REPORTING_FOLDER, self.frequency), REPORTS_FOLDER, PLOTLY_JS_FILE_NAME
+        )
+        if not os.path.exists(file_path):
+            with atomic_write(file_path) as tmp_file_path:
+                with open(tmp_file_path, "w", encoding="utf-8") as f:
+                    f.write(get_plotlyjs())
+
+    def _write_index(self):
+        """Write the index page linking to the reports of all states."""
+        links = "\n".join(
+            '<li><a href="{}">{}</a></li>'.format(
+                os.path.basename(report_filepath(state, self.frequency)), html.escape(state)
+            )
+            for state in get_states()
+            if os.path.exists(report_filepath(state, self.frequency))
+        )
+        file_path = get_filepath(
+            frequency_folder(REPORTING_FOLDER, self.frequency), REPORTS_FOLDER, INDEX_FILE_NAME
+        )
+        with atomic_write(file_path) as tmp_file_path:
+            with open(tmp_file_path, "w", encoding="utf-8") as f:
+                f.write(
+                    REPORT_TEMPLATE.format(
+                        title="Emissions Oracle State Reports",
+                        plotly_js=PLOTLY_JS_FILE_NAME,
+                        body="<ul>\n{}\n</ul>".format(links),
+                    )
+                )
+
+
+def render_state_report(state: str, frequency: str = DEFAULT_FREQUENCY) -> str:
+    """
+    Render the HTML report of a state, loading plotly.js from the shared bundle.
+
+    Parameters
+    -----------
+    state: str
+        State of interest
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+
+    Returns
+    --------
+    str
+        HTML document of the report
+    """
+    data_plane = open_data_plane(frequency)
+    forecast = data_plane.individual_forecast("Net_Gen_By_Fuel_MWh", state, "all_sources")
+    generation = data_plane.multi_region("Net_Gen_By_Fuel_MWh", state)
+    emissions = data_plane.multi_region("Total_Emissions", state)
+    intensity = data_plane.multi_region("Emissions_Intensity", state)
+
+    ylabel = "Net Generation (Thousand  MWh)"
+    figures = [
+        (
+            "Net Electricity Generation Forecast",
+            plot_prophet_forecast(forecast, title="All Sources - {}".format(state), ylabel=ylabel),
+        ),
+        (
+            "Forecast Components",
+            plot_forecast_components(forecast, title="All Sources - {}".format(state)),
+        ),
+        (
+            "Generation and Emissions by Source",
+            plot_combined_data_multiple_fuels(
+                generation,
+                emissions,
+                EmissionsCalculator.net_gen_fuels,
+                title="CO<sub>2</sub> Equivalent Emissions - {}".format(state),
+                ylabel=ylabel,
+            ),
+        ),
+        (
+            "Emissions Intensity Trend",
+            plot_multiple_states(
+                {state: intensity},
+                "emissions_intensity",
+                ylabel="Emissions Intensity (kg CO<sub>2</sub>e per MWh)",
+            ),
+        ),
+    ]
+    sections = [
+        "<p>Forecasts and emissions of {} data (data plane version {}).</p>".format(
+            frequency, data_plane.version
+        )
+    ]
+    for heading, fig in figures:
+        # Only the figure is embedded, plotly.js is loaded once in the page head
+        div = pio.to_html(fig, include_plotlyjs=False, full_html=False)
+        sections.append("<h2>{}</h2>\n{}".format(heading, div))
+    return REPORT_TEMPLATE.format(
+        title="Electricity Generation and Emissions - {}".format(html.escape(state)),
+        plotly_js=PLOTLY_JS_FILE_NAME,
+        body="\n".join(sections),
+    )
+
+
+def report_filepath(state: str, frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of the HTML report of a state and frequency (folder not created)."""
+    return os.path.join(
+        frequency_folder(REPORTING_FOLDER, frequency),
+        REPORTS_FOLDER,
+        "{}.html".format(state.replace(" ", "_")),
+    )
@@ -0,0 +1,404 @@
+"""
+Shared read-only data plane of the reporting outputs for multi-process app deployments.
+
+The emissions stage publishes the multi-region dataset and the individual forecasts of a run
+as memory-mapped NumPy array files (`.npy`) in a version folder named after the content hash
+of its inputs (`data/06_reporting/Data_Plane/<version>/`):
+
+- ``multi_region.npy`` / ``multi_region_dates.npy``: values (one column per generation type
+  and for emissions intensity) and dates of the multi-region dataset, sorted by dataset,
+  state and date
+- ``forecasts.npy`` / ``forecasts_dates.npy``: all columns of the individual forecasts, sorted
+  by data type, state, fuel type and date
+- ``manifest.json``: columns and the row range of every dataset and state, or data type,
+  state and fuel type
+
+A pointer file (`Data_Plane/CURRENT`) names the current version and is replaced atomically
+once a version folder is complete. Every app process maps the arrays of the current version
+read-only, so all processes share the same pages of the OS page cache instead of each holding
+its own copy of the outputs. `DataPlane.refresh` follows the pointer and switches all arrays
+of a process to a new run at once. Older version folders are removed after publishing, which
+is safe on POSIX: processes still mapping them keep the files until they switch.
+"""
+# Python Libraries
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+# Package Imports
+import numpy as np
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.const import DEFAULT_FREQUENCY, REPORTING_FOLDER, frequency_folder
+from src.d00_utils.lineage import code_version, fingerprint
+from src.d00_utils.utils import atomic_write
+from src.d06_reporting.calculate_emissions import multi_region_filepath
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+DATA_PLANE_FOLDER = "Data_Plane"
+POINTER_FILE_NAME = "CURRENT"
+MANIFEST_FILE_NAME = "manifest.json"
+EMISSIONS_DATASETS = ["Total_Emissions", "Emissions_Intensity"]
+# Number of published versions kept (besides the current one) for processes yet to switch
+DEFAULT_KEPT_VERSIONS = 2
+
+
+class _Snapshot(NamedTuple):
+    """Manifest and memory-mapped arrays of one version of the data plane."""
+
+    version: str
+    manifest: dict
+    arrays: Dict[str, np.ndarray]
+
+
+class DataPlane:
+    """
+    Read-only, memory-mapped view of the current version of the data plane of a frequency.
+
+    Frames are views of the mapped arrays: they must not be modified, and stay valid after
+    the data plane switched to a new version.
+    """
+
+    def __init__(self, frequency: str = DEFAULT_FREQUENCY):
+        """
+
+        Parameters
+        ----------
+        frequency: str
+            Frequency of the outputs: one of quarterly or monthly
+        """
+        self.frequency = frequency
+        self._snapshot: Optional[_Snapshot] = None
+        self._pointer_stat = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> Optional[str]:
+        """Version currently mapped (None before the first refresh)."""
+        snapshot = self._snapshot
+        return snapshot.version if snapshot is not None else None
+
+    def refresh(self) -> bool:
+        """
+        Switch to the version named by the pointer file, if it changed.
+
+        Returns
+        --------
+        bool
+            True if a new version was mapped
+        """
+        pointer_path = pointer_filepath(self.frequency)
+        try:
+            stat = os.stat(pointer_path)
+        except FileNotFoundError:
+            raise FileNotFoundError(
+                f"No data plane found at {pointer_path}, run the emissions stage to publish it."
+            )
+        # The pointer is replaced (not modified) on every switch, so its inode changes
+        pointer_stat = (stat.st_ino, stat.st_mtime_ns)
+        with self._lock:
+            if pointer_stat == self._pointer_stat:
+                return False
+            version = read_current_version(self.frequency)
+            changed = self.version != version
+            if changed:
+                # One assignment, so readers see either all old or all new arrays
+                self._snapshot = _load_snapshot(
+                    os.path.join(data_plane_folder(self.frequency), version)
+                )
+                log.info(f"Switched {self.frequency} data plane to version {version}.")
+            self._pointer_stat = pointer_stat
+            return changed
+
+    def multi_region(self, dataset: str, state: str) -> pd.DataFrame:
+        """
+        Multi-region dataset of a dataset and state.
+
+        Parameters
+        -----------
+        dataset: str
+            Dataset: Net_Gen_By_Fuel_MWh, Fuel_Consumption_BTU, Total_Emissions or
+            Emissions_Intensity
+        state: str
+            State of interest
+
+        Returns
+        --------
+        pd.DataFrame
+            One row per date with one column per generation type and for emissions intensity
+        """
+        snapshot = self._current()
+        start, stop = snapshot.manifest["multi_region"]["segments"][dataset][state]
+        return _frame(snapshot, "multi_region", "date", start, stop)
+
+    @property
+    def multi_region_columns(self) -> List[str]:
+        """Columns of the multi-region dataset, one per generation type and emissions intensity."""
+        return self._current().manifest["multi_region"]["columns"]
+
+    def stacked_multi_region(self, dataset: str) -> Tuple[List[str], np.ndarray, np.ndarray]:
+        """
+        Multi-region dataset of all states of a dataset, stacked along a first axis of states.
+
+        Parameters
+        -----------
+        dataset: str
+            Dataset: Net_Gen_By_Fuel_MWh, Fuel_Consumption_BTU, Total_Emissions or
+            Emissions_Intensity
+
+        Returns
+        --------
+        Tuple[List[str], np.ndarray, np.ndarray]
+            States, dates shared by all states, and a read-only view of the values with shape
+            (states, dates, columns)
+        """
+        snapshot = self._current()
+        segments = snapshot.manifest["multi_region"]["segments"][dataset]
+        states = list(segments)
+        # Rows of a dataset are contiguous and sorted by state, then date
+        start, stop = segments[states[0]][0], segments[states[-1]][1]
+        n_dates = segments[states[0]][1] - start
+        dates = snapshot.arrays["multi_region_dates"][start:stop]
+        if n_dates * len(states) != stop - start or not np.array_equal(
+            dates.reshape(len(states), n_dates),
+            np.broadcast_to(dates[:n_dates], (len(states), n_dates)),
+        ):
+            raise ValueError(f"States of the {dataset} dataset do not share the same dates.")
+        values = snapshot.arrays["multi_region"][start:stop]
+        return states, np.asarray(dates[:n_dates]), values.reshape(len(states), n_dates, -1)
+
+    def individual_forecast(self, data_type: str, state: str, fuel_type: str) -> pd.DataFrame:
+        """
+        Individual forecast of a data type, state and fuel type.
+
+        Parameters
+        -----------
+        data_type: str
+            Type of data: one of Net_Gen_By_Fuel_MWh or Fuel_Consumption_BTU
+        state: str
+            State of interest
+        fuel_type: str
+            Type of generation source (coal, wind, etc.)
+
+        Returns
+        --------
+        pd.DataFrame
+            Forecast dataframe with parsed dates (ds), like `read_forecast`
+        """
+        snapshot = self._current()
+        start, stop = snapshot.manifest["forecasts"]["segments"][data_type][state][fuel_type]
+        return _frame(snapshot, "forecasts", "ds", start, stop)
+
+    def _current(self) -> _Snapshot:
+        """Snapshot of the current version, mapping it on first use."""
+        if self._snapshot is None:
+            self.refresh()
+        return self._snapshot
+
+
+# Data planes of this process, shared by its threads (sessions)
+_data_planes: Dict[str, DataPlane] = {}
+_data_planes_lock = threading.Lock()
+
+
+def open_data_plane(frequency: str = DEFAULT_FREQUENCY) -> DataPlane:
+    """
+    Data plane of a frequency shared by all threads of this process, switched to the current
+    version.
+
+    Parameters
+    -----------
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+
+    Returns
+    --------
+    DataPlane
+        Data plane mapping the current version
+    """
+    with _data_planes_lock:
+        data_plane = _data_planes.setdefault(frequency, DataPlane(frequency))
+    data_plane.refresh()
+    return data_plane
+
+
+def publish_data_plane(
+    frequency: str = DEFAULT_FREQUENCY, keep: int = DEFAULT_KEPT_VERSIONS
+) -> str:
+    """
+    Publish the multi-region dataset and individual forecasts of a frequency as a new version
+    of the data plane and point to it. Versions are named after the content hash of their
+    inputs and this code, so publishing unchanged outputs only moves the pointer back to the
+    existing version.
+
+    Parameters
+    -----------
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+    keep: int
+        Number of previous versions to keep for processes which did not switch yet
+
+    Returns
+    --------
+    str
+        Published version
+    """
+    catalog = get_catalog()
+    df_multi_region = catalog.read("multi_region", frequency)
+    data_types = [
+        dataset
+        for dataset in df_multi_region["dataset"].unique()
+        if dataset not in EMISSIONS_DATASETS
+    ]
+    forecasts = [
+        partition
+        for data_type in data_types
+        for partition in catalog.partitions("individual_forecast", frequency, data_type=data_type)
+    ]
+    inputs = fingerprint(
+        [multi_region_filepath(frequency)]
+        + [catalog.filepath("individual_forecast", frequency, **keys) for keys in forecasts],
+        code_version(sys.modules[__name__]),
+    )
+    if None in inputs["inputs"].values():
+        # Outputs stored without files (eg: in SQLite) cannot be hashed, always publish them
+        inputs["published"] = time.time_ns()
+    version = hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()[:16]
+
+    folder = data_plane_folder(frequency)
+    version_folder = os.path.join(folder, version)
+    if not os.path.exists(os.path.join(version_folder, MANIFEST_FILE_NAME)):
+        tmp_folder = "{}.{}.tmp".format(version_folder, os.getpid())
+        os.makedirs(tmp_folder, exist_ok=True)
+        try:
+            manifest = {
+                "version": version,
+                "frequency": frequency,
+                "multi_region": _write_multi_region_arrays(tmp_folder, df_multi_region),
+                "forecasts": _write_forecast_arrays(tmp_folder, forecasts, frequency),
+            }
+            # The manifest is written last: a version folder with a manifest is complete
+            with open(os.path.join(tmp_folder, MANIFEST_FILE_NAME), "w") as f:
+                json.dump(manifest, f)
+            try:
+                os.rename(tmp_folder, version_folder)
+            except OSError:
+                # Published concurrently by another process (same content)
+                log.info(f"Version {version} of the data plane was already published.")
+        finally:
+            shutil.rmtree(tmp_folder, ignore_errors=True)
+        log.info(f"Published version {version} of the {frequency} data plane to {folder}.")
+
+    if read_current_version(frequency) != version:
+        # Newest first when removing old versions, also when switching back to a version
+        os.utime(version_folder)
+        with atomic_write(pointer_filepath(frequency)) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                f.write(version)
+        log.info(f"Switched {frequency} data plane pointer to version {version}.")
+    _remove_old_versions(folder, version, keep)
+    return version
+
+
+def read_current_version(frequency: str = DEFAULT_FREQUENCY) -> Optional[str]:
+    """Version the pointer file of a frequency names (None if nothing was published)."""
+    try:
+        with open(pointer_filepath(frequency), "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def data_plane_folder(frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Folder of the versions and pointer of the data plane of a frequency."""
+    return os.path.join(frequency_folder(REPORTING_FOLDER, frequency), DATA_PLANE_FOLDER)
+
+
+def pointer_filepath(frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of the pointer to the current version of the data plane of a frequency."""
+    return os.path.join(data_plane_folder(frequency), POINTER_FILE_NAME)
+
+
+def _write_multi_region_arrays(folder: str, df: pd.DataFrame) -> dict:
+    """Write values and dates of the multi-region dataset and return their manifest."""
+    df = df.astype({"dataset": str, "state": str})
+    df = df.sort_values(["dataset", "state", "date"], ignore_index=True)
+    columns = [column for column in df.columns if column not in ("dataset", "state", "date")]
+    np.save(os.path.join(folder, "multi_region.npy"), df[columns].to_numpy(np.float64))
+    np.save(os.path.join(folder, "multi_region_dates.npy"), df["date"].to_numpy("M8[ns]"))
+
+    segments: Dict[str, dict] = {}
+    for (dataset, state), idx in df.groupby(["dataset", "state"], sort=False).indices.items():
+        segments.setdefault(dataset, {})[state] = [int(idx[0]), int(idx[-1]) + 1]
+    return {"columns": columns, "segments": segments}
+
+
+def _write_forecast_arrays(folder: str, forecasts: List[dict], frequency: str) -> dict:
+    """Write values and dates of the individual forecasts and return their manifest."""
+    columns: List[str] = []
+    frames = get_catalog().read_many("individual_forecast", forecasts, frequency)
+    segments: Dict[str, dict] = {}
+    start = 0
+    for keys, df in zip(forecasts, frames):
+        columns.extend(column for column in df.columns if column not in columns + ["ds"])
+        segments.setdefault(keys["data_type"], {}).setdefault(keys["state"], {})[
+            keys["fuel_type"]
+        ] = [start, start + len(df)]
+        start += len(df)
+
+    values = np.empty((start, len(columns)), dtype=np.float64)
+    dates = np.empty(start, dtype="M8[ns]")
+    row = 0
+    for df in frames:
+        values[row : row + len(df)] = df.reindex(columns=columns).to_numpy(np.float64)
+        dates[row : row + len(df)] = pd.to_datetime(df["ds"], format="%Y-%m-%d").to_numpy()
+        row += len(df)
+    np.save(os.path.join(folder, "forecasts.npy"), values)
+    np.save(os.path.join(folder, "forecasts_dates.npy"), dates)
+    return {"columns": columns, "segments": segments}
+
+
+def _load_snapshot(version_folder: str) -> _Snapshot:
+    """Read the manifest of a version and map its arrays read-only."""
+    with open(os.path.join(version_folder, MANIFEST_FILE_NAME), "r") as f:
+        manifest = json.load(f)
+    arrays = {
+        name: np.load(os.path.join(version_folder, name + ".npy"), mmap_mode="r")
+        for name in ("multi_region", "multi_region_dates", "forecasts", "forecasts_dates")
+    }
+    return _Snapshot(manifest["version"], manifest, arrays)
+
+
+def _frame(snapshot: _Snapshot, name: str, date_column: str, start: int, stop: int) -> pd.DataFrame:
+    """Frame viewing rows of a mapped array, with the matching dates as first column."""
+    dates = snapshot.arrays[name + "_dates"]
+    # A 2D float array is kept as a single block without copying it, only dates are copied
+    df = pd.DataFrame(snapshot.arrays[name][start:stop], columns=snapshot.manifest[name]["columns"])
+    df.insert(0, date_column, np.asarray(dates[start:stop]))
+    return df
+
+
+def _remove_old_versions(folder: str, current_version: str, keep: int):
+    """Remove all but the current and the most recently published other versions."""
+    version_folders = [
+        path
+        for path in glob.glob(os.path.join(glob.escape(folder), "*"))
+        if os.path.isdir(path)
+        and not path.endswith(".tmp")
+        and os.path.basename(path) != current_version
+    ]
+    version_folders.sort(key=os.path.getmtime, reverse=True)
+    for path in version_folders[keep:]:
+        shutil.rmtree(path, ignore_errors=True)
+        log.info(f"Removed version {os.path.basename(path)} of the data plane.")
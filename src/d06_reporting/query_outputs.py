@@ -0,0 +1,419 @@
+"""
+Embedded SQL query layer over the pipeline outputs.
+
+The emissions stage registers the outputs of a run in one SQLite database per frequency
+(`data/06_reporting/Query/Pipeline-Outputs.sqlite`):
+
+- ``multi_region``: combined generation forecasts of both data types, total emissions and
+  emissions intensity of every state (the multi-region dataset), one row per dataset, state
+  and date with one column per generation type and for emissions intensity
+- ``individual_forecasts``: Prophet forecasts (y, yhat, yhat_lower, yhat_upper) of every data
+  type, state and fuel type
+- ``history``: processed history (model inputs) of every data type, state and fuel type
+- views ``forecasts``, ``total_emissions`` and ``emissions_intensity`` selecting the datasets
+  of ``multi_region``
+
+Tables are indexed (clustered) by their keys and dates are stored as ISO strings (YYYY-MM-DD). Query
+functions push filtering and aggregation by time unit into SQLite and only return the result,
+instead of loading CSVs and grouping them with pandas. Ad hoc queries can use `run_query`::
+
+    run_query(
+        "SELECT state, SUM(coal) AS coal FROM total_emissions "
+        "WHERE date BETWEEN ? AND ? GROUP BY state ORDER BY coal DESC",
+        ("2021-01-01", "2021-12-31"),
+    )
+"""
+# Python Libraries
+import csv
+import logging
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from typing import List, Sequence
+from urllib.request import pathname2url
+
+# Package Imports
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.catalog import get_catalog
+from src.d00_utils.const import DEFAULT_FREQUENCY, REPORTING_FOLDER, frequency_folder
+from src.d00_utils.lineage import code_version, fingerprint, is_current, record_lineage
+from src.d00_utils.utils import atomic_write, ensure_folder
+from src.d06_reporting.calculate_emissions import multi_region_filepath
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+QUERY_FOLDER = "Query"
+QUERY_DATABASE_FILE_NAME = "Pipeline-Outputs.sqlite"
+EMISSIONS_DATASETS = ["Total_Emissions", "Emissions_Intensity"]
+FORECAST_COLUMNS = ["ds", "y", "yhat", "yhat_lower", "yhat_upper"]
+
+# SQL expression of the end date of the period (time unit) of the date column, which is the
+# label pandas gives to groups of `pd.Grouper(freq=time_unit)`
+PERIOD_END_SQL = {
+    "M": "date(date, 'start of month', '+1 month', '-1 day')",
+    "Q": (
+        "date(strftime('%Y-', date) || "
+        "printf('%02d', (CAST(strftime('%m', date) AS INTEGER) + 2) / 3 * 3 - 2) || '-01', "
+        "'+3 months', '-1 day')"
+    ),
+    "Y": "strftime('%Y-12-31', date)",
+}
+
+# Tables are clustered by their primary keys (WITHOUT ROWID), which index them
+VIEWS_SQL = """
+CREATE VIEW forecasts AS
+    SELECT * FROM multi_region WHERE dataset NOT IN ('Total_Emissions', 'Emissions_Intensity');
+CREATE VIEW total_emissions AS
+    SELECT * FROM multi_region WHERE dataset = 'Total_Emissions';
+CREATE VIEW emissions_intensity AS
+    SELECT state, date, emissions_intensity FROM multi_region
+    WHERE dataset = 'Emissions_Intensity';
+"""
+
+
+def build_query_database(frequency: str = DEFAULT_FREQUENCY, force: bool = True) -> str:
+    """
+    Register the multi-region dataset, individual forecasts and processed history of a
+    frequency in a new query database, replacing the previous one once it is complete.
+
+    Parameters
+    -----------
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+    force: bool
+        If False, skip building the database when its inputs and this code are unchanged
+
+    Returns
+    --------
+    str
+        Filepath of the query database
+    """
+    catalog = get_catalog()
+    file_path = query_database_filepath(frequency)
+    df_multi_region = catalog.read("multi_region", frequency)
+    data_types = [
+        dataset
+        for dataset in df_multi_region["dataset"].unique()
+        if dataset not in EMISSIONS_DATASETS
+    ]
+    forecasts = _partitions("individual_forecast", data_types, frequency)
+    history = _partitions("processed", data_types, frequency)
+    inputs = fingerprint(
+        [multi_region_filepath(frequency)]
+        + [catalog.filepath("individual_forecast", frequency, **keys) for keys in forecasts]
+        + [catalog.filepath("processed", frequency, **keys) for keys in history],
+        code_version(sys.modules[__name__]),
+    )
+    if not force and is_current(file_path, inputs):
+        return file_path
+
+    df_multi_region["dataset"] = df_multi_region["dataset"].astype(str)
+    df_multi_region["state"] = df_multi_region["state"].astype(str)
+    df_multi_region["date"] = df_multi_region["date"].dt.strftime("%Y-%m-%d")
+    ensure_folder(os.path.dirname(file_path))
+    with atomic_write(file_path) as tmp_file_path:
+        with closing(sqlite3.connect(tmp_file_path)) as con:
+            _register_dataframe(con, "multi_region", df_multi_region, ["dataset", "state", "date"])
+            _register_partitions(
+                con,
+                "individual_forecasts",
+                "individual_forecast",
+                forecasts,
+                FORECAST_COLUMNS,
+                frequency,
+            )
+            _register_partitions(con, "history", "processed", history, ["ds", "y"], frequency)
+            con.executescript(VIEWS_SQL)
+            con.execute("ANALYZE")
+            con.commit()
+    record_lineage(file_path, inputs)
+    log.info(f"Saved query database of {len(forecasts)} forecasts to {file_path}.")
+    return file_path
+
+
+def connect(frequency: str = DEFAULT_FREQUENCY) -> sqlite3.Connection:
+    """
+    Open a read-only connection to the query database of a frequency.
+
+    Parameters
+    -----------
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+
+    Returns
+    --------
+    sqlite3.Connection
+        Read-only connection (can be shared by threads)
+    """
+    file_path = query_database_filepath(frequency)
+    if not os.path.exists(file_path):
+        raise FileNotFoundError(
+            f"No query database found at {file_path}, run the emissions stage to create it."
+        )
+    uri = "file:{}?mode=ro".format(pathname2url(os.path.abspath(file_path)))
+    return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+
+def run_query(sql: str, params: Sequence = (), frequency: str = DEFAULT_FREQUENCY) -> pd.DataFrame:
+    """
+    Run a SQL query on the query database of a frequency.
+
+    Parameters
+    -----------
+    sql: str
+        SELECT statement with ? placeholders for parameters
+    params: Sequence
+        Parameters of the statement
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+
+    Returns
+    --------
+    pd.DataFrame
+        Query result
+    """
+    with closing(connect(frequency)) as con:
+        return pd.read_sql_query(sql, con, params=list(params))
+
+
+def aggregate_multi_region(
+    datasets: List[str],
+    states: List[str],
+    time_unit: str,
+    frequency: str = DEFAULT_FREQUENCY,
+) -> pd.DataFrame:
+    """
+    Sum generation and emissions of datasets and states by time unit. Emissions intensity of a
+    period is the total emissions of the period divided by its total net generation, so months
+    or quarters are weighted by their generation instead of averaging their intensities.
+
+    Parameters
+    -----------
+    datasets: List[str]
+        Datasets: Net_Gen_By_Fuel_MWh, Fuel_Consumption_BTU, Total_Emissions and/or
+        Emissions_Intensity
+    states: List[str]
+        States of interest
+    time_unit: str
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per dataset, state and period (labelled by its end date) sorted in that order,
+        with one column per generation type and for emissions intensity
+    """
+    with closing(connect(frequency)) as con:
+        value_columns = [
+            column
+            for column in _table_columns(con, "multi_region")
+            if column not in ("dataset", "state", "date")
+        ]
+        # TOTAL sums missing values to 0 like pandas
+        aggregations = ", ".join(
+            'TOTAL("{}") AS "{}"'.format(column, column)
+            for column in value_columns
+            if column != "emissions_intensity"
+        )
+        # Generation-weighted emissions intensity of each state and period (SQLite divides by
+        # zero as NULL)
+        sql = (
+            f"WITH periods AS (SELECT dataset, state, {PERIOD_END_SQL[time_unit]} AS period, "
+            f"{aggregations} FROM multi_region WHERE dataset IN ({_placeholders(datasets)}) "
+            f"AND state IN ({_placeholders(states)}) GROUP BY dataset, state, period), "
+            f"weighted AS (SELECT state, {PERIOD_END_SQL[time_unit]} AS period, "
+            "TOTAL(CASE WHEN dataset = 'Total_Emissions' THEN all_sources END) "
+            "/ TOTAL(CASE WHEN dataset = 'Net_Gen_By_Fuel_MWh' THEN all_sources END) "
+            "AS emissions_intensity FROM multi_region "
+            "WHERE dataset IN ('Total_Emissions', 'Net_Gen_By_Fuel_MWh') "
+            f"AND state IN ({_placeholders(states)}) GROUP BY state, period) "
+            "SELECT periods.*, CASE WHEN dataset = 'Emissions_Intensity' "
+            "THEN weighted.emissions_intensity END AS emissions_intensity "
+            "FROM periods LEFT JOIN weighted USING (state, period) "
+            "ORDER BY dataset, state, period"
+        )
+        df = pd.read_sql_query(sql, con, params=list(datasets) + list(states) + list(states))
+    df = df.rename(columns={"period": "date"})
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    return df
+
+
+def aggregate_individual_forecast(
+    data_type: str,
+    state: str,
+    fuel_type: str,
+    time_unit: str,
+    frequency: str = DEFAULT_FREQUENCY,
+) -> pd.DataFrame:
+    """
+    Sum the individual forecast of a data type, state and fuel type by time unit.
+
+    Parameters
+    -----------
+    data_type: str
+        Type of data: one of Net_Gen_By_Fuel_MWh or Fuel_Consumption_BTU
+    state: str
+        State of interest
+    fuel_type: str
+        Type of generation source (coal, wind, etc.)
+    time_unit: str
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+    frequency: str
+        Frequency of the forecast: one of quarterly or monthly
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per period (ds, labelled by its end date) with y, yhat, yhat_lower and
+        yhat_upper
+    """
+    aggregations = ", ".join('TOTAL("{}") AS "{}"'.format(col, col) for col in FORECAST_COLUMNS[1:])
+    sql = (
+        f"SELECT {PERIOD_END_SQL[time_unit]} AS ds, {aggregations} FROM individual_forecasts "
+        "WHERE data_type = ? AND state = ? AND fuel_type = ? GROUP BY 1 ORDER BY 1"
+    )
+    df = run_query(sql, (data_type, state, fuel_type), frequency)
+    df["ds"] = pd.to_datetime(df["ds"], format="%Y-%m-%d")
+    return df
+
+
+def read_history(
+    data_type: str,
+    state: str = None,
+    fuel_type: str = None,
+    frequency: str = DEFAULT_FREQUENCY,
+) -> pd.DataFrame:
+    """
+    Read processed history of a data type, optionally for one state and/or fuel type.
+
+    Parameters
+    -----------
+    data_type: str
+        Type of data: one of Net_Gen_By_Fuel_MWh or Fuel_Consumption_BTU
+    state: str
+        Optional state of interest (all states by default)
+    fuel_type: str
+        Optional type of generation source (all fuel types by default)
+    frequency: str
+        Frequency of the history: one of quarterly or monthly
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per state, fuel type and date with the value y
+    """
+    conditions, params = ["data_type = ?"], [data_type]
+    for column, value in (("state", state), ("fuel_type", fuel_type)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    sql = (
+        "SELECT state, fuel_type, date, y FROM history WHERE {} "
+        "ORDER BY state, fuel_type, date".format(" AND ".join(conditions))
+    )
+    df = run_query(sql, params, frequency)
+    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
+    return df
+
+
+def query_database_filepath(frequency: str = DEFAULT_FREQUENCY) -> str:
+    """Filepath of the query database of a frequency (folder not created)."""
+    return os.path.join(
+        frequency_folder(REPORTING_FOLDER, frequency), QUERY_FOLDER, QUERY_DATABASE_FILE_NAME
+    )
+
+
+def _partitions(dataset: str, data_types: List[str], frequency: str) -> List[dict]:
+    """Data catalog keys of each data type, state and fuel type of a dataset."""
+    return [
+        keys
+        for data_type in data_types
+        for keys in get_catalog().partitions(dataset, frequency, data_type=data_type)
+    ]
+
+
+def _register_dataframe(
+    con: sqlite3.Connection, table: str, df: pd.DataFrame, key_columns: List[str]
+):
+    """Insert a dataframe into a new table with a primary key, with missing values as NULL."""
+    columns = ", ".join(
+        '"{}" {}'.format(column, "TEXT" if column in key_columns else "REAL")
+        for column in df.columns
+    )
+    con.execute(
+        'CREATE TABLE "{}" ({}, PRIMARY KEY ({})) WITHOUT ROWID'.format(
+            table, columns, ", ".join(key_columns)
+        )
+    )
+    df = df.astype(object).where(df.notna(), None)
+    con.executemany(
+        'INSERT INTO "{}" VALUES ({})'.format(table, _placeholders(df.columns)),
+        df.itertuples(index=False, name=None),
+    )
+
+
+def _register_partitions(
+    con: sqlite3.Connection,
+    table: str,
+    dataset: str,
+    partitions: List[dict],
+    columns: List[str],
+    frequency: str,
+):
+    """
+    Insert the columns of the partitions of a data catalog dataset (one per data type, state and
+    fuel type) into a table keyed by data type, state, fuel type and date, creating the table.
+    """
+    value_columns = columns[1:]
+    con.execute(
+        'CREATE TABLE "{}" (data_type TEXT, state TEXT, fuel_type TEXT, date TEXT, {}, '
+        "PRIMARY KEY (data_type, state, fuel_type, date)) WITHOUT ROWID".format(
+            table, ", ".join('"{}" REAL'.format(column) for column in value_columns)
+        )
+    )
+    insert_sql = 'INSERT INTO "{}" VALUES (?, ?, ?, ?, {})'.format(
+        table, _placeholders(value_columns)
+    )
+    catalog = get_catalog()
+    if catalog.backend_name(dataset) == "csv":
+        # CSV rows are streamed without parsing them into data frames first
+        for keys in partitions:
+            key = (keys["data_type"], keys["state"], keys["fuel_type"])
+            with open(catalog.filepath(dataset, frequency, **keys), "r", newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader)
+                indices = [header.index(column) for column in columns]
+                # Missing values are stored as NULL
+                rows = (
+                    key
+                    + (row[indices[0]],)
+                    + tuple(float(row[idx]) if row[idx] else None for idx in indices[1:])
+                    for row in reader
+                )
+                con.executemany(insert_sql, rows)
+        return
+
+    for keys, df in zip(partitions, catalog.read_many(dataset, partitions, frequency)):
+        key = (keys["data_type"], keys["state"], keys["fuel_type"])
+        dates = pd.to_datetime(df[columns[0]], format="%Y-%m-%d").dt.strftime("%Y-%m-%d")
+        values = df[value_columns].astype(object).where(df[value_columns].notna(), None)
+        con.executemany(
+            insert_sql,
+            (key + (date,) + row for date, row in zip(dates, values.itertuples(False, None))),
+        )
+
+
+def _table_columns(con: sqlite3.Connection, table: str) -> List[str]:
+    """Column names of a table."""
+    return [row[1] for row in con.execute('PRAGMA table_info("{}")'.format(table))]
+
+
+def _placeholders(values: Sequence) -> str:
+    """Comma separated ? placeholders for values."""
+    return ", ".join("?" * len(values))
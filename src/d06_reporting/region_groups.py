@@ -0,0 +1,222 @@
+"""
+Region groups (NERC regions, ISOs, custom groupings of states) computed from state outputs.
+
+Groups are configured by kind in `conf/base/region_groups.yml`. Their datasets have the layout
+of the multi-region dataset, with the group name in place of the state:
+
+- generation, fuel consumption and total emissions are the sums over the states of a group
+- emissions intensity is the total emissions of a group divided by its total net generation,
+  so states are weighted by their generation instead of averaging their intensities
+
+Membership of all groups is precomputed as a sparse matrix (groups x states) in compressed
+sparse row form. Datasets of every group are then the product of that matrix with the stacked
+state arrays of the data plane, one gather and one segmented sum however many groups there are.
+"""
+# Python Libraries
+import logging
+from functools import lru_cache
+from typing import Dict, List, Sequence, Tuple
+
+# Package Imports
+import numpy as np
+import pandas as pd
+
+# First Party Imports
+from src.d00_utils.const import DEFAULT_FREQUENCY, REGION_GROUPS_YML_FILEPATH, get_states
+from src.d00_utils.utils import load_yml
+from src.d06_reporting.data_plane import open_data_plane
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+# Datasets summed over the states of a group (emissions intensity is derived from two of them)
+SUMMED_DATASETS = ["Net_Gen_By_Fuel_MWh", "Fuel_Consumption_BTU", "Total_Emissions"]
+
+
+class GroupMembership:
+    """Sparse membership matrix of groups of states in compressed sparse row form."""
+
+    def __init__(self, groups: Dict[str, Sequence[str]], states: Sequence[str]):
+        """
+
+        Parameters
+        ----------
+        groups: Dict[str, Sequence[str]]
+            States of each group (every group needs at least one state)
+        states: Sequence[str]
+            States in the order of the first axis of the values to aggregate
+        """
+        position = {state: i for i, state in enumerate(states)}
+        self.names = list(groups)
+        # Column indices (states) of the non-zero entries of each row (group)
+        self.indices = np.array(
+            [position[state] for members in groups.values() for state in members], dtype=np.intp
+        )
+        self.indptr = np.cumsum([0] + [len(members) for members in groups.values()])
+        if (np.diff(self.indptr) == 0).any():
+            raise ValueError("Region groups must include at least one state.")
+
+    def aggregate(self, values: np.ndarray) -> np.ndarray:
+        """
+        Sum values over the states of every group (membership matrix times values).
+
+        Parameters
+        ----------
+        values: np.ndarray
+            Values with one row per state along the first axis
+
+        Returns
+        --------
+        np.ndarray
+            Values with one row per group along the first axis
+        """
+        return np.add.reduceat(values[self.indices], self.indptr[:-1], axis=0)
+
+
+@lru_cache(maxsize=None)
+def load_region_groups() -> Dict[str, Dict[str, Tuple[str, ...]]]:
+    """
+    Region groups of each kind (eg: NERC, ISO) from the region groups YAML (parsed once).
+
+    Returns
+    --------
+    Dict[str, Dict[str, Tuple[str, ...]]]
+        States of each group, by kind of grouping
+    """
+    region_groups = {
+        kind: {name: tuple(states) for name, states in groups.items()}
+        for kind, groups in load_yml(REGION_GROUPS_YML_FILEPATH).items()
+    }
+    _validate_region_groups(region_groups)
+    return region_groups
+
+
+def region_group_members() -> Dict[str, Tuple[str, ...]]:
+    """States of every region group of all kinds (group names are unique across kinds)."""
+    return {
+        name: states for groups in load_region_groups().values() for name, states in groups.items()
+    }
+
+
+def aggregate_region_groups(
+    groups: Dict[str, Sequence[str]] = None, frequency: str = DEFAULT_FREQUENCY
+) -> pd.DataFrame:
+    """
+    Datasets of region groups aggregated from the state datasets of the data plane.
+
+    Parameters
+    -----------
+    groups: Dict[str, Sequence[str]]
+        States of each group (all configured groups by default)
+    frequency: str
+        Frequency of the outputs: one of quarterly or monthly
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per dataset, group (`state` column) and date, with one column per generation
+        type and for emissions intensity, like the multi-region dataset
+    """
+    groups = groups if groups is not None else region_group_members()
+    data_plane = open_data_plane(frequency)
+    columns = data_plane.multi_region_columns
+
+    stacked = [data_plane.stacked_multi_region(dataset) for dataset in SUMMED_DATASETS]
+    states, dates = stacked[0][0], stacked[0][1]
+    if any(
+        other_states != states or len(other_dates) != len(dates)
+        for other_states, other_dates, _ in stacked
+    ):
+        raise ValueError("Datasets of the data plane do not share the same states and dates.")
+    membership = _membership(
+        tuple((name, tuple(members)) for name, members in groups.items()), tuple(states)
+    )
+
+    # One product for all datasets and groups: (groups x states) x (states x everything else)
+    values = np.stack([dataset_values for _, _, dataset_values in stacked], axis=1)
+    sums = membership.aggregate(values)
+
+    intensity = np.full(sums.shape[:1] + sums.shape[2:], np.nan)
+    all_sources = columns.index("all_sources")
+    emissions = sums[:, SUMMED_DATASETS.index("Total_Emissions"), :, all_sources]
+    net_gen = sums[:, SUMMED_DATASETS.index("Net_Gen_By_Fuel_MWh"), :, all_sources]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        intensity[:, :, columns.index("emissions_intensity")] = np.where(
+            net_gen != 0, emissions / net_gen, np.nan
+        )
+    sums = np.concatenate([sums, intensity[:, np.newaxis]], axis=1)
+
+    datasets = SUMMED_DATASETS + ["Emissions_Intensity"]
+    index = pd.MultiIndex.from_product(
+        [membership.names, datasets, dates], names=["state", "dataset", "date"]
+    )
+    df = pd.DataFrame(sums.reshape(-1, len(columns)), index=index, columns=columns)
+    return df.reset_index()[["dataset", "state", "date"] + columns]
+
+
+def aggregate_by_time_unit(df: pd.DataFrame, time_unit: str) -> pd.DataFrame:
+    """
+    Sum generation and emissions of datasets and regions by time unit, like
+    `aggregate_multi_region` of the query database. Emissions intensity of a period is the
+    total emissions of the period divided by its total net generation, so months or quarters
+    are weighted by their generation instead of averaging their intensities.
+
+    Parameters
+    -----------
+    df: pd.DataFrame
+        One row per dataset, region (`state` column) and date, like the multi-region dataset.
+        Emissions intensity needs the Total_Emissions and Net_Gen_By_Fuel_MWh rows.
+    time_unit: str
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per dataset, region and period (labelled by its end date) sorted in that order
+    """
+    columns = [column for column in df.columns if column not in ("dataset", "state", "date")]
+    grouped = df.groupby(
+        ["dataset", "state", pd.Grouper(key="date", freq=time_unit)], sort=True, observed=True
+    )
+    aggregated = grouped[columns].sum().reset_index()
+
+    is_intensity = aggregated["dataset"] == "Emissions_Intensity"
+    periods = pd.MultiIndex.from_frame(aggregated.loc[is_intensity, ["state", "date"]])
+    emissions, net_gen = (
+        aggregated[aggregated["dataset"] == dataset]
+        .set_index(["state", "date"])["all_sources"]
+        .reindex(periods)
+        .to_numpy()
+        for dataset in ("Total_Emissions", "Net_Gen_By_Fuel_MWh")
+    )
+    aggregated["emissions_intensity"] = np.nan
+    with np.errstate(divide="ignore", invalid="ignore"):
+        aggregated.loc[is_intensity, "emissions_intensity"] = np.where(
+            net_gen != 0, emissions / net_gen, np.nan
+        )
+    return aggregated
+
+
+@lru_cache(maxsize=16)
+def _membership(
+    groups: Tuple[Tuple[str, Tuple[str, ...]], ...], states: Tuple[str, ...]
+) -> GroupMembership:
+    """Membership matrix of groups over states, computed once per groups and state order."""
+    return GroupMembership(dict(groups), states)
+
+
+def _validate_region_groups(region_groups: Dict[str, Dict[str, Tuple[str, ...]]]):
+    """Check groups include known states only and have unique names."""
+    states = set(get_states())
+    names: List[str] = []
+    for groups in region_groups.values():
+        for name, members in groups.items():
+            unknown = set(members) - states
+            if unknown:
+                raise ValueError(f"Region group {name} includes unknown states: {sorted(unknown)}")
+            if not members:
+                raise ValueError(f"Region group {name} does not include any state.")
+            names.append(name)
+    duplicates = {name for name in names if names.count(name) > 1} | (set(names) & states)
+    if duplicates:
+        raise ValueError(f"Region group names must be unique and differ from states: {duplicates}")
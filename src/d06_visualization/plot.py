@@ -1,8 +1,9 @@
 # Python Libraries
 import logging
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
 
 # Package Imports
+import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
 import plotly.io as pio
@@ -26,6 +27,65 @@ COLORS = [
     "#17becf",  # blue-teal
 ]
 
+# Multi-state plots switch from SVG to WebGL traces above this number of traces
+WEBGL_TRACE_THRESHOLD = 20
+# Significant digits kept for y values sent to the browser
+SIGNIFICANT_DIGITS = 5
+
+
+def _scatter_class(n_traces: int, render_mode: str = "auto"):
+    """Pick SVG (go.Scatter) or WebGL (go.Scattergl) traces.
+
+    render_mode is one of 'auto' (WebGL above WEBGL_TRACE_THRESHOLD traces), 'svg' or 'webgl'.
+    """
+    if render_mode == "webgl" or (render_mode == "auto" and n_traces > WEBGL_TRACE_THRESHOLD):
+        return go.Scattergl
+    return go.Scatter
+
+
+def _trim_precision(values: pd.Series, significant_digits: int = SIGNIFICANT_DIGITS) -> np.ndarray:
+    """Round values to a number of significant digits (relative to the largest value)
+    to shrink the figure JSON without visibly changing the curves."""
+    values = values.to_numpy(dtype=float)
+    max_abs = np.nanmax(np.abs(values)) if len(values) else 0
+    if not np.isfinite(max_abs) or max_abs == 0:
+        return values
+    decimals = max(0, significant_digits - 1 - int(np.floor(np.log10(max_abs))))
+    return np.round(values, decimals)
+
+
+def _decimate(n_points: int, max_points: Optional[int]) -> np.ndarray:
+    """Indices of evenly spaced points (always keeping both ends) to plot at most max_points."""
+    if max_points is None or n_points <= max_points:
+        return np.arange(n_points)
+    return np.unique(np.linspace(0, n_points - 1, max_points).round().astype(int))
+
+
+class _TimeAxis:
+    """Split dataframes into historical and forecast parts, formatting the x-axis arrays as
+    ISO date strings once per set of dates. The arrays are reused when building the traces of
+    all states with the same dates, but each trace still serializes its own copy of them."""
+
+    def __init__(self, forecast_start: pd.Timestamp, max_points: Optional[int] = None):
+        self.forecast_start = forecast_start
+        self.max_points = max_points
+        self._cache = {}
+
+    def split(self, df: pd.DataFrame, date_col: str = "date"):
+        """Return (historical x, historical row positions, forecast x, forecast row positions)."""
+        dates = df[date_col]
+        key = (len(dates), dates.iat[0], dates.iat[-1]) if len(dates) else (0,)
+        if key not in self._cache:
+            dates = pd.to_datetime(dates)
+            is_historical = (dates < self.forecast_start).to_numpy()
+            parts = []
+            for mask in (is_historical, ~is_historical):
+                positions = np.flatnonzero(mask)
+                positions = positions[_decimate(len(positions), self.max_points)]
+                parts.append((dates.iloc[positions].dt.strftime("%Y-%m-%d").to_numpy(), positions))
+            self._cache[key] = (parts[0][0], parts[0][1], parts[1][0], parts[1][1])
+        return self._cache[key]
+
 
 def plot_prophet_forecast(
     fcst: pd.DataFrame,
@@ -140,6 +200,99 @@ def plot_prophet_forecast(
     return fig
 
 
+def plot_forecast_components(
+    fcst: pd.DataFrame,
+    components: Tuple[str, ...] = ("trend", "yearly"),
+    title: str = "",
+    xlabel: str = "Time",
+    figsize: Tuple = (900, 600),
+):
+    """Plot Prophet forecast components (eg: trend, yearly seasonality) over time, each in its
+    own chart with its uncertainty range. Components are read from the columns of the
+    forecast, so unlike `prophet.plot.plot_components_plotly` no trained model is needed.
+
+    Parameters
+    ----------
+    fcst: pd.DataFrame
+        pd.DataFrame output of Prophet model
+    components: Tuple[str, ...]
+        Components to plot (components missing from the forecast are skipped)
+    title: str
+        Optional title of plot
+    xlabel: str
+        Optional label name on X-axis
+    figsize: Tuple
+        Size of output figure
+
+    Returns
+    -------
+    A Plotly Figure.
+    """
+    # Formatting
+    prediction_color = "#1f77b4"
+    error_color = "rgba(0, 114, 178, 0.2)"  # '#0072B2' with 0.2 opacity
+    line_width = 2
+    gap = 0.1
+
+    components = [component for component in components if component in fcst.columns]
+    height = (1 - gap * (len(components) - 1)) / max(len(components), 1)
+    data = []
+    layout = dict(title=title, width=figsize[0], height=figsize[1], showlegend=False)
+    for idx, component in enumerate(components):
+        axis = str(idx + 1) if idx else ""
+        axes = dict(xaxis="x" + axis, yaxis="y" + axis)
+        has_bounds = {component + "_lower", component + "_upper"}.issubset(fcst.columns)
+        if has_bounds:
+            data.append(
+                go.Scatter(
+                    x=fcst["ds"],
+                    y=fcst[component + "_lower"],
+                    mode="lines",
+                    line=dict(width=0),
+                    hoverinfo="skip",
+                    **axes,
+                )
+            )
+        data.append(
+            go.Scatter(
+                name=component.title(),
+                x=fcst["ds"],
+                y=fcst[component],
+                mode="lines",
+                line=dict(color=prediction_color, width=line_width),
+                fillcolor=error_color,
+                fill="tonexty" if has_bounds else None,
+                **axes,
+            )
+        )
+        if has_bounds:
+            data.append(
+                go.Scatter(
+                    x=fcst["ds"],
+                    y=fcst[component + "_upper"],
+                    mode="lines",
+                    line=dict(width=0),
+                    fillcolor=error_color,
+                    fill="tonexty",
+                    hoverinfo="skip",
+                    **axes,
+                )
+            )
+
+        top = 1 - idx * (height + gap)
+        layout["yaxis" + axis] = dict(
+            title=component.title(), domain=[max(top - height, 0), min(top, 1)]
+        )
+        layout["xaxis" + axis] = dict(
+            anchor="y" + axis,
+            type="date",
+            # All charts share the time range of the first one
+            matches="x" if idx else None,
+            title=xlabel if idx == len(components) - 1 else None,
+        )
+    return go.Figure(data=data, layout=layout)
+
+
 def plot_multiple_fuels(
     df: pd.DataFrame,
     multiple_fuels: list,
@@ -232,6 +385,8 @@ def plot_multiple_states(
     xlabel: str = "Time",
     ylabel: str = "y",
     figsize: Tuple = (900, 600),
+    render_mode: str = "auto",
+    max_points: Optional[int] = None,
 ):
     """
     Plot one curve for each state - filter the state forecast dataframe by the filter_col.
@@ -250,6 +405,10 @@ def plot_multiple_states(
         Optional label name on Y-axis
     figsize: Tuple
         Size of output figure
+    render_mode: str
+        One of 'auto' (WebGL traces when there are many states), 'svg' or 'webgl'
+    max_points: Optional[int]
+        Optional maximum number of points per curve (longer series are decimated)
 
     Returns
     -------
@@ -257,27 +416,30 @@ def plot_multiple_states(
     """
     data = []
     curr_quarter_end = pd.to_datetime("today") - pd.tseries.offsets.QuarterEnd()
+    scatter = _scatter_class(2 * len(fcst_by_states), render_mode)
+    time_axis = _TimeAxis(curr_quarter_end, max_points)
     for idx, (state, df) in enumerate(fcst_by_states.items()):
-        df_historical = df[df["date"] < curr_quarter_end]
-        df_forecast = df[df["date"] >= curr_quarter_end]
+        x_historical, historical, x_forecast, forecast = time_axis.split(df)
+        y = df[filter_col]
+        color = COLORS[idx % len(COLORS)]
 
         data.append(
-            go.Scatter(
+            scatter(
                 name=state,
-                x=df_historical["date"],
-                y=df_historical[filter_col],
+                x=x_historical,
+                y=_trim_precision(y.iloc[historical]),
                 mode="lines",
-                line=dict(color=COLORS[idx], width=2),
+                line=dict(color=color, width=2),
             )
         )
 
         data.append(
-            go.Scatter(
+            scatter(
                 name=state + " Forecast",
-                x=df_forecast["date"],
-                y=df_forecast[filter_col],
+                x=x_forecast,
+                y=_trim_precision(y.iloc[forecast]),
                 mode="lines",
-                line=dict(color=COLORS[idx], width=2, dash="dot"),
+                line=dict(color=color, width=2, dash="dot"),
             )
         )
 
@@ -317,6 +479,8 @@ def plot_combined_data_multiple_states(
     xlabel: str = "Time",
     ylabel: str = "y",
     figsize: Tuple = (900, 600),
+    render_mode: str = "auto",
+    max_points: Optional[int] = None,
 ):
     """
     Create a combined plot with top chart showing generation forecast
@@ -339,62 +503,70 @@ def plot_combined_data_multiple_states(
         Optional label name on Y-axis
     figsize: Tuple
         Size of output figure
+    render_mode: str
+        One of 'auto' (WebGL traces when there are many states), 'svg' or 'webgl'
+    max_points: Optional[int]
+        Optional maximum number of points per curve (longer series are decimated)
 
     Returns
     -------
     A Plotly Figure.
     """
     curr_quarter_end = pd.to_datetime("today") - pd.tseries.offsets.QuarterEnd()
+    scatter = _scatter_class(4 * len(emissions_by_states), render_mode)
+    time_axis = _TimeAxis(curr_quarter_end, max_points)
     data = []
     for idx, (state, df) in enumerate(emissions_by_states.items()):
+        color = COLORS[idx % len(COLORS)]
+
         # Emissions Curves
-        emissions_historical = df[df["date"] < curr_quarter_end]
-        emissions_preds = df[df["date"] >= curr_quarter_end]
+        x_historical, historical, x_forecast, forecast = time_axis.split(df)
+        y = df[fuel]
 
         data.append(
-            go.Scatter(
+            scatter(
                 name="CO<sub>2</sub>eq - " + state,
-                x=emissions_historical["date"],
-                y=emissions_historical[fuel],
+                x=x_historical,
+                y=_trim_precision(y.iloc[historical]),
                 mode="lines",
-                line=dict(color=COLORS[idx], width=2),
+                line=dict(color=color, width=2),
             )
         )
 
         data.append(
-            go.Scatter(
+            scatter(
                 name="CO<sub>2</sub>eq - " + state + " Forecast",
-                x=emissions_preds["date"],
-                y=emissions_preds[fuel],
+                x=x_forecast,
+                y=_trim_precision(y.iloc[forecast]),
                 mode="lines",
-                line=dict(color=COLORS[idx], width=2, dash="dot"),
+                line=dict(color=color, width=2, dash="dot"),
             )
         )
 
         # Electricity Generation Curves
         df = gen_by_states[state]
-        gen_historical = df[df["date"] < curr_quarter_end]
-        gen_preds = df[df["date"] >= curr_quarter_end]
+        x_historical, historical, x_forecast, forecast = time_axis.split(df)
+        y = df[fuel]
 
         data.append(
-            go.Scatter(
+            scatter(
                 name=state,
-                x=gen_historical["date"],
-                y=gen_historical[fuel],
+                x=x_historical,
+                y=_trim_precision(y.iloc[historical]),
                 mode="lines",
-                line=dict(color=COLORS[idx], width=2),
+                line=dict(color=color, width=2),
                 xaxis="x",
                 yaxis="y2",
             )
         )
 
         data.append(
-            go.Scatter(
+            scatter(
                 name=state + " Forecast",
-                x=gen_preds["date"],
-                y=gen_preds[fuel],
+                x=x_forecast,
+                y=_trim_precision(y.iloc[forecast]),
                 mode="lines",
-                line=dict(color=COLORS[idx], width=2, dash="dot"),
+                line=dict(color=color, width=2, dash="dot"),
                 xaxis="x",
                 yaxis="y2",
             )
@@ -589,3 +761,97 @@ def plot_map(df: pd.DataFrame, filter_col: str, colorbar_title: str, title: str)
         geo_scope="usa",  # limited map scope to USA
     )
     return fig
+
+
+def plot_map_animated(
+    df: pd.DataFrame,
+    filter_col: str,
+    colorbar_title: str,
+    title: str,
+    frame_col: str = "year",
+    text_col: str = None,
+):
+    """
+    Create a map plot for all US states with one animation frame for each value of frame_col.
+    The colour scale is shared across frames so that values are comparable over time.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Data to plot on map with one row for each state and frame value.
+    filter_col: pd.DataFrame
+        Column to filter data by
+    colorbar_title: list
+        Title for color bar
+    title: str
+        Plot title name (the frame value is appended for each frame)
+    frame_col: str
+        Column to create animation frames from (eg: year)
+    text_col: str
+        Optional column of text shown when hovering over a state (eg: its region group)
+
+    Returns
+    -------
+    A Plotly Figure.
+    """
+    zmin = float(df[filter_col].min())
+    zmax = float(df[filter_col].max())
+
+    frames = []
+    for frame_value, df_frame in df.groupby(frame_col, sort=True):
+        frames.append(
+            go.Frame(
+                name=str(frame_value),
+                data=[
+                    go.Choropleth(
+                        locations=df_frame["state"],
+                        z=df_frame[filter_col].astype(float),
+                        text=df_frame[text_col] if text_col is not None else None,
+                        locationmode="USA-states",
+                        colorscale="YlOrRd",
+                        zmin=zmin,
+                        zmax=zmax,
+                        colorbar_title=colorbar_title,
+                    )
+                ],
+                layout=dict(title_text="{} ({})".format(title, frame_value)),
+            )
+        )
+
+    slider_steps = [
+        dict(
+            label=frame.name,
+            method="animate",
+            args=[[frame.name], dict(mode="immediate", frame=dict(duration=0, redraw=True))],
+        )
+        for frame in frames
+    ]
+    fig = go.Figure(data=frames[-1].data, frames=frames)
+    fig.update_layout(
+        template="seaborn",
+        width=900,
+        height=600,
+        title_text=frames[-1].layout.title.text,
+        geo_scope="usa",  # limited map scope to USA
+        sliders=[
+            dict(active=len(frames) - 1, currentvalue=dict(prefix="Year: "), steps=slider_steps)
+        ],
+        updatemenus=[
+            dict(
+                type="buttons",
+                showactive=False,
+                x=0.05,
+                y=0,
+                xanchor="right",
+                yanchor="top",
+                buttons=[
+                    dict(
+                        label="Play",
+                        method="animate",
+                        args=[None, dict(frame=dict(duration=500, redraw=True), fromcurrent=True)],
+                    )
+                ],
+            )
+        ],
+    )
+    return fig
@@ -1,16 +1,41 @@
 # Python Libraries
 import logging
 import warnings
+from contextlib import nullcontext
+from typing import List
 
 # First Party Imports
-from src.d00_utils.const import EIA_API_IDS_YML_FILEPATH, EMISSIONS_FACTORS_YML_FILEPATH
+from src.d00_utils.checkpoint import (
+    finish_checkpoint,
+    is_completed,
+    mark_completed,
+    start_checkpoint,
+    write_run_marker,
+)
+from src.d00_utils.const import (
+    DEFAULT_FREQUENCY,
+    DEFAULT_GRANULARITY,
+    EIA_API_IDS_YML_FILEPATH,
+    EMISSIONS_FACTORS_YML_FILEPATH,
+    get_states,
+)
+from src.d00_utils.instrumentation import end_run, measure, start_run, write_prometheus_metrics
+from src.d00_utils.profiling import profile
+from src.d00_utils.snapshots import SnapshotStore
 from src.d00_utils.utils import load_yml, setup_env_vars
 from src.d01_data.get_raw_data import EIADataPull
+from src.d02_intermediate.aggregate_plant_data import PlantDataAggregator
+from src.d02_intermediate.clean_plant_data import PlantDataCleaner, plant_source_filepaths
 from src.d02_intermediate.clean_raw_data import DataCleaner
 from src.d03_processing.create_model_input import DataPreprocessor
 from src.d04_modelling.create_prophet_models import ModelTrainer
 from src.d06_reporting.calculate_emissions import EmissionsCalculator
 from src.d06_reporting.create_forecasts import ModelForecast, combine_all_states_generation
+from src.d06_reporting.create_map_figures import MapFigureBuilder
+from src.d06_reporting.create_reports import ReportBuilder
+from src.d06_reporting.data_plane import publish_data_plane
+from src.d06_reporting.query_outputs import build_query_database
+from src.streaming import STREAMING_STAGES, StreamingPipeline
 
 # Suppress Future Warnings
 warnings.simplefilter(action="ignore", category=FutureWarning)
@@ -21,7 +46,38 @@ logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
 class PipelineInterface:
     """Interface class to access and run modular components of the data pipeline."""
 
-    def __init__(self, eia_api_ids_yml_filepath: str, emissions_factors_yml_filepath: str):
+    # Short name and method of each pipeline stage, in the order they need to run
+    STAGES = [
+        ("pull", "pull_data"),
+        ("clean", "clean_data"),
+        ("process", "process_data"),
+        ("train", "train_models"),
+        ("forecast", "create_forecasts"),
+        ("emissions", "calculate_emissions"),
+        ("maps", "create_map_figures"),
+        ("reports", "create_reports"),
+    ]
+    # Stages writing the reporting outputs shown in the app
+    REPORTING_STAGES = ["forecast", "emissions", "maps"]
+
+    def __init__(
+        self,
+        eia_api_ids_yml_filepath: str,
+        emissions_factors_yml_filepath: str,
+        states: List[str] = None,
+        data_types: List[str] = None,
+        fuel_types: List[str] = None,
+        workers: int = 1,
+        dry_run: bool = False,
+        force: bool = False,
+        profiler: str = None,
+        profile_top_n: int = 25,
+        streaming: bool = False,
+        io_workers: int = 8,
+        frequency: str = DEFAULT_FREQUENCY,
+        granularity: str = DEFAULT_GRANULARITY,
+        snapshot: bool = True,
+    ):
         """
         Load EIA API IDs and Emissions Factors from respective YAML filepaths.
         Set up environment variables which contain API Access keys.
@@ -30,31 +86,239 @@ class PipelineInterface:
             Filepath to YAML containing all IDs for data to be pulled from EIA API
         :param emissions_factors_yml_filepath:
             Filepath to YAML containing emissions factors for all types of generation
+        :param states:
+            Optional full names of states to run the pipeline for (all states by default).
+            Combined datasets and map figures always include every state.
+        :param data_types:
+            Optional data types to run the pipeline for (all data types in the yml by default)
+        :param fuel_types:
+            Optional fuel types to run the pipeline for (all fuel types by default).
+            Pulling and cleaning also include the inputs of the calculated "other" feature.
+        :param workers:
+            Number of worker processes used to run states in parallel within each stage
+        :param dry_run:
+            If True, only log the work each stage would do
+        :param force:
+            If False, skip series whose inputs and code are unchanged since they were last
+            created (see `src.d00_utils.lineage`)
+        :param profiler:
+            Optional profiler (sampling or cprofile) to profile each stage with, writing
+            flame graph ready output and a hot functions summary to the logs folder.
+            Stages are run in a single process while profiling.
+        :param profile_top_n:
+            Number of hot functions in the profile summary
+        :param streaming:
+            If True, run the selected stages from pull to forecast as one streaming stage,
+            moving each series through them as soon as its inputs are ready (see `src.streaming`)
+        :param io_workers:
+            Number of series pulled and cleaned concurrently when streaming
+        :param frequency:
+            Frequency of the series: quarterly or monthly (see `FREQUENCIES`). Monthly data is
+            kept in a separate `Monthly` folder within each data folder.
+        :param granularity:
+            Granularity of the source data: state level series pulled from the EIA API, or
+            plant level EIA-923 files which are cleaned in chunks and rolled up to state level
+            series by the clean stage (see `src.d02_intermediate.clean_plant_data`)
+        :param snapshot:
+            If True, record the data folders as a snapshot of every finished run in the
+            content-addressed snapshot store (see `src.d00_utils.snapshots`)
         """
+        if streaming and granularity == "plant":
+            raise ValueError("Plant level data is cleaned per source file and cannot be streamed")
         self.eia_api_ids = load_yml(eia_api_ids_yml_filepath)
+        if data_types is not None:
+            self.eia_api_ids = {
+                data_type: api_ids_dict
+                for data_type, api_ids_dict in self.eia_api_ids.items()
+                if data_type in data_types
+            }
         self.emissions_factors = load_yml(emissions_factors_yml_filepath)
+        self.data_types = data_types
+        self.states = states
+        self.fuel_types = fuel_types
+        self.workers = workers
+        self.dry_run = dry_run
+        self.force = force
+        self.profiler = profiler
+        self.profile_top_n = profile_top_n
+        self.streaming = streaming
+        self.io_workers = io_workers
+        self.frequency = frequency
+        self.granularity = granularity
+        self.snapshot = snapshot
+        self.streamed_stages: List[str] = []
+        if profiler is not None and workers > 1:
+            log.warning("Profiling only covers this process, running stages with 1 worker.")
+            self.workers = 1
         setup_env_vars()
 
+    def run(self, stages: List[str] = None, run_id: str = None):
+        """
+        Run pipeline stages in pipeline order.
+        Every stage and series is instrumented (see `src.d00_utils.instrumentation`),
+        with metrics written to the run log and Prometheus metrics file in the logs folder.
+        Completed stages and series are checkpointed in the run manifest
+        (see `src.d00_utils.checkpoint`), so an interrupted run can be resumed.
+        Once a run completes reporting stages, the completed-run marker tells the running app
+        to pick up the new outputs. Finished runs are recorded as snapshots which can be
+        compared and restored.
+
+        :param stages:
+            Short names of stages to run (see `STAGES`), all stages by default
+        :param run_id:
+            ID of an unfinished run to resume, skipping its completed stages and series
+        """
+        selected_stages = [
+            (stage, method_name)
+            for stage, method_name in PipelineInterface.STAGES
+            if stages is None or stage in stages
+        ]
+        stage_names = [stage for stage, _ in selected_stages]
+        if self.streaming:
+            selected_stages = self._fuse_streaming_stages(selected_stages)
+        if self.dry_run:
+            for stage, _ in selected_stages:
+                log.info(
+                    f"[dry run] Would run stage '{stage}' for data types "
+                    f"{list(self.eia_api_ids)}, states {self.states or 'all'}, "
+                    f"fuel types {self.fuel_types or 'all'} with {self.workers} worker(s)"
+                )
+            return
+
+        resuming = run_id is not None
+        run_id = start_run(run_id=run_id)
+        start_checkpoint(run_id, self._run_config(stage_names))
+        log.info(f"{'Resuming' if resuming else 'Starting'} pipeline run {run_id}")
+        finished = False
+        try:
+            for stage, method_name in selected_stages:
+                if is_completed(stage):
+                    log.info(f"Skipping stage '{stage}' which was completed before resuming")
+                    continue
+                try:
+                    with measure("stage", stage) as record, self._profile_stage(run_id, stage):
+                        if stage == "stream":
+                            record["series_stages"] = self.streamed_stages
+                        getattr(self, method_name)()
+                    mark_completed(stage)
+                    log.info(
+                        f"Stage '{stage}' processed {record['series']} series in "
+                        f"{record['wall_seconds']:.1f}s (CPU {record['cpu_seconds']:.1f}s)"
+                    )
+                finally:
+                    write_prometheus_metrics(run_id)
+            if set(stage_names) & set(PipelineInterface.REPORTING_STAGES):
+                write_run_marker(run_id, self._run_config(stage_names))
+            if self.snapshot:
+                SnapshotStore().snapshot(run_id, self._run_config(stage_names))
+            finished = True
+        finally:
+            finish_checkpoint(finished)
+            end_run()
+
+    def _run_config(self, stages: List[str]) -> dict:
+        """Selection of a run, saved in its manifest to resume it with the same selection."""
+        return {
+            "stages": stages,
+            "states": self.states,
+            "data_types": self.data_types,
+            "fuel_types": self.fuel_types,
+            "force": self.force,
+            "streaming": self.streaming,
+            "frequency": self.frequency,
+            "granularity": self.granularity,
+            "snapshot": self.snapshot,
+        }
+
+    def _fuse_streaming_stages(self, selected_stages: List[tuple]) -> List[tuple]:
+        """Replace the selected stages which can be streamed by a single streaming stage."""
+        self.streamed_stages = [stage for stage, _ in selected_stages if stage in STREAMING_STAGES]
+        fused_stages = []
+        for stage, method_name in selected_stages:
+            if stage not in STREAMING_STAGES:
+                fused_stages.append((stage, method_name))
+            elif stage == self.streamed_stages[0]:
+                fused_stages.append(("stream", "stream_data"))
+        return fused_stages
+
+    def _profile_stage(self, run_id: str, stage: str):
+        """Profile a stage if a profiler is selected (no overhead otherwise)."""
+        if self.profiler is None:
+            return nullcontext()
+        # Name profiles of a single state or fuel after it (eg: a single series)
+        name_parts = [run_id, stage]
+        for selection in (self.states, self.fuel_types):
+            if selection is not None and len(selection) == 1:
+                name_parts.append(selection[0].replace(" ", "_"))
+        return profile("-".join(name_parts), self.profiler, top_n=self.profile_top_n)
+
+    def _source_api_ids(self, api_ids_dict: dict) -> dict:
+        """
+        API IDs of the source series needed for the selected fuel types, including the
+        inputs of the calculated "other" feature.
+        """
+        if self.fuel_types is None:
+            return api_ids_dict
+        source_fuels = set(self.fuel_types)
+        if "other" in source_fuels:
+            source_fuels.update(DataPreprocessor.other_input_fuels)
+        return {fuel: api_id for fuel, api_id in api_ids_dict.items() if fuel in source_fuels}
+
     def pull_data(self):
         """
         Use the EIA API to pull data for all data type IDs in the yml
         for each state in states yml.
         """
+        if self.granularity == "plant":
+            log.info(
+                f"Plant level data is read from {len(plant_source_filepaths())} EIA-923 file(s)"
+            )
+            return
         for data_type, api_ids_dict in self.eia_api_ids.items():
             log.info(f"Loading raw data for {data_type}")
-            eia_data_pull = EIADataPull(api_ids_dict=api_ids_dict, data_type=data_type)
-            eia_data_pull.load_data()
+            eia_data_pull = EIADataPull(
+                api_ids_dict=self._source_api_ids(api_ids_dict),
+                data_type=data_type,
+                states=self.states,
+                frequency=self.frequency,
+            )
+            eia_data_pull.load_data(workers=self.workers)
         log.info("Finished loading all raw data.")
 
     def clean_data(self):
         """Clean pulled raw data in two steps:
         1) Convert raw data from JSON to CSV format (for failed API requests, create empty CSV)
         2) Impute missing data for time periods with no entry (implies no generation in that period)
+        For plant level data, source files are cleaned in chunks and rolled up to state level.
         """
+        if self.granularity == "plant":
+            self._clean_plant_data()
+            return
         for data_type, api_ids_dict in self.eia_api_ids.items():
             log.info(f"Cleaning raw data for {data_type}")
-            data_cleaner = DataCleaner(api_ids_dict=api_ids_dict, data_type=data_type)
-            data_cleaner.clean_data()
+            data_cleaner = DataCleaner(
+                api_ids_dict=self._source_api_ids(api_ids_dict),
+                data_type=data_type,
+                states=self.states,
+                force=self.force,
+                frequency=self.frequency,
+            )
+            data_cleaner.clean_data(workers=self.workers)
+
+    def _clean_plant_data(self):
+        """Clean plant level EIA-923 files into partitions and roll them up to state level."""
+        plant_data_cleaner = PlantDataCleaner(force=self.force)
+        plant_data_cleaner.clean_data(workers=self.workers)
+        for data_type, api_ids_dict in self.eia_api_ids.items():
+            log.info(f"Rolling up plant level data for {data_type}")
+            plant_data_aggregator = PlantDataAggregator(
+                api_ids_dict=self._source_api_ids(api_ids_dict),
+                data_type=data_type,
+                states=self.states,
+                force=self.force,
+                frequency=self.frequency,
+            )
+            plant_data_aggregator.aggregate_data(workers=self.workers)
 
     def process_data(self):
         """
@@ -63,16 +327,29 @@ class PipelineInterface:
         """
         for data_type, api_ids_dict in self.eia_api_ids.items():
             log.info(f"Processing intermediate data for {data_type}")
-            data_process = DataPreprocessor(api_ids_dict=api_ids_dict, data_type=data_type)
-            data_process.process_data()
+            data_process = DataPreprocessor(
+                api_ids_dict=api_ids_dict,
+                data_type=data_type,
+                states=self.states,
+                fuel_types=self.fuel_types,
+                force=self.force,
+                frequency=self.frequency,
+            )
+            data_process.process_data(workers=self.workers)
         log.info("Finished processing intermediate data.")
 
     def train_models(self):
         """Train and Save time-forecasting Prophet models"""
         for data_type in self.eia_api_ids.keys():
             log.info(f"Training and Saving Prophet Models for Category: {data_type}")
-            model_trainer = ModelTrainer(data_type=data_type)
-            model_trainer.train_models()
+            model_trainer = ModelTrainer(
+                data_type=data_type,
+                states=self.states,
+                fuel_types=self.fuel_types,
+                force=self.force,
+                frequency=self.frequency,
+            )
+            model_trainer.train_models(workers=self.workers)
         log.info("Finished training Prophet models.")
 
     def create_forecasts(self):
@@ -87,10 +364,38 @@ class PipelineInterface:
         log.info("Creating forecasts for all Prophet Models...")
         for data_type in self.eia_api_ids.keys():
             log.info(f"Creating forecasts for Category: {data_type}")
-            model_forecaster = ModelForecast(data_type=data_type)
-            model_forecaster.forecast()
+            model_forecaster = ModelForecast(
+                data_type=data_type,
+                states=self.states,
+                fuel_types=self.fuel_types,
+                force=self.force,
+                frequency=self.frequency,
+            )
+            model_forecaster.forecast(workers=self.workers)
         log.info("Finished all forecasting")
-        combine_all_states_generation()
+        combine_all_states_generation(self.frequency)
+
+    def stream_data(self):
+        """
+        Stream each series through the selected stages from pull to forecast as soon as its
+        inputs are ready, overlapping pulling data with training and forecasting models.
+        Combined forecasts of a state are created once all of its series are forecasted.
+        """
+        log.info(f"Streaming series through stages {self.streamed_stages}...")
+        streaming_pipeline = StreamingPipeline(
+            self.eia_api_ids,
+            self.streamed_stages,
+            states=self.states if self.states is not None else list(get_states()),
+            fuel_types=self.fuel_types,
+            force=self.force,
+            workers=self.workers,
+            io_workers=self.io_workers,
+            frequency=self.frequency,
+        )
+        failed = streaming_pipeline.run()
+        if failed:
+            raise RuntimeError(f"{failed} series failed or were skipped while streaming")
+        log.info("Finished streaming all series.")
 
     def calculate_emissions(self):
         """
@@ -101,20 +406,62 @@ class PipelineInterface:
             using total generation and total emissions
         3) Combine State Emissions: Saves a combined CSV of all states for
             both total emissions and emissions intensity
+        4) Combine Multi-Region Dataset: Saves one columnar dataset of generation and
+            emissions for all states, used to compare regions in the app
+        5) Query Database: Registers forecasts, emissions and processed history in an
+            embedded SQL database queried by the app (see `src.d06_reporting.query_outputs`)
+        6) Data Plane: Publishes forecasts and emissions as memory-mapped arrays shared by all
+            app processes, and switches them to this run (see `src.d06_reporting.data_plane`)
         """
         log.info("Calculating emissions for all regions...")
-        emissions_calculator = EmissionsCalculator(emission_factors=self.emissions_factors)
+        emissions_calculator = EmissionsCalculator(
+            emission_factors=self.emissions_factors,
+            states=self.states,
+            force=self.force,
+            frequency=self.frequency,
+        )
         emissions_calculator.calculate_total_emissions()
         emissions_calculator.calculate_emissions_intensity()
         emissions_calculator.combine_state_emissions()
+        emissions_calculator.combine_multi_region_dataset()
+        build_query_database(self.frequency, force=self.force)
+        publish_data_plane(self.frequency)
         log.info("Finished all emission calculations")
 
+    def create_map_figures(self):
+        """
+        Precompute and save the animated USA map figures (one frame per year) for
+        emissions intensity and total emissions of each generation source,
+        so the Streamlit app only has to load and display them.
+        """
+        if self.frequency != DEFAULT_FREQUENCY:
+            log.info("Map figures show yearly emissions, skipping them for non-quarterly data.")
+            return
+        log.info("Creating map figures for all emission types...")
+        map_figure_builder = MapFigureBuilder()
+        map_figure_builder.create_map_figures()
+
+    def create_reports(self):
+        """
+        Render a static HTML report for each state with its generation forecast, forecast
+        components, emissions breakdown and emissions intensity trend, sharing one plotly.js
+        bundle (see `src.d06_reporting.create_reports`).
+        """
+        log.info("Creating reports for all regions...")
+        report_builder = ReportBuilder(
+            states=self.states, force=self.force, frequency=self.frequency
+        )
+        report_builder.create_reports(workers=self.workers)
+
 
-# Sample code to run all pipeline steps
-interface = PipelineInterface(EIA_API_IDS_YML_FILEPATH, EMISSIONS_FACTORS_YML_FILEPATH)
-interface.pull_data()
-interface.clean_data()
-interface.process_data()
-interface.train_models()
-interface.create_forecasts()
-interface.calculate_emissions()
+if __name__ == "__main__":
+    # Sample code to run all pipeline steps (see `python -m src --help` for the command line)
+    interface = PipelineInterface(EIA_API_IDS_YML_FILEPATH, EMISSIONS_FACTORS_YML_FILEPATH)
+    interface.pull_data()
+    interface.clean_data()
+    interface.process_data()
+    interface.train_models()
+    interface.create_forecasts()
+    interface.calculate_emissions()
+    interface.create_map_figures()
+    interface.create_reports()
@@ -0,0 +1,241 @@
+"""
+Sharded execution of model training and forecasting on several nodes.
+
+Training and forecasting are split into work units of one series each (data type, state and
+fuel type), which are grouped into shards and submitted to a work queue on a shared filesystem
+(see `src.d00_utils.work_queue`). Any number of workers, on one or several machines sharing
+the queue and data folders, claim and process shards until the queue is drained. Forecasting
+shards only become claimable once the training shard of the same series is done. The merge step
+then assembles the combined forecasts of each state and of all states, after which the
+emissions and maps stages can be run as usual.
+"""
+# Python Libraries
+import logging
+import os
+import socket
+import subprocess
+import sys
+import time
+import traceback
+from typing import List
+
+# First Party Imports
+from src.d00_utils.const import DEFAULT_FREQUENCY, LOGS_FOLDER
+from src.d00_utils.instrumentation import end_run, start_run
+from src.d00_utils.work_queue import FileWorkQueue
+from src.d04_modelling.create_prophet_models import ModelTrainer
+from src.d06_reporting.create_forecasts import ModelForecast, combine_all_states_generation
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+QUEUE_FOLDER = os.path.join(LOGS_FOLDER, "queue")
+SHARDED_STAGES = ["train", "forecast"]
+
+
+class ShardedPipeline:
+    """Interface to submit, work on and merge shards of the training and forecasting stages."""
+
+    def __init__(self, queue_folder: str = QUEUE_FOLDER, lease_seconds: float = 600):
+        """
+        Parameters
+        ------------
+        queue_folder: str
+            Folder of the work queue, on a filesystem shared by all nodes
+        lease_seconds: float
+            Seconds after which a shard claimed by a worker which stopped responding
+            (eg: its node died) is taken over by another worker
+        """
+        self.queue = FileWorkQueue(queue_folder, lease_seconds)
+
+    def submit(
+        self,
+        data_types: List[str],
+        states: List[str],
+        fuel_types: List[str] = None,
+        stages: List[str] = None,
+        shard_size: int = 8,
+        force: bool = False,
+        frequency: str = DEFAULT_FREQUENCY,
+    ) -> int:
+        """
+        Replace the contents of the queue with shards of the selected work units.
+
+        Parameters
+        -----------
+        data_types: List[str]
+            Data types to train and forecast
+        states: List[str]
+            Full names of states to train and forecast
+        fuel_types: List[str]
+            Optional fuel types to train and forecast (all fuel types by default)
+        stages: List[str]
+            Sharded stages to submit: train and/or forecast (both by default)
+        shard_size: int
+            Number of work units (series) per shard
+        force: bool
+            If False, workers skip series whose inputs and code are unchanged
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
+
+        Returns
+        --------
+        int
+            Number of submitted shards
+        """
+        stages = [stage for stage in SHARDED_STAGES if stages is None or stage in stages]
+        units = [
+            dict(
+                data_type=data_type,
+                state=state,
+                fuel_type=fuel_type,
+                force=force,
+                frequency=frequency,
+            )
+            for data_type in data_types
+            for state in states
+            for fuel_type in ModelTrainer(data_type, fuel_types=fuel_types)._get_fuel_types()
+        ]
+        shards = [units[idx : idx + shard_size] for idx in range(0, len(units), shard_size)]
+
+        self.queue.clear()
+        for stage in stages:
+            for idx, shard_units in enumerate(shards):
+                # Forecasts of a shard need the models trained by the same shard
+                depends_on = []
+                if stage == "forecast" and "train" in stages:
+                    depends_on = ["train-{:05d}".format(idx)]
+                self.queue.submit(
+                    "{}-{:05d}".format(stage, idx),
+                    [dict(unit, stage=stage) for unit in shard_units],
+                    depends_on,
+                )
+        log.info(f"Submitted {len(units)} series as {len(shards)} shard(s) per stage {stages}")
+        return len(shards) * len(stages)
+
+    def work(self, worker_id: str = None, poll_seconds: float = 5) -> int:
+        """
+        Claim and process shards until no shard is left to claim or wait for.
+
+        Parameters
+        -----------
+        worker_id: str
+            ID of the worker (host name and process ID by default)
+        poll_seconds: float
+            Seconds to wait before trying again while shards are blocked by shards
+            claimed by other workers
+
+        Returns
+        --------
+        int
+            Number of shards processed by this worker
+        """
+        worker_id = worker_id or "{}-{}".format(socket.gethostname(), os.getpid())
+        run_id = start_run()
+        log.info(f"Worker {worker_id} recording run {run_id}")
+        processed = 0
+        try:
+            while True:
+                shard = self.queue.claim(worker_id)
+                if shard is None:
+                    # Other workers may still complete shards this worker can continue with
+                    if self.queue.status()["claimed"] == 0:
+                        break
+                    time.sleep(poll_seconds)
+                    continue
+
+                log.info(f"Worker {worker_id} claimed shard {shard['shard_id']}")
+                try:
+                    for unit in shard["units"]:
+                        self._process_unit(unit)
+                        self.queue.heartbeat(shard["shard_id"])
+                except Exception:
+                    log.exception(f"Shard {shard['shard_id']} failed")
+                    self.queue.fail(shard["shard_id"], worker_id, traceback.format_exc())
+                else:
+                    self.queue.complete(shard["shard_id"], worker_id)
+                    processed += 1
+        finally:
+            end_run()
+        log.info(f"Worker {worker_id} processed {processed} shard(s): {self.queue.status()}")
+        return processed
+
+    def merge(self, workers: int = 1) -> bool:
+        """
+        Assemble the combined forecasts of each forecasted state and of all states,
+        once every shard is done.
+
+        Parameters
+        -----------
+        workers: int
+            Number of worker processes combining forecasts of different states in parallel
+
+        Returns
+        --------
+        bool
+            True if the outputs were merged, False if shards are not done yet
+        """
+        status = self.queue.status()
+        if not self.queue.is_finished():
+            log.error(f"Cannot merge before every shard is done: {status}")
+            return False
+
+        states_by_data_type = {}
+        for unit in self.queue.units():
+            if unit["stage"] == "forecast":
+                key = (unit["data_type"], unit["frequency"])
+                states = states_by_data_type.setdefault(key, [])
+                if unit["state"] not in states:
+                    states.append(unit["state"])
+        for (data_type, frequency), states in states_by_data_type.items():
+            log.info(f"Combining {frequency} forecasts of {len(states)} state(s) for {data_type}")
+            forecaster = ModelForecast(data_type, states=states, force=False, frequency=frequency)
+            forecaster.combine_forecasts(workers)
+            if data_type == "Net_Gen_By_Fuel_MWh":
+                combine_all_states_generation(frequency)
+        log.info("Finished merging sharded outputs.")
+        return True
+
+    def run_local(self, nodes: int, poll_seconds: float = 5) -> bool:
+        """
+        Drain the queue with several local worker processes, each standing in for a node,
+        and merge the outputs.
+
+        Parameters
+        -----------
+        nodes: int
+            Number of worker processes
+        poll_seconds: float
+            Seconds workers wait before trying again while shards are blocked
+
+        Returns
+        --------
+        bool
+            True if every shard was done and the outputs were merged
+        """
+        command = [sys.executable, "-m", "src", "shard-worker", "--queue", self.queue.queue_folder]
+        command += ["--lease", str(self.queue.lease_seconds), "--poll", str(poll_seconds)]
+        processes = [
+            subprocess.Popen(command + ["--worker-id", "local-{}".format(idx)])
+            for idx in range(nodes)
+        ]
+        failed_workers = sum(process.wait() != 0 for process in processes)
+        if failed_workers:
+            log.error(f"{failed_workers} worker process(es) exited with an error")
+        return self.merge()
+
+    @staticmethod
+    def _process_unit(unit: dict):
+        """Train the model or create the individual forecast of one series."""
+        selection = dict(
+            states=[unit["state"]],
+            fuel_types=[unit["fuel_type"]],
+            force=unit["force"],
+            frequency=unit["frequency"],
+        )
+        if unit["stage"] == "train":
+            ModelTrainer(unit["data_type"], **selection).train_models()
+        elif unit["stage"] == "forecast":
+            ModelForecast(unit["data_type"], **selection).forecast(combine=False)
+        else:
+            raise ValueError(f"Unexpected sharded stage encountered: {unit['stage']}")
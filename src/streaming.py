@@ -0,0 +1,288 @@
+"""
+Streaming execution of the pull, clean, process, train and forecast stages.
+
+Instead of running every stage for all series before starting the next stage, each series
+moves through the stages as soon as its own inputs are ready:
+
+- An asyncio producer feeds source series (one EIA API ID of a state) into a bounded queue.
+  I/O workers pull each series in a thread pool, then clean it in a process pool.
+- As soon as all intermediate inputs of a feature are cleaned (eg: the four inputs of the
+  calculated "other" feature), the feature is put on a bounded queue and processed, trained
+  and forecasted in a process pool.
+- Once every feature of a state is forecasted, its combined forecast is created.
+
+Bounded queues provide backpressure: when fitting falls behind, pulling pauses instead of
+piling up work in memory. Pulling and fitting overlap, so a run takes about as long as its
+slowest stage rather than the sum of all stages. Series are processed by the same stage
+classes as in a regular run, so lineage, checkpoints and instrumentation apply unchanged.
+"""
+# Python Libraries
+import asyncio
+import logging
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Dict, List, Tuple
+
+# First Party Imports
+from src.d00_utils.const import DEFAULT_FREQUENCY
+from src.d01_data.get_raw_data import EIADataPull
+from src.d02_intermediate.clean_raw_data import DataCleaner
+from src.d03_processing.create_model_input import DataPreprocessor
+from src.d04_modelling.create_prophet_models import ModelTrainer
+from src.d06_reporting.create_forecasts import ModelForecast, combine_all_states_generation
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+# Stages which can be streamed, in pipeline order
+STREAMING_STAGES = ["pull", "clean", "process", "train", "forecast"]
+SOURCE_STAGES = ["pull", "clean"]
+
+# Marks the end of a queue for its consumers
+_END = None
+
+
+class StreamingPipeline:
+    """Run the selected stages per series, overlapping I/O bound and CPU bound stages."""
+
+    def __init__(
+        self,
+        eia_api_ids: dict,
+        stages: List[str],
+        states: List[str],
+        fuel_types: List[str] = None,
+        force: bool = False,
+        workers: int = 1,
+        io_workers: int = 8,
+        queue_size: int = None,
+        frequency: str = DEFAULT_FREQUENCY,
+    ):
+        """
+        Parameters
+        ------------
+        eia_api_ids: dict
+            EIA API IDs of each data type and fuel type (see EIA_API_ids.yml)
+        stages: List[str]
+            Stages to stream (see `STREAMING_STAGES`)
+        states: List[str]
+            Full names of states to run the stages for
+        fuel_types: List[str]
+            Optional fuel types (features) to run the stages for (all fuel types by default).
+            Pulling and cleaning also include the inputs of the calculated "other" feature.
+        force: bool
+            If False, skip series whose inputs and code are unchanged
+        workers: int
+            Number of worker processes processing, training and forecasting features
+        io_workers: int
+            Number of series pulled and cleaned concurrently
+        queue_size: int
+            Maximum number of series waiting in each queue (twice the number of workers
+            by default)
+        frequency: str
+            Frequency of the series: one of quarterly or monthly (see `FREQUENCIES`)
+        """
+        unknown = set(stages) - set(STREAMING_STAGES)
+        if unknown:
+            raise ValueError(f"Stages cannot be streamed: {', '.join(sorted(unknown))}")
+        self.eia_api_ids = eia_api_ids
+        self.stages = stages
+        self.states = states
+        self.fuel_types = fuel_types
+        self.force = force
+        self.workers = workers
+        self.io_workers = io_workers
+        self.queue_size = queue_size or 2 * max(workers, io_workers)
+        self.frequency = frequency
+        self.failed: List[tuple] = []
+
+    def run(self) -> int:
+        """
+        Stream all series through the selected stages.
+
+        Returns
+        --------
+        int
+            Number of series which failed or were skipped because one of their inputs failed
+        """
+        self.failed = []
+        asyncio.run(self._run())
+        if self.failed:
+            log.error(f"{len(self.failed)} series failed: {self.failed}")
+        return len(self.failed)
+
+    async def _run(self):
+        """Start the producer and the I/O and feature workers, and wait for them to finish."""
+        features = self._features()
+        # Intermediate inputs each feature of a state still waits for,
+        # and features each state waits for before combining its forecasts
+        waiting_inputs: Dict[tuple, Dict[str, set]] = defaultdict(dict)
+        waiting_features: Dict[tuple, set] = defaultdict(set)
+        for (data_type, state, fuel_type), inputs in features.items():
+            waiting_inputs[(data_type, state)][fuel_type] = set(inputs)
+            waiting_features[(data_type, state)].add(fuel_type)
+
+        source_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        feature_queue: asyncio.Queue = asyncio.Queue(self.queue_size)
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(self.io_workers) as threads, ProcessPoolExecutor(
+            self.workers
+        ) as processes:
+
+            async def release(source: tuple, ok: bool):
+                """Queue the features whose last input was just cleaned."""
+                data_type, state, source_fuel_type = source
+                state_inputs = waiting_inputs[(data_type, state)]
+                for fuel_type, inputs in list(state_inputs.items()):
+                    if source_fuel_type not in inputs:
+                        continue
+                    inputs.discard(source_fuel_type)
+                    if not ok:
+                        # Never queued, so the state's combined forecast is not created either
+                        del state_inputs[fuel_type]
+                        self.failed.append(("skipped", data_type, state, fuel_type))
+                    elif not inputs:
+                        del state_inputs[fuel_type]
+                        await feature_queue.put((data_type, state, fuel_type))
+
+            async def produce():
+                """Queue every source series, or every feature if no source stage is run."""
+                if any(stage in self.stages for stage in SOURCE_STAGES):
+                    for source in self._sources(features):
+                        await source_queue.put(source)
+                else:
+                    for feature in features:
+                        await feature_queue.put(feature)
+                for _ in range(self.io_workers):
+                    await source_queue.put(_END)
+
+            async def source_worker():
+                """Pull and clean source series until the producer is done."""
+                while True:
+                    source = await source_queue.get()
+                    if source is _END:
+                        return
+                    ok = "pull" not in self.stages or await self._run_step(
+                        loop, threads, _pull_source, source
+                    )
+                    if ok and "clean" in self.stages:
+                        ok = await self._run_step(loop, processes, _clean_source, source)
+                    await release(source, ok)
+
+            async def feature_worker():
+                """Process, train and forecast features, and combine forecasts of done states."""
+                while True:
+                    feature = await feature_queue.get()
+                    if feature is _END:
+                        return
+                    ok = await self._run_step(loop, processes, _stream_feature, feature)
+                    data_type, state, fuel_type = feature
+                    pending = waiting_features[(data_type, state)]
+                    pending.discard(fuel_type)
+                    if not ok:
+                        pending.add("failed")
+                    elif not pending and "forecast" in self.stages:
+                        await self._run_step(loop, threads, _combine_state, (data_type, state))
+
+            feature_workers = [asyncio.ensure_future(feature_worker()) for _ in range(self.workers)]
+            await asyncio.gather(produce(), *(source_worker() for _ in range(self.io_workers)))
+            for _ in range(self.workers):
+                await feature_queue.put(_END)
+            await asyncio.gather(*feature_workers)
+
+        if "forecast" in self.stages and "Net_Gen_By_Fuel_MWh" in self.eia_api_ids:
+            combine_all_states_generation(self.frequency)
+
+    async def _run_step(self, loop, executor, step, series: tuple) -> bool:
+        """Run a step for a series in an executor, recording a failure instead of raising."""
+        try:
+            await loop.run_in_executor(
+                executor,
+                step,
+                self.eia_api_ids[series[0]],
+                self.stages,
+                self.force,
+                self.frequency,
+                *series,
+            )
+            return True
+        except Exception:
+            log.exception(f"Streaming {step.__name__} failed for {series}")
+            self.failed.append((step.__name__, *series))
+            return False
+
+    def _features(self) -> Dict[Tuple[str, str, str], List[str]]:
+        """Intermediate inputs of each feature (data type, state, fuel type) to run."""
+        features = {}
+        for data_type in self.eia_api_ids:
+            fuel_types = ModelTrainer(data_type, fuel_types=self.fuel_types)._get_fuel_types()
+            for state in self.states:
+                for fuel_type in fuel_types:
+                    inputs = [fuel_type]
+                    if data_type == "Net_Gen_By_Fuel_MWh" and fuel_type == "other":
+                        inputs = DataPreprocessor.other_input_fuels
+                    features[(data_type, state, fuel_type)] = inputs
+        return features
+
+    def _sources(self, features: dict) -> List[Tuple[str, str, str]]:
+        """Source series (data type, state, fuel type) needed by the features to run."""
+        sources = []
+        for (data_type, state, _), inputs in features.items():
+            for fuel_type in inputs:
+                source = (data_type, state, fuel_type)
+                if fuel_type in self.eia_api_ids[data_type] and source not in sources:
+                    sources.append(source)
+        return sources
+
+
+def _pull_source(
+    api_ids_dict: dict,
+    stages: List[str],
+    force: bool,
+    frequency: str,
+    data_type: str,
+    state: str,
+    fuel_type: str,
+):
+    """Pull one source series (run in an I/O thread)."""
+    api_ids = {fuel_type: api_ids_dict[fuel_type]}
+    EIADataPull(data_type, api_ids, states=[state], frequency=frequency).load_data()
+
+
+def _clean_source(
+    api_ids_dict: dict,
+    stages: List[str],
+    force: bool,
+    frequency: str,
+    data_type: str,
+    state: str,
+    fuel_type: str,
+):
+    """Clean one source series (run in a worker process)."""
+    api_ids = {fuel_type: api_ids_dict[fuel_type]}
+    DataCleaner(data_type, api_ids, [state], force=force, frequency=frequency).clean_data()
+
+
+def _stream_feature(
+    api_ids_dict: dict,
+    stages: List[str],
+    force: bool,
+    frequency: str,
+    data_type: str,
+    state: str,
+    fuel_type: str,
+):
+    """Process, train and/or forecast one feature (run in a worker process)."""
+    selection = dict(states=[state], fuel_types=[fuel_type], force=force, frequency=frequency)
+    if "process" in stages:
+        DataPreprocessor(data_type, api_ids_dict, **selection).process_data()
+    if "train" in stages:
+        ModelTrainer(data_type, **selection).train_models()
+    if "forecast" in stages:
+        ModelForecast(data_type, **selection).forecast(combine=False)
+
+
+def _combine_state(
+    api_ids_dict: dict, stages: List[str], force: bool, frequency: str, data_type: str, state: str
+):
+    """Combine the individual forecasts of a state once all of them are created."""
+    ModelForecast(data_type, [state], force=force, frequency=frequency).combine_forecasts()
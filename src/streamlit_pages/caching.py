@@ -0,0 +1,137 @@
+"""
+Streamlit cached versions of shared utilities.
+
+Kept separate from `src.d00_utils` so that the data pipeline never imports Streamlit.
+"""
+# Python Libraries
+import functools
+import threading
+from collections import defaultdict
+
+# Package Imports
+import streamlit as st
+
+# First Party Imports
+from src.d00_utils import utils
+from src.d06_reporting import data_plane, query_outputs
+
+_cache_stats = defaultdict(lambda: {"calls": 0, "misses": 0})
+_cache_stats_lock = threading.Lock()
+
+
+def tracked_cache(**cache_kwargs):
+    """
+    Decorator equivalent to `st.cache(**cache_kwargs)` which also counts calls and cache misses
+    of the decorated function (see `get_cache_stats`).
+
+    Parameters
+    ----------
+    cache_kwargs:
+        Keyword arguments passed on to `st.cache`
+    """
+
+    def decorator(func):
+        name = "{}.{}".format(func.__module__, func.__qualname__)
+
+        @functools.wraps(func)
+        def compute(*args, **kwargs):
+            _record_cache_event(name, "misses")
+            return func(*args, **kwargs)
+
+        cached_func = st.cache(**cache_kwargs)(compute)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            _record_cache_event(name, "calls")
+            return cached_func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def _record_cache_event(name: str, event: str):
+    """Increment the counter of a cache event (calls or misses) for a cached function."""
+    with _cache_stats_lock:
+        _cache_stats[name][event] += 1
+
+
+def get_cache_stats() -> dict:
+    """
+    Get calls, misses and hit rate of every function decorated with `tracked_cache`
+    in this process.
+
+    Returns
+    -------
+    dict
+        Dictionary where the key is the cached function name and value is its statistics.
+    """
+    with _cache_stats_lock:
+        stats = {name: dict(counts) for name, counts in _cache_stats.items()}
+    for counts in stats.values():
+        calls = counts["calls"]
+        counts["hit_rate"] = (calls - counts["misses"]) / calls if calls else None
+    return stats
+
+
+def reset_cache_stats():
+    """Reset all cache statistics counters."""
+    with _cache_stats_lock:
+        _cache_stats.clear()
+
+
+@tracked_cache(allow_output_mutation=True, ttl=300)
+def load_config(toml_filepath: str) -> dict:
+    """Loads toml configuration file (cached for 5 minutes).
+
+    Parameters
+    ----------
+    toml_filepath : str
+        filepath to TOML config
+
+    Returns
+    -------
+    dict
+        Configuration file.
+    """
+    return utils.load_config(toml_filepath)
+
+
+@tracked_cache(show_spinner=False)
+def ensure_query_database(frequency: str, modified_time: float) -> str:
+    """Build the query database of a frequency unless it is up to date with the pipeline
+    outputs (checked once per modification of the multi-region dataset).
+
+    Parameters
+    ----------
+    frequency : str
+        Frequency of the outputs: one of quarterly or monthly
+    modified_time : float
+        Modification time of the multi-region dataset, used to check again when it changes
+
+    Returns
+    -------
+    str
+        Filepath of the query database
+    """
+    return query_outputs.build_query_database(frequency, force=False)
+
+
+@tracked_cache(show_spinner=False)
+def ensure_data_plane(frequency: str, modified_time: float) -> str:
+    """Publish the data plane of a frequency unless its current version is up to date with the
+    pipeline outputs (checked once per modification of the multi-region dataset).
+
+    Parameters
+    ----------
+    frequency : str
+        Frequency of the outputs: one of quarterly or monthly
+    modified_time : float
+        Modification time of the multi-region dataset, used to check again when it changes
+
+    Returns
+    -------
+    str
+        Current version of the data plane
+    """
+    return data_plane.publish_data_plane(frequency)
@@ -1,11 +1,15 @@
+# Python Libraries
+import json
+
 # Package Imports
-import pandas as pd
 import streamlit as st
 
 # First Party Imports
-from src.d00_utils.const import REPORTING_FOLDER, STATES_YML_FILEPATH, STREAMLIT_CONFIG_FILEPATH
-from src.d00_utils.utils import get_filepath, load_config, load_yml
-from src.d06_visualization.plot import plot_map
+from src.d00_utils.const import DEFAULT_FREQUENCY, STREAMLIT_CONFIG_FILEPATH
+from src.d06_reporting.create_map_figures import create_region_group_map_figure, read_map_figure
+from src.d06_reporting.region_groups import load_region_groups
+from src.streamlit_pages.caching import ensure_data_plane, load_config, tracked_cache
+from src.streamlit_pages.refresh import ActiveRun, get_active_run, register_warmer
 
 
 def app():
@@ -21,17 +25,16 @@ def app():
         options=["Emissions Intensity", "Total Emissions"],
         help=config["tooltips"]["emissions_type_choice"],
     )
+    regions = st.sidebar.radio(
+        "Show emissions by",
+        options=["State"] + list(load_region_groups()),
+        help=config["tooltips"]["region_groups_choice"],
+    )
 
     # Main Chart Options
     fuel_options = config["data_types"]["Net_Gen_By_Fuel_MWh"]["fuels"]
     turn_off_widget = emissions_type == "Emissions Intensity"
     col1, col2 = st.columns([4, 1])
-    chosen_year = col1.slider(
-        "Pick a year in time",
-        value=2021,
-        min_value=2001,
-        max_value=2025,
-    )
     chosen_fuel = col2.selectbox(
         "Pick a generation type",
         options=fuel_options,
@@ -39,65 +42,123 @@ def app():
         disabled=turn_off_widget,
     )
 
+    # Load precomputed figure (one animation frame per year)
+    run_id = get_active_run().run_id
+    if regions != "State":
+        # Region groups are aggregated from the state datasets of the data plane
+        version = ensure_data_plane(
+            DEFAULT_FREQUENCY, get_active_run().modified_time(DEFAULT_FREQUENCY)
+        )
+        if emissions_type == "Emissions Intensity":
+            fig = load_region_group_map_figure(regions, "intensity", version=version)
+        else:
+            fig = load_region_group_map_figure(regions, "total", chosen_fuel, version)
+    elif emissions_type == "Emissions Intensity":
+        fig = load_map_figure("intensity", run_id=run_id)
+    else:
+        fig = load_map_figure("total", chosen_fuel, run_id)
+
+    years = [int(frame["name"]) for frame in fig["frames"]]
+    chosen_year = col1.slider(
+        "Pick a year in time",
+        value=min(2021, years[-1]),
+        min_value=years[0],
+        max_value=years[-1],
+    )
+
     if chosen_year >= 2022:
         st.write("**Note**: Viewing Forecasted Emissions!")
 
-    # Get Data and Plot Chart
-    if emissions_type == "Emissions Intensity":
-        file_name = "Combined-CO2e-Emissions-Intensity.csv"
-        df = get_emissions_data(file_name)
-
-        # Aggregate by state and time unit (mean aggregation for emissions intensity)
-        df = df.groupby([pd.Grouper(key="date", freq="Y"), "state"]).mean().reset_index()
-        # Filter data for chosen year and remove US region data
-        data = df[df["date"].dt.year == chosen_year]
-        data = data[data["state"] != "United States"]
-
-        # Map state names to state codes
-        states_dict = load_yml(STATES_YML_FILEPATH)
-        data.replace({"state": states_dict}, inplace=True)
-
-        # Chart Elements + Plot
-        title = "Electricity Generation Emissions Intensity by State"
-        colorbar_title = "kg CO<sub>2</sub>e per MWh"
-        fig = plot_map(data, "emissions_intensity", colorbar_title=colorbar_title, title=title)
-    else:
-        file_name = "Combined-CO2e-Total-Emissions.csv"
-        df = get_emissions_data(file_name)
+    st.plotly_chart(select_map_year(fig, chosen_year))
+
+
+@tracked_cache(allow_output_mutation=True, show_spinner=False)
+def load_map_figure(emissions_type: str, fuel: str = None, run_id: str = None) -> dict:
+    """
+    Load precomputed animated map figure (one frame per year).
+
+    Parameters
+    -----------
+    emissions_type: str
+        Type of emissions data: one of total or intensity
+    fuel: str
+        Type of generation source (coal, wind, etc.). Only used for total emissions.
+    run_id: str
+        ID of the pipeline run shown by the app, used to load the figures of a new run
+
+    Returns
+    --------
+    dict
+        Plotly figure as a dictionary
+    """
+    return read_map_figure(emissions_type, fuel)
 
-        # Aggregate by state and time unit (sum aggregation for total emissions)
-        df = df.groupby([pd.Grouper(key="date", freq="Y"), "state"]).sum().reset_index()
-        # Filter data for chosen year and remove US region data
-        data = df[df["date"].dt.year == chosen_year]
-        data = data[data["state"] != "United States"]
 
-        # Map state names to state codes
-        states_dict = load_yml(STATES_YML_FILEPATH)
-        data.replace({"state": states_dict}, inplace=True)
+@tracked_cache(allow_output_mutation=True, show_spinner=False, max_entries=32)
+def load_region_group_map_figure(
+    kind: str, emissions_type: str, fuel: str = None, version: str = None
+) -> dict:
+    """
+    Create animated map figure (one frame per year) of the region groups of a kind.
+
+    Parameters
+    -----------
+    kind: str
+        Kind of region groups (eg: NERC, ISO)
+    emissions_type: str
+        Type of emissions data: one of total or intensity
+    fuel: str
+        Type of generation source (coal, wind, etc.). Only used for total emissions.
+    version: str
+        Version of the data plane, used to create the figures of a new pipeline run
 
-        # Chart Elements + Plot
-        title = "Electricity Generation Emissions by State - {}".format(chosen_fuel.title())
-        colorbar_title = "Thousand metric tons CO<sub>2</sub>e"
-        fig = plot_map(data, chosen_fuel, colorbar_title=colorbar_title, title=title)
-    st.plotly_chart(fig)
+    Returns
+    --------
+    dict
+        Plotly figure as a dictionary
+    """
+    return json.loads(create_region_group_map_figure(kind, emissions_type, fuel))
 
 
-def get_emissions_data(file_name: str) -> pd.DataFrame:
+def select_map_year(fig: dict, year: int) -> dict:
     """
-    Read combined emissions data CSV for plotting.
+    Create a shallow copy of the animated map figure showing the frame for the chosen year.
 
     Parameters
     -----------
-    file_name: str
-        File name of emissions CSV
+    fig: dict
+        Animated Plotly figure as a dictionary
+    year: int
+        Year to display
 
     Returns
     --------
-    pd.DataFrame
-        Emission forecast dataframe
+    dict
+        Plotly figure as a dictionary starting at the chosen year
+    """
+    frame_names = [frame["name"] for frame in fig["frames"]]
+    idx = frame_names.index(str(year))
+    frame = fig["frames"][idx]
+
+    layout = dict(fig["layout"])
+    layout["title"] = frame["layout"]["title"]
+    layout["sliders"] = [dict(layout["sliders"][0], active=idx)]
+    return dict(data=frame["data"], layout=layout, frames=fig["frames"])
+
+
+def warm_caches(run: ActiveRun):
+    """
+    Warm the map figures of every emissions type and generation type for a new pipeline run.
+
+    Parameters
+    -----------
+    run: ActiveRun
+        Run to be swapped in
     """
-    target_folder = "Emission_Forecasts"
-    file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
-    df = pd.read_csv(file_path)
-    df["date"] = pd.to_datetime(df["date"], format="%Y-%m-%d")
-    return df
+    config = load_config(STREAMLIT_CONFIG_FILEPATH)
+    load_map_figure("intensity", run_id=run.run_id)
+    for fuel in config["data_types"]["Net_Gen_By_Fuel_MWh"]["fuels"]:
+        load_map_figure("total", fuel, run.run_id)
+
+
+register_warmer(__name__, warm_caches)
@@ -1,16 +1,42 @@
 # Python Libraries
-from typing import Dict, Tuple
+import gzip
+import io
+import os
+import time
+from typing import Dict, Optional, Tuple
 
 # Package Imports
 import pandas as pd
 import streamlit as st
 
 # First Party Imports
-from src.d00_utils.const import REPORTING_FOLDER, STATES, STREAMLIT_CONFIG_FILEPATH
-from src.d00_utils.utils import get_filepath, load_config
-from src.d06_reporting.calculate_emissions import read_emissions
-from src.d06_reporting.create_forecasts import read_forecast
+from src.d00_utils.const import DEFAULT_FREQUENCY, STREAMLIT_CONFIG_FILEPATH, get_states
+from src.d06_reporting.calculate_emissions import (
+    all_states_emissions_filepath,
+    multi_region_filepath,
+)
+from src.d06_reporting.create_forecasts import all_states_generation_filepath
+from src.d06_reporting.query_outputs import aggregate_multi_region
+from src.d06_reporting.region_groups import (
+    aggregate_by_time_unit,
+    aggregate_region_groups,
+    load_region_groups,
+)
 from src.d06_visualization.plot import plot_combined_data_multiple_states, plot_multiple_states
+from src.streamlit_pages.caching import (
+    ensure_data_plane,
+    ensure_query_database,
+    load_config,
+    tracked_cache,
+)
+from src.streamlit_pages.refresh import ActiveRun, get_active_run, register_warmer
+
+# File extension and MIME type for each download format
+DOWNLOAD_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/octet-stream"),
+}
 
 
 def app():
@@ -30,17 +56,36 @@ def app():
     )
     fuel_options = config["data_types"][data_type]["fuels"]
 
-    time_units_mapping = {"Quarter": "Q", "Year": "Y"}
+    # Monthly data is only offered once the pipeline was run for monthly frequency
+    time_units_mapping = {"Quarter": ("Q", DEFAULT_FREQUENCY), "Year": ("Y", DEFAULT_FREQUENCY)}
+    if os.path.exists(multi_region_filepath("monthly")):
+        time_units_mapping = {"Month": ("M", "monthly"), **time_units_mapping}
     chosen_time_unit = st.sidebar.radio(
-        "Select the time unit to view data by.", options=["Quarter", "Year"]
+        "Select the time unit to view data by.",
+        options=list(time_units_mapping),
+        index=list(time_units_mapping).index("Quarter"),
     )
-    time_unit = time_units_mapping[chosen_time_unit]
+    time_unit, frequency = time_units_mapping[chosen_time_unit]
     chosen_states_multi = st.sidebar.multiselect(
-        "Pick regions to compare.", options=STATES, default=STATES[0]
+        "Pick regions to compare.", options=get_states(), default=get_states()[0]
     )
+    # Group names labelled with their kind (eg: "MRO (NERC)")
+    group_labels = {
+        "{} ({})".format(name, kind): name
+        for kind, groups in load_region_groups().items()
+        for name in groups
+    }
+    chosen_groups = [
+        group_labels[label]
+        for label in st.sidebar.multiselect(
+            "Pick region groups to compare.",
+            options=list(group_labels),
+            help=config["tooltips"]["region_groups_choice"],
+        )
+    ]
 
     # Download Raw Data (through sidebar)
-    setup_data_download(config)
+    setup_data_download(config, chosen_states_multi)
 
     # Chart 1 Options
     st.write("## Electricity Generation & Emissions Across Regions")
@@ -51,9 +96,15 @@ def app():
         help=config["tooltips"]["show_emissions_multi_region"],
     )
 
-    # Get Data for Chart 1
-    emissions_by_states, gen_by_states = get_multi_region_data(
-        chosen_states_multi, data_type, time_unit
+    # Get Data for all charts
+    start_time = time.perf_counter()
+    emissions_by_states, gen_by_states, intensity_by_states = get_multi_region_data(
+        chosen_states_multi, data_type, time_unit, frequency, chosen_groups
+    )
+    n_regions = len(chosen_states_multi) + len(chosen_groups)
+    st.caption(
+        f"Loaded and aggregated data for {n_regions} region(s) in "
+        f"{(time.perf_counter() - start_time) * 1e3:.0f} ms"
     )
 
     # Plot Chart 1
@@ -71,51 +122,155 @@ def app():
     st.plotly_chart(fig)
 
     # Emissions Intensity Section
-    plot_emissions_intensity(chosen_states_multi, time_unit, config)
+    plot_emissions_intensity(intensity_by_states, config)
+
+
+@tracked_cache(allow_output_mutation=True, show_spinner=False, max_entries=64)
+def query_multi_region_data(
+    datasets: Tuple[str, ...],
+    states: Tuple[str, ...],
+    time_unit: str,
+    frequency: str,
+    modified_time: float,
+) -> pd.DataFrame:
+    """
+    Aggregate datasets of states by time unit in the query database.
+
+    Parameters
+    -----------
+    datasets: Tuple[str, ...]
+        Datasets to aggregate (see `aggregate_multi_region`)
+    states: Tuple[str, ...]
+        States to compare
+    time_unit: str
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+    frequency: str
+        Frequency of the data to read: one of quarterly or monthly
+    modified_time: float
+        Modification time of the multi-region dataset, used to invalidate the cache when the
+        pipeline outputs change
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per dataset, state and period
+    """
+    return aggregate_multi_region(list(datasets), list(states), time_unit, frequency)
+
+
+@tracked_cache(allow_output_mutation=True, show_spinner=False, max_entries=4)
+def load_region_group_data(frequency: str, version: str) -> pd.DataFrame:
+    """
+    Datasets of all region groups, aggregated at once from the state datasets of the data plane.
+
+    Parameters
+    -----------
+    frequency: str
+        Frequency of the data to read: one of quarterly or monthly
+    version: str
+        Version of the data plane, used to aggregate the groups of a new pipeline run
+
+    Returns
+    --------
+    pd.DataFrame
+        One row per dataset, group and date (see `aggregate_region_groups`)
+    """
+    return aggregate_region_groups(frequency=frequency)
 
 
 def get_multi_region_data(
-    chosen_states_multi: list, data_type: str, time_unit: str
-) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
+    chosen_states_multi: list,
+    data_type: str,
+    time_unit: str,
+    frequency: str = DEFAULT_FREQUENCY,
+    chosen_groups: list = (),
+) -> Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]:
     """
-    Read generation and emissions data for multiple states
+    Get generation, emissions and emissions intensity data for multiple states using a single
+    query of the pipeline outputs, which filters and aggregates the data in SQLite.
+    Region groups are aggregated from the states of the data plane and added after the states.
 
     Parameters
     -----------
     chosen_states_multi: list
-        File path to YAML config
+        States to compare
     data_type: str
         Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
     time_unit: str
-        String signifying time unit to group data by (Q: Quarter, Y: Year)
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+    frequency: str
+        Frequency of the data to read: one of quarterly or monthly
+    chosen_groups: list
+        Region groups to compare (see `load_region_groups`)
 
     Returns
     --------
-    Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]
-        Each item of tuple is a dictionary where the key is state name and value is generation
-        dataframe for the first tuple item and emissions dataframe for the second tuple item.
+    Tuple[Dict[str, pd.DataFrame], Dict[str, pd.DataFrame], Dict[str, pd.DataFrame]]
+        Each item of tuple is a dictionary where the key is state or group name and value is
+        the emissions, generation and emissions intensity dataframe respectively.
     """
-    gen_by_states = {}
-    emissions_by_states = {}
-    for state in chosen_states_multi:
-        df_generation = read_forecast(data_type, "combined", state)
-        df_generation = aggregate_by_date(df_generation, time_unit)
-        gen_by_states[state] = df_generation
+    datasets = (data_type, "Total_Emissions", "Emissions_Intensity")
+    modified_time = get_active_run().modified_time(frequency)
+    ensure_query_database(frequency, modified_time)
+    df = query_multi_region_data(
+        datasets, tuple(chosen_states_multi), time_unit, frequency, modified_time
+    )
+    if chosen_groups:
+        df_groups = load_region_group_data(frequency, ensure_data_plane(frequency, modified_time))
+        # Emissions intensity is derived from total emissions and net generation by time unit
+        df_groups = aggregate_by_time_unit(
+            df_groups[df_groups["state"].isin(chosen_groups)], time_unit
+        )
+        df = pd.concat([df, df_groups[df_groups["dataset"].isin(datasets)]], ignore_index=True)
 
-        df_emissions = read_emissions("total", state)
-        df_emissions = aggregate_by_date(df_emissions, time_unit)
-        emissions_by_states[state] = df_emissions
-    return emissions_by_states, gen_by_states
+    regions = list(chosen_states_multi) + list(chosen_groups)
+    by_dataset = {}
+    for dataset, df_dataset in df.groupby("dataset", sort=False):
+        by_state = {
+            state: df_state.drop(columns=["dataset", "state"]).reset_index(drop=True)
+            for state, df_state in df_dataset.groupby("state", sort=False)
+        }
+        by_dataset[dataset] = {region: by_state[region] for region in regions if region in by_state}
+    return (
+        by_dataset.get("Total_Emissions", {}),
+        by_dataset.get(data_type, {}),
+        by_dataset.get("Emissions_Intensity", {}),
+    )
 
 
-def setup_data_download(config: dict):
+def warm_caches(run: ActiveRun):
     """
-    Setup widgets for raw data download and return data when button clicked.
+    Warm the cached data of the default selections of this page for a new pipeline run.
+
+    Parameters
+    -----------
+    run: ActiveRun
+        Run to be swapped in
+    """
+    config = load_config(STREAMLIT_CONFIG_FILEPATH)
+    states = (get_states()[0],)
+    for frequency, modified_time in run.modified_times.items():
+        time_units = ["Q", "Y"] if frequency == DEFAULT_FREQUENCY else ["M"]
+        for data_type in config["data_types"]:
+            datasets = (data_type, "Total_Emissions", "Emissions_Intensity")
+            for time_unit in time_units:
+                query_multi_region_data(datasets, states, time_unit, frequency, modified_time)
+        load_region_group_data(frequency, ensure_data_plane(frequency, modified_time))
+
+
+register_warmer(__name__, warm_caches)
+
+
+def setup_data_download(config: dict, chosen_states_multi: list):
+    """
+    Setup widgets for raw data download and prepare data only when requested.
 
     Parameters
     ----------
     config: dict
         Streamlit dict config
+    chosen_states_multi: list
+        States currently selected for comparison
     """
     st.sidebar.write("## Download Data")
     chosen_download_type = st.sidebar.radio(
@@ -127,89 +282,124 @@ def setup_data_download(config: dict):
         ],
         help=config["tooltips"]["download_type_choice"],
     )
-    csv = get_download_data(chosen_download_type)
-    st.sidebar.download_button(
-        label="Download Data as CSV",
-        data=csv,
-        file_name=f"{chosen_download_type}.csv",
-        mime="text/csv",
+    chosen_format = st.sidebar.selectbox("Select the file format", options=list(DOWNLOAD_FORMATS))
+    only_chosen_states = st.sidebar.checkbox("Only include selected regions", value=False)
+    chosen_years = st.sidebar.slider(
+        "Select the years to include", min_value=2001, max_value=2025, value=(2001, 2025)
     )
 
+    # Data is only read and encoded once the user asks for it
+    if st.sidebar.button("Prepare Download"):
+        states = tuple(chosen_states_multi) if only_chosen_states else None
+        years = None if chosen_years == (2001, 2025) else chosen_years
+        file_path = get_download_filepath(chosen_download_type)
+        data = get_download_data(
+            file_path, os.path.getmtime(file_path), chosen_format, states, years
+        )
+
+        extension, mime = DOWNLOAD_FORMATS[chosen_format]
+        st.sidebar.download_button(
+            label=f"Download Data as {chosen_format}",
+            data=data,
+            file_name=f"{chosen_download_type}.{extension}",
+            mime=mime,
+        )
+
 
-def plot_emissions_intensity(chosen_states_multi: list, time_unit: str, config: dict):
+def plot_emissions_intensity(intensity_by_states: Dict[str, pd.DataFrame], config: dict):
     """
-    Get data for emissions intensity for multiple states and plot it.
+    Plot emissions intensity for multiple states.
 
     Parameters
     -----------
-    chosen_states_multi: list
-        File path to YAML config
-    time_unit: str
-        String signifying time unit to group data by (Q: Quarter, Y: Year)
+    intensity_by_states: Dict[str, pd.DataFrame]
+        Dictionary where the key is state name and value is the emissions intensity dataframe
     config: dict
         Streamlit dict config
     """
     st.write("## Emissions Intensity Across Regions")
     with st.expander("More info on emissions intensity", expanded=False):
         st.write(config["explanations"]["emissions_intensity"])
-    emissions_by_states = {}
-    for state in chosen_states_multi:
-        emissions = read_emissions("intensity", state)
-        emissions["date"] = pd.to_datetime(emissions["date"], format="%Y-%m-%d")
-        emissions = emissions.resample(time_unit, on="date").mean().reset_index()
-        emissions_by_states[state] = emissions
     ylabel = "Emissions Intensity (kg CO<sub>2</sub>e per MWh)"
-    fig = plot_multiple_states(emissions_by_states, "emissions_intensity", ylabel=ylabel)
+    fig = plot_multiple_states(intensity_by_states, "emissions_intensity", ylabel=ylabel)
     st.plotly_chart(fig)
 
 
-def aggregate_by_date(df: pd.DataFrame, time_unit: str, date_var: str = "date") -> pd.DataFrame:
+def get_download_filepath(chosen_download_type: str) -> str:
     """
-    Aggregate data by time unit
+    Get filepath of the combined CSV for the type of data to be downloaded.
 
     Parameters
-    -----------
-    df: pd.DataFrame
-        Data to aggregate
-    time_unit: str
-        String signifying time unit to group data by (Q: Quarter, Y: Year)
-    date_var: str
-        String for the data column name in dataframe
+    ------------
+    chosen_download_type: str
+        String for the type of data to be downloaded
 
     Returns
     ---------
-    pd.DataFrame
-        Data grouped by time unit
+    str
+        File path to combined CSV
     """
-    df[date_var] = pd.to_datetime(df[date_var], format="%Y-%m-%d")
-    df = df.resample(time_unit, on=date_var).sum().reset_index()
-    return df
+    if chosen_download_type == "Net Electricity Generation":
+        return all_states_generation_filepath()
+    elif chosen_download_type == "Total Emissions By Generation Source":
+        return all_states_emissions_filepath("total")
+    return all_states_emissions_filepath("intensity")
 
 
-def get_download_data(chosen_download_type: str):
+@tracked_cache(show_spinner=False, max_entries=16)
+def get_download_data(
+    file_path: str,
+    modified_time: float,
+    chosen_format: str,
+    states: Optional[Tuple[str, ...]] = None,
+    years: Optional[Tuple[int, int]] = None,
+) -> bytes:
     """
-    Read data to be downloaded and return as encoded CSV in 'utf-8' format.
+    Read data to be downloaded and return it encoded in the chosen format.
+
+    Without any filters, the stored file bytes (or the stored gzip copy) are returned
+    as-is without parsing the CSV.
 
     Parameters
     ------------
-    chosen_download_type: str
-        String for the type of data to be downloaded
+    file_path: str
+        File path to combined CSV
+    modified_time: float
+        Modification time of the CSV, used to invalidate the cache when the file changes
+    chosen_format: str
+        File format to download: one of the keys of DOWNLOAD_FORMATS
+    states: Optional[Tuple[str, ...]]
+        States to include (all states when None)
+    years: Optional[Tuple[int, int]]
+        First and last year to include (all years when None)
 
     Returns
     ---------
-    CSV
-        CSV data to be downloaded
+    bytes
+        Data to be downloaded
     """
-    if chosen_download_type == "Net Electricity Generation":
-        target_folder = "Combined_Forecasts"
-        file_name = "Combined-Electricity-Generation-All-States.csv"
-    elif chosen_download_type == "Total Emissions By Generation Source":
-        target_folder = "Emission_Forecasts"
-        file_name = "Combined-CO2e-Total-Emissions.csv"
-    else:
-        target_folder = "Emission_Forecasts"
-        file_name = "Combined-CO2e-Emissions-Intensity.csv"
+    if states is None and years is None and chosen_format != "Parquet":
+        gzip_file_path = file_path + ".gz"
+        if chosen_format == "CSV (gzip)" and os.path.exists(gzip_file_path):
+            if os.path.getmtime(gzip_file_path) >= modified_time:
+                with open(gzip_file_path, "rb") as f:
+                    return f.read()
+
+        with open(file_path, "rb") as f:
+            data = f.read()
+        return gzip.compress(data, mtime=0) if chosen_format == "CSV (gzip)" else data
 
-    file_path = get_filepath(REPORTING_FOLDER, target_folder, file_name)
     df = pd.read_csv(file_path)
-    return df.to_csv().encode("utf-8")
+    if states is not None:
+        df = df[df["state"].isin(states)]
+    if years is not None:
+        year = df["date"].str.slice(0, 4).astype(int)
+        df = df[year.between(years[0], years[1])]
+
+    if chosen_format == "Parquet":
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False)
+        return buffer.getvalue()
+
+    data = df.to_csv(index=False).encode("utf-8")
+    return gzip.compress(data, mtime=0) if chosen_format == "CSV (gzip)" else data
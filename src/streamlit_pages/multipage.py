@@ -4,12 +4,16 @@ through an object oriented framework.
 
 This code is borrowed from https://github.com/prakharrathi25/data-storyteller
 """
+# Python Libraries
+import importlib
+
 # Package Imports
 import streamlit as st
 
 # First Party Imports
 from src.d00_utils.const import STREAMLIT_CONFIG_FILEPATH
-from src.d00_utils.utils import load_config
+from src.streamlit_pages.caching import load_config
+from src.streamlit_pages.refresh import pin_active_run, start_refresher
 
 
 # Define the multipage class to manage the multiple apps in our program
@@ -23,29 +27,40 @@ class MultiPage:
         """
         self.pages = []
         self.config = load_config(STREAMLIT_CONFIG_FILEPATH)
+        # Pick up completed pipeline runs in the background (see `src.streamlit_pages.refresh`)
+        start_refresher(poll_seconds=self.config["app"]["refresh_poll_seconds"])
 
-    def add_page(self, title, func) -> None:
+    def add_page(self, title, module, func_name="app") -> None:
         """Class Method to Add pages to the project
 
+        Page modules are only imported once the page is opened, so heavy dependencies
+        of one page (eg: prophet) do not slow down loading any other page.
+
         Parameters
         ------------
         title: str
             The title of page which we are adding to the list of apps
-        func:
-            Python function to render this page in Streamlit
+        module: str
+            Import path of the module rendering this page in Streamlit
+        func_name: str
+            Name of the function in the module which renders the page
         """
-        self.pages.append({"title": title, "function": func})
+        self.pages.append({"title": title, "module": module, "function": func_name})
 
     def run(self):
         st.sidebar.title("Emissions Oracle")
 
         # Dropdown to select the page to run
-        page = st.sidebar.selectbox(
+        titles = [page["title"] for page in self.pages]
+        title = st.sidebar.selectbox(
             "App Navigation",
-            self.pages,
-            format_func=lambda page: page["title"],
+            titles,
             help=self.config["tooltips"]["app_page_choice"],
         )
+        page = self.pages[titles.index(title)]
+        # Every page of this rerun shows the same pipeline run, even if a new one is swapped in
+        pin_active_run()
 
-        # run the app function
-        page["function"]()
+        # import the page module (cached by Python after first use) and run the app function
+        page_module = importlib.import_module(page["module"])
+        getattr(page_module, page["function"])()
@@ -0,0 +1,326 @@
+"""
+Background refresh of the app's cached reporting data once a pipeline run completes.
+
+A daemon thread in every app process watches the completed-run marker which the pipeline
+writes to `data/06_reporting/_RUN_COMPLETE.json` (see `src.d00_utils.checkpoint`). When a new
+run completed, the thread warms the caches for the new outputs: the query database, the data
+plane and the default views of every page opened in this process. It then swaps the active run
+in a single assignment. Pages key their caches by the active run, which is pinned once per
+rerun of a session. Users therefore keep seeing the previous run until the new one is fully
+warmed, and never wait through a cold-cache rerun.
+
+The warm-up and swap times of every refresh are reported by `get_refresh_stats`. They are also
+written in Prometheus text format to `logs/app_refresh_metrics-<pid>.prom`, one file per app
+process.
+"""
+# Python Libraries
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Dict, NamedTuple, Optional
+
+# Package Imports
+import streamlit as st
+
+# First Party Imports
+from src.d00_utils.checkpoint import RUN_MARKER_FILEPATH, read_run_marker
+from src.d00_utils.const import FREQUENCIES, LOGS_FOLDER
+from src.d00_utils.utils import atomic_write
+from src.d06_reporting.calculate_emissions import multi_region_filepath
+from src.streamlit_pages.caching import ensure_data_plane, ensure_query_database
+
+log = logging.getLogger(__name__)
+logging.basicConfig(format="%(asctime)s - %(message)s", level=logging.INFO)
+
+DEFAULT_POLL_SECONDS = 5.0
+REFRESH_METRICS_FILE_NAME = "app_refresh_metrics-{}.prom"
+_SESSION_KEY = "active_run"
+
+# Metric name, type, help text and statistics field of refresh metrics
+REFRESH_METRICS = [
+    ("app_refresh_total", "counter", "Pipeline runs swapped in", "refreshes"),
+    ("app_refresh_failures_total", "counter", "Refreshes which failed to warm", "failures"),
+    ("app_refresh_warmer_errors_total", "counter", "Page warmers which failed", "warmer_errors"),
+    (
+        "app_refresh_warmup_seconds",
+        "gauge",
+        "Time to warm caches of the last run",
+        "last_warmup_seconds",
+    ),
+    ("app_refresh_swap_seconds", "gauge", "Time to swap to the last run", "last_swap_seconds"),
+    (
+        "app_refresh_lag_seconds",
+        "gauge",
+        "Time from completing the last run to showing it",
+        "last_lag_seconds",
+    ),
+]
+
+
+class ActiveRun(NamedTuple):
+    """Pipeline run whose outputs the app shows, and the keys its cached data is read with."""
+
+    run_id: Optional[str]
+    # Modification time of the multi-region dataset of each frequency with outputs
+    modified_times: Dict[str, float]
+
+    def modified_time(self, frequency: str) -> float:
+        """Modification time of the multi-region dataset of a frequency in this run."""
+        if frequency in self.modified_times:
+            return self.modified_times[frequency]
+        # Outputs of the frequency were created after this run was activated
+        return os.path.getmtime(multi_region_filepath(frequency))
+
+
+class ReportingRefresher:
+    """
+    Watches the completed-run marker and swaps the active run once caches are warm.
+    """
+
+    def __init__(
+        self,
+        marker_filepath: str = RUN_MARKER_FILEPATH,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+    ):
+        """
+
+        Parameters
+        ----------
+        marker_filepath: str
+            Path of the completed-run marker written by the pipeline
+        poll_seconds: float
+            Seconds between checks of the marker
+        """
+        self.marker_filepath = marker_filepath
+        self.poll_seconds = poll_seconds
+        self._marker_stat = self._stat_marker()
+        marker = read_run_marker(marker_filepath)
+        # Outputs present at startup are loaded lazily, as before any refresh
+        self.active_run = _snapshot_run(marker["run_id"] if marker else None)
+        self._stats = {
+            "run_id": self.active_run.run_id,
+            "refreshes": 0,
+            "failures": 0,
+            "warmer_errors": 0,
+            "last_warmup_seconds": None,
+            "last_swap_seconds": None,
+            "last_lag_seconds": None,
+            "last_swapped_at": None,
+        }
+        self._stats_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """Start watching the marker in a daemon thread (once)."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._watch, name="reporting-refresher", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self):
+        """Stop watching the marker."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def check(self) -> bool:
+        """
+        Refresh if the marker names a new completed run.
+
+        Returns
+        --------
+        bool
+            True if the active run was swapped
+        """
+        marker_stat = self._stat_marker()
+        if marker_stat is None or marker_stat == self._marker_stat:
+            return False
+        marker = read_run_marker(self.marker_filepath)
+        if marker is None or marker["run_id"] == self.active_run.run_id:
+            self._marker_stat = marker_stat
+            return False
+
+        log.info(f"Pipeline run {marker['run_id']} completed, warming caches for it.")
+        start = time.perf_counter()
+        try:
+            run = _snapshot_run(marker["run_id"])
+            for frequency, modified_time in run.modified_times.items():
+                ensure_query_database(frequency, modified_time)
+                ensure_data_plane(frequency, modified_time)
+        except Exception:
+            # Outputs may still be incomplete, retried at the next check
+            log.exception(f"Failed to warm caches for run {marker['run_id']}")
+            with self._stats_lock:
+                self._stats["failures"] += 1
+            return False
+        warmer_errors = _run_warmers(run)
+        warmup_seconds = time.perf_counter() - start
+
+        swap_start = time.perf_counter()
+        # One assignment: every rerun pins either the previous or the new run
+        self.active_run = run
+        self._marker_stat = marker_stat
+        swap_seconds = time.perf_counter() - swap_start
+
+        with self._stats_lock:
+            self._stats.update(
+                run_id=run.run_id,
+                refreshes=self._stats["refreshes"] + 1,
+                warmer_errors=self._stats["warmer_errors"] + warmer_errors,
+                last_warmup_seconds=warmup_seconds,
+                last_swap_seconds=swap_seconds,
+                last_lag_seconds=time.time() - marker.get("completed_at", time.time()),
+                last_swapped_at=time.time(),
+            )
+        log.info(
+            f"Swapped to run {run.run_id} after warming caches in {warmup_seconds:.2f}s "
+            f"(swap {swap_seconds * 1e6:.0f} us)."
+        )
+        self._write_metrics()
+        return True
+
+    def get_stats(self) -> dict:
+        """Counts of refreshes and failures, and times of the last refresh."""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _watch(self):
+        """Check the marker every poll interval until stopped."""
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception:
+                log.exception("Failed to check for completed pipeline runs")
+
+    def _stat_marker(self) -> Optional[tuple]:
+        """Inode and modification time of the marker, which is replaced by every run."""
+        try:
+            stat = os.stat(self.marker_filepath)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def _write_metrics(self, file_path: str = None) -> str:
+        """Write the refresh statistics of this process in Prometheus text format."""
+        stats = self.get_stats()
+        file_path = file_path or os.path.join(
+            LOGS_FOLDER, REFRESH_METRICS_FILE_NAME.format(os.getpid())
+        )
+        labels = 'process="{}-{}"'.format(socket.gethostname(), os.getpid())
+        lines = [
+            "# HELP app_active_run_info ID of the pipeline run shown by the app process",
+            "# TYPE app_active_run_info gauge",
+            'app_active_run_info{{{},run_id="{}"}} 1'.format(labels, stats["run_id"]),
+        ]
+        for metric, metric_type, help_text, field in REFRESH_METRICS:
+            if stats[field] is not None:
+                lines += [
+                    f"# HELP {metric} {help_text}",
+                    f"# TYPE {metric} {metric_type}",
+                    "{}{{{}}} {}".format(metric, labels, stats[field]),
+                ]
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with atomic_write(file_path) as tmp_file_path:
+            with open(tmp_file_path, "w") as f:
+                f.write("\n".join(lines) + "\n")
+        return file_path
+
+
+# Page warmers (called with the new run before swapping) keyed by page module
+_warmers: Dict[str, Callable[[ActiveRun], None]] = {}
+
+# Refresher of this process, shared by all sessions
+_refresher: Optional[ReportingRefresher] = None
+_refresher_lock = threading.Lock()
+
+
+def start_refresher(poll_seconds: float = DEFAULT_POLL_SECONDS) -> ReportingRefresher:
+    """
+    Refresher of this process, watching the completed-run marker from its first use.
+
+    Parameters
+    -----------
+    poll_seconds: float
+        Seconds between checks of the marker
+
+    Returns
+    --------
+    ReportingRefresher
+        Refresher shared by all sessions of this process
+    """
+    global _refresher
+    with _refresher_lock:
+        if _refresher is None:
+            _refresher = ReportingRefresher(poll_seconds=poll_seconds)
+            _refresher.start()
+        return _refresher
+
+
+def register_warmer(name: str, warmer: Callable[[ActiveRun], None]):
+    """
+    Register a function warming the caches of a page for a new run, before it is swapped in.
+    Pages register when they are first opened, so only caches in use are warmed.
+
+    Parameters
+    -----------
+    name: str
+        Name of the page module (registering again replaces the warmer)
+    warmer: Callable[[ActiveRun], None]
+        Function called with the new run, which must pass its keys to cached functions
+        explicitly instead of calling `get_active_run`
+    """
+    _warmers[name] = warmer
+
+
+def pin_active_run() -> ActiveRun:
+    """Pin the active run for the current rerun of a session (called once per rerun)."""
+    run = start_refresher().active_run
+    st.session_state[_SESSION_KEY] = run
+    return run
+
+
+def get_active_run() -> ActiveRun:
+    """Run pinned for the current rerun of a session, so a swap never happens midway."""
+    run = st.session_state.get(_SESSION_KEY)
+    return run if run is not None else start_refresher().active_run
+
+
+def get_refresh_stats() -> dict:
+    """
+    Refresh statistics of this process.
+
+    Returns
+    -------
+    dict
+        Run ID shown, counts of refreshes, failures and warmer errors, and the warm-up time,
+        swap time and lag of the last refresh
+    """
+    return start_refresher().get_stats()
+
+
+def _snapshot_run(run_id: Optional[str]) -> ActiveRun:
+    """Run with the current modification times of the multi-region datasets."""
+    modified_times = {}
+    for frequency in FREQUENCIES:
+        file_path = multi_region_filepath(frequency)
+        if os.path.exists(file_path):
+            modified_times[frequency] = os.path.getmtime(file_path)
+    return ActiveRun(run_id, modified_times)
+
+
+def _run_warmers(run: ActiveRun) -> int:
+    """Warm the caches of every opened page for a run and return the number of errors."""
+    errors = 0
+    for name, warmer in list(_warmers.items()):
+        try:
+            warmer(run)
+        except Exception:
+            # The page computes whatever failed when it is next viewed
+            log.exception(f"Failed to warm caches of {name} for run {run.run_id}")
+            errors += 1
+    return errors
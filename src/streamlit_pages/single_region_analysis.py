@@ -1,23 +1,34 @@
 # Python Libraries
-import json
-from typing import Tuple
+import os
+from typing import Dict, Tuple
 
 # Package Imports
 import pandas as pd
+import plotly.graph_objects as go
 import streamlit as st
+from prophet import Prophet
 from prophet.plot import plot_components_plotly
-from prophet.serialize import model_from_json
 
 # First Party Imports
-from src.d00_utils.const import MODELS_FOLDER, STATES, STREAMLIT_CONFIG_FILEPATH
-from src.d00_utils.utils import get_filepath, load_config
-from src.d06_reporting.calculate_emissions import read_emissions
-from src.d06_reporting.create_forecasts import read_forecast
+from src.d00_utils.const import DEFAULT_FREQUENCY, STREAMLIT_CONFIG_FILEPATH, get_states
+from src.d06_reporting.create_forecasts import forecast_filepath, read_model
+from src.d06_reporting.data_plane import open_data_plane
+from src.d06_reporting.query_outputs import aggregate_individual_forecast, aggregate_multi_region
 from src.d06_visualization.plot import (
     plot_combined_data_multiple_fuels,
     plot_multiple_fuels,
     plot_prophet_forecast,
 )
+from src.streamlit_pages.caching import (
+    ensure_data_plane,
+    ensure_query_database,
+    load_config,
+    tracked_cache,
+)
+from src.streamlit_pages.refresh import ActiveRun, get_active_run, register_warmer
+
+# Upper bound on (data_type, state, fuel) entries kept in the shared resource caches
+MAX_CACHED_COMPONENTS = 64
 
 
 def app():
@@ -47,7 +58,7 @@ def app():
         )
         fuel_options = config["data_types"][data_type]["fuels"]
 
-        chosen_state = st.sidebar.selectbox("Pick a region to visualize", STATES)
+        chosen_state = st.sidebar.selectbox("Pick a region to visualize", get_states())
         show_all_sources_toggle = st.sidebar.checkbox(
             "Show Elec. Sources Separately",
             value=False,
@@ -58,13 +69,14 @@ def app():
             options=fuel_options,
             disabled=show_all_sources_toggle,
         )
-        time_units_mapping = {"Quarter": "Q", "Year": "Y"}
+        time_units_mapping = get_time_units(data_type, chosen_state)
         chosen_time_unit = st.sidebar.radio(
             "Select the time unit to view data by.",
-            options=["Quarter", "Year"],
+            options=list(time_units_mapping),
+            index=list(time_units_mapping).index("Quarter"),
             help=config["tooltips"]["time_unit_choice"],
         )
-        time_unit = time_units_mapping[chosen_time_unit]
+        time_unit, frequency = time_units_mapping[chosen_time_unit]
 
         # Main Chart Options
         chosen_sources_multi = st.multiselect(
@@ -87,11 +99,11 @@ def app():
 
         # Get Data and Plot
         if show_all_sources_toggle:
-            gen_by_fuels = read_forecast(data_type, "combined", chosen_state, chosen_fuel)
-            gen_by_fuels = aggregate_by_date(gen_by_fuels, time_unit)
+            gen_by_fuels = query_state_data(data_type, chosen_state, time_unit, frequency)
             if show_emissions:
-                emissions_df = read_emissions("total", chosen_state)
-                emissions_df = aggregate_by_date(emissions_df, time_unit)
+                emissions_df = query_state_data(
+                    "Total_Emissions", chosen_state, time_unit, frequency
+                )
 
                 # Chart Elements
                 title = "CO<sub>2</sub> Equivalent Emissions for Specified Generation"
@@ -109,8 +121,9 @@ def app():
                     gen_by_fuels, chosen_sources_multi, title=title, ylabel=ylabel
                 )
         else:
-            gen_by_chosen_fuel = read_forecast(data_type, "individual", chosen_state, chosen_fuel)
-            gen_by_chosen_fuel = aggregate_by_date(gen_by_chosen_fuel, time_unit, "ds")
+            gen_by_chosen_fuel = query_individual_forecast(
+                data_type, chosen_state, chosen_fuel, time_unit, frequency
+            )
 
             title, ylabel = get_chart_labels(chosen_state, data_type)
             title = title + " - {}".format(chosen_fuel.title())
@@ -120,10 +133,36 @@ def app():
         # Prophet Components
         st.write("## Impact of Components in Forecast")
         st.write(config["explanations"]["components"])
-        plot_components(chosen_fuel, chosen_state, data_type)
+        plot_components(chosen_fuel, chosen_state, data_type, frequency)
+
+
+def get_time_units(data_type: str, state: str) -> Dict[str, Tuple[str, str]]:
+    """
+    Time units the data of a state can be viewed by. Monthly data is only offered once the
+    pipeline was run for monthly frequency.
+
+    Parameters
+    -----------
+    data_type: str
+        Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
+    state: str
+        State of interest
+
+    Returns
+    --------
+    Dict[str, Tuple[str, str]]
+        Dictionary where the key is the time unit label and value is the pandas frequency to
+        group data by and the frequency of the data to read
+    """
+    time_units = {"Quarter": ("Q", DEFAULT_FREQUENCY), "Year": ("Y", DEFAULT_FREQUENCY)}
+    if os.path.exists(forecast_filepath(data_type, "combined", state, frequency="monthly")):
+        time_units = {"Month": ("M", "monthly"), **time_units}
+    return time_units
 
 
-def plot_components(chosen_fuel: str, chosen_state: str, data_type: str):
+def plot_components(
+    chosen_fuel: str, chosen_state: str, data_type: str, frequency: str = DEFAULT_FREQUENCY
+):
     """
     Get data for Prophet model components and plot it.
 
@@ -135,21 +174,78 @@ def plot_components(chosen_fuel: str, chosen_state: str, data_type: str):
         State of interest
     data_type: str
         Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
+    frequency: str
+        Frequency of the model: one of quarterly or monthly
     """
-    # Get model and forecast
-    save_folder = "{}/{}".format(data_type, chosen_state)
-    models_file_name = "{}-{}.{}".format(data_type, chosen_fuel, "json")
-    models_file_path = get_filepath(MODELS_FOLDER, save_folder, models_file_name)
-    with open(models_file_path, "r") as fin:
-        model = model_from_json(json.load(fin))
-    forecast = read_forecast(data_type, "individual", chosen_state, chosen_fuel)
-
-    # Plot components
-    forecast["ds"] = pd.to_datetime(forecast["ds"], format="%Y-%m-%d")
-    fig = plot_components_plotly(model, forecast)
+    version = ensure_data_plane(frequency, get_active_run().modified_time(frequency))
+    fig = get_components_figure(data_type, chosen_state, chosen_fuel, frequency, version)
     st.plotly_chart(fig)
 
 
+@tracked_cache(allow_output_mutation=True, max_entries=MAX_CACHED_COMPONENTS, show_spinner=False)
+def load_components_inputs(
+    data_type: str, state: str, fuel: str, frequency: str, version: str
+) -> Tuple[Prophet, pd.DataFrame]:
+    """
+    Load the deserialized Prophet model and its individual forecast. The forecast is a view of
+    the data plane shared by all app processes, so only the model is held by this process.
+
+    Cached across sessions and reruns, keyed by (data_type, state, fuel, frequency, version).
+
+    Parameters
+    -----------
+    data_type: str
+        Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
+    state: str
+        State of interest
+    fuel: str
+        Type of fuel
+    frequency: str
+        Frequency of the model: one of quarterly or monthly
+    version: str
+        Version of the data plane, used to invalidate the cache when the app processes switch to
+        a new pipeline run
+
+    Returns
+    --------
+    Tuple[Prophet, pd.DataFrame]
+        Prophet model and read-only forecast dataframe with parsed dates
+    """
+    model = read_model(data_type, state, fuel, frequency)
+    forecast = open_data_plane(frequency).individual_forecast(data_type, state, fuel)
+    return model, forecast
+
+
+@tracked_cache(allow_output_mutation=True, max_entries=MAX_CACHED_COMPONENTS, show_spinner=False)
+def get_components_figure(
+    data_type: str, state: str, fuel: str, frequency: str, version: str
+) -> go.Figure:
+    """
+    Create the Prophet components figure, memoized by (data_type, state, fuel, frequency,
+    version).
+
+    Parameters
+    -----------
+    data_type: str
+        Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
+    state: str
+        State of interest
+    fuel: str
+        Type of fuel
+    frequency: str
+        Frequency of the model: one of quarterly or monthly
+    version: str
+        Version of the data plane the forecast is read from
+
+    Returns
+    --------
+    go.Figure
+        Plotly figure of the Prophet model components
+    """
+    model, forecast = load_components_inputs(data_type, state, fuel, frequency, version)
+    return plot_components_plotly(model, forecast)
+
+
 def get_chart_labels(chosen_state: str, data_type: str) -> Tuple[str, str]:
     """
     Get strings for chart elements when plotting
@@ -175,24 +271,77 @@ def get_chart_labels(chosen_state: str, data_type: str) -> Tuple[str, str]:
     return title, ylabel
 
 
-def aggregate_by_date(df: pd.DataFrame, time_unit: str, date_var: str = "date") -> pd.DataFrame:
+def query_state_data(
+    dataset: str, state: str, time_unit: str, frequency: str = DEFAULT_FREQUENCY
+) -> pd.DataFrame:
+    """
+    Get combined forecasts or total emissions of a state aggregated by time unit in the
+    query database.
+
+    Parameters
+    -----------
+    dataset: str
+        Dataset: one of `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU` or `Total_Emissions`
+    state: str
+        State of interest
+    time_unit: str
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+    frequency: str
+        Frequency of the data to read: one of quarterly or monthly
+
+    Returns
+    ---------
+    pd.DataFrame
+        Data grouped by time unit with one column per generation type
+    """
+    ensure_query_database(frequency, get_active_run().modified_time(frequency))
+    df = aggregate_multi_region([dataset], [state], time_unit, frequency)
+    return df.drop(columns=["dataset", "state"])
+
+
+def query_individual_forecast(
+    data_type: str, state: str, fuel: str, time_unit: str, frequency: str = DEFAULT_FREQUENCY
+) -> pd.DataFrame:
     """
-    Aggregate data by time unit.
+    Get the individual forecast of a fuel type aggregated by time unit in the query database.
 
     Parameters
     -----------
-    df: pd.DataFrame
-        Data to aggregate
+    data_type: str
+        Type of data being extracted such as `Net_Gen_By_Fuel_MWh`, `Fuel_Consumption_BTU`.
+    state: str
+        State of interest
+    fuel: str
+        Type of fuel
     time_unit: str
-        String signifying time unit to group data by (Q: Quarter, Y: Year)
-    date_var: str
-        String for the data column name in dataframe
+        String signifying time unit to group data by (M: Month, Q: Quarter, Y: Year)
+    frequency: str
+        Frequency of the forecast: one of quarterly or monthly
 
     Returns
     ---------
     pd.DataFrame
-        Data grouped by time unit
+        Forecast (ds, y, yhat, yhat_lower and yhat_upper) grouped by time unit
+    """
+    ensure_query_database(frequency, get_active_run().modified_time(frequency))
+    return aggregate_individual_forecast(data_type, state, fuel, time_unit, frequency)
+
+
+def warm_caches(run: ActiveRun):
     """
-    df[date_var] = pd.to_datetime(df[date_var], format="%Y-%m-%d")
-    df = df.resample(time_unit, on=date_var).sum().reset_index()
-    return df
+    Warm the Prophet components of the default selection of this page for a new pipeline run.
+
+    Parameters
+    -----------
+    run: ActiveRun
+        Run to be swapped in
+    """
+    config = load_config(STREAMLIT_CONFIG_FILEPATH)
+    data_type = "Net_Gen_By_Fuel_MWh"
+    fuel = config["data_types"][data_type]["fuels"][0]
+    for frequency, modified_time in run.modified_times.items():
+        version = ensure_data_plane(frequency, modified_time)
+        get_components_figure(data_type, get_states()[0], fuel, frequency, version)
+
+
+register_warmer(__name__, warm_caches)